@@ -5,13 +5,42 @@
 解决前端CORS跨域问题
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, make_response, has_request_context
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 import requests
 import logging
-import time
-import sqlite3
+import math
 import os
+import atexit
+import hashlib
+import json
+import re
+import select
+import socket
+import sqlite3
+import ssl
+import time
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from functools import wraps
+
+from upstream import SessionPool, HostPacer, SharedHostPacer, CircuitBreaker, UpstreamUnavailable, WARMUP_URLS, CACHE_DIR, BLOCKED, ERROR, TIMEOUT, normalize_url, site_of
+from fetcher import DISCONNECT_POLL_INTERVAL, ClientDisconnected, FetchEngine
+from extractors import extract_notes, extract_recipes, extract_recipe_detail
+from note_extractors import BAIDU_REDIRECT_NOTICE, extractor_for
+from iplocate import IpLocator, IpQuotaExceeded, normalize_client_ip, ip_prefix
+from db import ConnectionPool, SchemaOutdatedError
+from search import search_dishes, search_shops, feed
+from pagination import encode_cursor, decode_cursor, keyset_page
+from tokens import TokenIndex
+from rankings import ThemeRankings, dish_leaderboard, shop_leaderboard
+from geo import AMAP_KEY, MAX_RADIUS, nearby_shops, nearby_dishes, wgs84_to_gcj02
+from cache import TTLCache, SharedStore, GeoCache, RedirectCache, SingleFlight, cache_key
+from compression import init_compression, negotiate_encoding
+from passthrough import passthrough_response, read_result, upstream_accept_encoding
+from warmer import CacheWarmer
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -20,6 +49,12 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)  # 允许所有来源的跨域请求
 
+# 部署在反向代理之后时，按代理层数信任 X-Forwarded-For，request.remote_addr 即为真实客户端IP
+# 默认不信任（直连时任何客户端都能伪造该请求头），部署在代理之后时再设置代理层数
+TRUSTED_PROXIES = int(os.environ.get('AI_GOURMET_TRUSTED_PROXIES', 0))
+if TRUSTED_PROXIES > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+
 # 请求头模拟真实浏览器
 def get_headers(referer='https://www.douguo.com/', site='douguo'):
     """
@@ -52,6 +87,501 @@ def get_headers(referer='https://www.douguo.com/', site='douguo'):
         'DNT': '1',
     }
 
+# 工作进程数（多进程部署时由 serve.py 设置）：ip-api.com 配额由各进程平分
+WORKER_COUNT = max(1, int(os.environ.get('AI_GOURMET_WORKERS', 1)))
+
+# 按站点的请求节奏控制，替代请求中固定的 time.sleep
+# 多进程部署时所有进程共用 .cache/pacer.db 中的令牌桶（运行缓存预热的进程不会只分到一份额度）；
+# 共享令牌桶不可用时各进程退回平分的速率
+if WORKER_COUNT > 1:
+    host_pacer = SharedHostPacer(os.path.join(CACHE_DIR, 'pacer.db'), share=1 / WORKER_COUNT)
+else:
+    host_pacer = HostPacer()
+
+# 上游Session池：按站点复用keep-alive连接，cookie在后台预热并落盘
+session_pool = SessionPool(
+    headers_factory=lambda site: get_headers(WARMUP_URLS[site], site.split('.')[0]),
+    pacer=host_pacer
+)
+
+# 按站点的熔断器：遇到安全验证、连续超时或5xx后暂停请求该站点，到期后用一个请求探测恢复
+upstream_breaker = CircuitBreaker()
+
+# 异步抓取引擎：上游I/O在事件循环中完成，按站点限制并发
+fetch_engine = FetchEngine(session_pool=session_pool, pacer=host_pacer, breaker=upstream_breaker)
+atexit.register(fetch_engine.stop)
+
+# 批量笔记详情的工作线程：线程只负责等待抓取结果和解析HTML，上游并发仍由抓取引擎按站点限制
+note_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('AI_GOURMET_NOTE_WORKERS', 16)),
+    thread_name_prefix='note-detail'
+)
+atexit.register(note_executor.shutdown, wait=False, cancel_futures=True)
+
+def client_disconnect_probe():
+    """
+    返回检查当前请求的客户端是否已断开的函数；不在请求中（后台任务）或拿不到连接时返回None
+    
+    GET请求没有未读的请求体，连接可读时要么是对端已关闭（MSG_PEEK读到空），要么是下一个请求
+    """
+    if not has_request_context():
+        return None
+    sock = request.environ.get('gunicorn.socket') or request.environ.get('werkzeug.socket')
+    if sock is None or isinstance(sock, ssl.SSLSocket):
+        return None
+    
+    def is_disconnected():
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+        except (OSError, ValueError):
+            return True     # 连接已重置或已关闭
+    return is_disconnected
+
+def fetch_upstream(url, site='douguo', referer='https://www.douguo.com/', timeout=15, headers=None, coalesce=True):
+    """
+    通过异步抓取引擎请求上游页面（cookie来自共享Session池）
+    
+    在请求中调用时，客户端断开后取消上游请求并抛出 ClientDisconnected
+    
+    参数:
+    - url: 目标URL
+    - site: headers类型 ('baidu' 或 'douguo')
+    - referer: 来源页面URL
+    - timeout: 超时时间（秒）
+    - headers: 自定义headers，传入时忽略site/referer
+    - coalesce: 是否与进行中的相同请求合并（重试时为False）
+    """
+    return fetch_engine.fetch(url, headers=headers or get_headers(referer, site), timeout=timeout, coalesce=coalesce,
+                              is_disconnected=client_disconnect_probe())
+
+class SecurityCheckError(Exception):
+    """上游返回了百度安全验证页面"""
+
+def is_security_check(text_content):
+    """检测是否是百度安全验证页面"""
+    return '百度安全验证' in text_content or 'mkdjump' in text_content
+
+def fetch_page_text(url, site='douguo', referer='https://www.douguo.com/', timeout=15, check_security=False):
+    """
+    请求上游页面并返回解码后的HTML文本
+    
+    - 非2xx状态抛出 requests.HTTPError
+    - check_security=True 时遇到百度安全验证抛出 SecurityCheckError
+    """
+    response = fetch_upstream(url, site, referer, timeout=timeout)
+    response.raise_for_status()
+    
+    # response.text会：1) 自动解压gzip  2) 根据Content-Type自动解码
+    text_content = response.text
+    logger.info(f"请求成功: status={response.status_code}, encoding={response.encoding}, length={len(text_content)} 字符")
+    
+    if check_security and is_security_check(text_content):
+        logger.warning("⚠️ 触发百度安全验证")
+        upstream_breaker.record_block(url)
+        raise SecurityCheckError(url)
+    return text_content
+
+# 各接口的缓存时间（秒）：(新鲜期, 宽限期)
+CACHE_TTLS = {
+    'search-notes': (600, 1800),
+    'search-recipes': (1800, 3600),
+    'featured-recipes': (900, 3600),
+    'health-recipes': (1800, 3600),
+    # IP定位结果按网段缓存（IPv4 /24、IPv6 /48）
+    'ip-location': (6 * 3600, 0),
+    # 解析结果按（URL, 内容哈希）缓存，内容变化后自然失效，这里只决定在内存中保留多久
+    'parsed': (6 * 3600, 0),
+    # 负缓存：上游请求失败（安全验证、超时、5xx）后，同一请求在这段时间内直接失败
+    'upstream-failure': (30, 0),
+}
+
+# 多进程共享的页面缓存（本地SQLite）：多进程部署时默认开启，各进程共用抓取的页面、解析结果和负缓存
+SHARED_PAGE_CACHE = os.environ.get('AI_GOURMET_SHARED_CACHE', '1' if WORKER_COUNT > 1 else '0') != '0'
+
+# 搜索页响应缓存：按内存占用LRU淘汰，过期后在宽限期内先返回旧数据并后台刷新
+# 开启共享时，CACHE_TTLS 中各类条目同时写入 page_cache.db（压缩结果只留在进程内存中）
+page_cache = TTLCache(
+    max_bytes=int(os.environ.get('AI_GOURMET_PAGE_CACHE_MB', 64)) * 1024 * 1024,
+    shared=SharedStore(os.path.join(CACHE_DIR, 'page_cache.db')) if SHARED_PAGE_CACHE else None,
+    shared_namespaces=CACHE_TTLS
+)
+
+# 响应压缩（gzip / brotli），较大页面的压缩结果也放在页面缓存中
+init_compression(app, cache=page_cache)
+
+# 逆地理编码缓存：经纬度按网格量化（默认3位小数≈110米），内存LRU + 本地SQLite
+geo_cache = GeoCache(
+    os.path.join(CACHE_DIR, 'geocode.db'),
+    precision=int(os.environ.get('AI_GOURMET_GEOCODE_PRECISION', 3))
+)
+
+# 笔记跳转缓存：百度笔记URL → 真实页面URL（及跳转提示），重复打开时跳过第一跳
+redirect_cache = RedirectCache(
+    os.path.join(CACHE_DIR, 'note_redirects.db'),
+    ttl=int(os.environ.get('AI_GOURMET_REDIRECT_TTL_DAYS', 7)) * 86400
+)
+
+# IP定位队列：合并查询、批量请求，不超过ip-api.com的免费配额（多进程时各进程平分）
+ip_locator = IpLocator(single_limit=max(1, 45 // WORKER_COUNT), batch_limit=max(1, 15 // WORKER_COUNT))
+
+# 菜谱精选（豆果首页）和饮食健康默认页（精选）
+FEATURED_RECIPES_URL = "https://www.douguo.com/"
+HEALTH_HOME_URL = "https://www.douguo.com/jingxuan/home"
+
+# 饮食健康分类映射 - 映射到豆果美食官方分类
+# 豆果分类来源：
+# - 饮食健康：饮食新闻 美容瘦身 饮食小常识 养生秘方
+# - 功能性调理：清热去火 减肥 祛痰 乌发 滋阴壮阳 健脾养胃
+# - 人群膳食：孕妇 老人 产妇 哺乳期
+# - 疾病调理：糖尿病 高血压 痛风
+# - 功效营养：补钙 贫血 提高免疫力 养胃 防雾霾 润肺止咳 养颜 失眠 抗癌
+HEALTH_CATEGORY_MAPPING = {
+    '减肥': '美容瘦身',      # 饮食健康 -> 美容瘦身（包含减肥）
+    '美容': '养颜',          # 功效营养 -> 养颜
+    '健脾': '健脾养胃',      # 功能性调理 -> 健脾养胃
+    '补钙': '补钙',          # 功效营养 -> 补钙
+    '提高免疫力': '提高免疫力',  # 功效营养 -> 提高免疫力
+    '清热': '清热去火',      # 功能性调理 -> 清热去火
+    '润肺': '润肺止咳',      # 功效营养 -> 润肺止咳
+    '糖尿病': '糖尿病',      # 疾病调理 -> 糖尿病
+    '高血压': '高血压'       # 疾病调理 -> 高血压
+}
+
+def baidu_search_url(query, page=1):
+    """百度笔记搜索URL：pd=note 搜索笔记类内容，pn 为分页偏移（每页10条）"""
+    return f"https://www.baidu.com/s?wd={query}&pd=note&rpf=pc&pn={(page-1)*10}"
+
+def douguo_search_url(query):
+    """豆果美食搜索URL - 使用caipu搜索而不是search/recipe，格式：https://www.douguo.com/caipu/关键词"""
+    return f"https://www.douguo.com/caipu/{quote(query)}"
+
+def health_recipes_url(mapped_category=''):
+    """饮食健康页面URL：使用分类页面（不是搜索接口），未指定分类时为精选"""
+    if mapped_category:
+        return f"https://www.douguo.com/caipu/{quote(mapped_category)}"
+    return HEALTH_HOME_URL
+
+def html_response(text_content, cache_state=None):
+    """构造HTML响应（不带包含中文的自定义响应头，避免编码错误）"""
+    headers = {'Content-Type': 'text/html; charset=utf-8'}
+    if cache_state:
+        headers['X-Cache'] = cache_state
+    return text_content, 200, headers
+
+def parse_cached(parser, url, text_content):
+    """
+    按（解析器, URL, 内容哈希）缓存解析结果，同一份页面内容只解析一次
+    
+    返回: (解析结果, 缓存状态)
+    """
+    digest = hashlib.sha1(text_content.encode('utf-8')).hexdigest()
+    return page_cache.get_or_load(
+        ('parsed', parser.__name__, url, digest),
+        lambda: parser(text_content),
+        *CACHE_TTLS['parsed']
+    )
+
+def failure_reason(error):
+    """上游错误 → 负缓存的失败原因；不需要缓存的错误（如4xx）返回None"""
+    if isinstance(error, SecurityCheckError):
+        return BLOCKED
+    if isinstance(error, requests.Timeout):
+        return TIMEOUT
+    if isinstance(error, requests.HTTPError):
+        status = getattr(error.response, 'status_code', 0)
+        return ERROR if status >= 500 or status == 429 else None
+    if isinstance(error, requests.ConnectionError):
+        return ERROR
+    return None
+
+def check_recent_failure(key, url):
+    """同一请求刚失败过（负缓存期内）时直接抛出 UpstreamUnavailable，不请求上游"""
+    failure, _ = page_cache.get(('upstream-failure',) + key)
+    if failure is not None:
+        logger.info(f"🚫 命中负缓存: {key}, reason={failure['reason']}")
+        raise UpstreamUnavailable(site_of(url), failure['until'] - time.time(), failure['reason'])
+
+def remember_failure(key, error):
+    """上游请求失败时写入负缓存"""
+    reason = failure_reason(error)
+    if reason is not None:
+        ttl = CACHE_TTLS['upstream-failure']
+        page_cache.set(('upstream-failure',) + key, {'reason': reason, 'until': time.time() + ttl[0]}, *ttl)
+
+def guarded_loader(key, url, loader):
+    """包装上游加载函数：刚失败过的请求直接失败，失败时写入负缓存（后台刷新也经过这里）"""
+    def load():
+        check_recent_failure(key, url)
+        try:
+            return loader()
+        except Exception as e:
+            remember_failure(key, e)
+            raise
+    return load
+
+def cached_page(key, url, loader=None):
+    """读取缓存的上游页面，未命中时请求url（或调用自定义loader）"""
+    loader = guarded_loader(key, url, loader or (lambda: fetch_page_text(url)))
+    return page_cache.get_or_load(key, loader, *CACHE_TTLS[key[0]])
+
+# 原始HTML模式下，未命中缓存的上游页面是否逐块流式转发（设为0时恢复为完整读取后返回）
+STREAM_UPSTREAM = os.environ.get('AI_GOURMET_STREAM_UPSTREAM', '1') != '0'
+
+def open_upstream(url, site='douguo', referer='https://www.douguo.com/', timeout=15):
+    """
+    流式请求上游页面，收到响应头即返回 UpstreamStream
+    
+    只向上游请求当前客户端也支持的压缩格式，压缩后的字节可以原样转发；
+    等待响应头和之后逐块读取时，客户端断开则取消上游请求
+    """
+    headers = get_headers(referer, site)
+    headers['Accept-Encoding'] = upstream_accept_encoding(request, allow_br=site != 'baidu')
+    return fetch_engine.open_stream(url, headers=headers, timeout=timeout, is_disconnected=client_disconnect_probe())
+
+# 流式转发的请求合并：同一上游页面同时只请求一次，并发的相同请求等待并共享解码后的页面
+stream_flights = SingleFlight()
+
+def wait_flight(flight, timeout, is_disconnected=None):
+    """等待进行中的相同请求（见 SingleFlight），客户端断开时抛出 ClientDisconnected"""
+    if is_disconnected is None:
+        return flight.wait(timeout)
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        done, value = flight.wait(max(0, min(DISCONNECT_POLL_INTERVAL, remaining)))
+        if done or remaining <= DISCONNECT_POLL_INTERVAL:
+            return done, value
+        if is_disconnected():
+            raise ClientDisconnected('客户端已断开，不再等待相同请求')
+
+def shared_passthrough(url, opener, timeout=15, check=None, on_complete=None, cache_state=None):
+    """
+    把上游页面流式转发给客户端，同一规范化URL的并发请求共享一次上游请求
+    
+    - 第一个请求边下载边转发，转发完成后把解码后的页面交给同时在等待的请求
+    - 其余请求最多等待timeout秒，返回同一份页面；第一个请求失败时抛出同一个异常
+    - 第一个请求没有完整转发（客户端断开、页面过大）或等待超时时，等待的请求自行请求上游
+    - 等待中的请求的客户端断开时抛出 ClientDisconnected
+    - 非2xx状态抛出 requests.HTTPError（response 为读取完的错误页面）
+    
+    参数:
+    - opener: 打开上游流的函数，返回 UpstreamStream
+    - check / on_complete / cache_state: 见 passthrough_response
+    """
+    key = normalize_url(url)
+    flight, leader = stream_flights.begin(key)
+    if not leader:
+        logger.info(f"🔗 等待进行中的相同请求: {url}")
+        done, text_content = wait_flight(flight, timeout, client_disconnect_probe())
+        if done and text_content is not None:
+            return html_response(text_content, cache_state)
+        logger.info(f"相同请求没有可共享的页面，自行请求: {url}")
+        flight = None
+    
+    def complete(result):
+        if on_complete is not None:
+            on_complete(result)
+        if flight is not None:
+            stream_flights.finish(key, flight, value=result.text)
+    
+    try:
+        upstream = opener()
+        logger.info(f"流式转发: status={upstream.status_code}, encoding={upstream.headers.get('Content-Encoding', 'identity')}, url={url}")
+        if not upstream.ok:
+            raise requests.HTTPError(f'{upstream.status_code} Error for url: {upstream.url}', response=read_result(upstream))
+        response = passthrough_response(upstream, request, check, complete, cache_state)
+    except BaseException as e:
+        if flight is not None:
+            stream_flights.finish(key, flight, error=e)
+        raise
+    if flight is not None:
+        # 没有完整转发时完成回调不会执行，结束后通知等待的请求自行请求
+        response.call_on_close(lambda: stream_flights.finish(key, flight))
+    return response
+
+def stream_page(key, url, site='douguo', referer='https://www.douguo.com/', timeout=15, check_security=False):
+    """
+    原始HTML模式的响应：缓存命中时返回缓存，未命中时把上游页面流式转发
+    
+    - 转发完整结束后解码写入页面缓存，JSON模式和后续请求直接复用
+    - 同一页面的并发请求共享一次上游请求（见 shared_passthrough）
+    - check_security=True 时检查开头的数据块，遇到百度安全验证抛出 SecurityCheckError
+    - 非2xx状态抛出 requests.HTTPError
+    - 站点熔断中、或同一请求刚失败过时抛出 UpstreamUnavailable（有缓存时仍返回缓存）
+    """
+    ttl = CACHE_TTLS[key[0]]
+    loader = guarded_loader(
+        key, url, lambda: fetch_page_text(url, site, referer, timeout=timeout, check_security=check_security)
+    )
+    if not STREAM_UPSTREAM:
+        text_content, cache_state = page_cache.get_or_load(key, loader, *ttl)
+        return html_response(text_content, cache_state)
+    
+    text_content, cache_state = page_cache.get_or_refresh(key, loader, *ttl)
+    if text_content is not None:
+        return html_response(text_content, cache_state)
+    
+    check_recent_failure(key, url)
+    
+    def check(head):
+        if is_security_check(head):
+            logger.warning("⚠️ 触发百度安全验证")
+            upstream_breaker.record_block(url)
+            raise SecurityCheckError(url)
+    
+    def store(result):
+        text = result.text
+        if not (check_security and is_security_check(text)):
+            page_cache.set(key, text, *ttl)
+        logger.info(f"流式转发完成: length={len(text)} 字符, 已写入缓存")
+    
+    try:
+        return shared_passthrough(
+            url, lambda: open_upstream(url, site, referer, timeout), timeout,
+            check if check_security else None, store, cache_state
+        )
+    except Exception as e:
+        remember_failure(key, e)
+        raise
+
+def recipes_response(key, douguo_url, output_format):
+    """豆果列表页响应：默认返回原始HTML，format=json时返回解析后的菜谱列表"""
+    if output_format == 'json':
+        text_content, cache_state = cached_page(key, douguo_url)
+        recipes, _ = parse_cached(extract_recipes, douguo_url, text_content)
+        return json_response({'success': True, 'data': recipes, 'count': len(recipes)}, cache_state)
+    return stream_page(key, douguo_url)
+
+def warm_page(endpoint, query='', category='', horizon=0):
+    """
+    预热一个页面（第1页）：请求上游、写入页面缓存，并缓存解析结果
+    
+    供缓存预热调度器在后台调用；站点熔断中或刚失败过时抛出 UpstreamUnavailable
+    
+    参数:
+    - horizon: 页面在这段时间（秒）内仍然新鲜时跳过
+    
+    返回: 是否请求了上游（页面仍新鲜、或其他进程正在刷新时为False）
+    """
+    key = cache_key(endpoint, query, 1, category)
+    if page_cache.fresh_for(key) > horizon or not page_cache.claim(key):
+        return False
+    if endpoint == 'search-notes':
+        url = baidu_search_url(query)
+        loader = lambda: fetch_page_text(url, 'baidu', 'https://www.baidu.com/', timeout=10, check_security=True)
+        parser = extract_notes
+    else:
+        if endpoint == 'search-recipes':
+            url = douguo_search_url(query)
+        elif endpoint == 'featured-recipes':
+            url = FEATURED_RECIPES_URL
+        else:
+            url = health_recipes_url(category)
+        loader = lambda: fetch_page_text(url)
+        parser = extract_recipes
+    try:
+        text_content = guarded_loader(key, url, loader)()
+        page_cache.set(key, text_content, *CACHE_TTLS[endpoint])
+    finally:
+        page_cache.release(key)
+    parse_cached(parser, url, text_content)
+    return True
+
+# 缓存预热：菜谱精选、饮食健康各分类和热门搜索在后台定时刷新，间隔短于缓存新鲜期
+# AI_GOURMET_WARM_INTERVAL=0 时关闭
+cache_warmer = CacheWarmer(
+    warm_page,
+    static_targets=[('featured-recipes', '', ''), ('health-recipes', '', '')] + [
+        ('health-recipes', '', mapped) for mapped in dict.fromkeys(HEALTH_CATEGORY_MAPPING.values())
+    ],
+    interval=float(os.environ.get('AI_GOURMET_WARM_INTERVAL', 300)),
+    top_queries=int(os.environ.get('AI_GOURMET_WARM_TOP_QUERIES', 10))
+)
+
+# 后台任务锁：多进程部署时只有持有该文件锁的一个工作进程运行cookie刷新和缓存预热
+BACKGROUND_LOCK_PATH = os.path.join(CACHE_DIR, 'background.lock')
+_background_lock = None
+
+def acquire_background_lock():
+    """
+    以非阻塞方式锁定 BACKGROUND_LOCK_PATH，成功时返回True
+
+    锁随进程退出自动释放；gunicorn 重新拉起的工作进程在fork之后再次尝试，由它接替
+    """
+    global _background_lock
+    if _background_lock is not None:
+        return True
+    try:
+        import fcntl
+    except ImportError:
+        # Windows 不支持 serve.py 多进程部署，只有一个进程
+        return True
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    lock_file = open(BACKGROUND_LOCK_PATH, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _background_lock = lock_file
+    return True
+
+def start_background_tasks():
+    """
+    启动后台线程：cookie定时刷新、缓存预热
+    
+    只在直接运行 app.py 时和 serve.py 的工作进程fork之后调用，导入本模块不启动任何线程；
+    多进程部署时只有拿到后台任务锁的一个进程真正启动，其他进程只在退出时保存cookie
+    """
+    atexit.register(session_pool.stop)
+    if not acquire_background_lock():
+        logger.info(f"⏭️ 后台任务由其他工作进程运行 (pid={os.getpid()})")
+        return
+    logger.info(f"🧵 后台任务在此进程中运行 (pid={os.getpid()})")
+    session_pool.start_background_refresh()
+    cache_warmer.start()
+    atexit.register(cache_warmer.stop)
+
+
+# 客户端提前断开的状态码（nginx 的约定），只出现在访问日志中
+CLIENT_CLOSED_REQUEST = 499
+
+def client_disconnected_response():
+    """客户端已断开：上游请求已取消，响应不会被收到，只用于日志"""
+    logger.info(f"🔌 客户端已断开，已取消上游请求: {request.full_path}")
+    return jsonify({'error': '客户端已断开'}), CLIENT_CLOSED_REQUEST
+
+def unavailable_response(error):
+    """站点熔断中或同一请求刚失败过：不请求上游，直接返回503"""
+    response = jsonify({'error': '上游网站暂时不可用，请稍后重试', 'retryAfter': error.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def security_check_response(retry_after=None):
+    """百度安全验证的响应（403）"""
+    response = jsonify({
+        'error': '触发百度安全验证',
+        'message': '百度检测到自动化请求，请稍后重试',
+        'tips': [
+            '这是百度的反爬虫机制，属于正常现象',
+            '请等待1-2分钟后重试',
+            '或者直接在浏览器中访问百度搜索'
+        ]
+    })
+    response.status_code = 403
+    if retry_after:
+        response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def json_response(payload, cache_state=None):
+    """构造JSON响应，附带缓存命中情况"""
+    response = jsonify(payload)
+    if cache_state:
+        response.headers['X-Cache'] = cache_state
+    return response
+
 @app.route('/')
 def index():
     """API首页"""
@@ -67,7 +597,7 @@ def index():
 @app.route('/api/health')
 def health():
     """健康检查接口"""
-    return jsonify({'status': 'healthy', 'service': '美食笔记搜索API'})
+    return jsonify({'status': 'healthy', 'service': '美食笔记搜索API', 'upstreams': upstream_breaker.snapshot()})
 
 @app.route('/api/geocode', methods=['GET'])
 def geocode():
@@ -88,11 +618,22 @@ def geocode():
         if not lat or not lon:
             return jsonify({'status': -1, 'message': '缺少经纬度参数'}), 400
         
+        try:
+            lat_value, lon_value = float(lat), float(lon)
+        except ValueError:
+            return jsonify({'status': -1, 'message': '经纬度参数必须是数字'}), 400
+        
+        # 同一网格内的坐标直接复用缓存结果，只替换为本次请求的坐标
+        cached, cache_state = geo_cache.get(lat_value, lon_value)
+        if cached is not None:
+            result = dict(cached, content=dict(cached['content'], point={'x': lon, 'y': lat}))
+            return json_response(result, cache_state)
+        
         # 使用高德地图逆地理编码API（国内服务，稳定快速）
         # 注意：需要申请高德地图Web服务API key
         # 可以在 https://console.amap.com/ 免费申请，每天配额充足
-        amap_key = 'a9e44f7c387c1b48ac79da8e40fc716f'  # 这是一个示例key，建议替换为自己的
-        api_url = f'https://restapi.amap.com/v3/geocode/regeo?key={amap_key}&location={lon},{lat}&extensions=all&output=json'
+        # key 由环境变量 AI_GOURMET_AMAP_KEY 配置（见 geo.py），默认是一个示例key
+        api_url = f'https://restapi.amap.com/v3/geocode/regeo?key={AMAP_KEY}&location={lon},{lat}&extensions=all&output=json'
         
         logger.info(f"请求高德逆地理编码API: lat={lat}, lon={lon}")
         
@@ -139,7 +680,8 @@ def geocode():
                 'source': 'gps+amap'
             }
             logger.info(f"✅ 逆地理编码成功: {formatted_address}")
-            return jsonify(result), 200
+            geo_cache.set(lat_value, lon_value, result)
+            return json_response(result, cache_state)
         else:
             error_msg = data.get('info', '逆地理编码失败')
             logger.error(f"逆地理编码失败: status={data.get('status')}, info={error_msg}")
@@ -149,34 +691,38 @@ def geocode():
         logger.error(f"逆地理编码错误: {str(e)}")
         return jsonify({'status': -1, 'message': f'服务器错误: {str(e)}'}), 500
 
+def request_client_ip():
+    """
+    调用方的公网IP（本机/内网地址返回 SELF_IP）
+    
+    request.remote_addr 是TCP对端地址；只有设置了 TRUSTED_PROXIES 时，ProxyFix 才改用 X-Forwarded-For
+    右起第 TRUSTED_PROXIES 个地址（更左边的条目客户端可以伪造，一律忽略；层数不足时保持对端地址）
+    """
+    if TRUSTED_PROXIES == 0 and 'X-Forwarded-For' in request.headers:
+        logger.debug("忽略 X-Forwarded-For：未设置 AI_GOURMET_TRUSTED_PROXIES")
+    return normalize_client_ip(request.remote_addr)
+
 @app.route('/api/ip-location', methods=['GET'])
 def ip_location():
     """
     IP定位代理接口（使用 ip-api.com，免费且稳定）
     
-    返回：JSON格式的位置信息
+    按调用方的IP定位（见 request_client_ip），本机/内网访问时定位服务器自身
+    
+    返回：JSON格式的位置信息；配额用完时返回429和 Retry-After
     """
     try:
-        # 使用 ip-api.com 免费服务（每分钟45次请求限制）
-        # lang=zh-CN 参数确保返回中文地名
-        api_url = 'http://ip-api.com/json/?lang=zh-CN&fields=status,message,country,regionName,city,district,lat,lon,query'
-        
-        logger.info(f"请求IP定位API: {api_url}")
-        
-        # 发起请求
-        response = requests.get(
-            api_url,
-            timeout=10,
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-                'Accept': 'application/json',
-            }
-        )
-        
-        response.raise_for_status()
-        data = response.json()
-        
-        logger.info(f"IP定位原始响应: {data}")
+        client_ip = request_client_ip()
+        key = cache_key('ip-location', ip_prefix(client_ip))
+        
+        # 同一网段先读缓存；未命中时进入定位队列（ip-api.com 免费配额：单个45次/分钟，批量15次/分钟）
+        data, cache_state = page_cache.get(key)
+        if data is None:
+            logger.info(f"请求IP定位: ip={client_ip or '服务器自身'}")
+            data = ip_locator.lookup(client_ip)
+            logger.info(f"IP定位原始响应: {data}")
+            if data.get('status') == 'success':
+                page_cache.set(key, data, *CACHE_TTLS['ip-location'])
         
         if data.get('status') == 'success':
             province = data.get('regionName', '')
@@ -185,7 +731,6 @@ def ip_location():
             
             # 处理地名：优先使用省份，如果城市是英文则忽略
             # 检查城市名是否包含中文字符
-            import re
             has_chinese = bool(re.search(r'[\u4e00-\u9fff]', city))
             
             # 如果城市名是纯英文，只显示省份
@@ -218,16 +763,22 @@ def ip_location():
                         'y': str(data.get('lat', ''))
                     }
                 },
-                'ip': data.get('query', ''),
+                'ip': client_ip or data.get('query', ''),
                 'source': 'ip-api.com'
             }
             logger.info(f"✅ 定位成功: {result['content']['address']}")
-            return jsonify(result), 200
+            return json_response(result, cache_state)
         else:
             error_msg = data.get('message', '定位失败')
             logger.error(f"IP定位失败: {error_msg}")
             return jsonify({'status': -1, 'message': error_msg}), 400
         
+    except IpQuotaExceeded as e:
+        response = jsonify({'status': -1, 'message': str(e), 'retryAfter': e.retry_after})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+        
     except requests.Timeout:
         logger.error("IP定位请求超时")
         return jsonify({'status': -1, 'message': '请求超时'}), 504
@@ -248,63 +799,58 @@ def search_notes():
     参数：
     - query: 搜索关键词（必填）
     - page: 页码，默认1
+    - format: 返回格式，默认html（百度原始HTML），可选json（服务端解析后的笔记列表）
     
-    返回：百度搜索结果的HTML
+    返回：百度搜索结果的HTML，或JSON格式的笔记列表
     """
     try:
         # 获取请求参数
         query = request.args.get('query', '').strip()
         page = int(request.args.get('page', 1))
+        output_format = request.args.get('format', 'html').strip().lower()
         
         if not query:
             return jsonify({'error': '搜索关键词不能为空'}), 400
         
-        # 构建百度搜索URL
-        # pd=note 参数用于搜索笔记类内容
-        # pn 参数用于分页，每页10条结果
-        baidu_url = f"https://www.baidu.com/s?wd={query}&pd=note&rpf=pc&pn={(page-1)*10}"
+        baidu_url = baidu_search_url(query, page)
+        cache_warmer.record('search-notes', query)
         
         logger.info(f"搜索请求: query={query}, page={page}")
         logger.info(f"百度URL: {baidu_url}")
         
-        # 创建session以支持cookie
-        session = requests.Session()
+        # 优先读缓存，未命中时请求百度（复用百度站点的共享Session）
+        key = cache_key('search-notes', query, page)
         
-        # 发起请求
-        # requests会自动处理gzip解压和编码
-        response = session.get(
-            baidu_url,
-            headers=get_headers('https://www.baidu.com/', 'baidu'),
-            timeout=10,
-            allow_redirects=True
-        )
-        
-        # 检查响应状态
-        response.raise_for_status()
-        
-        # 让requests自动处理解码
-        # response.text会：1) 自动解压gzip  2) 根据Content-Type自动解码
-        text_content = response.text
-        
-        logger.info(f"请求成功: status={response.status_code}, encoding={response.encoding}, length={len(text_content)} 字符")
-        
-        # 检测是否触发安全验证
-        if '百度安全验证' in text_content or 'mkdjump' in text_content:
-            logger.warning("⚠️ 触发百度安全验证")
-            return jsonify({
-                'error': '触发百度安全验证',
-                'message': '百度检测到自动化请求，请稍后重试',
-                'tips': [
-                    '这是百度的反爬虫机制，属于正常现象',
-                    '请等待1-2分钟后重试',
-                    '或者直接在浏览器中访问百度搜索'
-                ]
-            }), 403
-        
-        # 返回HTML内容（移除包含中文的自定义响应头，避免编码错误）
-        return text_content, 200, {
-            'Content-Type': 'text/html; charset=utf-8'
-        }
+        # JSON模式：服务端提取笔记列表并缓存解析结果，只下发紧凑数据
+        if output_format == 'json':
+            text_content, cache_state = cached_page(
+                key,
+                baidu_url,
+                lambda: fetch_page_text(baidu_url, 'baidu', 'https://www.baidu.com/', timeout=10, check_security=True)
+            )
+            notes, _ = parse_cached(extract_notes, baidu_url, text_content)
+            return json_response({
+                'success': True,
+                'data': notes,
+                'count': len(notes),
+                'query': query,
+                'page': page
+            }, cache_state)
+        
+        # HTML模式：未命中缓存时边下载边转发
+        return stream_page(key, baidu_url, 'baidu', 'https://www.baidu.com/', timeout=10, check_security=True)
+        
+    except SecurityCheckError:
+        return security_check_response()
+        
+    except ClientDisconnected:
+        return client_disconnected_response()
+        
+    except UpstreamUnavailable as e:
+        # 熔断或负缓存期内直接返回，不再请求百度
+        if e.reason == BLOCKED:
+            return security_check_response(e.retry_after)
+        return unavailable_response(e)
         
     except requests.Timeout:
         logger.error("请求超时")
@@ -330,50 +876,34 @@ def search_recipes():
     参数：
     - query: 搜索关键词（必填）
     - page: 页码，默认1
+    - format: 返回格式，默认html，可选json（服务端解析后的菜谱列表）
     
-    返回：豆果美食搜索结果的HTML
+    返回：豆果美食搜索结果的HTML，或JSON格式的菜谱列表
     """
     try:
         query = request.args.get('query', '').strip()
         page = int(request.args.get('page', 1))
+        output_format = request.args.get('format', 'html').strip().lower()
         
         if not query:
             return jsonify({'error': '搜索关键词不能为空'}), 400
         
         # 豆果美食搜索URL - 使用caipu搜索而不是search/recipe
         # 格式：https://www.douguo.com/caipu/关键词
-        from urllib.parse import quote
-        encoded_query = quote(query)
-        douguo_url = f"https://www.douguo.com/caipu/{encoded_query}"
+        douguo_url = douguo_search_url(query)
         
+        cache_warmer.record('search-recipes', query)
         logger.info(f"搜索菜谱: query={query}, page={page}")
         logger.info(f"豆果URL: {douguo_url}")
         
-        # 创建session并设置cookie
-        session = requests.Session()
-        
-        # 先访问首页获取cookie
-        try:
-            session.get('https://www.douguo.com/', headers=get_headers('https://www.douguo.com/', 'douguo'), timeout=5)
-        except:
-            pass
+        # 访问搜索页（cookie由Session池在后台预热）
+        return recipes_response(cache_key('search-recipes', query, page), douguo_url, output_format)
         
-        # 再访问搜索页
-        response = session.get(
-            douguo_url,
-            headers=get_headers('https://www.douguo.com/', 'douguo'),
-            timeout=15,
-            allow_redirects=True
-        )
+    except ClientDisconnected:
+        return client_disconnected_response()
         
-        response.raise_for_status()
-        text_content = response.text
-        
-        logger.info(f"请求成功: status={response.status_code}, length={len(text_content)} 字符")
-        
-        return text_content, 200, {
-            'Content-Type': 'text/html; charset=utf-8'
-        }
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
         
     except requests.Timeout:
         logger.error("请求超时")
@@ -396,29 +926,24 @@ def featured_recipes():
     """
     获取豆果美食精选推荐菜谱
     
-    返回：豆果美食首页精选菜谱的HTML
+    参数：
+    - format: 返回格式，默认html，可选json（服务端解析后的菜谱列表）
+    
+    返回：豆果美食首页精选菜谱的HTML，或JSON格式的菜谱列表
     """
     try:
-        douguo_url = "https://www.douguo.com/"
+        douguo_url = FEATURED_RECIPES_URL
+        output_format = request.args.get('format', 'html').strip().lower()
         
         logger.info("获取精选推荐菜谱")
         
-        session = requests.Session()
-        response = session.get(
-            douguo_url,
-            headers=get_headers('https://www.douguo.com/', 'douguo'),
-            timeout=15,
-            allow_redirects=True
-        )
-        
-        response.raise_for_status()
-        text_content = response.text
+        return recipes_response(cache_key('featured-recipes'), douguo_url, output_format)
         
-        logger.info(f"请求成功: status={response.status_code}, length={len(text_content)} 字符")
+    except ClientDisconnected:
+        return client_disconnected_response()
         
-        return text_content, 200, {
-            'Content-Type': 'text/html; charset=utf-8'
-        }
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
         
     except Exception as e:
         logger.error(f"获取精选菜谱失败: {str(e)}")
@@ -431,414 +956,296 @@ def health_recipes():
     
     参数：
     - category: 健康分类（如：减肥、养生、补钙等），可选
+    - format: 返回格式，默认html，可选json（服务端解析后的菜谱列表）
     
-    返回：豆果美食饮食健康页面的HTML
+    返回：豆果美食饮食健康页面的HTML，或JSON格式的菜谱列表
     """
     try:
-        from urllib.parse import quote
         category = request.args.get('category', '').strip()
+        output_format = request.args.get('format', 'html').strip().lower()
         
-        # 分类映射 - 映射到豆果美食官方分类
-        # 豆果分类来源：
-        # - 饮食健康：饮食新闻 美容瘦身 饮食小常识 养生秘方
-        # - 功能性调理：清热去火 减肥 祛痰 乌发 滋阴壮阳 健脾养胃
-        # - 人群膳食：孕妇 老人 产妇 哺乳期
-        # - 疾病调理：糖尿病 高血压 痛风
-        # - 功效营养：补钙 贫血 提高免疫力 养胃 防雾霾 润肺止咳 养颜 失眠 抗癌
-        category_mapping = {
-            '减肥': '美容瘦身',      # 饮食健康 -> 美容瘦身（包含减肥）
-            '美容': '养颜',          # 功效营养 -> 养颜
-            '健脾': '健脾养胃',      # 功能性调理 -> 健脾养胃
-            '补钙': '补钙',          # 功效营养 -> 补钙
-            '提高免疫力': '提高免疫力',  # 功效营养 -> 提高免疫力
-            '清热': '清热去火',      # 功能性调理 -> 清热去火
-            '润肺': '润肺止咳',      # 功效营养 -> 润肺止咳
-            '糖尿病': '糖尿病',      # 疾病调理 -> 糖尿病
-            '高血压': '高血压'       # 疾病调理 -> 高血压
-        }
-        
-        if category:
-            # 使用映射后的豆果官方分类名
-            mapped_category = category_mapping.get(category, category)
-            encoded_category = quote(mapped_category)
-            # 使用分类页面URL（不是搜索接口）
-            douguo_url = f"https://www.douguo.com/caipu/{encoded_category}"
-        else:
-            # 默认显示精选
-            douguo_url = "https://www.douguo.com/jingxuan/home"
-        
-        logger.info(f"获取饮食健康: category={category or '精选'}, mapped={category_mapping.get(category, category) if category else '精选'}, url={douguo_url}")
+        # 使用映射后的豆果官方分类名；未指定分类时显示精选
+        mapped_category = HEALTH_CATEGORY_MAPPING.get(category, category)
+        douguo_url = health_recipes_url(mapped_category)
         
-        session = requests.Session()
+        logger.info(f"获取饮食健康: category={category or '精选'}, mapped={mapped_category or '精选'}, url={douguo_url}")
         
-        # 先访问首页获取cookie
-        try:
-            session.get('https://www.douguo.com/', headers=get_headers('https://www.douguo.com/', 'douguo'), timeout=5)
-        except:
-            pass
-        
-        response = session.get(
+        # cookie由Session池在后台预热；同一映射分类共享缓存
+        return recipes_response(
+            cache_key('health-recipes', category=mapped_category),
             douguo_url,
-            headers=get_headers('https://www.douguo.com/', 'douguo'),
-            timeout=15,
-            allow_redirects=True
+            output_format
         )
         
-        response.raise_for_status()
-        text_content = response.text
+    except ClientDisconnected:
+        return client_disconnected_response()
         
-        logger.info(f"请求成功: status={response.status_code}, length={len(text_content)} 字符")
-        
-        return text_content, 200, {
-            'Content-Type': 'text/html; charset=utf-8'
-        }
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
         
     except Exception as e:
         logger.error(f"获取饮食健康失败: {str(e)}")
         return jsonify({'error': f'服务器错误: {str(e)}'}), 500
 
-@app.route('/api/note-detail', methods=['GET'])
-def note_detail():
+def note_result(final_url, note_url):
+    """笔记详情的初始字段"""
+    return {
+        'type': 'unknown',
+        'title': '',
+        'content': '',
+        'images': [],
+        'source': '',
+        'publishTime': '',
+        'rawUrl': final_url,
+        'originalUrl': note_url  # 保留原始URL
+    }
+
+def real_page_headers(real_url):
+    """请求跳转后真实页面的headers"""
+    # 根据目标域名设置合适的headers
+    if 'baidu.com' in real_url:
+        return get_headers('https://www.baidu.com/', 'baidu')
+    # 对于第三方网站，使用通用headers
+    return {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1',
+    }
+
+JS_REDIRECT_PATTERN = re.compile(r'window\.location\.replace\(["\']([^"\']+)["\']\)')
+META_REFRESH_PATTERN = re.compile(
+    r'<meta[^>]+http-equiv=["\']refresh["\'][^>]+content=["\'][^;]+;\s*url=([^"\']+)["\']', re.IGNORECASE
+)
+
+def resolve_note_redirect(note_url):
     """
-    获取笔记详情接口 - 支持多种来源的差异化处理
+    请求原始笔记页面（百度cookie由Session池在后台预热），识别其中的跳转
     
-    参数：
-    - url: 笔记详情页URL（必填）
-    - debug: 是否返回调试信息（可选）
+    返回: (原始页面响应, 真实URL)，没有跳转时真实URL为None
+    """
+    response = fetch_upstream(note_url, 'baidu', 'https://www.baidu.com/')
+    text_content = response.text
+    logger.info(f"请求完成: status={response.status_code}, length={len(text_content)} 字符")
     
-    返回：JSON格式的笔记详情
+    # 方法1: 检查 window.location.replace
+    match = JS_REDIRECT_PATTERN.search(text_content)
+    if match:
+        logger.info(f"检测到JavaScript跳转: {match.group(1)}")
+        return response, match.group(1)
+    
+    # 方法2: 检查 meta refresh
+    match = META_REFRESH_PATTERN.search(text_content)
+    if match:
+        logger.info(f"检测到meta refresh跳转: {match.group(1)}")
+        return response, match.group(1)
+    return response, None
+
+def load_note_detail(note_url):
+    """
+    获取并解析一篇笔记详情 - 支持多种来源的差异化处理
+    
+    供 /api/note-detail 和批量接口 /api/note-details 共用
+    
+    返回: (笔记详情字典, HTTP状态码)
     """
     try:
-        note_url = request.args.get('url', '').strip()
-        debug_mode = request.args.get('debug', '').lower() == 'true'
+        logger.info(f"获取笔记详情: url={note_url}")
         
-        if not note_url:
-            return jsonify({'error': '笔记URL不能为空'}), 400
-        
-        logger.info(f"获取笔记详情: url={note_url}, debug={debug_mode}")
+        # 百度笔记的跳转目标在缓存中时，直接请求真实页面
+        is_baidu_redirect = 'baidu.com' in note_url
+        response = None
+        real_url = None
+        cached, _ = redirect_cache.get(note_url)
+        if cached is not None:
+            real_url = cached['real_url']
+            if cached['notice']:
+                logger.info(f"♻️ 命中笔记跳转缓存，返回跳转提示: {real_url}")
+                result = note_result(real_url, note_url)
+                result.update(cached['notice'])
+                return result, 200
+            
+            logger.info(f"♻️ 命中笔记跳转缓存: {real_url}")
+            response = fetch_upstream(real_url, headers=real_page_headers(real_url))
+            if response.status_code >= 400:
+                # 跳转目标已失效，重新从原始页面识别
+                logger.warning(f"缓存的跳转目标返回 {response.status_code}，重新识别跳转")
+                redirect_cache.delete(note_url)
+                response, real_url = None, None
+        
+        if response is None:
+            response, real_url = resolve_note_redirect(note_url)
+            if real_url:
+                logger.info(f"跳转到真实URL: {real_url}")
+                response = fetch_upstream(real_url, headers=real_page_headers(real_url))
+                logger.info(f"真实页面请求完成: status={response.status_code}, URL={real_url}")
+                if response.status_code < 400:
+                    redirect_cache.set(note_url, real_url)
         
-        session = requests.Session()
+        text_content = response.text
         
-        # 先访问百度首页获取cookie
-        try:
-            time.sleep(0.5)
-            session.get('https://www.baidu.com/', headers=get_headers('https://www.baidu.com/', 'baidu'), timeout=10)
-            time.sleep(1)
-        except Exception as e:
-            logger.warning(f"访问百度首页失败: {e}")
-        
-        # 访问详情页
-        response = session.get(
-            note_url,
-            headers=get_headers('https://www.baidu.com/', 'baidu'),
-            timeout=15,
-            allow_redirects=True
-        )
+        # 检查是否是错误页面
+        if response.status_code >= 400:
+            logger.error(f"服务器返回错误: {response.status_code}")
+            return {'error': f'服务器返回错误: {response.status_code}', 'type': 'error'}, response.status_code
         
-        text_content = response.text
-        logger.info(f"请求完成: status={response.status_code}, length={len(text_content)} 字符")
+        # 根据真实URL判断来源类型并解析
+        final_url = real_url or note_url
+        result = note_result(final_url, note_url)
         
-        # 检测是否是百度的跳转页面
-        import re
-        import json
-        from bs4 import BeautifulSoup
+        # 按域名选择站点提取器（见 note_extractors.py）
+        extractor = extractor_for(final_url)
+        context = {'url': final_url, 'from_baidu': is_baidu_redirect}
         
-        real_url = None
-        is_baidu_redirect = False  # 标记是否是百度跳转
-        
-        # 检测是否是百度的跳转页面（判断原始URL是否包含baidu.com）
-        if 'baidu.com' in note_url or 'm.baidu.com' in note_url:
-            is_baidu_redirect = True
-        
-        # 方法1: 检查 window.location.replace
-        match = re.search(r'window\.location\.replace\(["\']([^"\']+)["\']\)', text_content)
-        if match:
-            real_url = match.group(1)
-            logger.info(f"检测到JavaScript跳转: {real_url}")
-        
-        # 方法2: 检查 meta refresh
-        if not real_url:
-            match = re.search(r'<meta[^>]+http-equiv=["\']refresh["\'][^>]+content=["\'][^;]+;\s*url=([^"\']+)["\']', text_content, re.IGNORECASE)
-            if match:
-                real_url = match.group(1)
-                logger.info(f"检测到meta refresh跳转: {real_url}")
-        
-        # 如果检测到跳转，重新请求真实URL
-        if real_url:
-            logger.info(f"跳转到真实URL: {real_url}")
-            time.sleep(1)  # 延迟1秒
-            
-            # 根据目标域名设置合适的headers
-            if 'baidu.com' in real_url or 'mbd.baidu.com' in real_url:
-                real_headers = get_headers('https://www.baidu.com/', 'baidu')
-            else:
-                # 对于第三方网站，使用通用headers
-                real_headers = {
+        # 百度跳转到第三方网站：只有已支持的站点（大众点评）继续解析，其他返回跳转提示
+        if is_baidu_redirect and real_url and 'baidu.com' not in real_url and not extractor.handles_baidu_redirect:
+            logger.info(f"百度跳转到第三方: {real_url}")
+            notice = BAIDU_REDIRECT_NOTICE.extract(text_content, context)
+            redirect_cache.set(note_url, real_url, notice)
+            result.update(notice)
+            logger.info(f"百度跳转第三方，返回跳转提示: {result['source']}")
+            return result, 200
+        
+        # 遇到验证页时重新请求一次，使用更真实的浏览器特征（请求间隔由host_pacer控制）
+        if extractor.is_blocked(text_content):
+            logger.warning("遇到百度安全验证或内容过短")
+            try:
+                retry_headers = {
                     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
                     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
                     'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
                     'Accept-Encoding': 'gzip, deflate',
                     'Connection': 'keep-alive',
                     'Upgrade-Insecure-Requests': '1',
+                    'Sec-Fetch-Dest': 'document',
+                    'Sec-Fetch-Mode': 'navigate',
+                    'Sec-Fetch-Site': 'none',
+                    'Sec-Fetch-User': '?1',
+                    'Cache-Control': 'max-age=0',
+                    'Referer': 'https://www.baidu.com/',
                 }
-            
-            response = session.get(
-                real_url,
-                headers=real_headers,
-                timeout=15,
-                allow_redirects=True
-            )
-            
-            text_content = response.text
-            logger.info(f"真实页面请求完成: status={response.status_code}, length={len(text_content)} 字符, URL={real_url}")
-        
-        # 检查是否是错误页面
-        if response.status_code >= 400:
-            logger.error(f"服务器返回错误: {response.status_code}")
-            return jsonify({'error': f'服务器返回错误: {response.status_code}', 'type': 'error'}), response.status_code
-        
-        # 根据真实URL判断来源类型并解析
-        result = {
-            'type': 'unknown',
-            'title': '',
-            'content': '',
-            'images': [],
-            'source': '',
-            'publishTime': '',
-            'rawUrl': real_url or note_url,
-            'originalUrl': note_url  # 保留原始URL
-        }
-        
-        # 如果是百度跳转到第三方网站，需要特殊处理
-        if is_baidu_redirect and real_url and 'baidu.com' not in real_url:
-            logger.info(f"百度跳转到第三方: {real_url}")
-            
-            # 对于百度跳转到第三方的情况，根据目标网站类型处理
-            if 'm.dianping.com' in real_url:
-                # 大众点评可以解析
-                pass  # 继续下面的正常流程
-            else:
-                # 其他第三方网站（携程、小红书等），提示跳转
-                result['type'] = 'baidu_redirect'
-                result['source'] = '百度笔记'
-                
-                # 尝试从目标网站提取基本信息
-                soup = BeautifulSoup(text_content, 'html.parser')
-                title_tag = soup.find('title')
-                if title_tag:
-                    result['title'] = title_tag.get_text(strip=True)
                 
-                # 识别目标网站
-                if 'ctrip.com' in real_url:
-                    result['content'] = '该笔记来自携程旅行，内容丰富多样。'
-                    result['source'] = '百度笔记 → 携程旅行'
-                elif 'xiaohongshu.com' in real_url or 'xhslink.com' in real_url:
-                    result['content'] = '该笔记来自小红书，内容精彩纷呈。'
-                    result['source'] = '百度笔记 → 小红书'
-                else:
-                    result['content'] = '该笔记来自第三方网站。'
-                    result['source'] = '百度笔记'
+                # 不与进行中的相同请求合并，否则可能拿回同一份验证页
+                retry_response = fetch_upstream(final_url, headers=retry_headers, coalesce=False)
                 
-                result['needJump'] = True
-                logger.info(f"百度跳转第三方，返回跳转提示: {result['source']}")
-                return jsonify(result), 200
-        
-        # 类型1: 大众点评 - 从JSON数据中提取
-        if real_url and 'm.dianping.com' in real_url:
-            logger.info("检测到大众点评笔记，从JSON提取数据")
-            result['type'] = 'dianping'
+                if retry_response.status_code == 200:
+                    text_content = retry_response.text
+                    logger.info(f"重试成功，内容长度: {len(text_content)}")
+            except Exception as retry_error:
+                logger.error(f"重试失败: {retry_error}")
             
-            # 提取 __NEXT_DATA__ 中的JSON数据
-            match = re.search(r'<script id="__NEXT_DATA__" type="application/json"[^>]*>(.*?)</script>', text_content, re.DOTALL)
-            if match:
-                try:
-                    data = json.loads(match.group(1))
-                    feed_info = data.get('props', {}).get('pageProps', {}).get('feedInfo', {})
-                    
-                    result['title'] = feed_info.get('title', '')
-                    result['content'] = feed_info.get('content', '')
-                    
-                    # 如果是从百度跳转来的，在来源中标注
-                    author = feed_info.get('feedUser', {}).get('nickName', '大众点评用户')
-                    if is_baidu_redirect:
-                        result['source'] = f'{author} (百度笔记 → 大众点评)'
-                    else:
-                        result['source'] = author
-                    
-                    # 提取图片
-                    pic_list = feed_info.get('feedPicList', [])
-                    result['images'] = [pic.get('url', '') for pic in pic_list if pic.get('url')]
-                    
-                    logger.info(f"大众点评数据提取成功: title={result['title']}, content_length={len(result.get('content', ''))}, images={len(result['images'])}")
-                except Exception as e:
-                    logger.error(f"解析大众点评JSON失败: {e}")
-                    result['type'] = 'parse_error'
-                    result['error'] = f'解析失败: {str(e)}'
-            else:
-                logger.warning("未找到大众点评的JSON数据")
-                result['error'] = '无法提取笔记内容'
+            # 再次检查
+            if extractor.is_blocked(text_content):
+                if is_security_check(text_content):
+                    upstream_breaker.record_block(final_url)
+                result['type'] = 'security_check'
+                result['error'] = '该笔记需要通过百度安全验证才能查看'
                 result['needJump'] = True
+                return result, 200
         
-        # 类型2: 携程旅行 - 从JSON数据中提取
-        elif real_url and 'm.ctrip.com' in real_url:
-            logger.info("检测到携程旅行笔记，从JSON提取数据")
-            result['type'] = 'ctrip'
-            result['source'] = '携程旅行'
-            
-            # 携程页面的数据在 __NEXT_DATA__ 中，但结构不同
-            # 这个页面主要是一个Next.js应用，内容是客户端渲染的
-            # 尝试提取基本信息
-            soup = BeautifulSoup(text_content, 'html.parser')
-            
-            # 携程的页面标题
-            title_tag = soup.find('title')
-            if title_tag:
-                result['title'] = title_tag.string or ''
-            
-            # 尝试从meta标签获取描述
-            desc_tag = soup.find('meta', {'name': 'description'})
-            if desc_tag and desc_tag.get('content'):
-                result['content'] = desc_tag.get('content')
-            
-            # 携程页面主要是客户端渲染，服务端HTML中内容较少
-            # 建议跳转到原网站查看完整体验
-            if not result['content']:
-                result['content'] = '该笔记来自携程旅行，为了获得最佳体验，建议前往原网站查看。'
-            result['needJump'] = True
-            
-        # 类型3: 百度笔记 - 尝试绕过安全验证
-        elif real_url and 'mbd.baidu.com' in real_url:
-            logger.info("检测到百度笔记，尝试获取内容")
-            result['type'] = 'baidu'
-            
-            # 检查是否是安全验证页面
-            if '安全验证' in text_content or 'timeout' in text_content or len(text_content) < 2000:
-                logger.warning("遇到百度安全验证或内容过短")
-                
-                # 尝试重新请求，添加更多延迟和真实浏览器特征
-                try:
-                    time.sleep(2)  # 增加延迟到2秒
-                    
-                    # 使用更完整的浏览器headers
-                    retry_headers = {
-                        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-                        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                        'Accept-Encoding': 'gzip, deflate',
-                        'Connection': 'keep-alive',
-                        'Upgrade-Insecure-Requests': '1',
-                        'Sec-Fetch-Dest': 'document',
-                        'Sec-Fetch-Mode': 'navigate',
-                        'Sec-Fetch-Site': 'none',
-                        'Sec-Fetch-User': '?1',
-                        'Cache-Control': 'max-age=0',
-                        'Referer': 'https://www.baidu.com/',
-                    }
-                    
-                    retry_response = session.get(
-                        real_url,
-                        headers=retry_headers,
-                        timeout=15,
-                        allow_redirects=True
-                    )
-                    
-                    if retry_response.status_code == 200:
-                        text_content = retry_response.text
-                        logger.info(f"重试成功，内容长度: {len(text_content)}")
-                except Exception as retry_error:
-                    logger.error(f"重试失败: {retry_error}")
-                
-                # 再次检查
-                if '安全验证' in text_content or 'timeout' in text_content or len(text_content) < 2000:
-                    result['type'] = 'security_check'
-                    result['error'] = '该笔记需要通过百度安全验证才能查看'
-                    result['needJump'] = True
-                    return jsonify(result), 200
-            
-            # 尝试解析百度笔记内容
-            soup = BeautifulSoup(text_content, 'html.parser')
-            
-            # 提取标题
-            title_tag = soup.find('h1') or soup.find('title')
-            if title_tag:
-                result['title'] = title_tag.get_text(strip=True) if hasattr(title_tag, 'get_text') else title_tag.string
-            
-            result['source'] = '百度笔记'
-            
-            # 尝试提取正文内容
-            content_selectors = [
-                '.content-article',
-                '.article-content',
-                '[class*="content"]',
-                'article',
-                '.detail-content'
-            ]
-            
-            for selector in content_selectors:
-                content_el = soup.select_one(selector)
-                if content_el:
-                    paragraphs = content_el.find_all('p')
-                    if paragraphs:
-                        result['content'] = '\n\n'.join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
-                        break
-                    elif content_el.get_text(strip=True):
-                        result['content'] = content_el.get_text(strip=True)
-                        break
-            
-            # 提取图片
-            images = soup.find_all('img')
-            for img in images:
-                src = img.get('src') or img.get('data-src') or img.get('data-original')
-                if src and not any(x in src for x in ['icon', 'logo', 'avatar']):
-                    # 处理相对URL
-                    if src.startswith('//'):
-                        src = 'https:' + src
-                    elif src.startswith('/'):
-                        src = 'https://mbd.baidu.com' + src
-                    result['images'].append(src)
-            
-            # 如果提取失败，标记为需要跳转
-            if not result['title'] and not result['content']:
-                result['needJump'] = True
-                result['error'] = '内容解析失败，建议前往原网站查看'
-        
-        # 未知类型 - 通用HTML解析
-        else:
-            logger.info("未知来源，使用通用HTML解析")
-            result['type'] = 'generic'
-            soup = BeautifulSoup(text_content, 'html.parser')
-            
-            # 尝试提取标题
-            title_el = soup.find('h1') or soup.find(class_='title')
-            if title_el:
-                result['title'] = title_el.get_text(strip=True)
-            
-            # 尝试提取内容
-            content_selectors = ['.content', '.article-content', 'article', '.detail-content']
-            for selector in content_selectors:
-                content_el = soup.select_one(selector)
-                if content_el:
-                    paragraphs = content_el.find_all('p')
-                    result['content'] = '\n\n'.join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
-                    if result['content']:
-                        break
+        logger.info(f"使用提取器: {extractor.name}, url={final_url}")
+        result.update(extractor.extract(text_content, context))
         
         # 最终结果日志
         logger.info(f"📤 返回笔记详情: type={result.get('type')}, has_title={bool(result.get('title'))}, has_content={bool(result.get('content'))}, images_count={len(result.get('images', []))}, needJump={result.get('needJump', False)}")
         
-        return jsonify(result), 200
+        return result, 200
+        
+    except ClientDisconnected:
+        logger.info(f"🔌 客户端已断开，已取消上游请求: {note_url}")
+        return {'error': '客户端已断开', 'type': 'client_disconnected'}, CLIENT_CLOSED_REQUEST
+        
+    except UpstreamUnavailable as e:
+        # 站点熔断中：不请求上游，直接返回
+        logger.warning(f"站点熔断中，跳过请求: {e}")
+        result = note_result(note_url, note_url)
+        if e.reason == BLOCKED:
+            result.update({'type': 'security_check', 'error': '该笔记需要通过百度安全验证才能查看', 'needJump': True})
+            return result, 200
+        result.update({'type': 'unavailable', 'error': '上游网站暂时不可用，请稍后重试', 'retryAfter': e.retry_after})
+        return result, 503
         
     except requests.Timeout:
         logger.error("请求超时")
-        return jsonify({'error': '请求超时，请稍后重试', 'type': 'timeout'}), 504
+        return {'error': '请求超时，请稍后重试', 'type': 'timeout'}, 504
         
     except requests.RequestException as e:
         logger.error(f"请求失败: {str(e)}")
-        return jsonify({'error': f'请求失败: {str(e)}', 'type': 'request_error'}), 500
+        return {'error': f'请求失败: {str(e)}', 'type': 'request_error'}, 500
         
     except Exception as e:
         logger.error(f"未知错误: {str(e)}")
-        return jsonify({'error': f'服务器错误: {str(e)}', 'type': 'server_error'}), 500
+        return {'error': f'服务器错误: {str(e)}', 'type': 'server_error'}, 500
+
+@app.route('/api/note-detail', methods=['GET'])
+def note_detail():
+    """
+    获取笔记详情接口
+    
+    参数：
+    - url: 笔记详情页URL（必填）
+    
+    返回：JSON格式的笔记详情
+    """
+    note_url = request.args.get('url', '').strip()
+    if not note_url:
+        return jsonify({'error': '笔记URL不能为空'}), 400
+    result, status = load_note_detail(note_url)
+    return jsonify(result), status
+
+# 批量笔记详情单次最多的URL数
+MAX_NOTE_BATCH = 20
+
+@app.route('/api/note-details', methods=['POST'])
+def note_details():
+    """
+    批量获取笔记详情（NDJSON流式返回）
+    
+    请求体：{"urls": ["笔记URL", ...]}，最多20个
+    
+    返回：每行一个JSON对象 {"index": 在urls中的位置, "url", "status": HTTP状态码, "data": 笔记详情}，
+    哪篇先完成先输出哪篇；各笔记并发获取，总耗时约等于最慢的一篇
+    """
+    payload = request.get_json(silent=True) or {}
+    urls = payload.get('urls')
+    if not isinstance(urls, list) or not urls or not all(isinstance(url, str) for url in urls):
+        return jsonify({'error': 'urls 必须是非空的URL列表'}), 400
+    if len(urls) > MAX_NOTE_BATCH:
+        return jsonify({'error': f'一次最多获取 {MAX_NOTE_BATCH} 篇笔记'}), 400
+    
+    # 重复的URL只获取一次
+    urls = [url.strip() for url in urls]
+    positions = {}
+    for index, url in enumerate(urls):
+        if url:
+            positions.setdefault(url, []).append(index)
+    futures = {note_executor.submit(load_note_detail, url): url for url in positions}
+    logger.info(f"📚 批量获取笔记详情: {len(urls)} 个URL, 去重后 {len(futures)} 个")
+    
+    def line(index, url, status, data):
+        return json.dumps({'index': index, 'url': url, 'status': status, 'data': data}, ensure_ascii=False) + '\n'
+    
+    def generate():
+        try:
+            for index, url in enumerate(urls):
+                if not url:
+                    yield line(index, url, 400, {'error': '笔记URL不能为空'})
+            for future in as_completed(futures):
+                url = futures[future]
+                result, status = future.result()
+                for index in positions[url]:
+                    yield line(index, url, status, result)
+        finally:
+            # 客户端提前断开时，尚未开始的抓取不再执行
+            for future in futures:
+                future.cancel()
+    
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'    # 反向代理不缓冲，逐行送达
+    })
 
 @app.route('/api/recipe-detail', methods=['GET'])
 def recipe_detail():
@@ -847,13 +1254,15 @@ def recipe_detail():
     
     参数：
     - url: 菜谱详情页URL（必填）
-    - debug: 是否返回调试信息（可选）
+    - debug: 是否返回调试信息（可选，仅html格式）
+    - format: 返回格式，默认html，可选json（服务端解析后的菜谱详情）
     
-    返回：菜谱详情的HTML
+    返回：菜谱详情的HTML，或JSON格式的菜谱详情
     """
     try:
         recipe_url = request.args.get('url', '').strip()
         debug_mode = request.args.get('debug', '').lower() == 'true'
+        output_format = request.args.get('format', 'html').strip().lower()
         
         if not recipe_url:
             return jsonify({'error': '菜谱URL不能为空'}), 400
@@ -864,27 +1273,29 @@ def recipe_detail():
         
         logger.info(f"获取菜谱详情: url={recipe_url}, debug={debug_mode}")
         
-        session = requests.Session()
+        # 原始HTML：上游字节直接流式转发（调试模式需要完整页面，仍按原方式处理）
+        if output_format != 'json' and not debug_mode and STREAM_UPSTREAM:
+            try:
+                return shared_passthrough(recipe_url, lambda: open_upstream(recipe_url))
+            except requests.HTTPError as e:
+                error_page = e.response
+                logger.error(f"服务器返回错误: {error_page.status_code}")
+                return jsonify({'error': f'服务器返回错误: {error_page.status_code}', 'html': error_page.text[:500]}), error_page.status_code
         
-        # 先访问首页获取cookie
-        try:
-            time.sleep(0.5)  # 延迟半秒
-            session.get('https://www.douguo.com/', headers=get_headers('https://www.douguo.com/', 'douguo'), timeout=10)
-            time.sleep(1)  # 延迟1秒，模拟真实用户
-        except Exception as e:
-            logger.warning(f"访问首页失败: {e}")
-        
-        # 访问详情页
-        response = session.get(
-            recipe_url,
-            headers=get_headers('https://www.douguo.com/', 'douguo'),
-            timeout=15,
-            allow_redirects=True
-        )
+        # 访问详情页（cookie由Session池在后台预热）
+        response = fetch_upstream(recipe_url)
         
         text_content = response.text
         logger.info(f"请求完成: status={response.status_code}, length={len(text_content)} 字符")
         
+        # JSON模式：解析结果按（URL, 内容哈希）缓存，热门菜谱只解析一次
+        if output_format == 'json':
+            if response.status_code >= 400:
+                logger.error(f"服务器返回错误: {response.status_code}")
+                return jsonify({'error': f'服务器返回错误: {response.status_code}'}), response.status_code
+            detail, parse_state = parse_cached(extract_recipe_detail, recipe_url, text_content)
+            return json_response({'success': True, 'data': detail, 'url': recipe_url}, parse_state)
+        
         # 调试模式：在HTML中添加注释显示关键结构
         if debug_mode:
             from bs4 import BeautifulSoup
@@ -920,6 +1331,12 @@ Title: {soup.title.string if soup.title else '未找到'}
             'Content-Type': 'text/html; charset=utf-8'
         }
         
+    except ClientDisconnected:
+        return client_disconnected_response()
+        
+    except UpstreamUnavailable as e:
+        return unavailable_response(e)
+        
     except requests.Timeout:
         logger.error("请求超时")
         return jsonify({'error': '请求超时，请稍后重试'}), 504
@@ -946,152 +1363,506 @@ def internal_error(error):
 # 数据库API - 读取本地美食数据
 # ============================================
 
-def get_db_connection():
-    """获取数据库连接"""
-    # 数据库文件在项目根目录
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data.db')
-    
-    if not os.path.exists(db_path):
-        raise FileNotFoundError(f'数据库文件不存在: {db_path}')
+# 只读连接池：连接长期复用，data.db 被替换后自动重新打开
+db_pool = ConnectionPool(size=int(os.environ.get('AI_GOURMET_DB_POOL_SIZE', 8)))
+
+# 关键词气泡索引：数据库版本变化后在下一次查询时重建
+token_index = TokenIndex(db_pool)
+
+# 主题榜单（内存），数据库版本变化后在下一次查询时刷新
+theme_rankings = ThemeRankings(db_pool)
+
+def dish_to_dict(row):
+    """菜品行 → 前端使用的字段名"""
+    return {
+        '菜品名称': row['name'],
+        '菜品图片url': row['image_url'],
+        '菜品推荐人数': row['recommendation_count'],
+        '店名': row['shop_name']
+    }
+
+def shop_to_dict(row):
+    """店铺行 → 前端使用的字段名"""
+    return {
+        '店名': row['name'],
+        '人均消费': row['avg_price'],
+        '地址': row['address'],
+        '电话': row['phone'],
+        '详情页': row['detail_url'],
+        '评分score': row['score'] if row['score'] is not None else ''
+    }
+
+def db_conditional(view):
+    """
+    数据库接口的条件请求：ETag 由数据库版本、请求参数和压缩编码决定
     
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row  # 使用Row工厂，可以通过列名访问
-    return conn
+    - If-None-Match 命中时直接返回304，不查询数据库
+    - 同时带 Last-Modified，客户端每次都需要重新校验（no-cache）
+    - 数据库文件不存在、结构版本过旧时与视图一样返回JSON错误（含迁移提示），不带ETag
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            version, modified = db_pool.version()
+        except (FileNotFoundError, SchemaOutdatedError, sqlite3.Error) as e:
+            logger.error(f'数据库不可用: {str(e)}')
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+        query = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+        raw = f'{version}|{request.path}|{query}|{negotiate_encoding(request) or "identity"}'
+        etag = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        
+        response.set_etag(etag)
+        response.last_modified = datetime.fromtimestamp(modified, timezone.utc)
+        response.cache_control.no_cache = True
+        response.vary.add('Accept-Encoding')
+        return response.make_conditional(request)
+    return wrapper
+
+# 默认每页数量与上限；大数据量请按 next_cursor 逐页读取
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# 旧版调用方式（不带游标、不传limit）的默认返回数量，与分页改造前一致
+LEGACY_DISHES_PAGE_SIZE = 1050
+LEGACY_SHOPS_PAGE_SIZE = 200
+
+# 排序方式 → (排序列, 是否降序)
+DISH_SORTS = {
+    'recommendation': ('recommendation_count', True),
+    'name': ('name', False),
+}
+SHOP_SORTS = {
+    'score': ('score', True),
+    'name': ('name', False),
+}
+
+def int_arg(name, default, minimum, maximum=None):
+    """读取整数查询参数；未传或为空时返回默认值，不是整数或超出范围时抛出 ValueError（maximum为None表示不限上限）"""
+    value = request.args.get(name, '').strip()
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f'{name} 必须是整数')
+    if number < minimum:
+        raise ValueError(f'{name} 不能小于 {minimum}')
+    if maximum is not None and number > maximum:
+        raise ValueError(f'{name} 必须在 {minimum}~{maximum} 之间')
+    return number
+
+def float_arg(name, *aliases):
+    """读取数字查询参数（可带别名）；未传或为空时返回None，不是有限数字时抛出 ValueError"""
+    value = ''
+    for key in (name,) + aliases:
+        value = request.args.get(key, '').strip()
+        if value:
+            break
+    if not value:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f'{name} 必须是数字')
+    if not math.isfinite(number):
+        raise ValueError(f'{name} 必须是有限的数字')
+    return number
+
+def page_args(legacy_limit=DEFAULT_PAGE_SIZE):
+    """
+    读取通用分页参数: (limit, offset, cursor)
+
+    既不带游标也不传limit的请求按旧版接口处理，返回 legacy_limit 条；
+    limit、offset 不是整数或超出范围时抛出 ValueError
+    """
+    cursor = request.args.get('cursor', '', type=str)
+    if 'limit' not in request.args and not cursor:
+        limit = legacy_limit
+    else:
+        limit = int_arg('limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    offset = int_arg('offset', 0, 0)
+    return limit, offset, cursor
+
+def page_payload(items, rows, has_more, sort, limit, offset):
+    """分页响应：next_cursor 指向本页最后一行，没有下一页时为 None"""
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(sort, rows[-1]['_key'], rows[-1]['_rowid'])
+    return {
+        'success': True,
+        'data': items,
+        'count': len(items),
+        'limit': limit,
+        'offset': offset,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
+
+def location_args():
+    """
+    读取附近查询参数: lat、lon（也可写作lng）、radius（米，可选）、coord（wgs84/gcj02，默认wgs84）
+
+    返回: None（未传坐标）或 (lat, lon, radius)，坐标已转换为GCJ-02；参数错误时抛出 ValueError
+    """
+    lat = float_arg('lat')
+    lon = float_arg('lon', 'lng')
+    if lat is None and lon is None:
+        return None
+    if lat is None or lon is None:
+        raise ValueError('lat 和 lon 需要同时提供')
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError('经纬度超出范围')
+    radius = float_arg('radius')
+    if radius is not None and not 0 < radius <= MAX_RADIUS:
+        raise ValueError(f'radius 必须在 0~{MAX_RADIUS} 米之间')
+    coord = request.args.get('coord', 'wgs84', type=str).lower()
+    if coord == 'wgs84':
+        lat, lon = wgs84_to_gcj02(lat, lon)
+    elif coord != 'gcj02':
+        raise ValueError('coord 只支持 wgs84 或 gcj02')
+    return lat, lon, radius
+
+def nearby_payload(items, limit, location):
+    """附近查询的响应：按距离排序的一页结果，不分页"""
+    lat, lon, radius = location
+    return {
+        'success': True,
+        'data': items,
+        'count': len(items),
+        'limit': limit,
+        'center': {'lat': round(lat, 6), 'lon': round(lon, 6), 'coord': 'gcj02'},
+        'radius': radius,
+        'next_cursor': None,
+        'has_more': False
+    }
 
 @app.route('/api/dishes', methods=['GET'])
+@db_conditional
 def get_dishes():
     """
-    获取菜品数据
+    获取菜品数据（游标分页）
     
     参数：
-    - limit: 返回数量，默认1050
-    - offset: 偏移量，默认0
+    - limit: 每页数量，默认100（不带cursor时默认1050，与旧版一致），最大1000
+    - cursor: 上一页返回的 next_cursor，不传表示第一页
+    - offset: 兼容旧版的偏移量（深分页较慢，建议改用cursor）
     - shop: 店铺名称过滤（可选）
     - sort: 排序方式，默认recommendation（按推荐数），可选name（按名称）
+    - lat / lon（或lng）: 附近查询的中心坐标（可选），传入后按店铺距离排序，忽略分页和排序参数
+    - radius: 半径（米，可选）；不传时返回最近的店铺的菜品
+    - coord: 坐标系，默认wgs84（浏览器定位），高德坐标传gcj02
     
-    返回：菜品列表
+    返回：菜品列表，next_cursor 用于读取下一页；附近查询时每项带 distance（米）
     """
     try:
-        limit = request.args.get('limit', 1050, type=int)
-        offset = request.args.get('offset', 0, type=int)
+        try:
+            location = location_args()
+            limit, offset, cursor = page_args() if location else page_args(LEGACY_DISHES_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if location:
+            lat, lon, radius = location
+            with db_pool.connection() as conn:
+                # 最近K个时取limit家店，一般足够凑满limit道菜
+                shops = nearby_shops(conn, lat, lon, radius, limit=MAX_PAGE_SIZE if radius else limit)
+                rows = nearby_dishes(conn, shops, limit)
+            dishes = [dict(dish_to_dict(row), distance=round(distance, 1)) for distance, row in rows]
+            logger.info(f'返回附近菜品: {len(dishes)}条 (店铺{len(shops)}家, radius={radius})')
+            return jsonify(nearby_payload(dishes, limit, location))
+        
         shop = request.args.get('shop', '', type=str)
         sort = request.args.get('sort', 'recommendation', type=str)
+        if sort not in DISH_SORTS:
+            sort = 'recommendation'
+        column, descending = DISH_SORTS[sort]
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 构建SQL查询
-        sql = 'SELECT name, image_url, recommendation_count, shop_name FROM dishes'
-        params = []
+        try:
+            after = decode_cursor(cursor, sort) if cursor else None
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         # 店铺过滤
+        where, params = '', []
         if shop:
-            sql += ' WHERE shop_name LIKE ?'
+            where = 'shop_name LIKE ?'
             params.append(f'%{shop}%')
         
-        # 排序
-        if sort == 'name':
-            sql += ' ORDER BY name ASC'
-        else:
-            sql += ' ORDER BY recommendation_count DESC'
+        with db_pool.connection() as conn:
+            rows, has_more = keyset_page(
+                conn, 'dishes', 'name, image_url, recommendation_count, shop_name',
+                column, descending, limit, after=after, where=where, params=params, offset=offset
+            )
+        
+        # 转换为字典列表
+        dishes = [dish_to_dict(row) for row in rows]
         
-        # 分页
-        sql += ' LIMIT ? OFFSET ?'
-        params.extend([limit, offset])
+        logger.info(f'返回菜品数据: {len(dishes)}条 (limit={limit}, cursor={bool(cursor)}, offset={offset})')
         
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
+        return jsonify(page_payload(dishes, rows, has_more, sort, limit, offset))
+        
+    except Exception as e:
+        logger.error(f'获取菜品数据失败: {str(e)}')
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/shops', methods=['GET'])
+@db_conditional
+def get_shops():
+    """
+    获取店铺数据（游标分页）
+    
+    参数：
+    - limit: 每页数量，默认100（不带cursor时默认200，与旧版一致），最大1000
+    - cursor: 上一页返回的 next_cursor，不传表示第一页
+    - offset: 兼容旧版的偏移量（深分页较慢，建议改用cursor）
+    - sort: 排序方式，默认score（按评分，无评分的排在最后），可选name（按名称）
+    - lat / lon（或lng）: 附近查询的中心坐标（可选），传入后按距离排序，忽略分页和排序参数
+    - radius: 半径（米，可选）；不传时返回最近的limit家店铺
+    - coord: 坐标系，默认wgs84（浏览器定位），高德坐标传gcj02
+    
+    返回：店铺列表，next_cursor 用于读取下一页；附近查询时每项带 distance（米）和坐标
+    """
+    try:
+        try:
+            location = location_args()
+            limit, offset, cursor = page_args() if location else page_args(LEGACY_SHOPS_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if location:
+            lat, lon, radius = location
+            with db_pool.connection() as conn:
+                rows = nearby_shops(conn, lat, lon, radius, limit)
+            shops = [
+                dict(shop_to_dict(row), distance=round(distance, 1), lat=row['lat'], lon=row['lon'])
+                for distance, row in rows
+            ]
+            logger.info(f'返回附近店铺: {len(shops)}条 (radius={radius})')
+            return jsonify(nearby_payload(shops, limit, location))
+        
+        sort = request.args.get('sort', 'score', type=str)
+        if sort not in SHOP_SORTS:
+            sort = 'score'
+        column, descending = SHOP_SORTS[sort]
+        
+        try:
+            after = decode_cursor(cursor, sort) if cursor else None
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        with db_pool.connection() as conn:
+            rows, has_more = keyset_page(
+                conn, 'shops', 'name, avg_price, address, phone, detail_url, score',
+                column, descending, limit, after=after, offset=offset
+            )
         
         # 转换为字典列表
-        dishes = []
-        for row in rows:
-            dishes.append({
-                '菜品名称': row['name'],
-                '菜品图片url': row['image_url'],
-                '菜品推荐人数': row['recommendation_count'],
-                '店名': row['shop_name']
-            })
+        shops = [shop_to_dict(row) for row in rows]
+        
+        logger.info(f'返回店铺数据: {len(shops)}条 (limit={limit}, cursor={bool(cursor)}, offset={offset})')
+        
+        return jsonify(page_payload(shops, rows, has_more, sort, limit, offset))
+        
+    except Exception as e:
+        logger.error(f'获取店铺数据失败: {str(e)}')
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def feed_item_to_dict(row):
+    """菜品-店铺关联行 → 与前端 joinAndFilter 结果相同的结构"""
+    return {
+        'dishName': row['name'] or '',
+        'imageUrl': row['image_url'] or '',
+        'recommendCount': row['recommendation_count'] or 0,
+        'shopName': (row['shop_name'] or '').strip(),
+        'shopScore': row['score'] or 0,
+        'shopAvgPrice': row['price_value'],
+        'shopAddress': row['address'] or '',
+        'shopPhone': row['phone'] or '',
+        'shopDetail': row['detail_url'] or '',
+        'shopRecommends': []
+    }
+
+@app.route('/api/feed', methods=['GET'])
+@db_conditional
+def get_feed():
+    """
+    菜品关联店铺后的筛选列表（关联、过滤、排序均在数据库中完成）
+    
+    参数：
+    - keyword: 关键词，匹配菜名、店名、地址（可选）
+    - min_score: 最低评分（可选）
+    - max_price: 人均消费上限（可选）
+    - limit: 返回数量，默认50，最大200
+    - offset: 偏移量，默认0
+    
+    返回：按评分降序、推荐人数降序排列的一页数据，has_more 表示是否还有下一页
+    """
+    try:
+        keyword = request.args.get('keyword', '', type=str).strip()
+        min_score = request.args.get('min_score', 0, type=float)
+        max_price = request.args.get('max_price', None, type=float)
+        limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+        offset = max(0, request.args.get('offset', 0, type=int))
         
-        conn.close()
+        # 多取一条判断是否还有下一页
+        with db_pool.connection() as conn:
+            rows = feed(conn, keyword, min_score, max_price, limit + 1, offset)
+        has_more = len(rows) > limit
+        items = [feed_item_to_dict(row) for row in rows[:limit]]
         
-        logger.info(f'返回菜品数据: {len(dishes)}条 (limit={limit}, offset={offset})')
+        logger.info(f'返回关联列表: {len(items)}条 (keyword={keyword}, min_score={min_score}, max_price={max_price}, offset={offset})')
         
         return jsonify({
             'success': True,
-            'data': dishes,
-            'count': len(dishes),
+            'data': items,
+            'count': len(items),
             'limit': limit,
-            'offset': offset
+            'offset': offset,
+            'has_more': has_more
         })
         
     except Exception as e:
-        logger.error(f'获取菜品数据失败: {str(e)}')
+        logger.error(f'获取关联列表失败: {str(e)}')
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
-@app.route('/api/shops', methods=['GET'])
-def get_shops():
+@app.route('/api/search', methods=['GET'])
+@db_conditional
+def search_local():
     """
-    获取店铺数据
+    全文检索本地菜品和店铺（FTS5 trigram索引，按相关度排序）
     
     参数：
-    - limit: 返回数量，默认200
+    - q: 关键词，多个关键词用空格分隔（AND）
+    - type: all（默认）/ dish / shop
+    - limit: 每类返回数量，默认20，最大100
     - offset: 偏移量，默认0
-    - sort: 排序方式，默认score（按评分），可选name（按名称）
     
-    返回：店铺列表
+    返回：{dishes: 菜品列表, shops: 店铺列表}
     """
     try:
-        limit = request.args.get('limit', 200, type=int)
-        offset = request.args.get('offset', 0, type=int)
-        sort = request.args.get('sort', 'score', type=str)
+        q = request.args.get('q', '', type=str).strip()
+        search_type = request.args.get('type', 'all', type=str)
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        offset = max(0, request.args.get('offset', 0, type=int))
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        if not q:
+            return jsonify({'success': False, 'error': '缺少关键词参数 q'}), 400
+        if search_type not in ('all', 'dish', 'shop'):
+            return jsonify({'success': False, 'error': 'type 只能是 all、dish 或 shop'}), 400
         
-        # 构建SQL查询
-        sql = 'SELECT name, avg_price, address, phone, detail_url, score FROM shops'
+        dishes, shops = [], []
+        with db_pool.connection() as conn:
+            if search_type in ('all', 'dish'):
+                dishes = [dish_to_dict(row) for row in search_dishes(conn, q, limit, offset)]
+            if search_type in ('all', 'shop'):
+                shops = [shop_to_dict(row) for row in search_shops(conn, q, limit, offset)]
         
-        # 排序
-        if sort == 'name':
-            sql += ' ORDER BY name ASC'
-        else:
-            sql += ' ORDER BY score DESC NULLS LAST'
+        logger.info(f'🔎 全文检索: q={q}, 菜品{len(dishes)}条, 店铺{len(shops)}条 (limit={limit}, offset={offset})')
         
-        # 分页
-        sql += ' LIMIT ? OFFSET ?'
+        return jsonify({
+            'success': True,
+            'query': q,
+            'data': {'dishes': dishes, 'shops': shops},
+            'count': len(dishes) + len(shops),
+            'limit': limit,
+            'offset': offset
+        })
         
-        cursor.execute(sql, [limit, offset])
-        rows = cursor.fetchall()
+    except Exception as e:
+        logger.error(f'全文检索失败: {str(e)}')
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/tokens', methods=['GET'])
+@db_conditional
+def get_tokens():
+    """
+    关键词气泡候选（服务端预先建好的索引，与前端 nextCandidates 结果一致）
+    
+    参数：
+    - level: 层级 1 / 2 / 3，默认1
+    - theme: 第一层选中的主题（level=2时使用）
+    - parent: 第二层选中的词（level=3时使用）
+    
+    返回：[{text, count}]，最多40个
+    """
+    try:
+        level = request.args.get('level', 1, type=int)
+        theme = request.args.get('theme', '', type=str).strip()
+        parent = request.args.get('parent', '', type=str).strip()
         
-        # 转换为字典列表
-        shops = []
-        for row in rows:
-            shops.append({
-                '店名': row['name'],
-                '人均消费': row['avg_price'],
-                '地址': row['address'],
-                '电话': row['phone'],
-                '详情页': row['detail_url'],
-                '评分score': row['score'] if row['score'] is not None else ''
-            })
+        if level not in (1, 2, 3):
+            return jsonify({'success': False, 'error': 'level 只能是 1、2 或 3'}), 400
+        
+        candidates = token_index.candidates(level, theme=theme, parent=parent)
+        
+        return jsonify({
+            'success': True,
+            'level': level,
+            'data': candidates,
+            'count': len(candidates)
+        })
+        
+    except Exception as e:
+        logger.error(f'获取气泡候选失败: {str(e)}')
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/rankings', methods=['GET'])
+@db_conditional
+def get_rankings():
+    """
+    首页榜单（服务端预先计算，前端无需下载全部菜品）
+    
+    参数：
+    - dish_limit: 菜品榜数量，默认20，最大100
+    - shop_limit: 店铺榜数量，默认10，最大100
+    - theme: 主题名称，返回该主题的菜品榜；传 all 返回全部主题（可选）
+    
+    返回：{dishes: 菜品榜, shops: 店铺榜（含每店前3道菜）, themes: {主题: 菜品榜}}
+    """
+    try:
+        dish_limit = max(1, min(request.args.get('dish_limit', 20, type=int), 100))
+        shop_limit = max(1, min(request.args.get('shop_limit', 10, type=int), 100))
+        theme = request.args.get('theme', '', type=str).strip()
         
-        conn.close()
+        with db_pool.connection() as conn:
+            dishes = dish_leaderboard(conn, dish_limit)
+            shops = shop_leaderboard(conn, shop_limit)
         
-        logger.info(f'返回店铺数据: {len(shops)}条 (limit={limit}, offset={offset})')
+        themes = {}
+        if theme == 'all':
+            themes = theme_rankings.get()
+        elif theme:
+            themes = {theme: theme_rankings.get(theme)}
         
         return jsonify({
             'success': True,
-            'data': shops,
-            'count': len(shops),
-            'limit': limit,
-            'offset': offset
+            'data': {'dishes': dishes, 'shops': shops, 'themes': themes}
         })
         
     except Exception as e:
-        logger.error(f'获取店铺数据失败: {str(e)}')
+        logger.error(f'获取榜单失败: {str(e)}')
         return jsonify({
             'success': False,
             'error': str(e)
@@ -1106,15 +1877,22 @@ if __name__ == '__main__':
     print("📍 搜索接口: http://localhost:5000/api/search-notes?query=杭州美食推荐")
     print("📍 菜品数据: http://localhost:5000/api/dishes")
     print("📍 店铺数据: http://localhost:5000/api/shops")
+    print("📍 全文检索: http://localhost:5000/api/search?q=红烧肉")
     print("=" * 60)
     print("\n按 Ctrl+C 停止服务\n")
     
+    # debug=True 时由一个监控进程反复拉起运行应用的子进程（WERKZEUG_RUN_MAIN=true），
+    # 后台线程只在子进程中启动，监控进程中不运行
+    debug = True
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_tasks()
+    
     # 启动Flask应用
     # debug=True: 开发模式，代码修改后自动重启
     # host='0.0.0.0': 允许外部访问
     # port=5000: 端口号
     app.run(
-        debug=True,
+        debug=debug,
         host='0.0.0.0',
         port=5000
     )
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+笔记详情提取性能对比
+
+用法:
+    python bench_extractors.py                # 每个站点默认运行3秒
+    python bench_extractors.py --seconds 1 --size 300
+
+- 用构造的页面（与各站点的结构一致，大小可调）比较改造前后每秒能提取的页面数
+- "改造前" 为原 note_detail 中的内联逻辑：每个站点都用 html.parser 解析整页
+- "改造后" 为 note_extractors 中的站点提取器：快速路径 + 局部解析
+- 同时检查两者的提取结果一致
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from note_extractors import BAIDU_REDIRECT_NOTICE, HTML_PARSER, extractor_for
+
+
+# ---------- 构造页面 ----------
+
+def _filler(size_kb, tag='div'):
+    """页面中与笔记无关的大量标记（导航、推荐列表、脚本等）"""
+    block = (f'<{tag} class="recommend-item"><a href="/item/{{i}}"><img src="/static/icon-{{i}}.png">'
+             f'<span class="name">推荐 {{i}}</span><span class="desc">这是一段与正文无关的推荐文字</span></a></{tag}>')
+    parts, size, i = [], 0, 0
+    while size < size_kb * 1024:
+        part = block.format(i=i)
+        parts.append(part)
+        size += len(part.encode('utf-8'))
+        i += 1
+    return ''.join(parts)
+
+
+def build_pages(size_kb):
+    paragraphs = ''.join(f'<p>第{i}段：今天去吃了这家店，味道非常好，推荐招牌菜。</p>' for i in range(30))
+    next_data = json.dumps({'props': {'pageProps': {'feedInfo': {
+        'title': '杭州必吃的十家面馆',
+        'content': '正文内容' * 200,
+        'feedUser': {'nickName': '吃货小王'},
+        'feedPicList': [{'url': f'https://img.dianping.com/{i}.jpg'} for i in range(9)],
+    }}}}, ensure_ascii=False)
+    return {
+        'dianping': ('https://m.dianping.com/ugcdetail/123', True, (
+            f'<html><head><title>大众点评</title></head><body><div id="__next">{_filler(size_kb)}</div>'
+            f'<script id="__NEXT_DATA__" type="application/json">{next_data}</script></body></html>')),
+        'ctrip': ('https://m.ctrip.com/webapp/you/tripshoot/paipai/detail/1', False, (
+            '<html><head><meta charset="utf-8"><title>西湖边的小吃 - 携程旅行</title>'
+            '<meta name="description" content="在西湖边找到的几家老字号小吃店，&amp;值得一试">'
+            f'</head><body><div id="main">{_filler(size_kb)}</div><script>window.__data = {{}};</script></body></html>')),
+        'baidu': ('https://mbd.baidu.com/newspage/data/landingsuper?id=1', True, (
+            '<html><head><title>百度笔记</title></head><body>'
+            f'<div class="header">{_filler(size_kb // 2)}</div>'
+            '<h1>老杭州人私藏的小馆子</h1>'
+            f'<div class="content-article">{paragraphs}<img src="//pic.baidu.com/a.jpg"><img src="/b.jpg"></div>'
+            f'<div class="footer">{_filler(size_kb // 2)}</div></body></html>')),
+        'generic': ('https://www.example.com/note/1', False, (
+            '<html><head><title>美食笔记</title></head><body>'
+            f'<div class="nav">{_filler(size_kb // 2)}</div>'
+            f'<h1>一家藏在巷子里的本帮菜</h1><div class="content">{paragraphs}</div>'
+            f'<div class="side">{_filler(size_kb // 2)}</div></body></html>')),
+        'baidu_redirect': ('https://www.xiaohongshu.com/explore/1', True, (
+            f'<html><head><title>小红书 - 你的生活指南</title></head><body>{_filler(size_kb)}</body></html>')),
+    }
+
+
+# ---------- 改造前：原 note_detail 的内联逻辑 ----------
+
+def legacy_extract(site, text, url, from_baidu):
+    result = {}
+    if site == 'baidu_redirect':
+        soup = BeautifulSoup(text, 'html.parser')
+        title_tag = soup.find('title')
+        if title_tag:
+            result['title'] = title_tag.get_text(strip=True)
+        result['type'] = 'baidu_redirect'
+        if 'ctrip.com' in url:
+            result['content'], result['source'] = '该笔记来自携程旅行，内容丰富多样。', '百度笔记 → 携程旅行'
+        elif 'xiaohongshu.com' in url or 'xhslink.com' in url:
+            result['content'], result['source'] = '该笔记来自小红书，内容精彩纷呈。', '百度笔记 → 小红书'
+        else:
+            result['content'], result['source'] = '该笔记来自第三方网站。', '百度笔记'
+        result['needJump'] = True
+    elif site == 'dianping':
+        result['type'] = 'dianping'
+        match = re.search(r'<script id="__NEXT_DATA__" type="application/json"[^>]*>(.*?)</script>', text, re.DOTALL)
+        data = json.loads(match.group(1))
+        feed_info = data.get('props', {}).get('pageProps', {}).get('feedInfo', {})
+        result['title'] = feed_info.get('title', '')
+        result['content'] = feed_info.get('content', '')
+        author = feed_info.get('feedUser', {}).get('nickName', '大众点评用户')
+        result['source'] = f'{author} (百度笔记 → 大众点评)' if from_baidu else author
+        result['images'] = [pic.get('url', '') for pic in feed_info.get('feedPicList', []) if pic.get('url')]
+    elif site == 'ctrip':
+        result.update({'type': 'ctrip', 'source': '携程旅行', 'title': '', 'content': ''})
+        soup = BeautifulSoup(text, 'html.parser')
+        title_tag = soup.find('title')
+        if title_tag:
+            result['title'] = title_tag.string or ''
+        desc_tag = soup.find('meta', {'name': 'description'})
+        if desc_tag and desc_tag.get('content'):
+            result['content'] = desc_tag.get('content')
+        if not result['content']:
+            result['content'] = '该笔记来自携程旅行，为了获得最佳体验，建议前往原网站查看。'
+        result['needJump'] = True
+    elif site == 'baidu':
+        result.update({'type': 'baidu', 'images': []})
+        soup = BeautifulSoup(text, 'html.parser')
+        title_tag = soup.find('h1') or soup.find('title')
+        if title_tag:
+            result['title'] = title_tag.get_text(strip=True)
+        result['source'] = '百度笔记'
+        result['content'] = ''
+        for selector in ['.content-article', '.article-content', '[class*="content"]', 'article', '.detail-content']:
+            content_el = soup.select_one(selector)
+            if content_el:
+                paragraphs = content_el.find_all('p')
+                if paragraphs:
+                    result['content'] = '\n\n'.join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
+                    break
+                elif content_el.get_text(strip=True):
+                    result['content'] = content_el.get_text(strip=True)
+                    break
+        for img in soup.find_all('img'):
+            src = img.get('src') or img.get('data-src') or img.get('data-original')
+            if src and not any(x in src for x in ['icon', 'logo', 'avatar']):
+                if src.startswith('//'):
+                    src = 'https:' + src
+                elif src.startswith('/'):
+                    src = 'https://mbd.baidu.com' + src
+                result['images'].append(src)
+        if not result.get('title') and not result['content']:
+            result['needJump'] = True
+            result['error'] = '内容解析失败，建议前往原网站查看'
+    else:
+        result['type'] = 'generic'
+        soup = BeautifulSoup(text, 'html.parser')
+        title_el = soup.find('h1') or soup.find(class_='title')
+        if title_el:
+            result['title'] = title_el.get_text(strip=True)
+        result['content'] = ''
+        for selector in ['.content', '.article-content', 'article', '.detail-content']:
+            content_el = soup.select_one(selector)
+            if content_el:
+                paragraphs = content_el.find_all('p')
+                result['content'] = '\n\n'.join([p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True)])
+                if result['content']:
+                    break
+    return result
+
+
+# ---------- 改造后 ----------
+
+def registry_extract(site, text, url, from_baidu):
+    context = {'url': url, 'from_baidu': from_baidu}
+    if site == 'baidu_redirect':
+        return BAIDU_REDIRECT_NOTICE.extract(text, context)
+    return extractor_for(url).extract(text, context)
+
+
+def throughput(func, args, seconds):
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while True:
+        func(*args)
+        count += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return count / (now - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='比较笔记详情提取改造前后的吞吐量')
+    parser.add_argument('--seconds', type=float, default=3.0, help='每个站点、每种实现的运行时间')
+    parser.add_argument('--size', type=int, default=150, help='构造页面的大小（KB）')
+    args = parser.parse_args(argv)
+
+    pages = build_pages(args.size)
+    print(f"页面大小约 {args.size}KB，解析器: {HTML_PARSER}")
+    print(f"{'站点':<16}{'改造前(页/秒)':>14}{'改造后(页/秒)':>14}{'倍数':>8}  结果一致")
+    for site, (url, from_baidu, text) in pages.items():
+        call_args = (site, text, url, from_baidu)
+        same = legacy_extract(*call_args) == registry_extract(*call_args)
+        before = throughput(legacy_extract, call_args, args.seconds)
+        after = throughput(registry_extract, call_args, args.seconds)
+        print(f"{site:<16}{before:>14.1f}{after:>14.1f}{after / before:>8.1f}  {'✅' if same else '❌'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应缓存
+- TTL过期 + 按内存占用的LRU淘汰
+- stale-while-revalidate：过期但仍在宽限期内的数据先返回，后台刷新
+- 多进程共享：可选的本地SQLite二级存储，多个工作进程读写同一份缓存
+- 逆地理编码缓存：按经纬度网格量化，内存LRU + 本地SQLite持久化
+- 笔记跳转缓存：原始笔记URL → 真实页面URL，内存LRU + 本地SQLite持久化
+- 请求合并（single-flight）：同一键同时只执行一次，并发的相同调用等待并共享结果
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 缓存状态，用于响应头 X-Cache
+HIT = 'HIT'
+STALE = 'STALE'
+MISS = 'MISS'
+
+
+def normalize_part(value):
+    """规范化缓存键的组成部分：全角转半角、去首尾空格、合并空白、转小写"""
+    text = unicodedata.normalize('NFKC', str(value if value is not None else ''))
+    return ' '.join(text.split()).lower()
+
+
+def cache_key(endpoint, query='', page=1, category=''):
+    """生成规范化缓存键 (endpoint, query, page, category)"""
+    return (endpoint, normalize_part(query), int(page or 1), normalize_part(category))
+
+
+def estimate_size(value):
+    """估算缓存值占用的内存（字节）"""
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'))
+    except (TypeError, ValueError):
+        return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'fresh_until', 'stale_until')
+
+    def __init__(self, value, size, fresh_until, stale_until):
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class SharedStore:
+    """
+    多进程共享的缓存存储（本地SQLite，WAL模式）
+
+    - 多个工作进程打开同一个数据库文件，一个进程写入的条目其他进程直接读取
+    - 条目保存绝对的新鲜期/宽限期截止时间，各进程按同一时间判断是否过期
+    - 刷新租约：同一条目同时只由一个进程刷新（claim / release）
+    - 进程fork后自动重新打开连接（SQLite连接不能跨进程使用）
+    """
+
+    # 每写入多少次清理一次过期条目
+    PURGE_EVERY = 200
+
+    def __init__(self, db_path, max_entries=20000, busy_timeout=2.0):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._inherited = []
+        self._writes = 0
+
+    def _db(self):
+        if self._conn is not None and self._pid != os.getpid():
+            # fork前打开的连接：子进程中既不能使用也不能关闭（关闭时会误删其他进程正在使用的WAL）
+            self._inherited.append(self._conn)
+            self._conn = None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS shared_cache ('
+                'key TEXT PRIMARY KEY, payload TEXT NOT NULL, fresh_until REAL NOT NULL, stale_until REAL NOT NULL)'
+            )
+            conn.execute('CREATE TABLE IF NOT EXISTS refresh_leases (key TEXT PRIMARY KEY, until REAL NOT NULL)')
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(list(key) if isinstance(key, tuple) else key, ensure_ascii=False)
+
+    def get(self, key):
+        """
+        读取条目
+
+        返回: (value, fresh_until, stale_until)，不存在或已超过宽限期时返回None
+        """
+        try:
+            with self._lock:
+                row = self._db().execute(
+                    'SELECT payload, fresh_until, stale_until FROM shared_cache WHERE key = ? AND stale_until > ?',
+                    (self._key(key), time.time())
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"读取共享缓存失败: {e}")
+            return None
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def set(self, key, value, fresh_until, stale_until):
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute(
+                    'INSERT OR REPLACE INTO shared_cache (key, payload, fresh_until, stale_until) VALUES (?, ?, ?, ?)',
+                    (self._key(key), payload, fresh_until, stale_until)
+                )
+                db.commit()
+                self._writes += 1
+                if self._writes % self.PURGE_EVERY == 0:
+                    self._purge(db)
+        except sqlite3.Error as e:
+            logger.warning(f"写入共享缓存失败: {e}")
+
+    def _purge(self, db):
+        """删除超过宽限期的条目；条目仍然过多时删除最早过期的"""
+        now = time.time()
+        db.execute('DELETE FROM shared_cache WHERE stale_until <= ?', (now,))
+        db.execute('DELETE FROM refresh_leases WHERE until <= ?', (now,))
+        db.execute(
+            'DELETE FROM shared_cache WHERE key IN ('
+            'SELECT key FROM shared_cache ORDER BY stale_until DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+        db.commit()
+
+    def delete(self, key):
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute('DELETE FROM shared_cache WHERE key = ?', (self._key(key),))
+                db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"删除共享缓存失败: {e}")
+
+    def clear(self):
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute('DELETE FROM shared_cache')
+                db.execute('DELETE FROM refresh_leases')
+                db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"清空共享缓存失败: {e}")
+
+    def claim(self, key, seconds):
+        """
+        申请刷新租约：租约期内其他进程申请同一条目时返回False
+
+        读写失败时返回True（宁可重复刷新，也不让条目一直得不到刷新）
+        """
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._db()
+                cursor = db.execute(
+                    'INSERT INTO refresh_leases (key, until) VALUES (?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET until = excluded.until WHERE refresh_leases.until <= ?',
+                    (self._key(key), now + seconds, now)
+                )
+                db.commit()
+                return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.warning(f"申请刷新租约失败: {e}")
+            return True
+
+    def release(self, key):
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute('DELETE FROM refresh_leases WHERE key = ?', (self._key(key),))
+                db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"释放刷新租约失败: {e}")
+
+
+class TTLCache:
+    """
+    线程安全的TTL + LRU缓存
+
+    - 每个条目有新鲜期(ttl)和宽限期(stale_ttl)
+    - 总占用超过 max_bytes 时淘汰最久未使用的条目
+    - 可选二级存储 shared（SharedStore）：键的第一项在 shared_namespaces 中的条目同时写入共享存储，
+      内存未命中或已过期时读取共享存储，多进程部署时各进程共用同一份数据；后台刷新按条目申请租约，
+      同一条目同时只有一个进程请求上游
+    """
+
+    # 后台刷新租约（秒）：持有租约的进程异常退出时，租约到期后由其他进程接替
+    REFRESH_LEASE = 60
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, refresh_workers=4, shared=None, shared_namespaces=()):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.shared_namespaces = frozenset(shared_namespaces)
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='cache-refresh')
+        self.stats = {HIT: 0, STALE: 0, MISS: 0}
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def _shares(self, key):
+        return (self.shared is not None and isinstance(key, tuple) and len(key) > 0
+                and key[0] in self.shared_namespaces)
+
+    def _lookup(self, key, now):
+        """
+        查找条目：先查内存，内存中没有或已过期时查共享存储（其他进程可能已写入或刷新）
+
+        返回: _Entry，不存在或已超过宽限期时返回None
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and now >= entry.stale_until:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._data.move_to_end(key)
+                if now < entry.fresh_until:
+                    return entry
+        if not self._shares(key):
+            return entry
+        row = self.shared.get(key)
+        if row is None or (entry is not None and row[1] <= entry.fresh_until):
+            return entry
+        value, fresh_until, stale_until = row
+        return self._put(key, value, estimate_size(value), fresh_until, stale_until) or entry
+
+    def get(self, key):
+        """
+        读取缓存
+
+        返回: (value, state)，state为 HIT / STALE / MISS
+        """
+        now = time.time()
+        entry = self._lookup(key, now)
+        if entry is None:
+            return None, MISS
+        return entry.value, (HIT if now < entry.fresh_until else STALE)
+
+    def fresh_for(self, key):
+        """条目还有多少秒过新鲜期（不存在或已过期时为0），不计入命中统计"""
+        now = time.time()
+        entry = self._lookup(key, now)
+        return max(0.0, entry.fresh_until - now) if entry is not None else 0.0
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        """写入缓存，超出内存上限时按LRU淘汰"""
+        now = time.time()
+        size = estimate_size(value)
+        if self._put(key, value, size, now + ttl, now + ttl + stale_ttl) and self._shares(key):
+            self.shared.set(key, value, now + ttl, now + ttl + stale_ttl)
+
+    def _put(self, key, value, size, fresh_until, stale_until):
+        if size > self.max_bytes:
+            return None
+        entry = _Entry(value, size, fresh_until, stale_until)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._data:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+        return entry
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+        if self._shares(key):
+            self.shared.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+        if self.shared is not None:
+            self.shared.clear()
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self._bytes -= entry.size
+
+    def claim(self, key, seconds=REFRESH_LEASE):
+        """申请刷新条目（多进程时同一条目同时只有一个进程刷新）；没有共享存储时总是成功"""
+        return not self._shares(key) or self.shared.claim(key, seconds)
+
+    def release(self, key):
+        if self._shares(key):
+            self.shared.release(key)
+
+    def get_or_refresh(self, key, loader, ttl, stale_ttl=0):
+        """
+        读取缓存，过期但在宽限期内时返回旧数据并用loader在后台刷新
+
+        未命中时返回 (None, MISS)，由调用方自行加载并写入（如边转发边缓存）
+
+        返回: (value, state)
+        """
+        value, state = self.get(key)
+        if state == STALE:
+            self._refresh_in_background(key, loader, ttl, stale_ttl)
+        self.stats[state] += 1
+        return value, state
+
+    def get_or_load(self, key, loader, ttl, stale_ttl=0):
+        """
+        读取缓存，未命中时调用loader加载
+
+        - 新鲜命中：直接返回
+        - 过期但在宽限期内：返回旧数据，同时在后台刷新
+        - 未命中：同步调用loader，结果写入缓存；loader抛出的异常不缓存、直接向上抛
+
+        返回: (value, state)
+        """
+        value, state = self.get_or_refresh(key, loader, ttl, stale_ttl)
+        if state == MISS:
+            value = loader()
+            self.set(key, value, ttl, stale_ttl)
+        return value, state
+
+    def _refresh_in_background(self, key, loader, ttl, stale_ttl):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        if not self.claim(key):
+            # 其他进程正在刷新，刷新结果写入共享存储后本进程下次读取时直接拿到
+            with self._lock:
+                self._refreshing.discard(key)
+            return
+
+        def refresh():
+            try:
+                self.set(key, loader(), ttl, stale_ttl)
+                logger.info(f"🔄 后台刷新缓存完成: {key}")
+            except Exception as e:
+                logger.warning(f"后台刷新缓存失败: {key}, {e}")
+            finally:
+                self.release(key)
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
+
+
+class _Flight:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self, timeout=None):
+        """
+        等待执行方的结果
+
+        返回: (是否已结束, 结果)；执行方失败时抛出同一个异常
+        """
+        if not self.event.wait(timeout):
+            return False, None
+        if self.error is not None:
+            raise self.error
+        return True, self.value
+
+
+class SingleFlight:
+    """
+    请求合并（single-flight）
+
+    - begin(key) 返回 (flight, 是否由当前调用执行)；同一键已有执行中的调用时，当前调用只需 flight.wait()
+    - 执行方结束时调用 finish()，结果（或异常）交给所有等待方
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def finish(self, key, flight, value=None, error=None):
+        """执行方结束（重复调用时只有第一次有效）"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if flight.event.is_set():
+                return
+            flight.value = value
+            flight.error = error
+            flight.event.set()
+
+
+class PersistentCache:
+    """
+    持久化缓存：内存LRU + 本地SQLite表，重启后仍然有效
+
+    - 多进程部署时各进程打开同一个数据库文件，一个进程写入的条目其他进程在内存未命中时读到
+    - 每个线程使用自己的SQLite连接，读写磁盘时不持有锁；锁只保护内存中的LRU
+    - 每写入 PURGE_EVERY 次（以及进程内第一次写入时）删除过期条目，条目仍然过多时删除最早写入的
+    - 子类设置 table / key_column（表名、键列名）
+    """
+
+    table = 'cache'
+    key_column = 'key'
+    label = '缓存'
+
+    # 每写入多少次清理一次过期条目
+    PURGE_EVERY = 200
+
+    def __init__(self, db_path, max_entries=10000, ttl=30 * 86400, max_rows=200000, busy_timeout=2.0):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.busy_timeout = busy_timeout
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._inherited = []
+        self._writes = 0
+
+    def _db(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        if conn is not None:
+            # fork前打开的连接留给父进程，子进程重新打开
+            self._inherited.append(conn)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            f'{self.key_column} TEXT PRIMARY KEY, payload TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{self.table}_updated_at ON {self.table}(updated_at)')
+        conn.commit()
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _remember(self, key, value, stored_at):
+        self._memory[key] = (value, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get_key(self, key):
+        """读取缓存，返回 (value, state)"""
+        expire_before = time.time() - self.ttl
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                if item[1] > expire_before:
+                    self._memory.move_to_end(key)
+                    return item[0], HIT
+                del self._memory[key]
+        try:
+            row = self._db().execute(
+                f'SELECT payload, updated_at FROM {self.table} WHERE {self.key_column} = ? AND updated_at > ?',
+                (key, expire_before)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"读取{self.label}失败: {e}")
+            row = None
+        if row is None:
+            return None, MISS
+        value = json.loads(row[0])
+        with self._lock:
+            self._remember(key, value, row[1])
+        return value, HIT
+
+    def set_key(self, key, value):
+        """写入内存和SQLite"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._writes += 1
+            purge = self._writes % self.PURGE_EVERY == 1
+        try:
+            db = self._db()
+            db.execute(
+                f'INSERT OR REPLACE INTO {self.table} ({self.key_column}, payload, updated_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), now)
+            )
+            db.commit()
+            if purge:
+                self._purge(db)
+        except sqlite3.Error as e:
+            logger.warning(f"写入{self.label}失败: {e}")
+
+    def _purge(self, db):
+        """删除过期条目；条目仍然超过 max_rows 时删除最早写入的"""
+        db.execute(f'DELETE FROM {self.table} WHERE updated_at <= ?', (time.time() - self.ttl,))
+        db.execute(
+            f'DELETE FROM {self.table} WHERE {self.key_column} IN ('
+            f'SELECT {self.key_column} FROM {self.table} ORDER BY updated_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_rows,)
+        )
+        db.commit()
+
+    def delete_key(self, key):
+        """删除内存和SQLite中的条目"""
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            db = self._db()
+            db.execute(f'DELETE FROM {self.table} WHERE {self.key_column} = ?', (key,))
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"删除{self.label}失败: {e}")
+
+
+class GeoCache(PersistentCache):
+    """
+    逆地理编码缓存
+
+    - 经纬度按固定精度量化为网格（precision=3 约110米），同一网格内的坐标共享结果
+    - 一级缓存：内存LRU；二级缓存：本地SQLite表，重启后仍然有效
+    """
+
+    table = 'geocode_cache'
+    key_column = 'cell'
+    label = '逆地理编码缓存'
+
+    def __init__(self, db_path, precision=3, max_entries=10000, ttl=30 * 86400, max_rows=200000):
+        super().__init__(db_path, max_entries, ttl, max_rows)
+        self.precision = precision
+
+    def cell(self, lat, lon):
+        """经纬度 → 网格键"""
+        p = self.precision
+        return f"{round(float(lat), p):.{p}f},{round(float(lon), p):.{p}f}"
+
+    def get(self, lat, lon):
+        """读取缓存，返回 (value, state)"""
+        return self.get_key(self.cell(lat, lon))
+
+    def set(self, lat, lon, value):
+        """写入内存和SQLite"""
+        self.set_key(self.cell(lat, lon), value)
+
+
+class RedirectCache(PersistentCache):
+    """
+    笔记跳转缓存：原始笔记URL → 跳转解析结果
+
+    值为字典:
+    - real_url: 跳转后的真实页面URL
+    - notice: 跳转到暂不解析的第三方站点时的跳转提示（直接返回，不再请求任何页面），否则为None
+    """
+
+    table = 'note_redirects'
+    key_column = 'url'
+    label = '笔记跳转缓存'
+
+    def get(self, url):
+        return self.get_key(url)
+
+    def set(self, url, real_url, notice=None):
+        self.set_key(url, {'real_url': real_url, 'notice': notice})
+
+    def delete(self, url):
+        self.delete_key(url)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应压缩
+- 按请求头 Accept-Encoding 选择 br（安装了brotli时）或 gzip
+- 只压缩HTML/JSON等文本响应，流式响应和过小的响应不压缩
+- 较大的响应（如抓取的搜索结果页）压缩结果按内容哈希缓存，重复请求不再重新压缩
+"""
+
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只使用gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = {'text/html', 'text/plain', 'application/json', 'application/x-ndjson'}
+MIN_SIZE = 1024
+CACHE_MIN_SIZE = 16 * 1024
+CACHE_TTL = 3600
+
+
+def supported_encodings():
+    """服务端支持的编码，按优先顺序"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate_encoding(request):
+    """根据 Accept-Encoding 选择编码，客户端不支持压缩时返回None"""
+    return request.accept_encodings.best_match(supported_encodings())
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+
+def init_compression(app, cache=None):
+    """
+    注册压缩钩子
+
+    参数:
+    - cache: 可选的 TTLCache，用于缓存较大响应的压缩结果
+    """
+
+    def compress_response(response):
+        from flask import request
+
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding(request)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+
+        if cache is not None and len(data) >= CACHE_MIN_SIZE:
+            key = ('compressed', encoding, hashlib.sha1(data).hexdigest())
+            body, _ = cache.get_or_load(key, lambda: compress(data, encoding), CACHE_TTL)
+        else:
+            body = compress(data, encoding)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    app.after_request(compress_response)
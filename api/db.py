@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地美食数据库（data.db）访问
+- 长期存活的只读连接池，连接按需创建、用完归还
+- 读优化PRAGMA：WAL、mmap、大页缓存、内存临时表、query_only
+- data.db 被整体替换（如重新导入数据）后自动重新打开
+- 连接池只读：索引、全文检索表等由 ingest.py 或 `python db.py migrate` 建立（migrate），
+  数据库结构版本过旧时查询直接报错，提示先执行迁移
+
+用法:
+    python db.py migrate                  # 补齐 data.db 的索引、全文检索表、榜单表和空间索引
+    python db.py migrate --db other.db
+    python db.py migrate --if-exists      # 启动脚本使用：数据库文件不存在时跳过（还没导入数据）
+"""
+
+import argparse
+import logging
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+from tokens import THEME_KEYWORDS
+
+logger = logging.getLogger(__name__)
+
+# 数据库文件在项目根目录
+DB_PATH = os.environ.get(
+    'AI_GOURMET_DB_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data.db')
+)
+
+# 数据库结构版本（PRAGMA user_version），migrate 完成后写入；连接池要求不低于该版本
+# 2: price_value 改为导入时写入的普通数字列；菜品冗余店铺评分 shop_score，/api/feed 按索引排序
+# 3: 主题榜单改为触发器维护的 theme_dishes 表（主题关键词存放在 theme_keywords）
+SCHEMA_VERSION = 3
+
+# 旧数据库缺少时补上的列
+# price_value: 人均消费的数字，由 ingest.py 导入时解析写入（parse_price），"人均消费：¥88" → 88.0
+# lat / lon: 店铺坐标（GCJ-02），由 geocode_shops.py 离线批量填充
+# shop_score: 菜品所属店铺的评分（没有对应店铺为0），由触发器随 shops、dishes 的增删改维护
+ADDED_COLUMNS = (
+    ('shops', 'price_value', 'REAL'),
+    ('shops', 'lat', 'REAL'),
+    ('shops', 'lon', 'REAL'),
+    ('dishes', 'shop_score', 'REAL NOT NULL DEFAULT 0'),
+)
+
+# PRAGMA table_xinfo 的 hidden 字段：2、3 为生成列（VIRTUAL、STORED）
+GENERATED_COLUMN = (2, 3)
+
+PRICE_STRIP_PATTERN = re.compile(r'[^0-9.]')
+PRICE_NUMBER_PATTERN = re.compile(r'\d+(?:\.\d*)?|\.\d+')
+
+
+def parse_price(value):
+    """
+    人均消费文本 → 数字，与前端 parseFloat(text.replace(/[^\\d.]/g, '')) 一致
+
+    "人均消费：¥88" → 88.0，"¥ 88元/人" → 88.0，空值或没有数字时为None
+    """
+    match = PRICE_NUMBER_PATTERN.match(PRICE_STRIP_PATTERN.sub('', value or ''))
+    return float(match.group()) if match else None
+
+
+# 全文检索：trigram分词适合中文子串匹配
+# 外部内容表（content=）不重复存储原文，由触发器与基础表保持同步
+SCHEMA_STATEMENTS = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS dishes_fts USING fts5(
+        name, shop_name, content='dishes', content_rowid='rowid', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS dishes_fts_ai AFTER INSERT ON dishes BEGIN
+        INSERT INTO dishes_fts(rowid, name, shop_name) VALUES (new.rowid, new.name, new.shop_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS dishes_fts_ad AFTER DELETE ON dishes BEGIN
+        INSERT INTO dishes_fts(dishes_fts, rowid, name, shop_name) VALUES ('delete', old.rowid, old.name, old.shop_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS dishes_fts_au AFTER UPDATE OF name, shop_name ON dishes BEGIN
+        INSERT INTO dishes_fts(dishes_fts, rowid, name, shop_name) VALUES ('delete', old.rowid, old.name, old.shop_name);
+        INSERT INTO dishes_fts(rowid, name, shop_name) VALUES (new.rowid, new.name, new.shop_name);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS shops_fts USING fts5(
+        name, address, content='shops', content_rowid='rowid', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS shops_fts_ai AFTER INSERT ON shops BEGIN
+        INSERT INTO shops_fts(rowid, name, address) VALUES (new.rowid, new.name, new.address);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shops_fts_ad AFTER DELETE ON shops BEGIN
+        INSERT INTO shops_fts(shops_fts, rowid, name, address) VALUES ('delete', old.rowid, old.name, old.address);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shops_fts_au AFTER UPDATE OF name, address ON shops BEGIN
+        INSERT INTO shops_fts(shops_fts, rowid, name, address) VALUES ('delete', old.rowid, old.name, old.address);
+        INSERT INTO shops_fts(rowid, name, address) VALUES (new.rowid, new.name, new.address);
+    END""",
+    # /api/feed：菜品按店名关联店铺，按人均过滤
+    'CREATE INDEX IF NOT EXISTS idx_shops_name ON shops(name)',
+    'CREATE INDEX IF NOT EXISTS idx_shops_score ON shops(score)',
+    'CREATE INDEX IF NOT EXISTS idx_shops_price_value ON shops(price_value)',
+    'CREATE INDEX IF NOT EXISTS idx_dishes_shop_recommendation ON dishes(shop_name, recommendation_count)',
+    # 按 (店铺评分, 推荐人数) 降序直接读索引，不需要先关联店铺再排序
+    'CREATE INDEX IF NOT EXISTS idx_dishes_feed ON dishes(shop_score DESC, recommendation_count DESC)',
+    """CREATE TRIGGER IF NOT EXISTS dishes_shop_score_ai AFTER INSERT ON dishes BEGIN
+        UPDATE dishes SET shop_score = COALESCE((SELECT MAX(score) FROM shops WHERE name = new.shop_name), 0)
+        WHERE rowid = new.rowid;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS dishes_shop_score_au AFTER UPDATE OF shop_name ON dishes BEGIN
+        UPDATE dishes SET shop_score = COALESCE((SELECT MAX(score) FROM shops WHERE name = new.shop_name), 0)
+        WHERE rowid = new.rowid;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shops_score_ai AFTER INSERT ON shops BEGIN
+        UPDATE dishes SET shop_score = COALESCE(new.score, 0) WHERE shop_name = new.name;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shops_score_ad AFTER DELETE ON shops BEGIN
+        UPDATE dishes SET shop_score = COALESCE((SELECT MAX(score) FROM shops WHERE name = old.name), 0)
+        WHERE shop_name = old.name;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shops_score_au AFTER UPDATE OF name, score ON shops BEGIN
+        UPDATE dishes SET shop_score = COALESCE((SELECT MAX(score) FROM shops WHERE name = old.name), 0)
+        WHERE shop_name = old.name AND old.name IS NOT new.name;
+        UPDATE dishes SET shop_score = COALESCE(new.score, 0) WHERE shop_name = new.name;
+    END""",
+    # /api/dishes、/api/shops 游标分页：索引隐含以rowid结尾，即 (排序列, rowid)
+    'CREATE INDEX IF NOT EXISTS idx_dishes_recommendation ON dishes(recommendation_count)',
+    'CREATE INDEX IF NOT EXISTS idx_dishes_name ON dishes(name)',
+    # /api/rankings 店铺榜：各店菜品推荐人数之和，由触发器随 dishes 的增删改增量更新
+    """CREATE TABLE IF NOT EXISTS shop_rankings (
+        shop_name TEXT PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0,
+        dishes INTEGER NOT NULL DEFAULT 0
+    )""",
+    'CREATE INDEX IF NOT EXISTS idx_shop_rankings_total ON shop_rankings(total)',
+    """CREATE TRIGGER IF NOT EXISTS shop_rankings_ai AFTER INSERT ON dishes BEGIN
+        INSERT INTO shop_rankings (shop_name, total, dishes)
+        VALUES (COALESCE(new.shop_name, ''), COALESCE(new.recommendation_count, 0), 1)
+        ON CONFLICT(shop_name) DO UPDATE SET total = total + excluded.total, dishes = dishes + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shop_rankings_ad AFTER DELETE ON dishes BEGIN
+        UPDATE shop_rankings SET total = total - COALESCE(old.recommendation_count, 0), dishes = dishes - 1
+        WHERE shop_name = COALESCE(old.shop_name, '');
+        DELETE FROM shop_rankings WHERE shop_name = COALESCE(old.shop_name, '') AND dishes <= 0;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shop_rankings_au AFTER UPDATE OF recommendation_count, shop_name ON dishes BEGIN
+        UPDATE shop_rankings SET total = total - COALESCE(old.recommendation_count, 0), dishes = dishes - 1
+        WHERE shop_name = COALESCE(old.shop_name, '');
+        DELETE FROM shop_rankings WHERE shop_name = COALESCE(old.shop_name, '') AND dishes <= 0;
+        INSERT INTO shop_rankings (shop_name, total, dishes)
+        VALUES (COALESCE(new.shop_name, ''), COALESCE(new.recommendation_count, 0), 1)
+        ON CONFLICT(shop_name) DO UPDATE SET total = total + excluded.total, dishes = dishes + 1;
+    END""",
+    # /api/rankings 主题榜：菜品 → 所属主题（菜名包含该主题任一关键词），由触发器随菜名、推荐人数的变化维护，
+    # 按 (主题, 推荐人数) 索引读取各主题前K条；关键词由 migrate 从 tokens.THEME_KEYWORDS 同步到 theme_keywords
+    """CREATE TABLE IF NOT EXISTS theme_keywords (
+        theme TEXT NOT NULL,
+        keyword TEXT NOT NULL,
+        PRIMARY KEY (theme, keyword)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS theme_dishes (
+        theme TEXT NOT NULL,
+        dish_rowid INTEGER NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (theme, dish_rowid)
+    ) WITHOUT ROWID""",
+    'CREATE INDEX IF NOT EXISTS idx_theme_dishes_rank ON theme_dishes(theme, count DESC, dish_rowid)',
+    'CREATE INDEX IF NOT EXISTS idx_theme_dishes_dish ON theme_dishes(dish_rowid)',
+    """CREATE TRIGGER IF NOT EXISTS theme_dishes_ai AFTER INSERT ON dishes BEGIN
+        INSERT OR IGNORE INTO theme_dishes (theme, dish_rowid, count)
+        SELECT theme, new.rowid, COALESCE(new.recommendation_count, 0) FROM theme_keywords
+        WHERE instr(COALESCE(new.name, ''), keyword) > 0;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS theme_dishes_ad AFTER DELETE ON dishes BEGIN
+        DELETE FROM theme_dishes WHERE dish_rowid = old.rowid;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS theme_dishes_au_name AFTER UPDATE OF name ON dishes
+    WHEN old.name IS NOT new.name BEGIN
+        DELETE FROM theme_dishes WHERE dish_rowid = old.rowid;
+        INSERT OR IGNORE INTO theme_dishes (theme, dish_rowid, count)
+        SELECT theme, new.rowid, COALESCE(new.recommendation_count, 0) FROM theme_keywords
+        WHERE instr(COALESCE(new.name, ''), keyword) > 0;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS theme_dishes_au_count AFTER UPDATE OF recommendation_count ON dishes
+    WHEN old.name IS new.name BEGIN
+        UPDATE theme_dishes SET count = COALESCE(new.recommendation_count, 0) WHERE dish_rowid = new.rowid;
+    END""",
+    # 附近店铺：R*Tree空间索引，id 为 shops.rowid，只收录有坐标的店铺
+    'CREATE VIRTUAL TABLE IF NOT EXISTS shops_geo USING rtree(id, min_lat, max_lat, min_lon, max_lon)',
+    """CREATE TRIGGER IF NOT EXISTS shops_geo_ai AFTER INSERT ON shops
+    WHEN new.lat IS NOT NULL AND new.lon IS NOT NULL BEGIN
+        INSERT INTO shops_geo VALUES (new.rowid, new.lat, new.lat, new.lon, new.lon);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shops_geo_ad AFTER DELETE ON shops BEGIN
+        DELETE FROM shops_geo WHERE id = old.rowid;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shops_geo_au AFTER UPDATE OF lat, lon ON shops BEGIN
+        DELETE FROM shops_geo WHERE id = old.rowid;
+        INSERT INTO shops_geo SELECT new.rowid, new.lat, new.lat, new.lon, new.lon
+        WHERE new.lat IS NOT NULL AND new.lon IS NOT NULL;
+    END""",
+)
+
+# 新建的派生表需要从基础表完整生成一次，之后由触发器维护
+POPULATE_STATEMENTS = {
+    'dishes_fts': "INSERT INTO dishes_fts(dishes_fts) VALUES ('rebuild')",
+    'shops_fts': "INSERT INTO shops_fts(shops_fts) VALUES ('rebuild')",
+    'shop_rankings': (
+        "INSERT INTO shop_rankings (shop_name, total, dishes) "
+        "SELECT COALESCE(shop_name, ''), SUM(COALESCE(recommendation_count, 0)), COUNT(*) "
+        "FROM dishes GROUP BY COALESCE(shop_name, '')"
+    ),
+    'shops_geo': (
+        "INSERT INTO shops_geo SELECT rowid, lat, lat, lon, lon FROM shops "
+        "WHERE lat IS NOT NULL AND lon IS NOT NULL"
+    ),
+    'theme_dishes': (
+        "INSERT OR IGNORE INTO theme_dishes (theme, dish_rowid, count) "
+        "SELECT k.theme, d.rowid, COALESCE(d.recommendation_count, 0) FROM dishes d "
+        "JOIN theme_keywords k ON instr(COALESCE(d.name, ''), k.keyword) > 0"
+    ),
+}
+
+# 升级到某一结构版本时对已有数据执行一次的回填：{版本: 语句}
+UPGRADE_STATEMENTS = {
+    2: (
+        # 关联改为店名精确匹配（可走唯一索引），去掉旧数据中店名首尾的空白；去掉后与已有行重复的保持原样
+        "UPDATE OR IGNORE shops SET name = TRIM(name) WHERE name != TRIM(name)",
+        "UPDATE OR IGNORE dishes SET shop_name = TRIM(shop_name) WHERE shop_name != TRIM(shop_name)",
+        'UPDATE shops SET price_value = parse_price(avg_price)',
+        'UPDATE dishes SET shop_score = COALESCE((SELECT MAX(score) FROM shops WHERE name = dishes.shop_name), 0)',
+    ),
+}
+
+READ_PRAGMAS = (
+    'PRAGMA query_only = ON',
+    'PRAGMA mmap_size = 268435456',   # 256MB
+    'PRAGMA cache_size = -16384',     # 16MB
+    'PRAGMA temp_store = MEMORY',
+)
+
+
+class SchemaOutdatedError(RuntimeError):
+    """data.db 的结构版本低于 SCHEMA_VERSION，需要先执行迁移"""
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def add_columns(conn):
+    """补上旧数据库缺少的列，旧版本的生成列换成普通列（需在事务中调用，数值由 migrate 回填）"""
+    for table, column, definition in ADDED_COLUMNS:
+        columns = {row[1]: row[6] for row in conn.execute(f'PRAGMA table_xinfo({table})')}
+        if columns.get(column) in GENERATED_COLUMN:
+            # 建在该列上的索引要先删掉才能删列，migrate 会重新建立
+            indexes = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql LIKE ?",
+                (table, f'%{column}%'),
+            ).fetchall()
+            for (index,) in indexes:
+                conn.execute(f'DROP INDEX {index}')
+            conn.execute(f'ALTER TABLE {table} DROP COLUMN {column}')
+            del columns[column]
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def sync_theme_keywords(conn):
+    """
+    把 tokens.THEME_KEYWORDS 写入 theme_keywords（需在事务中调用）
+
+    返回: 关键词是否有变化（有变化时 theme_dishes 需要重新生成）
+    """
+    expected = {(theme, keyword) for theme, keywords in THEME_KEYWORDS.items() for keyword in keywords}
+    current = set(conn.execute('SELECT theme, keyword FROM theme_keywords'))
+    if current == expected:
+        return False
+    conn.execute('DELETE FROM theme_keywords')
+    conn.executemany('INSERT INTO theme_keywords (theme, keyword) VALUES (?, ?)', sorted(expected))
+    return True
+
+
+def migrate(conn):
+    """
+    补齐API查询依赖的列、索引、全文检索表、榜单表、空间索引和触发器（可重复执行）
+
+    返回: 本次新建并生成数据的派生表列表
+    """
+    # 建表和生成数据放在同一个事务里，中途失败不会留下空的派生表
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+    try:
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        version = schema_version(conn)
+        add_columns(conn)
+        for statement in SCHEMA_STATEMENTS:
+            conn.execute(statement)
+        created = [table for table in POPULATE_STATEMENTS if table not in existing]
+        if sync_theme_keywords(conn) and 'theme_dishes' not in created:
+            # 主题关键词改动过：按新关键词重新归类
+            conn.execute('DELETE FROM theme_dishes')
+            created.append('theme_dishes')
+        for table in created:
+            conn.execute(POPULATE_STATEMENTS[table])
+            logger.info(f"🔎 已生成派生表: {table}")
+        conn.create_function('parse_price', 1, parse_price, deterministic=True)
+        for target, statements in sorted(UPGRADE_STATEMENTS.items()):
+            if version < target:
+                for statement in statements:
+                    conn.execute(statement)
+                logger.info(f"🔧 已升级数据库结构到版本 {target}")
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return created
+
+
+class ConnectionPool:
+    """
+    线程安全的SQLite只读连接池
+
+    - 最多 size 个连接，空闲连接放在队列中复用
+    - 每个连接开启语句缓存（cached_statements），相同SQL不再重复编译
+    - 通过文件的 (设备号, inode) 判断 data.db 是否被替换，替换后旧连接在归还时关闭
+    - 只以 mode=ro 打开，不修改数据库；结构版本低于 SCHEMA_VERSION 时抛出 SchemaOutdatedError
+    """
+
+    def __init__(self, db_path=DB_PATH, size=8, check_interval=1.0):
+        self.db_path = db_path
+        self.size = size
+        self.check_interval = check_interval
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._generation = 0
+        self._file_id = None
+        self._checked_at = 0.0
+        self._outdated = None
+        self._lock = threading.Lock()
+
+    def _stat_file(self):
+        try:
+            st = os.stat(self.db_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f'数据库文件不存在: {self.db_path}')
+        return (st.st_dev, st.st_ino)
+
+    def _check_replaced(self):
+        """
+        定期检查数据库文件是否被替换，被替换时切换到新一代连接
+
+        结构版本过旧时抛出 SchemaOutdatedError（原地执行迁移后，下一次检查即恢复）
+        """
+        now = time.monotonic()
+        if self._file_id is None or now - self._checked_at >= self.check_interval:
+            with self._lock:
+                file_id = self._stat_file()
+                self._checked_at = now
+                if file_id != self._file_id:
+                    if self._file_id is not None:
+                        logger.info("🔄 检测到数据库文件已替换，重新打开连接")
+                    self._file_id = file_id
+                    self._generation += 1
+                    self._outdated = self._read_schema_version()
+                elif self._outdated is not None:
+                    self._outdated = self._read_schema_version()
+        outdated = self._outdated
+        if outdated is not None:
+            raise SchemaOutdatedError(
+                f'数据库结构版本过旧（{outdated} < {SCHEMA_VERSION}），请先运行 python db.py migrate 或重新执行 ingest.py'
+            )
+
+    def version(self):
+        """
+        数据库内容版本，用于HTTP缓存校验
+
+        PRAGMA data_version 只在同一连接内可比，这里改用主文件和WAL文件的
+        (inode, 修改时间, 大小)：任一写入都会改变其中之一
+
+        返回: (版本字符串, 最后修改时间戳)
+        """
+        self._check_replaced()
+        parts = []
+        modified = 0.0
+        for path in (self.db_path, self.db_path + '-wal'):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            # 空的WAL文件（读连接打开时创建、checkpoint后截断）不含数据，不影响版本
+            if path != self.db_path and st.st_size == 0:
+                continue
+            parts.append(f'{st.st_ino}-{st.st_mtime_ns}-{st.st_size}')
+            modified = max(modified, st.st_mtime)
+        return ':'.join(parts), modified
+
+    def _read_schema_version(self):
+        """
+        读取结构版本
+
+        返回: 过旧时为当前版本号，满足要求时为None
+        """
+        conn = self._connect()
+        try:
+            version = schema_version(conn)
+        finally:
+            conn.close()
+        if version < SCHEMA_VERSION:
+            logger.warning(f"⚠️ 数据库结构版本过旧: {version} < {SCHEMA_VERSION}，请先运行 python db.py migrate")
+            return version
+        return None
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            f'file:{pathname2url(self.db_path)}?mode=ro',
+            uri=True,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        conn.row_factory = sqlite3.Row  # 使用Row工厂，可以通过列名访问
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        while True:
+            try:
+                generation, conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self._generation:
+                return generation, conn
+            self._discard(conn)
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._generation, self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        generation, conn = self._idle.get()
+        if generation != self._generation:
+            self._discard(conn)
+            return self._acquire()
+        return generation, conn
+
+    def _discard(self, conn):
+        conn.close()
+        with self._lock:
+            self._created -= 1
+
+    @contextmanager
+    def connection(self):
+        """借出一个只读连接，with块结束后归还"""
+        self._check_replaced()
+        generation, conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if generation == self._generation:
+                self._idle.put((generation, conn))
+            else:
+                self._discard(conn)
+
+    def close(self):
+        """关闭所有空闲连接"""
+        while True:
+            try:
+                _, conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+def migrate_file(db_path=DB_PATH):
+    """对数据库文件执行迁移：开启WAL（写在数据库文件里）并补齐结构"""
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    try:
+        conn.execute('PRAGMA journal_mode = WAL')
+        created = migrate(conn)
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+    return created
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='data.db 维护')
+    parser.add_argument('command', choices=['migrate'], help='migrate: 补齐API查询需要的索引、全文检索表和触发器')
+    parser.add_argument('--db', default=DB_PATH, help=f'数据库文件（默认 {DB_PATH}）')
+    parser.add_argument('--if-exists', action='store_true', help='数据库文件不存在时跳过，不报错（供启动脚本使用）')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if not os.path.exists(args.db):
+        if args.if_exists:
+            print(f"⏭️ 数据库文件不存在，跳过迁移: {args.db}")
+            return 0
+        print(f"❌ 文件不存在: {args.db}")
+        return 1
+    created = migrate_file(args.db)
+    print(f"✅ 迁移完成: {args.db}，结构版本 {SCHEMA_VERSION}"
+          + (f"，新建 {', '.join(created)}" if created else ''))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+页面内容提取
+把上游HTML解析成紧凑的JSON结构，前端无需再下载和解析整页HTML
+"""
+
+import logging
+import re
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+
+logger = logging.getLogger(__name__)
+
+DOUGUO_BASE_URL = 'https://www.douguo.com/'
+
+# 百度标题中 <!--s-text-->标题<!--/s-text--> 注释标记
+S_TEXT_PATTERN = re.compile(r'<!--s-text-->(.*?)<!--/s-text-->', re.DOTALL)
+
+
+def _strip_tags(html):
+    return BeautifulSoup(html, 'html.parser').get_text().strip()
+
+
+def extract_notes(html):
+    """
+    从百度笔记搜索结果页提取笔记列表（与前端原 parseNotesFromHtml 逻辑一致）
+
+    返回: [{title, image, url, source, description}]，已按标题去重
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    items = soup.select('.c-result[data-srcid="1599"]')
+
+    notes = []
+    seen_titles = set()
+    for item in items:
+        try:
+            # 标题：优先从 s-text 注释标记中提取
+            title = ''
+            title_el = item.select_one('h3.cosc-title, h3 .cosc-title-slot, h3')
+            if title_el:
+                match = S_TEXT_PATTERN.search(title_el.decode_contents())
+                title = _strip_tags(match.group(1)) if match else title_el.get_text().strip()
+
+            if not title or title in seen_titles:
+                continue
+            seen_titles.add(title)
+
+            # 图片
+            image = ''
+            img_el = item.select_one('img.cos-image-body, img[alt]')
+            if img_el:
+                image = img_el.get('src') or img_el.get('data-src') or ''
+
+            # 链接：rl-link-href > a[href] > 容器自身的 rl-link-href
+            url = ''
+            link_el = item.select_one('[rl-link-href]')
+            if link_el:
+                url = link_el.get('rl-link-href', '')
+            else:
+                a_el = item.select_one('a[href]')
+                if a_el:
+                    url = a_el.get('href', '')
+            if not url:
+                url = item.get('rl-link-href', '')
+
+            # 来源和时间
+            source_el = item.select_one('.source-name_5yg27, .cu-color-source')
+            source = source_el.get_text().strip() if source_el else '百度'
+            time_el = item.select_one('.source-time_7nWwX, .cu-color-info')
+            time_text = time_el.get_text().strip() if time_el else ''
+
+            notes.append({
+                'title': title,
+                'image': image,
+                'url': url,
+                'source': source,
+                'description': f'{source} · {time_text}' if time_text else source,
+            })
+        except Exception as e:
+            logger.warning(f"解析笔记项失败: {e}")
+
+    logger.info(f"📊 笔记解析完成: 找到 {len(items)} 个容器, 去重后得到 {len(notes)} 个唯一笔记")
+    return notes
+
+
+def _img_src(img_el):
+    if img_el is None:
+        return ''
+    return img_el.get('src') or img_el.get('data-src') or img_el.get('data-original') or ''
+
+
+def _text(el):
+    return el.get_text().strip() if el else ''
+
+
+def extract_recipes(html):
+    """
+    从豆果美食列表页（搜索、首页精选、分类页）提取菜谱列表（与前端原 parseRecipesFromHtml 逻辑一致）
+
+    返回: [{title, image, url, author}]，已按标题去重
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    items = soup.select('a[href*="/cookbook/"]')
+    if not items:
+        items = soup.select('.cook-list li, .recipe-item, .item, .list-item')
+
+    recipes = []
+    seen_titles = set()
+    for item in items:
+        try:
+            title = ''
+            if item.name == 'a' and '/cookbook/' in item.get('href', ''):
+                url = item.get('href', '')
+                img_el = item.find('img')
+                image = _img_src(img_el)
+                if img_el is not None and img_el.get('alt'):
+                    title = img_el['alt']
+                if not title:
+                    title = _text(item.select_one('.title, .name, .cp-title, h3, strong, p'))
+            else:
+                link_el = item.select_one('a[href*="/cookbook/"]')
+                url = link_el.get('href', '') if link_el else ''
+                title = _text(item.select_one('.title, .name, .cp-title, h3, strong, a'))
+                img_el = item.find('img')
+                image = _img_src(img_el)
+                if not title and img_el is not None:
+                    title = img_el.get('alt', '')
+
+            author = _text(item.select_one('.author, .username, .by'))
+            title = ' '.join(title.split())
+
+            if not title or len(title) >= 100 or not url or title in seen_titles:
+                continue
+            seen_titles.add(title)
+
+            recipes.append({
+                'title': title,
+                'image': urljoin(DOUGUO_BASE_URL, image) if image else '',
+                'url': urljoin(DOUGUO_BASE_URL, url),
+                'author': author or '豆果美食',
+            })
+        except Exception as e:
+            logger.warning(f"解析菜谱项失败: {e}")
+
+    logger.info(f"📊 菜谱解析完成: 找到 {len(items)} 个容器, 去重后得到 {len(recipes)} 个唯一菜谱")
+    return recipes
+
+
+def _step_text(step_info):
+    """步骤文本：stepinfo下除 <p>（"步骤X"标题）以外的全部文本"""
+    parts = []
+    for node in step_info.children:
+        if isinstance(node, Comment):
+            continue
+        if isinstance(node, NavigableString):
+            text = str(node).strip()
+        elif isinstance(node, Tag) and node.name != 'p':
+            text = node.get_text().strip()
+        else:
+            continue
+        if text:
+            parts.append(text)
+    return ' '.join(parts)
+
+
+def extract_recipe_detail(html):
+    """
+    从豆果美食菜谱详情页提取结构化数据（与前端原 parseRecipeDetail 逻辑一致）
+
+    返回: {title, image, author, description, ingredients, steps, tips, images}
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    detail = {
+        'title': _text(soup.select_one('h1.title')),
+        'image': _img_src(soup.select_one('#banner img, #banner .wb100')),
+        'author': _text(soup.select_one('.nickname, .author-info .nickname')),
+        'description': _text(soup.select_one('p.intro')),
+        'ingredients': [],
+        'steps': [],
+        'tips': '',
+        'images': [],
+    }
+
+    # 食材：table.retamr 结构，旧版页面使用 .ings li
+    table = soup.select_one('table.retamr')
+    if table is not None:
+        for td in table.find_all('td'):
+            name = _text(td.select_one('.scname'))
+            if name:
+                detail['ingredients'].append({'name': name, 'amount': _text(td.select_one('.scnum'))})
+    else:
+        for li in soup.select('.ings li'):
+            spans = [s.get_text().strip() for s in li.find_all('span')]
+            name = spans[0] if spans else _text(li)
+            if name:
+                detail['ingredients'].append({'name': name, 'amount': spans[1] if len(spans) > 1 else ''})
+
+    # 步骤：.stepcont 结构，旧版页面使用 .steps li / .cookstep
+    containers = soup.select('.stepcont')
+    if containers:
+        for index, container in enumerate(containers):
+            step_info = container.select_one('.stepinfo')
+            if step_info is None:
+                continue
+            text = _step_text(step_info)
+            if len(text) > 3:
+                detail['steps'].append({'step': index + 1, 'text': text, 'image': _img_src(container.find('img'))})
+    else:
+        for index, container in enumerate(soup.select('.steps li, .cookstep')):
+            text = ' '.join(container.get_text(' ').split())
+            if len(text) > 3:
+                detail['steps'].append({'step': index + 1, 'text': text, 'image': _img_src(container.find('img'))})
+
+    # 小贴士
+    tips_el = soup.select_one('.tips')
+    if tips_el is not None:
+        detail['tips'] = _text(tips_el.find('p'))
+
+    # 全部图片：封面 + 步骤图，去重保序
+    images = [detail['image']] + [step['image'] for step in detail['steps']]
+    detail['images'] = list(dict.fromkeys(img for img in images if img))
+
+    logger.info(f"✅ 菜谱详情解析完成: title={detail['title']}, 食材={len(detail['ingredients'])}, 步骤={len(detail['steps'])}")
+    return detail
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步上游抓取引擎
+- 后台线程运行一个asyncio事件循环，所有上游请求共享一个aiohttp连接池
+- 按站点限制并发数，请求节奏由HostPacer预约、异步等待，不占用工作线程
+- 同步接口 fetch() 供Flask路由调用，异步接口 fetch_async() 供协程直接await
+- open_stream() 只等到响应头，正文按需逐块读取原始字节（不解压），用于把上游页面直接转发给客户端
+- 可选的熔断器：熔断中的站点不发请求，超时、连接失败、5xx计入失败
+- 请求合并（single-flight）：同一URL、相同身份请求头同时进行中的请求只发一次，并发的相同请求共享结果
+- 同步接口可传入 is_disconnected：等待期间客户端断开时取消进行中的协程
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+
+import aiohttp
+import chardet
+import requests
+from requests.cookies import get_cookie_header
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from upstream import ERROR, TIMEOUT, normalize_url, site_of
+
+logger = logging.getLogger(__name__)
+
+# 各站点同时进行中的最大请求数
+HOST_CONCURRENCY = {
+    'baidu.com': 8,
+    'douguo.com': 16,
+    'dianping.com': 8,
+    'ctrip.com': 8,
+}
+DEFAULT_CONCURRENCY = 16
+
+# 请求合并时区分请求的请求头：身份不同（cookie、来源、浏览器特征）的请求可能得到不同的页面，不能共享结果
+FLIGHT_KEY_HEADERS = ('Cookie', 'Referer', 'User-Agent', 'Accept-Encoding')
+
+# 流式读取时每次读取的最大字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 同步等待结果时检查客户端是否已断开的间隔（秒）
+DISCONNECT_POLL_INTERVAL = 0.5
+
+
+class ClientDisconnected(Exception):
+    """等待上游结果时客户端已断开，进行中的请求已取消（不是上游的错误，不计入熔断和负缓存）"""
+
+
+def wait_future(future, timeout, is_disconnected=None):
+    """
+    等待 concurrent.futures.Future 的结果，超时抛出 concurrent.futures.TimeoutError
+
+    传入 is_disconnected 时每隔 DISCONNECT_POLL_INTERVAL 秒检查一次，返回True时取消future并抛出 ClientDisconnected
+    """
+    if is_disconnected is None:
+        return future.result(timeout)
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise concurrent.futures.TimeoutError()
+        try:
+            return future.result(min(DISCONNECT_POLL_INTERVAL, remaining))
+        except concurrent.futures.TimeoutError:
+            if future.done():
+                raise   # 协程自身抛出的超时
+        if is_disconnected():
+            future.cancel()
+            raise ClientDisconnected('客户端已断开，取消上游请求')
+
+
+class FetchResult:
+    """
+    上游响应结果，接口与 requests.Response 常用部分一致
+    (status_code / headers / url / content / encoding / text / raise_for_status)
+    """
+
+    def __init__(self, status_code, headers, url, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.url = url
+        self.content = content
+        self.encoding = self._detect_encoding()
+        self._text = None
+
+    def _detect_encoding(self):
+        content_type = self.headers.get('Content-Type', '')
+        if 'charset' in content_type.lower():
+            return get_encoding_from_headers(self.headers)
+        return chardet.detect(self.content[:65536]).get('encoding') or 'utf-8'
+
+    @property
+    def text(self):
+        if self._text is None:
+            try:
+                self._text = self.content.decode(self.encoding, errors='replace')
+            except LookupError:
+                self._text = self.content.decode('utf-8', errors='replace')
+        return self._text
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f'{self.status_code} Error for url: {self.url}', response=self)
+
+
+class UpstreamStream:
+    """
+    流式上游响应：响应头已收到，正文由调用线程按需逐块读取（原始字节，保持上游的压缩格式）
+
+    - 迭代时逐块返回数据，读完或迭代中止时自动关闭
+    - 未读完就不再需要时必须调用 close()，释放连接和站点并发名额
+    """
+
+    def __init__(self, engine, loop, resp, semaphore, timeout):
+        self._engine = engine
+        self._loop = loop
+        self._resp = resp
+        self._semaphore = semaphore
+        self._timeout = timeout
+        self._eof = False
+        self.closed = False
+        self.is_disconnected = None
+        self.status_code = resp.status
+        self.headers = CaseInsensitiveDict(resp.headers)
+        self.url = str(resp.url)
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    async def _read_async(self):
+        try:
+            return await self._resp.content.read(STREAM_CHUNK_SIZE)
+        except asyncio.TimeoutError as e:
+            raise requests.Timeout(f'读取超时: {self.url}') from e
+        except aiohttp.ClientError as e:
+            raise requests.ConnectionError(f'{type(e).__name__}: {e}') from e
+
+    def read_chunk(self):
+        """读取下一块原始字节，读完时返回 b''"""
+        if self._eof or self.closed:
+            return b''
+        future = asyncio.run_coroutine_threadsafe(self._read_async(), self._loop)
+        try:
+            chunk = wait_future(future, self._timeout + 5, self.is_disconnected)
+        except concurrent.futures.TimeoutError as e:
+            future.cancel()
+            self.close()
+            raise requests.Timeout(f'读取超时: {self.url}') from e
+        except BaseException:
+            future.cancel()
+            self.close()
+            raise
+        if not chunk:
+            self._eof = True
+        return chunk
+
+    def __iter__(self):
+        try:
+            while True:
+                chunk = self.read_chunk()
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        """关闭响应：读完的连接放回连接池，没读完的直接断开"""
+        if self.closed:
+            return
+        self.closed = True
+        resp, semaphore, eof = self._resp, self._semaphore, self._eof
+
+        def release():
+            if eof:
+                resp.release()
+            else:
+                resp.close()
+            semaphore.release()
+
+        try:
+            self._loop.call_soon_threadsafe(release)
+        except RuntimeError:
+            pass    # 事件循环已停止（进程退出中）
+
+
+class _Flight:
+    """进行中的上游请求及等待它的调用数"""
+
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class FetchEngine:
+    """
+    asyncio上游抓取引擎
+
+    - 一个事件循环 + 一个aiohttp.ClientSession，连接在所有请求间复用
+    - cookie仍由SessionPool统一管理（预热、持久化），请求前注入、响应后回写
+    - aiohttp异常转换为对应的requests异常，路由中的错误处理保持不变
+    - 调用方放弃等待（超时或异常）时取消进行中的请求
+    - 传入 breaker（CircuitBreaker）时，熔断中的站点直接抛出 UpstreamUnavailable
+    - 同一规范化URL、相同身份请求头（FLIGHT_KEY_HEADERS）的并发请求共享一次上游请求，所有等待方都放弃时才取消它
+    """
+
+    def __init__(self, session_pool=None, pacer=None, concurrency=None, max_connections=256, breaker=None):
+        self.session_pool = session_pool
+        self.pacer = pacer
+        self.breaker = breaker
+        self.concurrency = dict(HOST_CONCURRENCY if concurrency is None else concurrency)
+        self.max_connections = max_connections
+        self._loop = None
+        self._thread = None
+        self._connector = None
+        self._sessions = {}
+        self._semaphores = {}
+        self._flights = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # ---------- 事件循环管理 ----------
+
+    def _ensure_started(self):
+        """按需启动事件循环线程（fork后的子进程会重新启动自己的循环）"""
+        if self._loop is not None and self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name='fetch-engine', daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._connector = None
+            self._sessions = {}
+            self._semaphores = {}
+            self._flights = {}
+            self._loop = loop
+            self._pid = os.getpid()
+            logger.info("🚀 异步抓取引擎已启动")
+            return loop
+
+    def stop(self):
+        """关闭连接池并停止事件循环"""
+        loop = self._loop
+        if loop is None or self._pid != os.getpid():
+            return
+
+        async def close():
+            for session in self._sessions.values():
+                await session.close()
+            if self._connector is not None:
+                await self._connector.close()
+
+        try:
+            asyncio.run_coroutine_threadsafe(close(), loop).result(5)
+        except Exception as e:
+            logger.warning(f"关闭抓取引擎连接池失败: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop = None
+
+    def _get_session(self, raw=False):
+        """raw=True 时返回不自动解压的Session（流式转发用），两个Session共用一个连接池"""
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300)
+            self._sessions = {}
+        session = self._sessions.get(raw)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=self._connector,
+                connector_owner=False,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                auto_decompress=not raw,
+            )
+            self._sessions[raw] = session
+        return session
+
+    def _semaphore(self, site):
+        semaphore = self._semaphores.get(site)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency.get(site, DEFAULT_CONCURRENCY))
+            self._semaphores[site] = semaphore
+        return semaphore
+
+    # ---------- cookie ----------
+
+    def _request_headers(self, url, headers):
+        request_headers = dict(headers or {})
+        cookie = self._cookie_header(url)
+        if cookie:
+            request_headers['Cookie'] = cookie
+        return request_headers
+
+    def _cookie_header(self, url):
+        if self.session_pool is None:
+            return None
+        jar = self.session_pool.get(url).cookies
+        return get_cookie_header(jar, requests.Request('GET', url))
+
+    def _store_cookies(self, url, responses):
+        if self.session_pool is None:
+            return
+        jar = self.session_pool.get(url).cookies
+        for resp in responses:
+            host = resp.url.host or ''
+            for name, morsel in resp.cookies.items():
+                jar.set(name, morsel.value, domain=morsel['domain'] or host, path=morsel['path'] or '/')
+
+    # ---------- 熔断 ----------
+
+    def _before_request(self, url):
+        if self.breaker is not None:
+            self.breaker.before_request(url)
+
+    def _record_status(self, url, status):
+        if self.breaker is None:
+            return
+        if status >= 500 or status == 429:
+            self.breaker.record_failure(url, ERROR)
+        else:
+            self.breaker.record_success(url)
+
+    def _record_failure(self, url, reason):
+        if self.breaker is not None:
+            self.breaker.record_failure(url, reason)
+
+    # ---------- 请求 ----------
+
+    @staticmethod
+    def flight_key(url, headers=None):
+        """请求合并的键：规范化URL + 区分身份的请求头"""
+        headers = CaseInsensitiveDict(headers or {})
+        return (normalize_url(url),) + tuple(headers.get(name) for name in FLIGHT_KEY_HEADERS)
+
+    async def fetch_async(self, url, headers=None, timeout=15, coalesce=True):
+        """
+        异步请求上游页面（必须在引擎的事件循环中调用）
+
+        同一请求（见 flight_key）已有进行中的请求时不再发起新请求，等待它的结果（最多等待timeout秒）；
+        coalesce=False 时总是单独请求（如遇到验证页后的重试，不能拿回同一份验证页）
+
+        返回: FetchResult
+        """
+        if not coalesce:
+            return await self._fetch_once(url, headers, timeout)
+        key = self.flight_key(url, headers)
+        flight = self._flights.get(key)
+        joined = flight is not None
+        if joined:
+            logger.info(f"🔗 合并相同的上游请求: {url}")
+        else:
+            flight = _Flight(asyncio.ensure_future(self._fetch_once(url, headers, timeout)))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._end_flight(key, flight))
+
+        flight.waiters += 1
+        try:
+            if not joined:
+                return await asyncio.shield(flight.task)
+            try:
+                return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+            except asyncio.TimeoutError as e:
+                raise requests.Timeout(f'请求超时: {url}') from e
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # 所有等待方都已放弃（超时或取消），取消请求，释放连接和并发名额
+                flight.task.cancel()
+
+    def _end_flight(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            flight.task.exception()     # 没有等待方时也取走异常，避免 "exception was never retrieved"
+
+    async def _fetch_once(self, url, headers, timeout):
+        site = site_of(url)
+        self._before_request(url)
+        request_headers = self._request_headers(url, headers)
+
+        try:
+            async with self._semaphore(site):
+                if self.pacer is not None:
+                    delay = self.pacer.reserve(url)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                async with self._get_session().get(
+                    url,
+                    headers=request_headers,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                    allow_redirects=True,
+                ) as resp:
+                    content = await resp.read()
+                    self._store_cookies(url, list(resp.history) + [resp])
+                    self._record_status(url, resp.status)
+                    return FetchResult(resp.status, CaseInsensitiveDict(resp.headers),
+                                       str(resp.url), content)
+        except asyncio.TimeoutError as e:
+            self._record_failure(url, TIMEOUT)
+            raise requests.Timeout(f'请求超时: {url}') from e
+        except aiohttp.ClientError as e:
+            self._record_failure(url, ERROR)
+            raise requests.ConnectionError(f'{type(e).__name__}: {e}') from e
+
+    async def open_stream_async(self, url, headers=None, timeout=15):
+        """
+        异步发起流式请求，收到响应头即返回（必须在引擎的事件循环中调用）
+
+        站点并发名额一直占用到 UpstreamStream 关闭；timeout 是连接和每次读取的超时，不限制总时长
+        """
+        site = site_of(url)
+        self._before_request(url)
+        request_headers = self._request_headers(url, headers)
+        semaphore = self._semaphore(site)
+        await semaphore.acquire()
+        try:
+            if self.pacer is not None:
+                delay = self.pacer.reserve(url)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            resp = await self._get_session(raw=True).get(
+                url,
+                headers=request_headers,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout),
+                allow_redirects=True,
+            )
+        except asyncio.TimeoutError as e:
+            semaphore.release()
+            self._record_failure(url, TIMEOUT)
+            raise requests.Timeout(f'请求超时: {url}') from e
+        except aiohttp.ClientError as e:
+            semaphore.release()
+            self._record_failure(url, ERROR)
+            raise requests.ConnectionError(f'{type(e).__name__}: {e}') from e
+        except BaseException:
+            semaphore.release()
+            raise
+        self._store_cookies(url, list(resp.history) + [resp])
+        self._record_status(url, resp.status)
+        return UpstreamStream(self, asyncio.get_running_loop(), resp, semaphore, timeout)
+
+    def submit(self, coro):
+        """把协程提交到引擎的事件循环，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+
+    def fetch(self, url, headers=None, timeout=15, coalesce=True, is_disconnected=None):
+        """
+        同步请求上游页面（供Flask路由调用）
+
+        调用线程只等待结果，实际I/O在事件循环中完成；
+        等待被中断（或 is_disconnected() 返回True，抛出 ClientDisconnected）时取消对应的协程，释放连接和并发名额
+        """
+        future = self.submit(self.fetch_async(url, headers=headers, timeout=timeout, coalesce=coalesce))
+        try:
+            # 额外留出排队时间，真正的超时由aiohttp控制
+            return wait_future(future, timeout + 30, is_disconnected)
+        except concurrent.futures.TimeoutError as e:
+            future.cancel()
+            raise requests.Timeout(f'请求超时: {url}') from e
+        except BaseException:
+            future.cancel()
+            raise
+
+    def open_stream(self, url, headers=None, timeout=15, is_disconnected=None):
+        """
+        同步发起流式请求（供Flask路由调用）
+
+        is_disconnected 同 fetch()，之后逐块读取时同样检查
+
+        返回: UpstreamStream，调用方负责读完或 close()
+        """
+        future = self.submit(self.open_stream_async(url, headers=headers, timeout=timeout))
+        try:
+            stream = wait_future(future, timeout + 30, is_disconnected)
+            stream.is_disconnected = is_disconnected
+            return stream
+        except concurrent.futures.TimeoutError as e:
+            self._discard_stream(future)
+            raise requests.Timeout(f'请求超时: {url}') from e
+        except BaseException:
+            self._discard_stream(future)
+            raise
+
+    @staticmethod
+    def _discard_stream(future):
+        """放弃等待流式请求：取消协程；恰好在放弃等待时建立了连接的，关闭它"""
+        if not future.cancel() and future.done() and not future.cancelled() and future.exception() is None:
+            future.result().close()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+店铺坐标与附近查询
+- 店铺坐标存于 shops.lat / shops.lon（GCJ-02，与高德一致），空间索引为R*Tree表 shops_geo
+- 半径查询：先用R*Tree按外接矩形筛选，再按球面距离精确过滤、排序
+- 最近K个：从小半径开始查询，不足K个时半径翻倍
+- 浏览器定位得到的是WGS-84坐标，查询前转换为GCJ-02，否则在国内会有数百米偏差
+"""
+
+import math
+import os
+
+# 高德Web服务key（逆地理编码、店铺坐标批量填充共用）
+AMAP_KEY = os.environ.get('AI_GOURMET_AMAP_KEY', 'a9e44f7c387c1b48ac79da8e40fc716f')
+
+EARTH_RADIUS = 6371008.8        # 米
+METERS_PER_DEGREE = 111320.0
+
+# 最近K个查询的起始半径和最大半径（米）
+KNN_START_RADIUS = 1000
+MAX_RADIUS = 50000
+
+SHOP_GEO_SELECT = (
+    'SELECT s.rowid AS _rowid, s.name, s.avg_price, s.address, s.phone, s.detail_url, s.score, s.lat, s.lon '
+    'FROM shops_geo g JOIN shops s ON s.rowid = g.id '
+    'WHERE g.max_lat >= ? AND g.min_lat <= ? AND g.max_lon >= ? AND g.min_lon <= ?'
+)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """两点间球面距离（米）"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat, lon, radius):
+    """以(lat, lon)为圆心、radius米为半径的外接矩形: (min_lat, max_lat, min_lon, max_lon)"""
+    dlat = radius / METERS_PER_DEGREE
+    dlon = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+# ---------- WGS-84 → GCJ-02 ----------
+
+_A = 6378245.0
+_EE = 0.00669342162296594323
+
+
+def _out_of_china(lat, lon):
+    return not (73.66 < lon < 135.05 and 3.86 < lat < 53.55)
+
+
+def _transform_lat(x, y):
+    ret = -100.0 + 2.0 * x + 3.0 * y + 0.2 * y * y + 0.1 * x * y + 0.2 * math.sqrt(abs(x))
+    ret += (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    ret += (20.0 * math.sin(y * math.pi) + 40.0 * math.sin(y / 3.0 * math.pi)) * 2.0 / 3.0
+    ret += (160.0 * math.sin(y / 12.0 * math.pi) + 320 * math.sin(y * math.pi / 30.0)) * 2.0 / 3.0
+    return ret
+
+
+def _transform_lon(x, y):
+    ret = 300.0 + x + 2.0 * y + 0.1 * x * x + 0.1 * x * y + 0.1 * math.sqrt(abs(x))
+    ret += (20.0 * math.sin(6.0 * x * math.pi) + 20.0 * math.sin(2.0 * x * math.pi)) * 2.0 / 3.0
+    ret += (20.0 * math.sin(x * math.pi) + 40.0 * math.sin(x / 3.0 * math.pi)) * 2.0 / 3.0
+    ret += (150.0 * math.sin(x / 12.0 * math.pi) + 300.0 * math.sin(x / 30.0 * math.pi)) * 2.0 / 3.0
+    return ret
+
+
+def wgs84_to_gcj02(lat, lon):
+    """GPS坐标 → 高德/国测局坐标；国外坐标原样返回"""
+    if _out_of_china(lat, lon):
+        return lat, lon
+    dlat = _transform_lat(lon - 105.0, lat - 35.0)
+    dlon = _transform_lon(lon - 105.0, lat - 35.0)
+    rad_lat = math.radians(lat)
+    magic = 1 - _EE * math.sin(rad_lat) ** 2
+    sqrt_magic = math.sqrt(magic)
+    dlat = (dlat * 180.0) / ((_A * (1 - _EE)) / (magic * sqrt_magic) * math.pi)
+    dlon = (dlon * 180.0) / (_A / sqrt_magic * math.cos(rad_lat) * math.pi)
+    return lat + dlat, lon + dlon
+
+
+# ---------- 附近查询 ----------
+
+def _within(conn, lat, lon, radius):
+    rows = conn.execute(SHOP_GEO_SELECT, bounding_box(lat, lon, radius)).fetchall()
+    result = []
+    for row in rows:
+        distance = haversine(lat, lon, row['lat'], row['lon'])
+        if distance <= radius:
+            result.append((distance, row))
+    result.sort(key=lambda item: (item[0], item[1]['_rowid']))
+    return result
+
+
+def nearby_shops(conn, lat, lon, radius=None, limit=20):
+    """
+    附近店铺（坐标为GCJ-02）
+
+    - 指定radius：半径内的店铺，按距离排序，最多limit个
+    - 未指定radius：最近的limit个店铺（最远查到 MAX_RADIUS）
+
+    返回: [(距离米, sqlite3.Row)]
+    """
+    if radius is not None:
+        return _within(conn, lat, lon, min(radius, MAX_RADIUS))[:limit]
+
+    radius = KNN_START_RADIUS
+    while True:
+        result = _within(conn, lat, lon, radius)
+        # 圆内已有K个时，它们就是最近的K个
+        if len(result) >= limit or radius >= MAX_RADIUS:
+            return result[:limit]
+        radius = min(radius * 2, MAX_RADIUS)
+
+
+def nearby_dishes(conn, shops, limit=100, chunk=500):
+    """
+    附近店铺的菜品：先按店铺距离、再按推荐人数排序，最多limit道
+
+    参数:
+    - shops: nearby_shops 的结果
+
+    返回: [(距离米, 菜品sqlite3.Row)]
+    """
+    rank = {}
+    for index, (distance, shop) in enumerate(shops):
+        rank.setdefault(shop['name'], (index, distance))
+
+    names = list(rank)
+    rows = []
+    for start in range(0, len(names), chunk):
+        part = names[start:start + chunk]
+        placeholders = ', '.join('?' * len(part))
+        rows += conn.execute(
+            'SELECT rowid AS _rowid, name, image_url, recommendation_count, shop_name FROM dishes '
+            f'WHERE shop_name IN ({placeholders})',
+            part
+        ).fetchall()
+
+    rows.sort(key=lambda row: (rank[row['shop_name']][0], -(row['recommendation_count'] or 0), row['_rowid']))
+    return [(rank[row['shop_name']][1], row) for row in rows[:limit]]
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+店铺坐标批量填充（离线任务）
+
+用法:
+    python geocode_shops.py                           # 用高德地理编码API填充所有没有坐标的店铺
+    python geocode_shops.py --city 上海 --qps 2
+    python geocode_shops.py --table coords.csv        # 用本地 地址,纬度,经度 对照表代替在线服务
+    python geocode_shops.py --amap-url http://127.0.0.1:9000/v3/geocode/geo   # 本地模拟服务
+
+- 只处理 lat/lon 为空、地址不为空的店铺，可以反复运行，中断后从未完成的部分继续
+- 高德批量接口一次最多10个地址，按 --qps 控制请求频率
+- 坐标为GCJ-02（高德坐标系），写入后由触发器同步到空间索引 shops_geo
+- 每批结果单独提交，服务运行中也可以执行
+"""
+
+import argparse
+import csv
+import logging
+import sqlite3
+import sys
+import time
+
+import requests
+
+from db import DB_PATH, migrate
+from geo import AMAP_KEY
+
+logger = logging.getLogger(__name__)
+
+AMAP_GEOCODE_URL = 'https://restapi.amap.com/v3/geocode/geo'
+AMAP_BATCH_SIZE = 10
+DEFAULT_QPS = 3
+
+PENDING_SELECT = (
+    "SELECT rowid, address FROM shops "
+    "WHERE (lat IS NULL OR lon IS NULL) AND TRIM(COALESCE(address, '')) != '' AND rowid > ? "
+    "ORDER BY rowid LIMIT ?"
+)
+
+
+class AmapGeocoder:
+    """高德地理编码（批量模式）"""
+
+    batch_size = AMAP_BATCH_SIZE
+
+    def __init__(self, key=AMAP_KEY, url=AMAP_GEOCODE_URL, city='', timeout=10):
+        self.key = key
+        self.url = url
+        self.city = city
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def geocode(self, addresses):
+        """地址列表 → [(lat, lon) 或 None]，顺序与输入一致"""
+        params = {
+            'key': self.key,
+            'address': '|'.join(a.replace('|', ' ') for a in addresses),
+            'batch': 'true',
+            'output': 'JSON',
+        }
+        if self.city:
+            params['city'] = self.city
+        response = self.session.get(self.url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if data.get('status') != '1':
+            raise RuntimeError(f"高德地理编码失败: {data.get('info')}")
+
+        geocodes = data.get('geocodes') or []
+        result = []
+        for i in range(len(addresses)):
+            location = geocodes[i].get('location') if i < len(geocodes) else None
+            result.append(parse_location(location))
+        return result
+
+
+class TableGeocoder:
+    """本地对照表（CSV：地址,纬度,经度），用于测试或离线环境"""
+
+    batch_size = 100
+
+    def __init__(self, path):
+        self.table = {}
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            for row in csv.reader(f):
+                if len(row) < 3:
+                    continue
+                try:
+                    self.table[row[0].strip()] = (float(row[1]), float(row[2]))
+                except ValueError:
+                    continue    # 表头或无效行
+
+    def geocode(self, addresses):
+        return [self.table.get(address.strip()) for address in addresses]
+
+
+def parse_location(location):
+    """高德的 '经度,纬度' → (lat, lon)；查不到时高德返回空列表或空字符串"""
+    if not isinstance(location, str) or ',' not in location:
+        return None
+    try:
+        lon, lat = (float(part) for part in location.split(',', 1))
+    except ValueError:
+        return None
+    return lat, lon
+
+
+def geocode_shops(geocoder, db_path=DB_PATH, qps=DEFAULT_QPS, limit=None):
+    """
+    填充没有坐标的店铺
+
+    返回: 统计信息字典
+    """
+    started = time.monotonic()
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    stats = {'requested': 0, 'located': 0, 'failed': 0}
+    interval = 1.0 / qps if qps > 0 else 0
+    last_request = 0.0
+    last_rowid = 0
+    try:
+        conn.execute('PRAGMA journal_mode = WAL')
+        migrate(conn)   # 确保 lat/lon 列和 shops_geo 已存在
+
+        while limit is None or stats['requested'] < limit:
+            size = geocoder.batch_size
+            if limit is not None:
+                size = min(size, limit - stats['requested'])
+            pending = conn.execute(PENDING_SELECT, (last_rowid, size)).fetchall()
+            if not pending:
+                break
+            last_rowid = pending[-1][0]
+
+            wait = last_request + interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            last_request = time.monotonic()
+            try:
+                points = geocoder.geocode([address for _, address in pending])
+            except (requests.RequestException, RuntimeError, ValueError) as e:
+                # 本批跳过，下次运行时重试；网络错误的信息里带有含key的URL，只记录类型
+                reason = type(e).__name__ if isinstance(e, requests.RequestException) else e
+                logger.warning(f"⚠️ 地理编码请求失败: {reason}")
+                stats['requested'] += len(pending)
+                stats['failed'] += len(pending)
+                continue
+
+            updates = [(point[0], point[1], rowid) for (rowid, _), point in zip(pending, points) if point]
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany('UPDATE shops SET lat = ?, lon = ? WHERE rowid = ?', updates)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            stats['requested'] += len(pending)
+            stats['located'] += len(updates)
+            stats['failed'] += len(pending) - len(updates)
+            logger.info(f"📍 已处理 {stats['requested']} 家店铺, 成功 {stats['located']}")
+    finally:
+        conn.close()
+
+    stats['seconds'] = round(time.monotonic() - started, 2)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='为没有坐标的店铺批量填充经纬度')
+    parser.add_argument('--db', default=DB_PATH, help=f'数据库文件（默认 {DB_PATH}）')
+    parser.add_argument('--table', help='本地对照表CSV（地址,纬度,经度），指定后不请求高德')
+    parser.add_argument('--amap-url', default=AMAP_GEOCODE_URL, help='高德地理编码接口地址（可指向本地模拟服务）')
+    parser.add_argument('--city', default='', help='限定城市，提高地址匹配准确度')
+    parser.add_argument('--qps', type=float, default=DEFAULT_QPS, help='每秒最多请求次数')
+    parser.add_argument('--limit', type=int, help='最多处理的店铺数')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.table:
+        geocoder = TableGeocoder(args.table)
+    else:
+        geocoder = AmapGeocoder(url=args.amap_url, city=args.city)
+
+    print("=" * 60)
+    print(f"📍 填充店铺坐标: {args.db}")
+    print("=" * 60)
+    stats = geocode_shops(geocoder, args.db, args.qps, args.limit)
+    print(f"✅ 处理 {stats['requested']} 家, 成功 {stats['located']} 家, "
+          f"未找到 {stats['failed']} 家, 用时 {stats['seconds']}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
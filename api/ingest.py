@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CSV → data.db 导入工具
+
+用法:
+    python ingest.py                                  # 导入项目根目录的 店铺名录.csv、菜品名录.csv
+    python ingest.py --shops a.csv --dishes b.csv --prune
+
+- 逐行读取CSV，按批 executemany 写入，全部数据在同一个事务中提交
+- 店铺按店名、菜品按 (店名, 菜品名称) 去重并增量更新（upsert），内容未变的行不改写
+- 评分、推荐人数写成数字列，人均消费保留原文，解析出的数字写入 shops.price_value
+- 导入后执行 db.migrate，补齐API查询需要的索引和全文检索表
+- 店铺地址变化时清空其坐标，再运行 geocode_shops.py 补填
+- 服务运行中也可以导入，连接池无需重启即可读到新数据
+"""
+
+import argparse
+import csv
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+
+from db import DB_PATH, add_columns, migrate, parse_price
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SHOPS_CSV = os.path.join(ROOT_DIR, '店铺名录.csv')
+DEFAULT_DISHES_CSV = os.path.join(ROOT_DIR, '菜品名录.csv')
+
+BATCH_SIZE = 1000
+
+# CSV列名 → 数据库列，别名与前端 joinAndFilter 读取的字段一致
+SHOP_COLUMNS = {
+    'name': ('店名',),
+    'avg_price': ('人均消费',),
+    'address': ('地址',),
+    'phone': ('电话',),
+    'detail_url': ('详情页', '链接'),
+    'score': ('评分score', '评分'),
+}
+DISH_COLUMNS = {
+    'name': ('菜品名称', '菜名', '名称'),
+    'image_url': ('菜品图片url', '图片', '图片url'),
+    'recommendation_count': ('菜品推荐人数', '推荐人数'),
+    'shop_name': ('店名',),
+}
+
+CREATE_TABLES = (
+    'CREATE TABLE IF NOT EXISTS shops ('
+    'name TEXT, avg_price TEXT, address TEXT, phone TEXT, detail_url TEXT, score REAL)',
+    'CREATE TABLE IF NOT EXISTS dishes ('
+    'name TEXT, image_url TEXT, recommendation_count INTEGER, shop_name TEXT)',
+)
+
+# upsert 依赖的唯一键；已有数据中的重复行先按"最后一条为准"去掉
+# 唯一索引中NULL互不相等，键列一律存空字符串而不是NULL（CSV中的空值读出来就是''）
+UNIQUE_KEYS = (
+    ('shops', 'ux_shops_name', ('name',)),
+    ('dishes', 'ux_dishes_shop_dish', ('shop_name', 'name')),
+)
+
+UPSERT_SHOP = (
+    'INSERT INTO shops (name, avg_price, price_value, address, phone, detail_url, score) VALUES (?, ?, ?, ?, ?, ?, ?) '
+    'ON CONFLICT(name) DO UPDATE SET avg_price = excluded.avg_price, price_value = excluded.price_value, '
+    'address = excluded.address, '
+    'phone = excluded.phone, detail_url = excluded.detail_url, score = excluded.score, '
+    # 地址变了坐标作废，等 geocode_shops.py 重新填充
+    'lat = CASE WHEN shops.address IS excluded.address THEN shops.lat END, '
+    'lon = CASE WHEN shops.address IS excluded.address THEN shops.lon END '
+    'WHERE (shops.avg_price, shops.address, shops.phone, shops.detail_url, shops.score) '
+    'IS NOT (excluded.avg_price, excluded.address, excluded.phone, excluded.detail_url, excluded.score)'
+)
+UPSERT_DISH = (
+    'INSERT INTO dishes (name, image_url, recommendation_count, shop_name) VALUES (?, ?, ?, ?) '
+    'ON CONFLICT(shop_name, name) DO UPDATE SET image_url = excluded.image_url, '
+    'recommendation_count = excluded.recommendation_count '
+    'WHERE (dishes.image_url, dishes.recommendation_count) '
+    'IS NOT (excluded.image_url, excluded.recommendation_count)'
+)
+
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+
+def parse_score(value):
+    """'4.5' → 4.5，空值或无法解析时为None"""
+    match = NUMBER_PATTERN.search(value or '')
+    return float(match.group()) if match else None
+
+
+def parse_count(value):
+    """'1.2万' → 12000，'356' → 356，空值为0"""
+    match = NUMBER_PATTERN.search(value or '')
+    if not match:
+        return 0
+    number = float(match.group())
+    if '万' in value:
+        number *= 10000
+    return int(number)
+
+
+def read_csv(path, columns):
+    """逐行读取CSV（兼容UTF-8 BOM），按列别名映射为 {数据库列: 去掉首尾空格的值}"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader, [])]
+        index = {}
+        for column, aliases in columns.items():
+            for alias in aliases:
+                if alias in header:
+                    index[column] = header.index(alias)
+                    break
+        missing = [aliases[0] for column, aliases in columns.items() if column not in index]
+        if missing:
+            raise ValueError(f'{os.path.basename(path)} 缺少列: {", ".join(missing)}')
+        for row in reader:
+            yield {column: (row[i].strip() if i < len(row) else '') for column, i in index.items()}
+
+
+def shop_rows(path):
+    for row in read_csv(path, SHOP_COLUMNS):
+        if row['name']:
+            yield (row['name'], row['avg_price'], parse_price(row['avg_price']), row['address'], row['phone'],
+                   row['detail_url'], parse_score(row['score']))
+
+
+def dish_rows(path):
+    for row in read_csv(path, DISH_COLUMNS):
+        if row['name']:
+            yield (row['name'], row['image_url'], parse_count(row['recommendation_count']), row['shop_name'])
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ensure_unique_keys(conn):
+    """建立upsert需要的唯一索引：键列的NULL改为''，已有的重复行只保留rowid最大的一条"""
+    for table, index, columns in UNIQUE_KEYS:
+        cols = ', '.join(columns)
+        keys = ', '.join(f"COALESCE({col}, '')" for col in columns)
+        removed = conn.execute(
+            f'DELETE FROM {table} WHERE rowid NOT IN (SELECT MAX(rowid) FROM {table} GROUP BY {keys})'
+        ).rowcount
+        if removed:
+            logger.info(f"🧹 {table} 删除重复行: {removed}")
+        for col in columns:
+            conn.execute(f"UPDATE {table} SET {col} = '' WHERE {col} IS NULL")
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {index} ON {table}({cols})')
+
+
+def shop_key(row):
+    return (row[0],)
+
+
+def dish_key(row):
+    return (row[3], row[0])
+
+
+def load(conn, sql, rows, batch_size, seen_table=None, key=None):
+    """
+    分批写入；seen_table 不为空时同时记录出现过的键（key(row)），用于 --prune
+
+    返回: (读取行数, 新增或内容有变化的行数)
+    """
+    total = changed = 0
+    for batch in batched(rows, batch_size):
+        changed += conn.executemany(sql, batch).rowcount
+        if seen_table:
+            keys = [key(row) for row in batch]
+            placeholders = ', '.join('?' * len(keys[0]))
+            conn.executemany(f'INSERT OR IGNORE INTO temp.{seen_table} VALUES ({placeholders})', keys)
+        total += len(batch)
+    return total, changed
+
+
+def ingest(db_path=DB_PATH, shops_csv=DEFAULT_SHOPS_CSV, dishes_csv=DEFAULT_DISHES_CSV,
+           batch_size=BATCH_SIZE, prune=False):
+    """
+    导入CSV到数据库（单个事务，失败时整体回滚）
+
+    返回: 统计信息字典
+    """
+    started = time.monotonic()
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    stats = {}
+    try:
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA cache_size = -65536')   # 64MB
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for statement in CREATE_TABLES:
+                conn.execute(statement)
+            add_columns(conn)
+            ensure_unique_keys(conn)
+            if prune:
+                conn.execute('CREATE TEMP TABLE seen_shops (name TEXT PRIMARY KEY)')
+                conn.execute('CREATE TEMP TABLE seen_dishes (shop_name TEXT, name TEXT, PRIMARY KEY (shop_name, name))')
+
+            if shops_csv:
+                stats['shops'], stats['shops_changed'] = load(
+                    conn, UPSERT_SHOP, shop_rows(shops_csv), batch_size,
+                    'seen_shops' if prune else None, shop_key)
+            if dishes_csv:
+                stats['dishes'], stats['dishes_changed'] = load(
+                    conn, UPSERT_DISH, dish_rows(dishes_csv), batch_size,
+                    'seen_dishes' if prune else None, dish_key)
+
+            # 删除CSV中已不存在的行
+            if prune and shops_csv:
+                stats['shops_removed'] = conn.execute(
+                    'DELETE FROM shops WHERE name NOT IN (SELECT name FROM temp.seen_shops)').rowcount
+            if prune and dishes_csv:
+                stats['dishes_removed'] = conn.execute(
+                    'DELETE FROM dishes WHERE NOT EXISTS (SELECT 1 FROM temp.seen_dishes s '
+                    'WHERE s.shop_name = dishes.shop_name AND s.name = dishes.name)').rowcount
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        migrate(conn)
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+
+    stats['seconds'] = round(time.monotonic() - started, 2)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把店铺、菜品CSV导入 data.db')
+    parser.add_argument('--db', default=DB_PATH, help=f'数据库文件（默认 {DB_PATH}）')
+    parser.add_argument('--shops', default=DEFAULT_SHOPS_CSV, help='店铺CSV，传空字符串表示不导入店铺')
+    parser.add_argument('--dishes', default=DEFAULT_DISHES_CSV, help='菜品CSV，传空字符串表示不导入菜品')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='每批写入的行数')
+    parser.add_argument('--prune', action='store_true', help='删除CSV中已不存在的店铺和菜品')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    for path in (args.shops, args.dishes):
+        if path and not os.path.exists(path):
+            print(f"❌ 文件不存在: {path}")
+            return 1
+
+    print("=" * 60)
+    print(f"📥 导入数据到 {args.db}")
+    print("=" * 60)
+    stats = ingest(args.db, args.shops or None, args.dishes or None, args.batch_size, args.prune)
+    if 'shops' in stats:
+        print(f"🏪 店铺: 读取 {stats['shops']} 行, 新增/更新 {stats['shops_changed']} 行"
+              + (f", 删除 {stats['shops_removed']} 行" if 'shops_removed' in stats else ''))
+    if 'dishes' in stats:
+        print(f"🍽️  菜品: 读取 {stats['dishes']} 行, 新增/更新 {stats['dishes_changed']} 行"
+              + (f", 删除 {stats['dishes_removed']} 行" if 'dishes_removed' in stats else ''))
+    print(f"✅ 完成，用时 {stats['seconds']}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
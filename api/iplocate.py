@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IP定位服务（ip-api.com）
+- 所有查询进入同一个队列，由后台线程统一发出，调用方只等待结果
+- 严格遵守免费版配额：单个查询45次/分钟，批量查询15次/分钟（每次最多100个IP）
+- 同一时间窗口内的多个IP合并为一次批量查询，相同IP的并发请求共享结果
+- 配额用完、短时间内无法发出的查询不进入队列，直接失败（IpQuotaExceeded），不在没人等待时消耗配额
+"""
+
+import ipaddress
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+SINGLE_URL = 'http://ip-api.com/json/{ip}'
+BATCH_URL = 'http://ip-api.com/batch'
+FIELDS = 'status,message,country,regionName,city,district,lat,lon,query'
+
+# 本机/内网地址无法定位，改为查询服务器自身的公网IP
+SELF_IP = ''
+
+
+class IpQuotaExceeded(requests.RequestException):
+    """配额已用完，retry_after 秒后才能再查询"""
+
+    def __init__(self, retry_after):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f'IP定位配额已用完，请{self.retry_after}秒后重试')
+
+
+def normalize_client_ip(ip):
+    """内网、回环等地址返回SELF_IP，其余返回规范化后的IP字符串"""
+    try:
+        addr = ipaddress.ip_address((ip or '').strip())
+    except ValueError:
+        return SELF_IP
+    if addr.is_private or addr.is_loopback or addr.is_link_local or addr.is_reserved:
+        return SELF_IP
+    return str(addr)
+
+
+def ip_prefix(ip):
+    """缓存用的网段：IPv4取/24，IPv6取/48；同一网段的用户位置基本一致"""
+    if ip == SELF_IP:
+        return 'self'
+    addr = ipaddress.ip_address(ip)
+    prefix_len = 24 if addr.version == 4 else 48
+    return str(ipaddress.ip_network(f'{ip}/{prefix_len}', strict=False))
+
+
+class _Quota:
+    """
+    单个接口的配额状态
+
+    - 本地按窗口计数，保证不超过上限
+    - 以响应头 X-Rl（剩余次数）/ X-Ttl（距重置秒数）为准随时校正
+    """
+
+    def __init__(self, limit, window=60):
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset_at = time.monotonic() + window
+
+    def wait_time(self):
+        now = time.monotonic()
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+        return 0.0 if self.remaining > 0 else self.reset_at - now
+
+    def consume(self, headers):
+        self.remaining -= 1
+        try:
+            if 'X-Rl' in headers:
+                self.remaining = int(headers['X-Rl'])
+            if 'X-Ttl' in headers:
+                self.reset_at = time.monotonic() + int(headers['X-Ttl'])
+        except ValueError:
+            pass
+
+
+class IpLocator:
+    """配额感知的IP定位队列"""
+
+    def __init__(self, lang='zh-CN', single_limit=45, batch_limit=15, batch_window=0.2, max_batch=100):
+        self.lang = lang
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._single_quota = _Quota(single_limit)
+        self._batch_quota = _Quota(batch_limit)
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._worker = None
+
+    def lookup(self, ip, timeout=10, max_wait=5):
+        """
+        查询IP位置（ip为SELF_IP时查询服务器自身公网IP）
+
+        - 配额用完、要等待超过 max_wait 秒才能发出时不进入队列，直接抛出 IpQuotaExceeded
+        - 否则最多等待：配额恢复的时间 + 合并窗口 + timeout（请求本身的超时）
+
+        返回: ip-api原始结果字典；超时抛出 requests.Timeout
+        """
+        with self._lock:
+            future = self._pending.get(ip)
+            if future is None:
+                delay = self.quota_delay(ip)
+                if delay > max_wait:
+                    logger.warning(f"⏳ ip-api 配额已用完，{delay:.1f}s 后恢复，不再排队: {ip or 'self'}")
+                    raise IpQuotaExceeded(delay)
+                future = Future()
+                self._pending[ip] = future
+                self._queue.put(ip)
+            self._ensure_worker()
+        try:
+            return future.result(max_wait + self.batch_window + timeout)
+        except FutureTimeoutError as e:
+            raise requests.Timeout(f'IP定位排队超时: {ip or "self"}') from e
+
+    def quota_delay(self, ip):
+        """查询ip最早还要等多少秒：服务器自身只能单个查询，其余IP单个和批量接口都可以用"""
+        if ip == SELF_IP:
+            return self._single_quota.wait_time()
+        return min(self._single_quota.wait_time(), self._batch_quota.wait_time())
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='ip-locator', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # 短暂等待，把同一时间窗口内的查询合并成一批
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._dispatch(batch)
+            except Exception as e:
+                logger.error(f"IP定位批次处理失败: {e}")
+                self._resolve(batch, error=e)
+
+    def _dispatch(self, batch):
+        """按查询方式分组发出；某一组失败只影响该组的等待者"""
+        groups = []
+        if SELF_IP in batch:
+            groups.append((self._query_single, [SELF_IP]))
+        ips = [ip for ip in batch if ip != SELF_IP]
+        # 单个IP优先用单个查询；单个查询配额用完时改用批量接口
+        if len(ips) == 1 and self._single_quota.wait_time() <= self._batch_quota.wait_time():
+            groups.append((self._query_single, ips))
+        elif ips:
+            groups.append((self._query_batch, ips))
+
+        for query, group in groups:
+            try:
+                query(group)
+            except Exception as e:
+                logger.error(f"IP定位请求失败: {e}")
+                self._resolve(group, error=e)
+
+    def _wait_quota(self, quota, name):
+        delay = quota.wait_time()
+        if delay > 0:
+            logger.warning(f"⏳ ip-api {name}配额已用完，等待 {delay:.1f}s")
+            time.sleep(delay)
+            quota.wait_time()
+
+    def _query_single(self, ips):
+        ip = ips[0]
+        self._wait_quota(self._single_quota, '单个查询')
+        response = self._session.get(
+            SINGLE_URL.format(ip=ip),
+            params={'lang': self.lang, 'fields': FIELDS},
+            headers={'Accept': 'application/json'},
+            timeout=10
+        )
+        self._single_quota.consume(response.headers)
+        response.raise_for_status()
+        self._resolve([ip], results={ip: response.json()})
+
+    def _query_batch(self, ips):
+        self._wait_quota(self._batch_quota, '批量查询')
+        logger.info(f"IP定位批量查询: {len(ips)} 个IP")
+        response = self._session.post(
+            BATCH_URL,
+            params={'lang': self.lang, 'fields': FIELDS},
+            json=ips,
+            timeout=10
+        )
+        self._batch_quota.consume(response.headers)
+        response.raise_for_status()
+        # 批量接口按请求顺序返回结果
+        self._resolve(ips, results=dict(zip(ips, response.json())))
+
+    def _resolve(self, ips, results=None, error=None):
+        with self._lock:
+            futures = [(ip, self._pending.pop(ip, None)) for ip in ips]
+        for ip, future in futures:
+            if future is None or future.done():
+                continue
+            if results is not None and ip in results:
+                future.set_result(results[ip])
+            else:
+                future.set_exception(error or requests.RequestException(f'IP定位无结果: {ip}'))
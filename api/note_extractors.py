@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+笔记详情提取器（按站点注册）
+- 每个站点一个提取器，按最终页面URL的域名选择，没有匹配时使用通用提取器
+- 提取器先走快速路径（正则 / 页面内嵌JSON），不需要建DOM树
+- 快速路径拿不到时再解析HTML：只解析需要的标签（SoupStrainer），安装了lxml时使用lxml解析器
+- 同一份页面最多解析一次
+"""
+
+import html as html_lib
+import json
+import logging
+import re
+from urllib.parse import urlsplit
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:  # 可选依赖，未安装时使用内置解析器
+    HTML_PARSER = 'html.parser'
+
+logger = logging.getLogger(__name__)
+
+TITLE_PATTERN = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+META_DESCRIPTION_PATTERN = re.compile(
+    r'<meta\s[^>]*?name=["\']description["\'][^>]*?content=["\']([^"\']*)["\']'
+    r'|<meta\s[^>]*?content=["\']([^"\']*)["\'][^>]*?name=["\']description["\']',
+    re.IGNORECASE
+)
+NEXT_DATA_PATTERN = re.compile(r'<script id="__NEXT_DATA__" type="application/json"[^>]*>(.*?)</script>', re.DOTALL)
+
+IMAGE_SKIP_WORDS = ('icon', 'logo', 'avatar')
+
+
+def parse_html(text, parse_only=None):
+    """解析HTML（可只解析部分标签），整个提取过程只调用一次"""
+    return BeautifulSoup(text, HTML_PARSER, parse_only=parse_only)
+
+
+def page_title(text):
+    """<title> 的文本（快速路径），没有时返回None"""
+    match = TITLE_PATTERN.search(text)
+    if match is None:
+        return None
+    return html_lib.unescape(re.sub(r'<[^>]+>', '', match.group(1))).strip()
+
+
+def _classes_match(attrs, names):
+    classes = attrs.get('class') or ''
+    if not isinstance(classes, str):
+        classes = ' '.join(classes)
+    return any(name in classes for name in names)
+
+
+def _first_content(soup, selectors, require_paragraphs=False):
+    """按选择器顺序找正文：有 <p> 时按段落拼接，否则取整体文本"""
+    for selector in selectors:
+        content_el = soup.select_one(selector)
+        if content_el is None:
+            continue
+        paragraphs = [p.get_text(strip=True) for p in content_el.find_all('p')]
+        content = '\n\n'.join(text for text in paragraphs if text)
+        if require_paragraphs:
+            if content:
+                return content
+            continue
+        if paragraphs:
+            return content
+        if content_el.get_text(strip=True):
+            return content_el.get_text(strip=True)
+    return ''
+
+
+class NoteExtractor:
+    """
+    笔记提取器基类（同时是通用提取器）
+
+    子类声明:
+    - domains: 适用的域名（含子域名）
+    - fast_path(text, context): 不建DOM树的提取，返回结果字典；返回None表示需要解析HTML
+    - parse_only: 解析HTML时只保留的标签（SoupStrainer）
+    - from_soup(soup, context): 解析后的提取
+    - handles_baidu_redirect: 从百度跳转过来时是否解析内容（否则只返回跳转提示）
+    """
+
+    name = 'generic'
+    domains = ()
+    handles_baidu_redirect = False
+    content_selectors = ('.content', '.article-content', 'article', '.detail-content')
+    parse_only = SoupStrainer(
+        lambda name, attrs: name in ('h1', 'article')
+        or _classes_match(attrs, ('title', 'content', 'detail-content'))
+    )
+
+    def matches(self, host):
+        return any(host == domain or host.endswith('.' + domain) for domain in self.domains)
+
+    def is_blocked(self, text):
+        """页面是否是验证/拦截页（需要重新请求）"""
+        return False
+
+    def fast_path(self, text, context):
+        return None
+
+    def from_soup(self, soup, context):
+        result = {'type': 'generic'}
+        title_el = soup.find('h1') or soup.find(class_='title')
+        if title_el:
+            result['title'] = title_el.get_text(strip=True)
+        result['content'] = _first_content(soup, self.content_selectors, require_paragraphs=True)
+        return result
+
+    def extract(self, text, context):
+        """
+        提取笔记内容
+
+        参数:
+        - context: {'url': 最终页面URL, 'from_baidu': 是否由百度跳转而来}
+
+        返回: 要合并到响应中的字段
+        """
+        result = self.fast_path(text, context)
+        if result is None:
+            result = self.from_soup(parse_html(text, self.parse_only), context)
+        return result
+
+
+class DianpingExtractor(NoteExtractor):
+    """大众点评：数据都在 __NEXT_DATA__ 的JSON中，不需要解析HTML"""
+
+    name = 'dianping'
+    domains = ('m.dianping.com',)
+    handles_baidu_redirect = True
+
+    def fast_path(self, text, context):
+        result = {'type': 'dianping'}
+        match = NEXT_DATA_PATTERN.search(text)
+        if not match:
+            logger.warning("未找到大众点评的JSON数据")
+            result['error'] = '无法提取笔记内容'
+            result['needJump'] = True
+            return result
+        try:
+            data = json.loads(match.group(1))
+            feed_info = data.get('props', {}).get('pageProps', {}).get('feedInfo', {})
+
+            result['title'] = feed_info.get('title', '')
+            result['content'] = feed_info.get('content', '')
+
+            # 如果是从百度跳转来的，在来源中标注
+            author = feed_info.get('feedUser', {}).get('nickName', '大众点评用户')
+            result['source'] = f'{author} (百度笔记 → 大众点评)' if context.get('from_baidu') else author
+
+            pic_list = feed_info.get('feedPicList', [])
+            result['images'] = [pic.get('url', '') for pic in pic_list if pic.get('url')]
+
+            logger.info(f"大众点评数据提取成功: title={result['title']}, content_length={len(result.get('content', ''))}, images={len(result['images'])}")
+        except Exception as e:
+            logger.error(f"解析大众点评JSON失败: {e}")
+            result['type'] = 'parse_error'
+            result['error'] = f'解析失败: {str(e)}'
+        return result
+
+
+class CtripExtractor(NoteExtractor):
+    """携程旅行：页面由客户端渲染，服务端HTML只有标题和描述，建议跳转原网站"""
+
+    name = 'ctrip'
+    domains = ('m.ctrip.com',)
+    parse_only = SoupStrainer(['title', 'meta'])
+
+    def _finish(self, result):
+        if not result['content']:
+            result['content'] = '该笔记来自携程旅行，为了获得最佳体验，建议前往原网站查看。'
+        result['needJump'] = True
+        return result
+
+    def fast_path(self, text, context):
+        title = page_title(text)
+        match = META_DESCRIPTION_PATTERN.search(text)
+        if title is None or match is None:
+            return None
+        description = html_lib.unescape(match.group(1) or match.group(2) or '')
+        return self._finish({'type': 'ctrip', 'source': '携程旅行', 'title': title, 'content': description})
+
+    def from_soup(self, soup, context):
+        result = {'type': 'ctrip', 'source': '携程旅行', 'title': '', 'content': ''}
+        title_tag = soup.find('title')
+        if title_tag:
+            result['title'] = title_tag.string or ''
+        desc_tag = soup.find('meta', {'name': 'description'})
+        if desc_tag and desc_tag.get('content'):
+            result['content'] = desc_tag.get('content')
+        return self._finish(result)
+
+
+class BaiduNoteExtractor(NoteExtractor):
+    """百度笔记（mbd.baidu.com）：只解析标题、正文容器和图片"""
+
+    name = 'baidu'
+    domains = ('mbd.baidu.com',)
+    content_selectors = ('.content-article', '.article-content', '[class*="content"]', 'article', '.detail-content')
+    parse_only = SoupStrainer(
+        lambda name, attrs: name in ('h1', 'title', 'img', 'article') or _classes_match(attrs, ('content',))
+    )
+
+    def is_blocked(self, text):
+        return '安全验证' in text or 'timeout' in text or len(text) < 2000
+
+    def from_soup(self, soup, context):
+        result = {'type': 'baidu', 'source': '百度笔记', 'images': []}
+        title_tag = soup.find('h1') or soup.find('title')
+        if title_tag:
+            result['title'] = title_tag.get_text(strip=True)
+        result['content'] = _first_content(soup, self.content_selectors)
+
+        for img in soup.find_all('img'):
+            src = img.get('src') or img.get('data-src') or img.get('data-original')
+            if src and not any(word in src for word in IMAGE_SKIP_WORDS):
+                # 处理相对URL
+                if src.startswith('//'):
+                    src = 'https:' + src
+                elif src.startswith('/'):
+                    src = 'https://mbd.baidu.com' + src
+                result['images'].append(src)
+
+        # 如果提取失败，标记为需要跳转
+        if not result.get('title') and not result['content']:
+            result['needJump'] = True
+            result['error'] = '内容解析失败，建议前往原网站查看'
+        return result
+
+
+# 百度跳转到第三方站点时的来源说明: (域名, 来源, 简介)
+BAIDU_REDIRECT_SITES = (
+    (('ctrip.com',), '百度笔记 → 携程旅行', '该笔记来自携程旅行，内容丰富多样。'),
+    (('xiaohongshu.com', 'xhslink.com'), '百度笔记 → 小红书', '该笔记来自小红书，内容精彩纷呈。'),
+)
+
+
+class BaiduRedirectNotice(NoteExtractor):
+    """百度跳转到暂不解析的第三方站点：只取标题，返回跳转提示"""
+
+    name = 'baidu_redirect'
+    parse_only = SoupStrainer('title')
+
+    def _finish(self, result, url):
+        result.update({'type': 'baidu_redirect', 'source': '百度笔记',
+                       'content': '该笔记来自第三方网站。', 'needJump': True})
+        for domains, source, content in BAIDU_REDIRECT_SITES:
+            if any(domain in url for domain in domains):
+                result['source'], result['content'] = source, content
+                break
+        return result
+
+    def fast_path(self, text, context):
+        title = page_title(text)
+        if title is None:
+            return None
+        return self._finish({'title': title} if title else {}, context['url'])
+
+    def from_soup(self, soup, context):
+        result = {}
+        title_tag = soup.find('title')
+        if title_tag:
+            result['title'] = title_tag.get_text(strip=True)
+        return self._finish(result, context['url'])
+
+
+# 站点提取器注册表，按顺序匹配
+NOTE_EXTRACTORS = []
+GENERIC_EXTRACTOR = NoteExtractor()
+BAIDU_REDIRECT_NOTICE = BaiduRedirectNotice()
+
+
+def register_extractor(extractor):
+    """注册站点提取器（后注册的先匹配，可覆盖内置的）"""
+    NOTE_EXTRACTORS.insert(0, extractor)
+    return extractor
+
+
+for _extractor in (DianpingExtractor(), CtripExtractor(), BaiduNoteExtractor()):
+    register_extractor(_extractor)
+
+
+def extractor_for(url):
+    """按URL的域名选择提取器，没有匹配时返回通用提取器"""
+    host = (urlsplit(url).hostname or '').lower()
+    for extractor in NOTE_EXTRACTORS:
+        if extractor.matches(host):
+            return extractor
+    return GENERIC_EXTRACTOR
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+游标（keyset）分页
+- 游标记录上一页最后一行的 (排序列的值, rowid)，下一页从该位置之后按索引继续读取
+- 翻到多深都只读取一页的数据，不像 OFFSET 那样先扫描再丢弃前面的行
+- 排序列上的普通索引隐含以 rowid 结尾，相当于 (排序列, rowid) 复合索引
+- 排序列为NULL的行与SQLite默认顺序一致：升序时排在最前，降序时排在最后
+"""
+
+import base64
+import json
+
+
+def encode_cursor(sort, value, rowid):
+    """(排序方式, 最后一行排序列的值, 最后一行rowid) → 不透明的游标字符串"""
+    raw = json.dumps([sort, value, rowid], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """
+    解析游标
+
+    返回: (value, rowid)；游标格式错误或与当前排序方式不符时抛出 ValueError
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, value, rowid = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError('无效的分页游标') from e
+    if cursor_sort != sort or not isinstance(rowid, int):
+        raise ValueError('分页游标与当前排序方式不匹配')
+    return value, rowid
+
+
+def keyset_page(conn, table, select, column, descending, limit, after=None, where='', params=(), offset=0):
+    """
+    读取一页数据
+
+    参数:
+    - select: 要查询的列（SQL片段），结果中额外带上 _key 和 _rowid
+    - column: 排序列；descending 为 True 时降序
+    - after: decode_cursor 的结果，None 表示第一页
+    - where / params: 额外的过滤条件
+    - offset: 兼容旧的 OFFSET 分页，仅在没有游标时使用，顺序与游标分页相同
+
+    返回: (rows, has_more)
+    """
+    direction = 'DESC' if descending else 'ASC'
+    op = '<' if descending else '>'
+    base = f'SELECT {select}, {column} AS _key, rowid AS _rowid FROM {table} WHERE '
+    extra = f' AND ({where})' if where else ''
+
+    # 多取一条判断是否还有下一页
+    want = limit + 1
+    rows = []
+
+    if after is None and offset > 0:
+        rows = conn.execute(
+            f'SELECT {select}, {column} AS _key, rowid AS _rowid FROM {table}'
+            + (f' WHERE {where}' if where else '')
+            + f' ORDER BY {column} {direction}, rowid {direction} LIMIT ? OFFSET ?',
+            list(params) + [want, offset]
+        ).fetchall()
+        return rows[:limit], len(rows) > limit
+
+    # 分两段读取：排序列非NULL的行按 (column, rowid) 范围读取，为NULL的行按 rowid 读取
+    # SQLite中NULL小于任何值，升序时NULL段在前，降序时在后
+    phases = ('null', 'value') if not descending else ('value', 'null')
+    if after is not None:
+        # 从游标所在的一段继续，跳过它之前的段
+        phases = phases[phases.index('null' if after[0] is None else 'value'):]
+
+    for phase in phases:
+        if len(rows) >= want:
+            break
+        phase_params = []
+        if phase == 'value':
+            conditions = f'{column} IS NOT NULL'
+            order = f'{column} {direction}, rowid {direction}'
+            if after is not None and after[0] is not None:
+                conditions += f' AND ({column}, rowid) {op} (?, ?)'
+                phase_params = [after[0], after[1]]
+        else:
+            conditions = f'{column} IS NULL'
+            order = f'rowid {direction}'
+            if after is not None and after[0] is None:
+                conditions += f' AND rowid {op} ?'
+                phase_params = [after[1]]
+        rows += conn.execute(
+            base + conditions + extra + f' ORDER BY {order} LIMIT ?',
+            phase_params + list(params) + [want - len(rows)]
+        ).fetchall()
+
+    return rows[:limit], len(rows) > limit
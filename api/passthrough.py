@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上游页面流式转发（原始HTML模式）
+- 向上游只请求客户端也能接受的压缩格式，收到的字节原样逐块转给客户端，不解码成str再重新编码
+- 上游的 Content-Encoding 原样转给客户端；Content-Type 标明UTF-8（前端按UTF-8读取）
+- 开头的数据块解压后先做检查（如百度安全验证），通过后才开始转发
+- 转发时保留原始字节（压缩后的大小），结束后解码交给回调，用于写入页面缓存
+- 客户端不支持上游的压缩格式、或页面不是UTF-8时，退回到完整读取、解码后返回
+"""
+
+import logging
+import re
+import zlib
+
+import chardet
+from flask import Response
+from requests.exceptions import ContentDecodingError
+
+from fetcher import FetchResult
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时不向上游请求br
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SNIFF_BYTES = 8 * 1024               # 解压后用于检查的开头字节数
+TEE_MAX_BYTES = 4 * 1024 * 1024      # 原始字节超过该大小后不再保留（不写缓存）
+
+CHARSET_PATTERN = re.compile(r'charset=["\']?([\w-]+)', re.IGNORECASE)
+UTF8_NAMES = {'utf-8', 'utf8', 'ascii', 'us-ascii'}
+
+
+def decodable_encodings():
+    """可以解压检查的压缩格式，按优先顺序"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def upstream_accept_encoding(request, allow_br=True):
+    """
+    向上游请求的 Accept-Encoding：客户端接受、且本服务能解压检查的格式
+
+    百度的页面不请求br（allow_br=False）
+    """
+    encodings = [
+        encoding for encoding in decodable_encodings()
+        if (allow_br or encoding != 'br') and request.accept_encodings[encoding]
+    ]
+    return ', '.join(encodings) or 'identity'
+
+
+class ContentDecoder:
+    """按 Content-Encoding 增量解压；不支持的格式抛出 ContentDecodingError"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'gzip':
+            self._decompress = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
+        elif encoding == 'br' and brotli is not None:
+            self._decompress = brotli.Decompressor().process
+        elif encoding == 'identity':
+            self._decompress = None
+        else:
+            raise ContentDecodingError(f'不支持的压缩格式: {encoding}')
+
+    def decompress(self, data):
+        return data if self._decompress is None else self._decompress(data)
+
+
+def content_encoding(stream):
+    return (stream.headers.get('Content-Encoding') or 'identity').strip().lower()
+
+
+def decode_result(stream, chunks):
+    """原始字节 → FetchResult（解压，按响应头或内容判断字符编码）"""
+    decoder = ContentDecoder(content_encoding(stream))
+    content = b''.join(decoder.decompress(chunk) for chunk in chunks)
+    return FetchResult(stream.status_code, stream.headers, stream.url, content)
+
+
+def read_result(stream):
+    """读完整个上游响应并解码"""
+    return decode_result(stream, list(stream))
+
+
+def _is_utf8(stream, head):
+    match = CHARSET_PATTERN.search(stream.headers.get('Content-Type', ''))
+    if match is None:
+        match = CHARSET_PATTERN.search(head[:2048].decode('ascii', errors='ignore'))
+    if match is not None:
+        return match.group(1).lower() in UTF8_NAMES
+    detected = chardet.detect(head).get('encoding')
+    return detected is None or detected.lower() in UTF8_NAMES
+
+
+def passthrough_response(stream, request, check=None, on_complete=None, cache_state=None):
+    """
+    把上游流转成Flask响应
+
+    参数:
+    - stream: FetchEngine.open_stream 的结果（状态码正常）
+    - check: 可选，check(开头的文本)；抛出异常时关闭上游连接并把异常向上抛
+    - on_complete: 可选，完整转发后以解码后的 FetchResult 调用（在响应发送完毕后执行）
+    - cache_state: 写入 X-Cache 响应头
+
+    返回: Flask Response
+    """
+    encoding = content_encoding(stream)
+    try:
+        decoder = ContentDecoder(encoding)
+        chunks = iter(stream)
+        head, decoded = [], b''
+        for chunk in chunks:
+            head.append(chunk)
+            decoded += decoder.decompress(chunk)
+            if len(decoded) >= SNIFF_BYTES:
+                break
+        if check is not None:
+            check(decoded.decode('utf-8', errors='ignore'))
+    except BaseException:
+        stream.close()
+        raise
+
+    headers = {'X-Cache': cache_state} if cache_state else {}
+
+    # 无法原样转发：读完后解码，按普通响应返回（由压缩钩子按客户端支持的格式压缩）
+    if not (encoding == 'identity' or request.accept_encodings[encoding]) or not _is_utf8(stream, decoded):
+        result = decode_result(stream, head + list(chunks))
+        if on_complete is not None:
+            on_complete(result)
+        return Response(result.text, content_type='text/html; charset=utf-8', headers=headers)
+
+    tee = list(head) if on_complete is not None else None
+    state = {'size': sum(len(chunk) for chunk in head), 'complete': False}
+
+    def generate():
+        nonlocal tee
+        yield from head
+        for chunk in chunks:
+            if tee is not None:
+                state['size'] += len(chunk)
+                if state['size'] <= TEE_MAX_BYTES:
+                    tee.append(chunk)
+                else:
+                    tee = None
+            yield chunk
+        state['complete'] = True
+
+    def finish():
+        stream.close()
+        if state['complete'] and tee is not None:
+            try:
+                on_complete(decode_result(stream, tee))
+            except Exception as e:
+                logger.warning(f"流式转发结束后的处理失败: {e}")
+
+    # 不用 direct_passthrough：那样werkzeug不会调用 call_on_close 注册的回调
+    response = Response(generate(), content_type='text/html; charset=utf-8', headers=headers)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.call_on_close(finish)
+    return response
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+首页榜单（与前端原 renderRankings 逻辑一致）
+- 菜品榜：按推荐人数取前K，直接按 idx_dishes_recommendation 索引顺序读取
+- 店铺榜：各店推荐人数之和，来自触发器增量维护的 shop_rankings 表，附带每店推荐人数最多的3道菜
+- 主题榜：每个气泡主题下推荐人数最多的菜品，来自触发器维护的 theme_dishes 表，
+  按 idx_theme_dishes_rank 索引每个主题只读取前K条；结果按数据库版本缓存在内存中
+- 店名可能重复（未经 ingest.py 去重的旧数据），关联店铺时按 rowid 只取同名店铺中的最后一条，不会使菜品重复
+"""
+
+import logging
+import threading
+
+from tokens import LEVEL1_SEEDS
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_SHOP = '未知店铺'
+UNNAMED_DISH = '未命名菜品'
+
+# 同名店铺只关联rowid最大的一条（与 ingest.py 去重时"最后一条为准"一致）
+SHOP_JOIN = 'LEFT JOIN shops s ON s.rowid = (SELECT MAX(rowid) FROM shops WHERE name = {shop_name})'
+
+DISH_SELECT = (
+    "SELECT d.name, d.shop_name, COALESCE(d.recommendation_count, 0) AS count, d.image_url, s.detail_url "
+    "FROM dishes d " + SHOP_JOIN.format(shop_name='d.shop_name')
+)
+
+
+def dish_item(row):
+    return {
+        'name': row['name'] or UNNAMED_DISH,
+        'shopName': row['shop_name'] or UNKNOWN_SHOP,
+        'count': row['count'],
+        'imageUrl': row['image_url'] or '',
+        'detailUrl': row['detail_url'] or '',
+    }
+
+
+def dish_leaderboard(conn, k=20):
+    """推荐人数前K的菜品；全部为0时仍返回前K个"""
+    rows = conn.execute(
+        DISH_SELECT + ' WHERE d.recommendation_count > 0 ORDER BY d.recommendation_count DESC, d.rowid LIMIT ?',
+        (k,)
+    ).fetchall()
+    if not rows:
+        rows = conn.execute(DISH_SELECT + ' ORDER BY d.rowid LIMIT ?', (k,)).fetchall()
+    return [dish_item(row) for row in rows]
+
+
+def shop_leaderboard(conn, k=10, top_dishes=3):
+    """菜品推荐人数之和前K的店铺，每店附带推荐人数最多的几道菜"""
+    shops = conn.execute(
+        'SELECT r.shop_name, r.total, s.detail_url FROM shop_rankings r '
+        + SHOP_JOIN.format(shop_name='r.shop_name') + ' ORDER BY r.total DESC LIMIT ?',
+        (k,)
+    ).fetchall()
+    result = []
+    for shop in shops:
+        # 按 idx_dishes_shop_recommendation 读取；没有店名的菜品汇总在 '' 下
+        condition = 'shop_name = ?' if shop['shop_name'] else "(shop_name = ? OR shop_name IS NULL)"
+        dishes = conn.execute(
+            'SELECT name, COALESCE(recommendation_count, 0) AS count, image_url FROM dishes '
+            f'WHERE {condition} ORDER BY recommendation_count DESC, rowid LIMIT ?',
+            (shop['shop_name'], top_dishes)
+        ).fetchall()
+        result.append({
+            'name': shop['shop_name'] or UNKNOWN_SHOP,
+            'count': shop['total'],
+            'detailUrl': shop['detail_url'] or '',
+            'topDishes': [
+                {'name': d['name'] or UNNAMED_DISH, 'count': d['count'], 'imageUrl': d['image_url'] or ''}
+                for d in dishes
+            ],
+        })
+    return result
+
+
+class ThemeRankings:
+    """
+    各主题的菜品榜（内存）
+
+    - 数据库版本变化时按 (主题, 推荐人数) 索引重新读取各主题前K条，不扫描全部菜品，也不在Python中归类菜名
+    - 人数相同时rowid小的在前
+    - get() 返回副本，调用方修改结果不会影响缓存的榜单
+    """
+
+    def __init__(self, db_pool, k=10):
+        self.db_pool = db_pool
+        self.k = k
+        self._version = None
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    def _ensure_current(self):
+        version, _ = self.db_pool.version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            boards = {}
+            with self.db_pool.connection() as conn:
+                for theme in LEVEL1_SEEDS:
+                    rows = conn.execute(
+                        'SELECT d.name, d.shop_name, COALESCE(d.recommendation_count, 0) AS count, '
+                        'd.image_url, s.detail_url FROM theme_dishes t JOIN dishes d ON d.rowid = t.dish_rowid '
+                        + SHOP_JOIN.format(shop_name='d.shop_name')
+                        + ' WHERE t.theme = ? ORDER BY t.count DESC, t.dish_rowid LIMIT ?',
+                        (theme, self.k)
+                    ).fetchall()
+                    boards[theme] = [dish_item(row) for row in rows]
+            self._boards = boards
+            self._version = version
+            logger.info(f"🏆 主题榜单已更新: {len(boards)} 个主题")
+
+    def get(self, theme=None):
+        """theme为None时返回全部主题，否则返回该主题的榜单（未知主题为空列表）"""
+        self._ensure_current()
+        if theme is None:
+            return {name: [dict(item) for item in board] for name, board in self._boards.items()}
+        return [dict(item) for item in self._boards.get(theme, [])]
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+菜品、店铺全文检索（FTS5 trigram，索引表由 db.migrate 建立）
+- 长度≥3的关键词走 MATCH，按 bm25 相关度排序
+- trigram 无法索引1~2个字的词（如"火锅"），这类词在全文检索表上用 LIKE 过滤
+- 多个关键词（空格分隔）之间为 AND 关系
+- 菜品-店铺关联列表（feed）：关联、过滤、排序都在SQL中完成，只返回一页
+"""
+
+# bm25 列权重：名称命中比店名/地址命中更相关
+DISH_WEIGHTS = (2.0, 1.0)   # name, shop_name
+SHOP_WEIGHTS = (2.0, 1.0)   # name, address
+
+TRIGRAM = 3
+
+
+def split_terms(query):
+    """关键词分组: (可走MATCH的长词, 只能LIKE过滤的短词)"""
+    terms = list(dict.fromkeys((query or '').split()))
+    long_terms = [t for t in terms if len(t) >= TRIGRAM]
+    short_terms = [t for t in terms if len(t) < TRIGRAM]
+    return long_terms, short_terms
+
+
+def _match_expr(terms):
+    # 每个词作为短语加引号，避免用户输入被当作FTS语法
+    return ' AND '.join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _search(conn, table, base, columns, select, weights, tiebreak, query, limit, offset):
+    long_terms, short_terms = split_terms(query)
+    if not long_terms and not short_terms:
+        return []
+
+    where = []
+    params = []
+    if long_terms:
+        where.append(f'{table} MATCH ?')
+        params.append(_match_expr(long_terms))
+    for term in short_terms:
+        where.append('(' + ' OR '.join(f"{table}.{col} LIKE ? ESCAPE '\\'" for col in columns) + ')')
+        params.extend([_like_pattern(term)] * len(columns))
+
+    order = []
+    if long_terms:
+        order.append(f'bm25({table}, {", ".join(str(w) for w in weights)})')
+    order.append(tiebreak)
+
+    sql = (
+        f'SELECT {select} FROM {table} JOIN {base} ON {base}.rowid = {table}.rowid '
+        f'WHERE {" AND ".join(where)} ORDER BY {", ".join(order)} LIMIT ? OFFSET ?'
+    )
+    params.extend([limit, offset])
+    return conn.execute(sql, params).fetchall()
+
+
+def search_dishes(conn, query, limit=20, offset=0):
+    """按菜品名称、店名检索菜品，返回 sqlite3.Row 列表"""
+    return _search(
+        conn, 'dishes_fts', 'dishes', ('name', 'shop_name'),
+        'dishes.name, dishes.image_url, dishes.recommendation_count, dishes.shop_name',
+        DISH_WEIGHTS, 'dishes.recommendation_count DESC',
+        query, limit, offset,
+    )
+
+
+def search_shops(conn, query, limit=20, offset=0):
+    """按店名、地址检索店铺，返回 sqlite3.Row 列表"""
+    return _search(
+        conn, 'shops_fts', 'shops', ('name', 'address'),
+        'shops.name, shops.avg_price, shops.address, shops.phone, shops.detail_url, shops.score',
+        SHOP_WEIGHTS, 'shops.score DESC NULLS LAST',
+        query, limit, offset,
+    )
+
+
+# 同名店铺只关联rowid最大的一条（与 ingest.py 去重一致），菜品不会因店名重复而重复出现
+FEED_SELECT = (
+    'SELECT d.name, d.image_url, d.recommendation_count, d.shop_name, '
+    's.score, s.price_value, s.address, s.phone, s.detail_url '
+    'FROM dishes d LEFT JOIN shops s ON s.rowid = (SELECT MAX(rowid) FROM shops WHERE name = d.shop_name)'
+)
+
+
+def _keyword_condition(table, columns, rowid_expr, keyword):
+    """关键词作为一个整体子串匹配任意列（与前端 joinAndFilter 一致，不区分大小写）"""
+    if len(keyword) >= TRIGRAM:
+        return f'{rowid_expr} IN (SELECT rowid FROM {table} WHERE {table} MATCH ?)', [_match_expr([keyword])]
+    condition = ' OR '.join(f"{col} LIKE ? ESCAPE '\\'" for col in columns)
+    return f'({condition})', [_like_pattern(keyword)] * len(columns)
+
+
+def feed(conn, keyword='', min_score=0, max_price=None, limit=50, offset=0):
+    """
+    菜品关联店铺后过滤、排序（评分降序、推荐人数降序），返回一页 sqlite3.Row
+
+    - 评分取菜品冗余的 shop_score（没有对应店铺为0），排序直接按 idx_dishes_feed 索引顺序读取
+    - 人均未知的店铺不受人均上限过滤
+    - keyword 匹配菜名、店名或店铺地址
+    """
+    where = []
+    params = []
+    if min_score and min_score > 0:
+        where.append('d.shop_score >= ?')
+        params.append(min_score)
+    if max_price is not None and max_price > 0:
+        where.append('(s.price_value IS NULL OR s.price_value <= ?)')
+        params.append(max_price)
+    if keyword:
+        dish_cond, dish_params = _keyword_condition('dishes_fts', ('d.name', 'd.shop_name'), 'd.rowid', keyword)
+        shop_cond, shop_params = _keyword_condition('shops_fts', ('s.address',), 's.rowid', keyword)
+        where.append(f'({dish_cond} OR {shop_cond})')
+        params.extend(dish_params + shop_params)
+
+    sql = FEED_SELECT
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY d.shop_score DESC, d.recommendation_count DESC, d.rowid LIMIT ? OFFSET ?'
+    params.extend([limit, offset])
+    return conn.execute(sql, params).fetchall()
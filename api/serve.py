@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生产环境入口：gunicorn 多进程 + 多线程运行Flask应用
+
+    pip install gunicorn
+    python serve.py                                   # 默认2个工作进程、每进程8个线程
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:5000
+
+- 主进程先导入应用（preload），工作进程fork后共享已加载的代码和数据
+- 后台线程在工作进程fork之后才启动，主进程中不运行任何线程；cookie刷新和缓存预热只在拿到文件锁的一个工作进程中运行
+- 页面缓存、逆地理编码缓存和笔记跳转缓存放在本地SQLite中，所有工作进程共享
+- 按站点的上游请求频率由各进程共用一个令牌桶（本地SQLite），进程数增加时对上游的总访问频率不变
+- 收到 SIGTERM / Ctrl+C 后停止接收新连接，进行中的请求在 graceful_timeout 秒内完成后退出
+
+开发调试仍然使用 python app.py（自动重启、交互式调试器）
+"""
+
+import argparse
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+# 请求大多在等待上游，线程比进程便宜；进程数按需用 --workers 调大
+DEFAULT_WORKERS = 2
+DEFAULT_THREADS = 8
+DEFAULT_GRACEFUL_TIMEOUT = 30
+# 工作进程无响应多久后被重启（秒）：gthread 模式下由主循环心跳，耗时长的请求不受影响
+DEFAULT_TIMEOUT = 60
+
+
+def post_fork(server, worker):
+    """工作进程fork之后启动后台线程（只有一个工作进程拿到后台任务锁）"""
+    import app
+    app.start_background_tasks()
+
+
+class GourmetApplication(BaseApplication):
+    """以代码配置的 gunicorn 应用（不需要单独的配置文件）"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='以多进程模式启动美食笔记搜索API服务')
+    parser.add_argument('--bind', default=os.environ.get('AI_GOURMET_BIND', '0.0.0.0:5000'),
+                        help='监听地址（默认 0.0.0.0:5000）')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('AI_GOURMET_WORKERS', DEFAULT_WORKERS)),
+                        help=f'工作进程数（默认{DEFAULT_WORKERS}）')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('AI_GOURMET_THREADS', DEFAULT_THREADS)),
+                        help=f'每个进程的线程数（默认{DEFAULT_THREADS}）')
+    parser.add_argument('--graceful-timeout', type=int,
+                        default=int(os.environ.get('AI_GOURMET_GRACEFUL_TIMEOUT', DEFAULT_GRACEFUL_TIMEOUT)),
+                        help=f'退出时等待进行中请求的秒数（默认{DEFAULT_GRACEFUL_TIMEOUT}）')
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('AI_GOURMET_TIMEOUT', DEFAULT_TIMEOUT)),
+                        help=f'工作进程无响应多久后重启（默认{DEFAULT_TIMEOUT}秒）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workers = max(1, args.workers)
+
+    # 应用在导入时读取这些设置，必须在 load() 之前设置
+    os.environ['AI_GOURMET_WORKERS'] = str(workers)
+
+    print("=" * 60)
+    print("🚀 美食笔记搜索API服务启动（生产模式）")
+    print("=" * 60)
+    print(f"📍 监听地址: {args.bind}")
+    print(f"⚙️  工作进程: {workers}，每进程线程: {args.threads}")
+    print("=" * 60)
+
+    GourmetApplication({
+        'bind': args.bind,
+        'workers': workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'graceful_timeout': args.graceful_timeout,
+        'timeout': args.timeout,
+        'post_fork': post_fork,
+        'accesslog': '-',
+    }).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -37,6 +37,13 @@ source venv/bin/activate
 echo "📥 安装依赖包（使用清华镜像源）..."
 pip install -r requirements.txt -i https://pypi.tuna.tsinghua.edu.cn/simple --quiet
 
+# 补齐数据库结构（服务只读打开 data.db，不会自己迁移；可重复执行，没有 data.db 时跳过）
+echo "🗄️ 检查数据库结构..."
+if ! python db.py migrate --if-exists; then
+    echo "❌ 数据库迁移失败"
+    exit 1
+fi
+
 echo ""
 echo "=================================="
 echo "  🚀 启动Flask服务器"
@@ -44,5 +51,10 @@ echo "=================================="
 echo ""
 
 # 启动Flask应用
-python app.py
+# 默认生产模式（gunicorn多进程，见 serve.py）；--dev 使用开发服务器（自动重启、调试器）
+if [ "$1" = "--dev" ]; then
+    python app.py
+else
+    exec python serve.py "$@"
+fi
 
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""pytest 公共夹具：把 api 目录加入导入路径，运行期文件放到临时目录，提供可手动推进的时钟、临时CSV和临时数据库"""
+
+import csv
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 被测模块导入时读取这些路径：运行期缓存和数据库指向临时目录，测试不读写 api/.cache 和 data.db
+TEST_ROOT = tempfile.mkdtemp(prefix='ai-gourmet-tests-')
+os.environ['AI_GOURMET_CACHE_DIR'] = os.path.join(TEST_ROOT, 'cache')
+os.environ['AI_GOURMET_DB_PATH'] = os.path.join(TEST_ROOT, 'data.db')
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_ROOT, ignore_errors=True)
+
+
+class FakeClock:
+    """代替模块中的 time：time() / monotonic() 返回同一个手动推进的时间"""
+
+    def __init__(self, start=1_000_000.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    """write_csv(文件名, 表头, 行) → 临时目录中的CSV路径（UTF-8 BOM，与 Excel 导出的一致）"""
+    def write(name, header, rows):
+        path = tmp_path / name
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return str(path)
+    return write
+
+
+SHOP_HEADER = ['店名', '人均消费', '地址', '电话', '详情页', '评分score']
+DISH_HEADER = ['菜品名称', '菜品图片url', '菜品推荐人数', '店名']
+
+
+@pytest.fixture
+def catalog(tmp_path, write_csv):
+    """catalog(店铺行, 菜品行, 文件名='data.db') → 用 ingest.py 导入后的临时数据库路径（已迁移到当前结构版本）"""
+    from ingest import ingest
+
+    def build(shops, dishes, name='data.db'):
+        db_path = str(tmp_path / name)
+        ingest(db_path, write_csv(f'{name}.shops.csv', SHOP_HEADER, shops),
+               write_csv(f'{name}.dishes.csv', DISH_HEADER, dishes))
+        return db_path
+    return build
+
+
+@pytest.fixture
+def db_app(monkeypatch):
+    """db_app(数据库路径) → app 模块，连接池、关键词气泡索引、主题榜单换成读取该数据库的新实例"""
+    import app as app_module
+    from db import ConnectionPool
+    from rankings import ThemeRankings
+    from tokens import TokenIndex
+
+    pools = []
+
+    def use(db_path):
+        pool = ConnectionPool(db_path, size=2, check_interval=0)
+        pools.append(pool)
+        monkeypatch.setattr(app_module, 'db_pool', pool)
+        monkeypatch.setattr(app_module, 'token_index', TokenIndex(pool))
+        monkeypatch.setattr(app_module, 'theme_rankings', ThemeRankings(pool))
+        return app_module
+
+    yield use
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import upstream
+from upstream import BLOCKED, CLOSED, HALF_OPEN, OPEN, CircuitBreaker, UpstreamUnavailable
+
+URL = 'https://m.dianping.com/ugcdetail/1'
+OTHER_URL = 'https://www.douguo.com/caipu/1'
+
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    monkeypatch.setattr(upstream, 'time', clock)
+    return CircuitBreaker(failure_threshold=3, open_seconds=30, block_seconds=60,
+                          max_open_seconds=100, probe_timeout=10)
+
+
+def state(breaker, url=URL):
+    return breaker.snapshot()[upstream.site_of(url)]['state']
+
+
+def trip(breaker, url=URL):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure(url)
+
+
+def test_stays_closed_below_threshold(breaker):
+    breaker.record_failure(URL)
+    breaker.record_failure(URL)
+
+    assert state(breaker) == CLOSED
+    breaker.before_request(URL)
+
+
+def test_success_resets_the_failure_count(breaker):
+    breaker.record_failure(URL)
+    breaker.record_failure(URL)
+    breaker.record_success(URL)
+    breaker.record_failure(URL)
+    breaker.record_failure(URL)
+
+    assert state(breaker) == CLOSED
+
+
+def test_opens_after_consecutive_failures(breaker):
+    trip(breaker)
+
+    assert state(breaker) == OPEN
+    with pytest.raises(UpstreamUnavailable) as excinfo:
+        breaker.before_request(URL)
+    assert excinfo.value.site == 'dianping.com'
+    assert excinfo.value.retry_after == 30
+    # 其他站点不受影响
+    breaker.before_request(OTHER_URL)
+
+
+def test_block_opens_immediately_for_longer(breaker):
+    breaker.record_block(URL)
+
+    with pytest.raises(UpstreamUnavailable) as excinfo:
+        breaker.before_request(URL)
+    assert excinfo.value.reason == BLOCKED
+    assert excinfo.value.retry_after == 60
+
+
+def test_half_open_lets_one_probe_through(breaker, clock):
+    trip(breaker)
+    clock.advance(30)
+
+    breaker.before_request(URL)
+    assert state(breaker) == HALF_OPEN
+    # 探测进行中，其他请求仍被拒绝
+    with pytest.raises(UpstreamUnavailable):
+        breaker.before_request(URL)
+
+
+def test_successful_probe_closes(breaker, clock):
+    trip(breaker)
+    clock.advance(30)
+    breaker.before_request(URL)
+
+    breaker.record_success(URL)
+
+    assert state(breaker) == CLOSED
+    breaker.before_request(URL)
+
+
+def test_failed_probe_reopens_with_doubled_duration(breaker, clock):
+    trip(breaker)
+    clock.advance(30)
+    breaker.before_request(URL)
+
+    breaker.record_failure(URL)
+
+    assert state(breaker) == OPEN
+    assert breaker.snapshot()['dianping.com']['retryAfter'] == 60
+
+
+def test_open_duration_is_capped(breaker, clock):
+    trip(breaker)
+    for _ in range(4):
+        clock.advance(breaker.max_open_seconds)
+        breaker.before_request(URL)
+        breaker.record_failure(URL)
+
+    assert breaker.snapshot()['dianping.com']['retryAfter'] == 100
+
+
+def test_failure_soon_after_recovery_doubles_duration(breaker, clock):
+    trip(breaker)
+    clock.advance(30)
+    breaker.before_request(URL)
+    breaker.record_success(URL)
+
+    clock.advance(5)
+    trip(breaker)
+
+    assert breaker.snapshot()['dianping.com']['retryAfter'] == 60
+
+
+def test_stale_probe_is_replaced_after_timeout(breaker, clock):
+    trip(breaker)
+    clock.advance(30)
+    breaker.before_request(URL)
+
+    clock.advance(10)
+
+    # 探测请求一直没有回报结果，再放行一个
+    breaker.before_request(URL)
+    assert state(breaker) == HALF_OPEN
+
+
+def test_results_while_open_do_not_change_state(breaker):
+    trip(breaker)
+
+    breaker.record_success(URL)
+    breaker.record_failure(URL)
+
+    assert state(breaker) == OPEN
+    assert breaker.snapshot()['dianping.com']['retryAfter'] == 30
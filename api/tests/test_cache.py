@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+import cache
+from cache import HIT, MISS, STALE, TTLCache, cache_key
+
+
+@pytest.fixture
+def ttl_cache(clock, monkeypatch):
+    monkeypatch.setattr(cache, 'time', clock)
+    c = TTLCache(max_bytes=1024 * 1024, refresh_workers=2)
+    yield c
+    c._executor.shutdown(wait=True)
+
+
+def test_cache_key_normalizes_query_and_category():
+    assert cache_key('notes', '  杭州　美食 ', None, 'ABC') == ('notes', '杭州 美食', 1, 'abc')
+
+
+def test_entry_is_fresh_then_stale_then_missing(ttl_cache, clock):
+    ttl_cache.set('k', 'v', ttl=10, stale_ttl=20)
+    assert ttl_cache.get('k') == ('v', HIT)
+    clock.advance(15)
+    assert ttl_cache.get('k') == ('v', STALE)
+    clock.advance(20)
+    assert ttl_cache.get('k') == (None, MISS)
+    assert len(ttl_cache) == 0
+
+
+def test_get_or_load_calls_loader_only_on_miss(ttl_cache):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return len(calls)
+
+    assert ttl_cache.get_or_load('k', loader, ttl=10) == (1, MISS)
+    assert ttl_cache.get_or_load('k', loader, ttl=10) == (1, HIT)
+    assert calls == [1]
+    assert ttl_cache.stats == {HIT: 1, STALE: 0, MISS: 1}
+
+
+def test_loader_errors_are_not_cached(ttl_cache):
+    def failing():
+        raise RuntimeError('upstream down')
+
+    with pytest.raises(RuntimeError):
+        ttl_cache.get_or_load('k', failing, ttl=10)
+    assert ttl_cache.get('k') == (None, MISS)
+
+
+def test_stale_entry_is_served_while_refreshing_in_background(ttl_cache, clock):
+    ttl_cache.set('k', 'old', ttl=10, stale_ttl=60)
+    clock.advance(11)
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return 'new'
+
+    # 刷新进行中的重复读取仍返回旧数据，且不会再提交一次刷新
+    assert ttl_cache.get_or_load('k', loader, ttl=10, stale_ttl=60) == ('old', STALE)
+    assert ttl_cache.get_or_load('k', loader, ttl=10, stale_ttl=60) == ('old', STALE)
+    release.set()
+    ttl_cache._executor.shutdown(wait=True)
+
+    assert calls == [1]
+    assert ttl_cache.get('k') == ('new', HIT)
+
+
+def test_failed_background_refresh_keeps_stale_value(ttl_cache, clock):
+    ttl_cache.set('k', 'old', ttl=10, stale_ttl=60)
+    clock.advance(11)
+
+    def failing():
+        raise RuntimeError('upstream down')
+
+    assert ttl_cache.get_or_load('k', failing, ttl=10, stale_ttl=60) == ('old', STALE)
+    ttl_cache._executor.shutdown(wait=True)
+    assert ttl_cache.get('k') == ('old', STALE)
+    assert not ttl_cache._refreshing
+
+
+def test_least_recently_used_entries_are_evicted_by_size(clock, monkeypatch):
+    monkeypatch.setattr(cache, 'time', clock)
+    value = 'x' * 400
+    size = cache.estimate_size(value)
+    c = TTLCache(max_bytes=size * 2)
+    c.set('a', value, ttl=60)
+    c.set('b', value, ttl=60)
+    c.get('a')
+    c.set('c', value, ttl=60)
+
+    assert c.get('b') == (None, MISS)
+    assert c.get('a')[1] == HIT
+    assert c.get('c')[1] == HIT
+    assert c.size_bytes == size * 2
+
+
+def test_values_larger_than_the_cache_are_not_stored(ttl_cache):
+    ttl_cache.max_bytes = 10
+    ttl_cache.set('k', 'x' * 100, ttl=60)
+    assert ttl_cache.get('k') == (None, MISS)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import gzip
+import sqlite3
+
+import pytest
+
+import compression
+
+SHOPS = [['湖畔居', '¥120', '西湖区北山街', '', '', '4.8']]
+# 足够多的菜品，使 /api/dishes 的响应超过压缩下限
+DISHES = [[f'招牌菜{i:03d}', f'https://example.com/{i}.jpg', str(1000 - i), '湖畔居'] for i in range(60)]
+
+
+@pytest.fixture
+def db_path(catalog):
+    return catalog(SHOPS, DISHES)
+
+
+@pytest.fixture
+def client(db_app, db_path):
+    return db_app(db_path).app.test_client()
+
+
+def test_matching_etag_returns_304(client):
+    first = client.get('/api/dishes?limit=100')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'no-cache'
+    etag = first.headers['ETag']
+
+    second = client.get('/api/dishes?limit=100', headers={'If-None-Match': etag})
+
+    assert second.status_code == 304
+    assert second.data == b''
+    assert second.headers['ETag'] == etag
+
+
+def test_etag_depends_on_parameters(client):
+    assert client.get('/api/dishes?limit=100').headers['ETag'] != client.get('/api/dishes?limit=50').headers['ETag']
+
+
+def test_etag_changes_after_a_write(client, db_path):
+    etag = client.get('/api/dishes?limit=100').headers['ETag']
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE dishes SET recommendation_count = 5000 WHERE name = '招牌菜059'")
+    conn.commit()
+    conn.close()
+
+    response = client.get('/api/dishes?limit=100', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.get_json()['data'][0]['菜品名称'] == '招牌菜059'
+
+
+def test_gzip_and_identity_have_separate_etags(client):
+    identity = client.get('/api/dishes?limit=100', headers={'Accept-Encoding': 'identity'})
+    gzipped = client.get('/api/dishes?limit=100', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in identity.headers
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gzipped.data) == identity.data
+    assert gzipped.headers['ETag'] != identity.headers['ETag']
+    assert 'Accept-Encoding' in gzipped.headers['Vary']
+    # 一种编码的ETag不能让另一种编码返回304
+    response = client.get('/api/dishes?limit=100', headers={
+        'Accept-Encoding': 'identity', 'If-None-Match': gzipped.headers['ETag'],
+    })
+    assert response.status_code == 200
+
+
+def test_brotli_is_preferred_when_installed(client):
+    brotli = pytest.importorskip('brotli')
+
+    response = client.get('/api/dishes?limit=100', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert response.headers['Content-Encoding'] == 'br'
+    identity = client.get('/api/dishes?limit=100', headers={'Accept-Encoding': 'identity'})
+    assert brotli.decompress(response.data) == identity.data
+    assert response.headers['ETag'] != client.get(
+        '/api/dishes?limit=100', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+
+
+def test_brotli_request_falls_back_without_brotli(client, monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+
+    br_only = client.get('/api/dishes?limit=100', headers={'Accept-Encoding': 'br'})
+    both = client.get('/api/dishes?limit=100', headers={'Accept-Encoding': 'br, gzip'})
+
+    assert 'Content-Encoding' not in br_only.headers
+    assert both.headers['Content-Encoding'] == 'gzip'
+
+
+def test_missing_database_returns_json_error(db_app, tmp_path):
+    client = db_app(str(tmp_path / 'missing.db')).app.test_client()
+
+    response = client.get('/api/dishes?limit=10', headers={'If-None-Match': '"anything"'})
+
+    assert response.status_code == 500
+    assert response.get_json()['success'] is False
+    assert '数据库文件不存在' in response.get_json()['error']
+    assert 'ETag' not in response.headers
+
+
+def test_outdated_schema_returns_migrate_hint(db_app, db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+    conn.close()
+    client = db_app(db_path).app.test_client()
+
+    response = client.get('/api/search?q=招牌菜')
+
+    assert response.status_code == 500
+    assert response.get_json()['success'] is False
+    assert '请先运行 python db.py migrate' in response.get_json()['error']
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+
+import pytest
+
+from db import SCHEMA_VERSION, ConnectionPool, SchemaOutdatedError, main, migrate_file, schema_version
+from ingest import CREATE_TABLES
+
+
+def create_catalog(path, shops=(), dishes=()):
+    """建立只有基础表的数据库（相当于迁移之前的 data.db）"""
+    conn = sqlite3.connect(path)
+    for statement in CREATE_TABLES:
+        conn.execute(statement)
+    conn.executemany('INSERT INTO shops (name, avg_price, score) VALUES (?, ?, ?)', shops)
+    conn.executemany('INSERT INTO dishes (name, recommendation_count, shop_name) VALUES (?, ?, ?)', dishes)
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return create_catalog(
+        str(tmp_path / 'data.db'),
+        shops=[('老街面馆', '¥30', 4.6)],
+        dishes=[('牛肉面', 120, '老街面馆'), ('葱油拌面', 80, '老街面馆')],
+    )
+
+
+def test_pool_rejects_outdated_schema_until_migrated(db_path):
+    pool = ConnectionPool(db_path, size=2, check_interval=0)
+
+    with pytest.raises(SchemaOutdatedError):
+        with pool.connection():
+            pass
+
+    created = migrate_file(db_path)
+    assert 'dishes_fts' in created
+
+    with pool.connection() as conn:
+        assert schema_version(conn) == SCHEMA_VERSION
+        assert conn.execute('SELECT COUNT(*) FROM dishes').fetchone()[0] == 2
+    pool.close()
+
+
+def test_pool_never_writes(db_path):
+    migrate_file(db_path)
+    pool = ConnectionPool(db_path, size=1)
+
+    with pool.connection() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO dishes (name) VALUES ('x')")
+    pool.close()
+
+
+def test_migrate_is_idempotent(db_path):
+    assert migrate_file(db_path)
+    assert migrate_file(db_path) == []
+
+
+def test_migrate_command_upgrades_before_serving(db_path):
+    # 启动脚本在启动服务前执行 python db.py migrate --if-exists
+    assert main(['migrate', '--if-exists', '--db', db_path]) == 0
+
+    pool = ConnectionPool(db_path, size=1)
+    with pool.connection() as conn:
+        assert schema_version(conn) == SCHEMA_VERSION
+    pool.close()
+
+
+def test_migrate_command_skips_missing_file_only_when_asked(tmp_path):
+    missing = str(tmp_path / 'missing.db')
+
+    assert main(['migrate', '--if-exists', '--db', missing]) == 0
+    assert main(['migrate', '--db', missing]) == 1
+    assert not os.path.exists(missing)
+
+
+def test_pool_reuses_connections(db_path):
+    migrate_file(db_path)
+    pool = ConnectionPool(db_path, size=2)
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    assert pool._created == 1
+    pool.close()
+    assert pool._created == 0
+
+
+def test_pool_reopens_replaced_file(db_path, tmp_path):
+    migrate_file(db_path)
+    pool = ConnectionPool(db_path, size=2, check_interval=0)
+    with pool.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM dishes').fetchone()[0] == 2
+    version, _ = pool.version()
+
+    replacement = create_catalog(str(tmp_path / 'new.db'), dishes=[('小笼包', 300, '')])
+    migrate_file(replacement)
+    os.replace(replacement, db_path)
+
+    with pool.connection() as conn:
+        assert conn.execute('SELECT name FROM dishes').fetchall()[0][0] == '小笼包'
+    assert pool.version()[0] != version
+    pool.close()
+
+
+def test_missing_database_file(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'missing.db'))
+    with pytest.raises(FileNotFoundError):
+        with pool.connection():
+            pass
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import socket
+
+import pytest
+
+import app as app_module
+from cache import SingleFlight
+from fetcher import ClientDisconnected
+
+
+@pytest.fixture
+def connection():
+    """(服务端socket, 客户端socket)"""
+    server, client = socket.socketpair()
+    yield server, client
+    server.close()
+    client.close()
+
+
+def test_probe_detects_a_closed_client(connection):
+    server, client = connection
+    with app_module.app.test_request_context(environ_base={'werkzeug.socket': server}):
+        is_disconnected = app_module.client_disconnect_probe()
+
+        assert is_disconnected() is False
+        client.close()
+        assert is_disconnected() is True
+
+
+def test_probe_ignores_a_pipelined_request(connection):
+    server, client = connection
+    client.sendall(b'GET /api/health HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    with app_module.app.test_request_context(environ_base={'gunicorn.socket': server}):
+        assert app_module.client_disconnect_probe()() is False
+    # 只是窥探，数据仍留给服务器读取
+    assert server.recv(3) == b'GET'
+
+
+def test_no_probe_outside_requests_or_without_a_socket():
+    assert app_module.client_disconnect_probe() is None
+    with app_module.app.test_request_context():
+        assert app_module.client_disconnect_probe() is None
+
+
+def test_waiting_for_a_shared_stream_stops_on_disconnect(monkeypatch):
+    monkeypatch.setattr(app_module, 'DISCONNECT_POLL_INTERVAL', 0.01)
+    flight, _ = SingleFlight().begin('key')
+
+    with pytest.raises(ClientDisconnected):
+        app_module.wait_flight(flight, 5, lambda: True)
+    assert app_module.wait_flight(flight, 0.05, lambda: False) == (False, None)
+
+
+def test_scraping_route_answers_499_and_skips_the_negative_cache(monkeypatch):
+    def fetch(*args, **kwargs):
+        raise ClientDisconnected('客户端已断开，取消上游请求')
+
+    monkeypatch.setattr(app_module.fetch_engine, 'fetch', fetch)
+    client = app_module.app.test_client()
+
+    response = client.get('/api/search-recipes?query=客户端断开测试&format=json')
+
+    assert response.status_code == app_module.CLIENT_CLOSED_REQUEST
+    key = app_module.cache_key('search-recipes', '客户端断开测试', 1)
+    assert app_module.page_cache.get(('upstream-failure',) + key)[0] is None
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import os
+
+from extractors import extract_notes, extract_recipe_detail, extract_recipes
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def test_extract_notes_from_baidu_search_page():
+    notes = extract_notes(fixture('baidu_notes.html'))
+
+    assert notes == [
+        {
+            'title': '杭州美食推荐｜本地人常去的10家店',
+            'image': 'https://img.example.com/note1.jpg',
+            'url': 'https://mbd.baidu.com/note/1',
+            'source': '小红书',
+            'description': '小红书 · 3天前',
+        },
+        {
+            'title': '西湖边的宝藏小馆',
+            'image': 'https://img.example.com/note2.jpg',
+            'url': 'https://www.xiaohongshu.com/explore/2',
+            'source': '百度',
+            'description': '百度',
+        },
+    ]
+
+
+def test_extract_notes_without_results():
+    assert extract_notes('<html><body><p>没有找到相关结果</p></body></html>') == []
+
+
+def test_extract_recipes_from_douguo_list_page():
+    recipes = extract_recipes(fixture('douguo_search.html'))
+
+    assert recipes == [
+        {
+            'title': '家常红烧肉',
+            'image': 'https://cp1.douguo.com/upload/caiku/a/b/c.jpg',
+            'url': 'https://www.douguo.com/cookbook/2001.html',
+            'author': '豆果美食',
+        },
+        {
+            'title': '毛氏 红烧肉',
+            'image': 'https://cp1.douguo.com/upload/caiku/d.jpg',
+            'url': 'https://www.douguo.com/cookbook/2002.html',
+            'author': '豆果美食',
+        },
+    ]
+
+
+def test_extract_recipes_falls_back_to_list_items():
+    html = (
+        '<ul class="cook-list"><li><span class="title">清蒸鲈鱼</span>'
+        '<span class="author">阿鲜</span><img src="/fish.jpg"></li></ul>'
+    )
+    # 没有菜谱链接的条目不返回
+    assert extract_recipes(html) == []
+
+
+def test_extract_recipe_detail_from_douguo_recipe_page():
+    detail = extract_recipe_detail(fixture('douguo_recipe.html'))
+
+    assert detail['title'] == '家常红烧肉'
+    assert detail['author'] == '厨房小白'
+    assert detail['description'] == '肥而不腻，入口即化。'
+    assert detail['ingredients'] == [
+        {'name': '五花肉', 'amount': '500克'},
+        {'name': '冰糖', 'amount': '20克'},
+        {'name': '生抽', 'amount': '适量'},
+    ]
+    # 过短的步骤跳过，步骤号保持页面上的序号；注释不计入步骤文本
+    assert detail['steps'] == [
+        {'step': 1, 'text': '五花肉切块，冷水下锅焯水。', 'image': 'https://cp1.douguo.com/upload/caiku/step1.jpg'},
+        {'step': 2, 'text': '炒糖色 小火慢炒', 'image': ''},
+        {'step': 4, 'text': '加水炖煮40分钟，大火收汁。', 'image': 'https://cp1.douguo.com/upload/caiku/cover.jpg'},
+    ]
+    assert detail['tips'] == '糖色不要炒糊。'
+    assert detail['images'] == [
+        'https://cp1.douguo.com/upload/caiku/cover.jpg',
+        'https://cp1.douguo.com/upload/caiku/step1.jpg',
+    ]
+
+
+def test_extract_recipe_detail_legacy_layout():
+    html = (
+        '<h1 class="title">番茄炒蛋</h1>'
+        '<ul class="ings"><li><span>番茄</span><span>2个</span></li><li><span>鸡蛋</span></li></ul>'
+        '<ol class="steps"><li>鸡蛋打散炒熟盛出</li><li>番茄炒软后倒回鸡蛋</li></ol>'
+    )
+    detail = extract_recipe_detail(html)
+
+    assert detail['ingredients'] == [{'name': '番茄', 'amount': '2个'}, {'name': '鸡蛋', 'amount': ''}]
+    assert [step['text'] for step in detail['steps']] == ['鸡蛋打散炒熟盛出', '番茄炒软后倒回鸡蛋']
+    assert detail['images'] == []
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+from db import SCHEMA_VERSION, migrate_file, parse_price
+from ingest import CREATE_TABLES, ingest
+from search import feed
+
+SHOP_HEADER = ['店名', '人均消费', '地址', '电话', '详情页', '评分score']
+DISH_HEADER = ['菜品名称', '菜品图片url', '菜品推荐人数', '店名']
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('人均消费：¥88', 88.0),
+    ('¥ 88元/人', 88.0),
+    ('￥66.5', 66.5),
+    ('人均 .5', 0.5),
+    ('暂无', None),
+    ('', None),
+    (None, None),
+])
+def test_parse_price_matches_frontend(text, expected):
+    assert parse_price(text) == expected
+
+
+@pytest.fixture
+def conn(tmp_path, write_csv):
+    shops = write_csv('shops.csv', SHOP_HEADER, [
+        ['湖畔居', '人均消费：¥120', '西湖区', '', 'https://example.com/1', '4.8'],
+        ['巷口面馆', '¥25/人', '上城区', '', '', '4.2'],
+        ['夜宵摊', '', '拱墅区', '', '', ''],
+    ])
+    dishes = write_csv('dishes.csv', DISH_HEADER, [
+        ['龙井虾仁', '', '300', '湖畔居'],
+        ['西湖醋鱼', '', '500', '湖畔居'],
+        ['片儿川', '', '900', '巷口面馆'],
+        ['烤串', '', '50', '夜宵摊'],
+        ['无名小炒', '', '70', '不存在的店'],
+    ])
+    db_path = str(tmp_path / 'data.db')
+    ingest(db_path, shops, dishes)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+def names(rows):
+    return [row['name'] for row in rows]
+
+
+def test_feed_orders_by_shop_score_then_recommendations(conn):
+    assert names(feed(conn)) == ['西湖醋鱼', '龙井虾仁', '片儿川', '无名小炒', '烤串']
+
+
+def test_feed_filters(conn):
+    assert names(feed(conn, min_score=4.5)) == ['西湖醋鱼', '龙井虾仁']
+    # 人均未知的店铺不受人均上限过滤
+    assert names(feed(conn, max_price=100)) == ['片儿川', '无名小炒', '烤串']
+    assert names(feed(conn, keyword='西湖')) == ['西湖醋鱼', '龙井虾仁']
+    assert names(feed(conn, limit=2, offset=1)) == ['龙井虾仁', '片儿川']
+
+
+def test_feed_reads_the_index_in_order(conn):
+    plan = ' '.join(row[3] for row in conn.execute(
+        'EXPLAIN QUERY PLAN SELECT rowid FROM dishes d '
+        'ORDER BY d.shop_score DESC, d.recommendation_count DESC, d.rowid LIMIT 10'
+    ))
+    assert 'idx_dishes_feed' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_shop_score_follows_shop_changes(conn):
+    def score(dish):
+        return conn.execute('SELECT shop_score FROM dishes WHERE name = ?', (dish,)).fetchone()[0]
+
+    conn.execute("UPDATE shops SET score = 3.0 WHERE name = '湖畔居'")
+    assert score('西湖醋鱼') == 3.0
+    conn.execute("INSERT INTO shops (name, score) VALUES ('不存在的店', 4.9)")
+    assert score('无名小炒') == 4.9
+    conn.execute("UPDATE dishes SET shop_name = '巷口面馆' WHERE name = '烤串'")
+    assert score('烤串') == 4.2
+    conn.execute("DELETE FROM shops WHERE name = '巷口面馆'")
+    assert score('片儿川') == 0
+
+
+def test_migrate_replaces_generated_price_column(tmp_path):
+    db_path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(db_path)
+    for statement in CREATE_TABLES:
+        conn.execute(statement)
+    # 结构版本1的生成列：只去掉开头的符号，"人均消费：¥88" 解析不出数字
+    conn.execute(
+        "ALTER TABLE shops ADD COLUMN price_value REAL GENERATED ALWAYS AS ("
+        "CASE WHEN avg_price GLOB '*[0-9]*' THEN CAST(LTRIM(avg_price, '¥￥人均:： ') AS REAL) END) VIRTUAL"
+    )
+    conn.execute('CREATE INDEX idx_shops_price_value ON shops(price_value)')
+    conn.execute("INSERT INTO shops (name, avg_price, score) VALUES (' 湖畔居 ', '人均消费：¥88', 4.8)")
+    conn.execute("INSERT INTO dishes (name, recommendation_count, shop_name) VALUES ('西湖醋鱼', 5, '湖畔居 ')")
+    conn.execute('PRAGMA user_version = 1')
+    conn.commit()
+    conn.close()
+
+    migrate_file(db_path)
+
+    conn = sqlite3.connect(db_path)
+    columns = {row[1]: row[6] for row in conn.execute('PRAGMA table_xinfo(shops)')}
+    assert columns['price_value'] == 0
+    assert conn.execute('SELECT name, price_value FROM shops').fetchall() == [('湖畔居', 88.0)]
+    assert conn.execute('SELECT shop_name, shop_score FROM dishes').fetchall() == [('湖畔居', 4.8)]
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    conn.close()
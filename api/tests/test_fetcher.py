@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import fetcher
+from cache import SingleFlight
+from fetcher import ClientDisconnected, FetchEngine, FetchResult, wait_future
+
+URL = 'https://www.douguo.com/caipu/红烧肉'
+HTML_HEADERS = CaseInsensitiveDict({'Content-Type': 'text/html; charset=utf-8'})
+
+
+class FakeUpstream:
+    """代替 FetchEngine._fetch_once：记录调用次数，release() 之前请求一直进行中"""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.cancelled = 0
+        self.error = error
+        self._released = None
+
+    def release(self):
+        self._released.set()
+
+    async def __call__(self, url, headers, timeout):
+        if self._released is None:
+            self._released = asyncio.Event()
+        self.calls.append((url, headers))
+        try:
+            await self._released.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return FetchResult(200, HTML_HEADERS, url, f'第{len(self.calls)}次'.encode())
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    engine = FetchEngine()
+    fake = FakeUpstream()
+    monkeypatch.setattr(engine, '_fetch_once', fake)
+    return engine, fake
+
+
+async def settle():
+    """让已创建的协程都运行到等待点"""
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+# ---------- SingleFlight ----------
+
+def test_single_flight_first_caller_runs():
+    flights = SingleFlight()
+
+    flight, leader = flights.begin('key')
+    joined, follower = flights.begin('key')
+
+    assert leader is True
+    assert follower is False
+    assert joined is flight
+
+
+def test_single_flight_waiters_get_the_result():
+    flights = SingleFlight()
+    flight, _ = flights.begin('key')
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(flight.wait(5)))
+    waiter.start()
+
+    flights.finish('key', flight, value='页面')
+    waiter.join(5)
+
+    assert results == [(True, '页面')]
+    # 结束后同一个键重新开始
+    _, leader = flights.begin('key')
+    assert leader is True
+
+
+def test_single_flight_propagates_errors():
+    flights = SingleFlight()
+    flight, _ = flights.begin('key')
+    error = requests.ConnectionError('上游不可用')
+
+    flights.finish('key', flight, error=error)
+
+    with pytest.raises(requests.ConnectionError) as excinfo:
+        flight.wait(0)
+    assert excinfo.value is error
+
+
+def test_single_flight_wait_times_out():
+    flight, _ = SingleFlight().begin('key')
+
+    assert flight.wait(0.01) == (False, None)
+
+
+def test_single_flight_only_the_first_finish_counts():
+    flights = SingleFlight()
+    flight, _ = flights.begin('key')
+    flights.finish('key', flight, value='第一次')
+    flights.finish('key', flight, error=RuntimeError('第二次'))
+
+    assert flight.wait(0) == (True, '第一次')
+
+
+# ---------- flight_key ----------
+
+def test_flight_key_normalizes_url_and_ignores_header_case():
+    headers = {'User-Agent': 'ua', 'Referer': 'https://www.douguo.com/'}
+
+    assert FetchEngine.flight_key(URL, headers) == FetchEngine.flight_key(
+        URL, {'user-agent': 'ua', 'referer': 'https://www.douguo.com/', 'Accept': 'text/html'})
+
+
+@pytest.mark.parametrize('name', ['Cookie', 'Referer', 'User-Agent', 'Accept-Encoding'])
+def test_flight_key_separates_identity_headers(name):
+    assert FetchEngine.flight_key(URL, {name: 'a'}) != FetchEngine.flight_key(URL, {name: 'b'})
+    assert FetchEngine.flight_key(URL, {name: 'a'}) != FetchEngine.flight_key(URL)
+
+
+# ---------- fetch_async ----------
+
+def test_concurrent_identical_requests_share_one_fetch(upstream):
+    engine, fake = upstream
+
+    async def run():
+        tasks = [asyncio.ensure_future(engine.fetch_async(URL, {'User-Agent': 'ua'})) for _ in range(3)]
+        await settle()
+        fake.release()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(run())
+
+    assert len(fake.calls) == 1
+    assert {result.text for result in results} == {'第1次'}
+    assert engine._flights == {}
+
+
+def test_different_headers_are_not_coalesced(upstream):
+    engine, fake = upstream
+
+    async def run():
+        tasks = [asyncio.ensure_future(engine.fetch_async(URL, {'Cookie': cookie})) for cookie in ('a=1', 'a=2')]
+        await settle()
+        fake.release()
+        return await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert len(fake.calls) == 2
+
+
+def test_coalesce_false_always_fetches(upstream):
+    engine, fake = upstream
+
+    async def run():
+        shared = asyncio.ensure_future(engine.fetch_async(URL))
+        await settle()
+        alone = asyncio.ensure_future(engine.fetch_async(URL, coalesce=False))
+        await settle()
+        fake.release()
+        return await asyncio.gather(shared, alone)
+
+    asyncio.run(run())
+
+    assert len(fake.calls) == 2
+
+
+def test_errors_reach_every_waiter(monkeypatch):
+    engine = FetchEngine()
+    fake = FakeUpstream(error=requests.ConnectionError('连接失败'))
+    monkeypatch.setattr(engine, '_fetch_once', fake)
+
+    async def run():
+        tasks = [asyncio.ensure_future(engine.fetch_async(URL)) for _ in range(2)]
+        await settle()
+        fake.release()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert len(fake.calls) == 1
+    assert all(isinstance(result, requests.ConnectionError) for result in results)
+
+
+def test_request_survives_while_someone_still_waits(upstream):
+    engine, fake = upstream
+
+    async def run():
+        first = asyncio.ensure_future(engine.fetch_async(URL))
+        second = asyncio.ensure_future(engine.fetch_async(URL))
+        await settle()
+        first.cancel()
+        await settle()
+        fake.release()
+        return await second
+
+    result = asyncio.run(run())
+
+    assert fake.cancelled == 0
+    assert result.text == '第1次'
+
+
+def test_request_is_cancelled_when_every_waiter_gives_up(upstream):
+    engine, fake = upstream
+
+    async def run():
+        tasks = [asyncio.ensure_future(engine.fetch_async(URL)) for _ in range(2)]
+        await settle()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await settle()
+
+    asyncio.run(run())
+
+    assert fake.cancelled == 1
+    assert engine._flights == {}
+
+
+def test_joined_waiter_times_out_on_its_own(upstream):
+    engine, fake = upstream
+
+    async def run():
+        leader = asyncio.ensure_future(engine.fetch_async(URL, timeout=15))
+        await settle()
+        with pytest.raises(requests.Timeout):
+            await engine.fetch_async(URL, timeout=0.01)
+        # 后加入的调用超时不影响先发起的请求
+        fake.release()
+        return await leader
+
+    result = asyncio.run(run())
+
+    assert fake.cancelled == 0
+    assert result.text == '第1次'
+
+
+def test_sync_fetch_runs_on_the_engine_loop(monkeypatch):
+    engine = FetchEngine()
+
+    async def fetch_once(url, headers, timeout):
+        return FetchResult(200, HTML_HEADERS, url, '红烧肉'.encode())
+
+    monkeypatch.setattr(engine, '_fetch_once', fetch_once)
+    try:
+        assert engine.fetch(URL).text == '红烧肉'
+    finally:
+        engine.stop()
+
+
+# ---------- 客户端断开 ----------
+
+@pytest.fixture
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(fetcher, 'DISCONNECT_POLL_INTERVAL', 0.01)
+
+
+def test_wait_future_cancels_when_the_client_disconnects(fast_poll):
+    future = concurrent.futures.Future()
+
+    with pytest.raises(ClientDisconnected):
+        wait_future(future, 5, lambda: True)
+
+    assert future.cancelled()
+
+
+def test_wait_future_returns_the_result_while_connected(fast_poll):
+    future = concurrent.futures.Future()
+    threading.Timer(0.05, future.set_result, ['页面']).start()
+
+    assert wait_future(future, 5, lambda: False) == '页面'
+
+
+def test_wait_future_still_times_out(fast_poll):
+    with pytest.raises(concurrent.futures.TimeoutError):
+        wait_future(concurrent.futures.Future(), 0.05, lambda: False)
+
+
+def test_sync_fetch_cancels_the_upstream_request_on_disconnect(upstream, fast_poll):
+    engine, fake = upstream
+    checks = []
+
+    def is_disconnected():
+        checks.append(1)
+        return len(checks) >= 3
+
+    try:
+        with pytest.raises(ClientDisconnected):
+            engine.fetch(URL, is_disconnected=is_disconnected)
+        deadline = time.monotonic() + 5
+        while fake.cancelled == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        engine.stop()
+
+    assert len(fake.calls) == 1
+    assert fake.cancelled == 1
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+import geo
+from geo import KNN_START_RADIUS, MAX_RADIUS, METERS_PER_DEGREE, haversine, nearby_dishes, nearby_shops, wgs84_to_gcj02
+
+CENTER = (30.274, 120.155)
+
+# 店铺到中心点的距离（米，正北方向）
+SHOP_DISTANCES = {'近店': 300, '次近店': 1500, '远店': 3500, '城外店': 40000}
+
+SHOPS = [[name, '', f'地址{i}', '', '', '4.5'] for i, name in enumerate(SHOP_DISTANCES)] + [['没有坐标', '', '', '', '', '4.9']]
+DISHES = [
+    ['片儿川', '', '900', '次近店'],
+    ['葱包桧', '', '100', '近店'],
+    ['小笼包', '', '300', '近店'],
+    ['烤串', '', '50', '城外店'],
+]
+
+
+@pytest.fixture
+def db_path(catalog):
+    db_path = catalog(SHOPS, DISHES)
+    conn = sqlite3.connect(db_path)
+    for name, distance in SHOP_DISTANCES.items():
+        conn.execute('UPDATE shops SET lat = ?, lon = ? WHERE name = ?',
+                     (CENTER[0] + distance / METERS_PER_DEGREE, CENTER[1], name))
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def radii(monkeypatch):
+    """记录每次半径查询用的半径"""
+    calls = []
+    real_within = geo._within
+
+    def within(conn, lat, lon, radius):
+        calls.append(radius)
+        return real_within(conn, lat, lon, radius)
+
+    monkeypatch.setattr(geo, '_within', within)
+    return calls
+
+
+def names(rows):
+    return [row['name'] for _, row in rows]
+
+
+# ---------- 坐标转换 ----------
+
+@pytest.mark.parametrize('wgs84, gcj02', [
+    # 与常用的 coordtransform 实现（wgs84togcj02）结果一致
+    ((39.915, 116.404), (39.91640428150164, 116.41024449916938)),
+    ((30.274, 120.155), (30.27167139097357, 120.15969475912149)),
+])
+def test_wgs84_to_gcj02_reference_points(wgs84, gcj02):
+    lat, lon = wgs84_to_gcj02(*wgs84)
+
+    assert lat == pytest.approx(gcj02[0], abs=1e-9)
+    assert lon == pytest.approx(gcj02[1], abs=1e-9)
+    # 国内偏移约数百米
+    assert 100 < haversine(*wgs84, lat, lon) < 1000
+
+
+@pytest.mark.parametrize('point', [(48.8566, 2.3522), (40.7128, -74.0060), (-33.8688, 151.2093)])
+def test_points_outside_china_are_unchanged(point):
+    assert wgs84_to_gcj02(*point) == point
+
+
+def test_haversine():
+    assert haversine(*CENTER, *CENTER) == 0
+    assert haversine(30.0, 120.0, 31.0, 120.0) == pytest.approx(111195, rel=1e-3)
+
+
+# ---------- 附近查询 ----------
+
+def test_radius_query_filters_by_distance(conn, radii):
+    rows = nearby_shops(conn, *CENTER, radius=2000)
+
+    assert names(rows) == ['近店', '次近店']
+    assert [distance for distance, _ in rows] == pytest.approx([300, 1500], rel=0.01)
+    assert radii == [2000]
+
+
+def test_knn_doubles_the_radius_until_enough_shops(conn, radii):
+    rows = nearby_shops(conn, *CENTER, limit=3)
+
+    assert names(rows) == ['近店', '次近店', '远店']
+    assert radii == [KNN_START_RADIUS, 2 * KNN_START_RADIUS, 4 * KNN_START_RADIUS]
+
+
+def test_knn_stops_at_the_first_radius_with_enough_shops(conn, radii):
+    assert names(nearby_shops(conn, *CENTER, limit=1)) == ['近店']
+    assert radii == [KNN_START_RADIUS]
+
+
+def test_knn_gives_up_at_max_radius(conn, radii):
+    rows = nearby_shops(conn, *CENTER, limit=10)
+
+    # 没有坐标的店铺不在空间索引中
+    assert names(rows) == ['近店', '次近店', '远店', '城外店']
+    assert radii[-1] == MAX_RADIUS
+    assert radii == sorted(set(radii))
+    assert all(b == min(a * 2, MAX_RADIUS) for a, b in zip(radii, radii[1:]))
+
+
+def test_nearby_dishes_order_by_shop_distance_then_recommendations(conn):
+    rows = nearby_dishes(conn, nearby_shops(conn, *CENTER, limit=3))
+
+    assert names(rows) == ['小笼包', '葱包桧', '片儿川']
+    assert [distance for distance, _ in rows] == pytest.approx([300, 300, 1500], rel=0.01)
+
+
+# ---------- 接口参数 ----------
+
+@pytest.fixture
+def client(db_app, db_path):
+    return db_app(db_path).app.test_client()
+
+
+def test_route_accepts_lng_alias(client):
+    payload = client.get('/api/shops', query_string={'lat': CENTER[0], 'lng': CENTER[1],
+                                                     'coord': 'gcj02', 'limit': 2}).get_json()
+
+    assert [shop['店名'] for shop in payload['data']] == ['近店', '次近店']
+    assert payload['center'] == {'lat': CENTER[0], 'lon': CENTER[1], 'coord': 'gcj02'}
+
+
+@pytest.mark.parametrize('path', ['/api/shops', '/api/dishes'])
+@pytest.mark.parametrize('params', [
+    {'lat': '30.27'},
+    {'lng': '120.15'},
+    {'lat': 'abc', 'lon': '120.15'},
+    {'lat': '30.27', 'lon': 'nan'},
+    {'lat': '95', 'lon': '120.15'},
+    {'lat': '30.27', 'lon': '-181'},
+    {'lat': '30.27', 'lon': '120.15', 'radius': 'far'},
+    {'lat': '30.27', 'lon': '120.15', 'radius': '0'},
+    {'lat': '30.27', 'lon': '120.15', 'radius': str(MAX_RADIUS + 1)},
+    {'lat': '30.27', 'lon': '120.15', 'limit': 'ten'},
+    {'lat': '30.27', 'lon': '120.15', 'limit': '0'},
+    {'lat': '30.27', 'lon': '120.15', 'coord': 'bd09'},
+    {'limit': '1001'},
+    {'limit': '-5'},
+    {'limit': '2.5'},
+    {'offset': '-1'},
+    {'offset': 'x'},
+])
+def test_route_rejects_invalid_parameters(client, path, params):
+    response = client.get(path, query_string=params)
+
+    assert response.status_code == 400
+    payload = response.get_json()
+    assert payload['success'] is False
+    assert payload['error']
+
+
+def test_route_keeps_defaults_for_missing_parameters(client):
+    payload = client.get('/api/shops', query_string={'limit': '', 'offset': ''}).get_json()
+
+    assert payload['success'] is True
+    assert payload['limit'] == 100
+    assert payload['offset'] == 0
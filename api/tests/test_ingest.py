@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+from ingest import ingest, parse_count, parse_score
+
+SHOP_HEADER = ['店名', '人均消费', '地址', '电话', '详情页', '评分score']
+DISH_HEADER = ['菜品名称', '菜品图片url', '菜品推荐人数', '店名']
+
+SHOPS = [
+    ['湖畔居', '¥120', '西湖区1号', '0571-1', 'https://example.com/1', '4.8'],
+    ['巷口面馆', '¥25', '上城区2号', '', '', '4.2'],
+]
+DISHES = [
+    ['龙井虾仁', 'a.jpg', '300', '湖畔居'],
+    ['片儿川', 'b.jpg', '1.2万', '巷口面馆'],
+    ['炒年糕', 'c.jpg', '', ''],
+]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'data.db')
+
+
+def rows(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('text, expected', [('1.2万', 12000), ('356', 356), ('约 80 人推荐', 80), ('', 0), (None, 0)])
+def test_parse_count(text, expected):
+    assert parse_count(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [('4.5', 4.5), ('4.5分', 4.5), ('', None)])
+def test_parse_score(text, expected):
+    assert parse_score(text) == expected
+
+
+def test_first_import_inserts_everything(db_path, write_csv):
+    stats = ingest(db_path, write_csv('s.csv', SHOP_HEADER, SHOPS), write_csv('d.csv', DISH_HEADER, DISHES))
+
+    assert stats['shops'] == stats['shops_changed'] == 2
+    assert stats['dishes'] == stats['dishes_changed'] == 3
+    assert rows(db_path, 'SELECT name, recommendation_count, shop_name FROM dishes ORDER BY rowid') == [
+        ('龙井虾仁', 300, '湖畔居'), ('片儿川', 12000, '巷口面馆'), ('炒年糕', 0, ''),
+    ]
+    assert rows(db_path, 'SELECT score, price_value FROM shops ORDER BY rowid') == [(4.8, 120.0), (4.2, 25.0)]
+
+
+def test_reimport_only_touches_changed_rows(db_path, write_csv):
+    shops = write_csv('s.csv', SHOP_HEADER, SHOPS)
+    ingest(db_path, shops, write_csv('d.csv', DISH_HEADER, DISHES))
+
+    # 店名为空的菜品每次导入都应命中同一行，而不是再插入一条
+    changed = DISHES[:2] + [['炒年糕', 'c2.jpg', '15', ''], ['定胜糕', 'e.jpg', '40', '巷口面馆']]
+    stats = ingest(db_path, shops, write_csv('d2.csv', DISH_HEADER, changed))
+
+    assert stats['shops_changed'] == 0
+    assert stats['dishes_changed'] == 2
+    assert rows(db_path, "SELECT image_url, recommendation_count FROM dishes WHERE name = '炒年糕'") == [('c2.jpg', 15)]
+    assert rows(db_path, 'SELECT COUNT(*) FROM dishes')[0][0] == 4
+
+
+def test_prune_removes_rows_missing_from_csv(db_path, write_csv):
+    ingest(db_path, write_csv('s.csv', SHOP_HEADER, SHOPS), write_csv('d.csv', DISH_HEADER, DISHES))
+
+    stats = ingest(db_path, write_csv('s2.csv', SHOP_HEADER, SHOPS[:1]),
+                   write_csv('d2.csv', DISH_HEADER, [DISHES[0], DISHES[2]]), prune=True)
+
+    assert stats['shops_removed'] == 1
+    assert stats['dishes_removed'] == 1
+    assert rows(db_path, 'SELECT name FROM dishes ORDER BY rowid') == [('龙井虾仁',), ('炒年糕',)]
+    # 派生表随之更新
+    assert rows(db_path, 'SELECT shop_name, total FROM shop_rankings ORDER BY shop_name') == [('', 0), ('湖畔居', 300)]
+
+
+def test_prune_collects_keys_across_batches(db_path, write_csv):
+    shops = SHOPS + [['夜宵摊', '', '拱墅区', '', '', '3.9']]
+    dishes = DISHES + [['片儿川', 'd.jpg', '50', '湖畔居'], ['烤串', 'e.jpg', '20', '夜宵摊']]
+    ingest(db_path, write_csv('s.csv', SHOP_HEADER, shops), write_csv('d.csv', DISH_HEADER, dishes))
+
+    # 每批1行：出现过的键分多批写入临时表，重复行只记录一次
+    kept_dishes = [DISHES[1], DISHES[1], dishes[3], dishes[4]]
+    stats = ingest(db_path, write_csv('s2.csv', SHOP_HEADER, [shops[1], shops[2], shops[1]]),
+                   write_csv('d2.csv', DISH_HEADER, kept_dishes), batch_size=1, prune=True)
+
+    assert stats['shops_removed'] == 1
+    assert stats['dishes_removed'] == 2
+    assert rows(db_path, 'SELECT name FROM shops ORDER BY rowid') == [('巷口面馆',), ('夜宵摊',)]
+    # 同名菜品按 (店名, 菜名) 区分：巷口面馆和湖畔居的片儿川都保留
+    assert rows(db_path, 'SELECT shop_name, name FROM dishes ORDER BY rowid') == [
+        ('巷口面馆', '片儿川'), ('湖畔居', '片儿川'), ('夜宵摊', '烤串'),
+    ]
+
+
+def test_prune_only_touches_imported_tables(db_path, write_csv):
+    ingest(db_path, write_csv('s.csv', SHOP_HEADER, SHOPS), write_csv('d.csv', DISH_HEADER, DISHES))
+
+    stats = ingest(db_path, write_csv('s2.csv', SHOP_HEADER, SHOPS[:1]), None, prune=True)
+
+    assert stats['shops_removed'] == 1
+    assert 'dishes_removed' not in stats
+    assert rows(db_path, 'SELECT COUNT(*) FROM dishes')[0][0] == 3
+
+
+def test_prune_tables_are_temporary(db_path, write_csv):
+    shops = write_csv('s.csv', SHOP_HEADER, SHOPS)
+    dishes = write_csv('d.csv', DISH_HEADER, DISHES)
+
+    # 临时表只存在于导入连接中，连续导入不会因表已存在而失败，也不会留在 data.db 里
+    ingest(db_path, shops, dishes, prune=True)
+    stats = ingest(db_path, shops, dishes, prune=True)
+
+    assert stats['shops_removed'] == stats['dishes_removed'] == 0
+    assert rows(db_path, "SELECT name FROM sqlite_master WHERE name LIKE 'seen_%'") == []
+
+
+def test_existing_null_shop_names_are_normalized(db_path, write_csv):
+    dishes = write_csv('d.csv', DISH_HEADER, DISHES)
+    ingest(db_path, write_csv('s.csv', SHOP_HEADER, SHOPS), dishes)
+    conn = sqlite3.connect(db_path)
+    conn.execute('DROP INDEX ux_dishes_shop_dish')
+    conn.execute("INSERT INTO dishes (name, image_url, recommendation_count, shop_name) VALUES ('炒年糕', 'old.jpg', 1, NULL)")
+    conn.execute("INSERT INTO dishes (name, image_url, recommendation_count, shop_name) VALUES ('炒年糕', 'old.jpg', 2, NULL)")
+    conn.commit()
+    conn.close()
+
+    ingest(db_path, None, dishes)
+
+    assert rows(db_path, "SELECT quote(shop_name), image_url FROM dishes WHERE name = '炒年糕'") == [("''", 'c.jpg')]
+
+
+def test_address_change_clears_coordinates(db_path, write_csv):
+    ingest(db_path, write_csv('s.csv', SHOP_HEADER, SHOPS), None)
+    conn = sqlite3.connect(db_path)
+    conn.execute('UPDATE shops SET lat = 30.25, lon = 120.15')
+    conn.commit()
+    conn.close()
+
+    moved = [SHOPS[0][:2] + ['滨江区3号'] + SHOPS[0][3:], SHOPS[1]]
+    ingest(db_path, write_csv('s2.csv', SHOP_HEADER, moved), None)
+
+    assert rows(db_path, 'SELECT name, lat, lon FROM shops ORDER BY rowid') == [
+        ('湖畔居', None, None), ('巷口面馆', 30.25, 120.15),
+    ]
+
+
+def test_failed_import_rolls_back(db_path, write_csv):
+    ingest(db_path, write_csv('s.csv', SHOP_HEADER, SHOPS), None)
+
+    with pytest.raises(ValueError):
+        ingest(db_path, write_csv('s2.csv', SHOP_HEADER, SHOPS + [['新店', '', '', '', '', '']]),
+               write_csv('bad.csv', ['菜品名称'], [['缺少店名列']]))
+
+    assert rows(db_path, 'SELECT COUNT(*) FROM shops')[0][0] == 2
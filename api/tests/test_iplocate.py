@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+import requests
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import iplocate
+from iplocate import SELF_IP, IpLocator, IpQuotaExceeded, _Quota, ip_prefix, normalize_client_ip
+
+
+def located(ip):
+    return {'status': 'success', 'query': ip or '1.2.3.4', 'regionName': '浙江省', 'city': '杭州市'}
+
+
+class FakeResponse:
+    def __init__(self, payload, headers=None, status_code=200):
+        self.payload = payload
+        self.headers = headers or {}
+        self.status_code = status_code
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} Error')
+
+
+class FakeSession:
+    """代替 ip-api.com：记录单个查询和批量查询"""
+
+    def __init__(self, headers=None, error=None):
+        self.singles = []
+        self.batches = []
+        self.headers = headers or {}
+        self.error = error
+
+    def get(self, url, **kwargs):
+        if self.error is not None:
+            raise self.error
+        ip = url.rsplit('/', 1)[1]
+        self.singles.append(ip)
+        return FakeResponse(located(ip), self.headers)
+
+    def post(self, url, json, **kwargs):
+        if self.error is not None:
+            raise self.error
+        self.batches.append(list(json))
+        return FakeResponse([located(ip) for ip in json], self.headers)
+
+
+@pytest.fixture
+def locator():
+    locator = IpLocator(batch_window=0.1)
+    locator._session = FakeSession()
+    return locator
+
+
+def lookup_all(locator, ips, **kwargs):
+    """并发查询，按顺序返回结果（或异常）"""
+    results = [None] * len(ips)
+
+    def run(index, ip):
+        try:
+            results[index] = locator.lookup(ip, **kwargs)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=run, args=(i, ip)) for i, ip in enumerate(ips)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+# ---------- IP规范化 ----------
+
+@pytest.mark.parametrize('ip, expected', [
+    ('115.236.10.5', '115.236.10.5'),
+    (' 115.236.10.5 ', '115.236.10.5'),
+    ('240E:3B0::0001', '240e:3b0::1'),
+    ('127.0.0.1', SELF_IP),
+    ('192.168.1.20', SELF_IP),
+    ('10.0.0.8', SELF_IP),
+    ('::1', SELF_IP),
+    ('fe80::1', SELF_IP),
+    ('not-an-ip', SELF_IP),
+    (None, SELF_IP),
+])
+def test_normalize_client_ip(ip, expected):
+    assert normalize_client_ip(ip) == expected
+
+
+@pytest.mark.parametrize('ip, expected', [
+    ('115.236.10.5', '115.236.10.0/24'),
+    ('240e:3b0:1234:5678::1', '240e:3b0:1234::/48'),
+    (SELF_IP, 'self'),
+])
+def test_ip_prefix(ip, expected):
+    assert ip_prefix(ip) == expected
+
+
+# ---------- 合并与批量 ----------
+
+def test_single_ip_uses_the_single_endpoint(locator):
+    assert locator.lookup('115.236.10.5') == located('115.236.10.5')
+
+    assert locator._session.singles == ['115.236.10.5']
+    assert locator._session.batches == []
+
+
+def test_concurrent_ips_are_batched(locator):
+    ips = ['115.236.10.5', '115.236.10.6', '36.27.1.1']
+
+    results = lookup_all(locator, ips)
+
+    assert results == [located(ip) for ip in ips]
+    assert len(locator._session.batches) == 1
+    assert sorted(locator._session.batches[0]) == sorted(ips)
+
+
+def test_same_ip_is_queried_once(locator):
+    results = lookup_all(locator, ['115.236.10.5'] * 5)
+
+    assert results == [located('115.236.10.5')] * 5
+    assert locator._session.singles == ['115.236.10.5']
+
+
+def test_self_lookup_is_queried_separately(locator):
+    results = lookup_all(locator, [SELF_IP, '115.236.10.5', '36.27.1.1'])
+
+    assert all(result['status'] == 'success' for result in results)
+    # 服务器自身只能用单个查询（空路径），其余IP合并为一批
+    assert locator._session.singles == ['']
+    assert [sorted(batch) for batch in locator._session.batches] == [['115.236.10.5', '36.27.1.1']]
+
+
+def test_request_errors_reach_every_waiter(locator):
+    locator._session = FakeSession(error=requests.ConnectionError('连接失败'))
+
+    results = lookup_all(locator, ['115.236.10.5', '36.27.1.1'])
+
+    assert all(isinstance(result, requests.ConnectionError) for result in results)
+    assert locator._pending == {}
+
+
+# ---------- 配额 ----------
+
+def test_quota_follows_response_headers(monkeypatch, clock):
+    monkeypatch.setattr(iplocate, 'time', clock)
+    quota = _Quota(45)
+
+    quota.consume({'X-Rl': '0', 'X-Ttl': '20'})
+    assert quota.wait_time() == 20
+    clock.advance(20)
+    assert quota.wait_time() == 0.0
+    assert quota.remaining == 45
+
+
+def test_spent_single_quota_falls_back_to_the_batch_endpoint(locator):
+    locator._single_quota = _Quota(1, window=60)
+    locator._single_quota.consume({})
+
+    assert locator.lookup('115.236.10.5') == located('115.236.10.5')
+
+    assert locator._session.singles == []
+    assert locator._session.batches == [['115.236.10.5']]
+
+
+def test_spent_quota_fails_fast_without_queueing(locator):
+    locator._single_quota = _Quota(1, window=60)
+    locator._batch_quota = _Quota(1, window=60)
+    locator._single_quota.consume({})
+    locator._batch_quota.consume({})
+
+    started = time.monotonic()
+    with pytest.raises(IpQuotaExceeded) as excinfo:
+        locator.lookup('115.236.10.5', max_wait=5)
+
+    assert time.monotonic() - started < 1
+    assert 55 <= excinfo.value.retry_after <= 60
+    assert locator._pending == {}
+    assert locator._queue.empty()
+
+
+def test_wait_covers_a_short_quota_window(locator):
+    # 配额0.3秒后恢复：调用方等到配额恢复后的结果，而不是先按0.1秒超时
+    locator._single_quota = _Quota(1, window=0.3)
+    locator._single_quota.consume({})
+    locator._batch_quota = _Quota(1, window=0.3)
+    locator._batch_quota.consume({})
+
+    assert locator.lookup(SELF_IP, timeout=0.1, max_wait=1) == located(SELF_IP)
+    assert locator._session.singles == ['']
+
+
+# ---------- /api/ip-location ----------
+
+@pytest.fixture
+def app_module(monkeypatch, locator):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'ip_locator', locator)
+    app_module.page_cache.clear()
+    yield app_module
+    app_module.page_cache.clear()
+
+
+def test_route_ignores_forwarded_for_without_trusted_proxies(app_module):
+    client = app_module.app.test_client()
+
+    response = client.get('/api/ip-location', headers={'X-Forwarded-For': '8.8.8.8'},
+                          environ_base={'REMOTE_ADDR': '115.236.10.5'})
+
+    assert response.status_code == 200
+    assert response.get_json()['ip'] == '115.236.10.5'
+    assert app_module.ip_locator._session.singles == ['115.236.10.5']
+
+
+def test_route_takes_only_the_trusted_hop(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.app, 'wsgi_app', ProxyFix(app_module.app.wsgi_app, x_for=1))
+    client = app_module.app.test_client()
+
+    # 客户端自己填写的 8.8.8.8 在最左边，只信任代理追加的最后一个地址
+    response = client.get('/api/ip-location', headers={'X-Forwarded-For': '8.8.8.8, 115.236.10.5'},
+                          environ_base={'REMOTE_ADDR': '10.0.0.2'})
+
+    assert response.get_json()['ip'] == '115.236.10.5'
+
+
+def test_route_returns_429_when_the_quota_is_spent(app_module):
+    app_module.ip_locator._single_quota = _Quota(1, window=60)
+    app_module.ip_locator._batch_quota = _Quota(1, window=60)
+    app_module.ip_locator._single_quota.consume({})
+    app_module.ip_locator._batch_quota.consume({})
+    client = app_module.app.test_client()
+
+    response = client.get('/api/ip-location', environ_base={'REMOTE_ADDR': '115.236.10.5'})
+
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    assert response.get_json()['status'] == -1
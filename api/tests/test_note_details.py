@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """代替 load_note_detail：记录调用；gates 中的URL等到对应事件被设置后才返回"""
+    calls = []
+    gates = {}
+
+    def load(url):
+        calls.append(url)
+        gate = gates.get(url)
+        if gate is not None:
+            assert gate.wait(5)
+        if 'missing' in url:
+            return {'error': '服务器返回错误: 404', 'type': 'error'}, 404
+        return {'title': f'标题 {url}', 'url': url}, 200
+
+    monkeypatch.setattr(app_module, 'load_note_detail', load)
+    load.calls = calls
+    load.gates = gates
+    return load
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(app_module, 'note_executor', executor)
+    yield executor
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+def post(urls, **kwargs):
+    return app_module.app.test_client().post('/api/note-details', json={'urls': urls}, **kwargs)
+
+
+def lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'urls': []},
+    {'urls': 'https://example.com/1'},
+    {'urls': ['https://example.com/1', 2]},
+    {'urls': [f'https://example.com/{i}' for i in range(app_module.MAX_NOTE_BATCH + 1)]},
+])
+def test_rejects_invalid_batches(loads, executor, body):
+    response = app_module.app.test_client().post('/api/note-details', json=body)
+
+    assert response.status_code == 400
+    assert response.get_json()['error']
+    assert loads.calls == []
+
+
+def test_streams_one_line_per_url(loads, executor):
+    urls = ['https://example.com/1', ' https://example.com/2 ', '', 'https://example.com/missing']
+
+    response = post(urls)
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert response.headers['X-Accel-Buffering'] == 'no'
+    by_index = {item['index']: item for item in lines(response)}
+    assert sorted(by_index) == [0, 1, 2, 3]
+    assert by_index[0] == {'index': 0, 'url': 'https://example.com/1', 'status': 200,
+                           'data': {'title': '标题 https://example.com/1', 'url': 'https://example.com/1'}}
+    assert by_index[1]['url'] == 'https://example.com/2'
+    assert by_index[2] == {'index': 2, 'url': '', 'status': 400, 'data': {'error': '笔记URL不能为空'}}
+    assert by_index[3]['status'] == 404
+
+
+def test_duplicate_urls_are_fetched_once(loads, executor):
+    response = post(['https://example.com/1', 'https://example.com/1 ', 'https://example.com/2'])
+
+    items = lines(response)
+    assert loads.calls.count('https://example.com/1') == 1
+    assert sorted(item['index'] for item in items if item['url'] == 'https://example.com/1') == [0, 1]
+    assert len(items) == 3
+
+
+def test_finished_notes_are_sent_first(loads, executor):
+    slow = threading.Event()
+    loads.gates['https://example.com/slow'] = slow
+
+    response = post(['https://example.com/slow', 'https://example.com/fast'], buffered=False)
+    stream = response.response
+    first = json.loads(next(iter(stream)))
+
+    # 慢的一篇还没返回时，快的一篇已经送达
+    assert first['url'] == 'https://example.com/fast'
+    assert first['index'] == 1
+    slow.set()
+    rest = [json.loads(line) for line in stream]
+    assert [item['url'] for item in rest] == ['https://example.com/slow']
+    response.close()
+
+
+def test_closing_the_stream_cancels_pending_notes(loads, monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(app_module, 'note_executor', executor)
+    blocked = threading.Event()
+    loads.gates['https://example.com/2'] = blocked
+    try:
+        response = post(['https://example.com/1', 'https://example.com/2', 'https://example.com/3'], buffered=False)
+        stream = iter(response.response)
+        assert json.loads(next(stream))['url'] == 'https://example.com/1'
+        for _ in range(500):
+            if len(loads.calls) == 2:
+                break
+            time.sleep(0.01)
+
+        # 客户端断开：第2篇正在获取，第3篇还在排队
+        response.close()
+        blocked.set()
+    finally:
+        executor.shutdown(wait=True)
+
+    assert loads.calls == ['https://example.com/1', 'https://example.com/2']
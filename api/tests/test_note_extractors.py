@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+import note_extractors
+from note_extractors import (
+    BAIDU_REDIRECT_NOTICE,
+    GENERIC_EXTRACTOR,
+    BaiduNoteExtractor,
+    CtripExtractor,
+    DianpingExtractor,
+    NoteExtractor,
+    extractor_for,
+    parse_html,
+    register_extractor,
+)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('https://m.dianping.com/ugcdetail/123', DianpingExtractor),
+    ('https://m.ctrip.com/webapp/you/tripshoot/1', CtripExtractor),
+    ('https://mbd.baidu.com/newspage/data/landingsuper?id=1', BaiduNoteExtractor),
+    ('https://a.m.dianping.com/note/1', DianpingExtractor),
+])
+def test_extractor_for_matches_domain_and_subdomains(url, expected):
+    assert type(extractor_for(url)) is expected
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.dianping.com/note/1',
+    'https://evil-m.dianping.com.example.com/',
+    'https://notm.ctrip.com/',
+    'not a url',
+])
+def test_extractor_for_falls_back_to_generic(url):
+    assert extractor_for(url) is GENERIC_EXTRACTOR
+
+
+def test_register_extractor_takes_precedence(monkeypatch):
+    monkeypatch.setattr(note_extractors, 'NOTE_EXTRACTORS', list(note_extractors.NOTE_EXTRACTORS))
+
+    class CustomDianping(NoteExtractor):
+        name = 'custom'
+        domains = ('dianping.com',)
+
+    custom = register_extractor(CustomDianping())
+
+    assert extractor_for('https://m.dianping.com/ugcdetail/1') is custom
+    assert extractor_for('https://m.ctrip.com/x') is not custom
+
+
+def test_dianping_reads_next_data_json():
+    result = DianpingExtractor().extract(fixture('dianping_note.html'), {'url': 'https://m.dianping.com/ugcdetail/1'})
+
+    assert result == {
+        'type': 'dianping',
+        'title': '杭州必吃的面馆',
+        'content': '片儿川汤头鲜美，浇头足。',
+        'source': '吃货小王',
+        'images': ['https://img.dianping.com/1.jpg', 'https://img.dianping.com/2.jpg'],
+    }
+
+
+def test_dianping_labels_baidu_redirects():
+    result = DianpingExtractor().extract(fixture('dianping_note.html'),
+                                         {'url': 'https://m.dianping.com/ugcdetail/1', 'from_baidu': True})
+
+    assert result['source'] == '吃货小王 (百度笔记 → 大众点评)'
+
+
+def test_dianping_without_json_needs_jump():
+    result = DianpingExtractor().extract('<html><body>加载中</body></html>', {'url': 'https://m.dianping.com/'})
+
+    assert result == {'type': 'dianping', 'error': '无法提取笔记内容', 'needJump': True}
+
+
+def test_dianping_with_broken_json_reports_parse_error():
+    page = '<script id="__NEXT_DATA__" type="application/json">{"props": </script>'
+    result = DianpingExtractor().extract(page, {'url': 'https://m.dianping.com/'})
+
+    assert result['type'] == 'parse_error'
+    assert result['error'].startswith('解析失败')
+
+
+def test_ctrip_fast_path_reads_title_and_description():
+    result = CtripExtractor().extract(fixture('ctrip_note.html'), {'url': 'https://m.ctrip.com/x'})
+
+    assert result == {
+        'type': 'ctrip',
+        'source': '携程旅行',
+        'title': '西湖边的小吃 - 携程旅行',
+        'content': '在西湖边找到的几家老字号小吃店，&值得一试',
+        'needJump': True,
+    }
+
+
+def test_ctrip_soup_fallback_matches_fast_path():
+    extractor = CtripExtractor()
+    page = fixture('ctrip_note.html')
+
+    from_soup = extractor.from_soup(parse_html(page, extractor.parse_only), {})
+
+    assert from_soup == extractor.fast_path(page, {})
+
+
+def test_ctrip_without_description_uses_default_content():
+    result = CtripExtractor().extract('<html><head><title>携程</title></head></html>', {'url': 'https://m.ctrip.com/x'})
+
+    assert result['title'] == '携程'
+    assert result['content'] == '该笔记来自携程旅行，为了获得最佳体验，建议前往原网站查看。'
+    assert result['needJump'] is True
+
+
+def test_baidu_note_reads_content_and_images():
+    extractor = BaiduNoteExtractor()
+    page = fixture('baidu_note.html')
+
+    assert not extractor.is_blocked(page)
+    result = extractor.extract(page, {'url': 'https://mbd.baidu.com/newspage/1'})
+
+    assert result == {
+        'type': 'baidu',
+        'source': '百度笔记',
+        'title': '杭州人私藏的早餐店',
+        'content': '第一家：巷子里的葱包桧，现做现卖。\n\n第二家：老字号的小笼包，汤汁饱满。',
+        # 图标、logo、头像不算正文图片；协议相对和站内路径补全为绝对地址
+        'images': ['https://pic.baidu.com/note/1.jpg', 'https://mbd.baidu.com/note/2.jpg'],
+    }
+
+
+@pytest.mark.parametrize('page', [
+    '<html><body>请完成安全验证</body></html>' + ' ' * 3000,
+    '<html><body>request timeout</body></html>' + ' ' * 3000,
+    '<html><body>太短</body></html>',
+])
+def test_baidu_note_detects_blocked_pages(page):
+    assert BaiduNoteExtractor().is_blocked(page)
+
+
+def test_baidu_note_without_content_needs_jump():
+    result = BaiduNoteExtractor().extract('<html><body><div></div></body></html>', {'url': 'https://mbd.baidu.com/'})
+
+    assert result['needJump'] is True
+    assert result['error'] == '内容解析失败，建议前往原网站查看'
+
+
+@pytest.mark.parametrize('url, source', [
+    ('https://www.xiaohongshu.com/explore/1', '百度笔记 → 小红书'),
+    ('https://xhslink.com/a/1', '百度笔记 → 小红书'),
+    ('https://you.ctrip.com/travels/1', '百度笔记 → 携程旅行'),
+    ('https://www.example.com/note/1', '百度笔记'),
+])
+def test_baidu_redirect_notice_names_the_source(url, source):
+    result = BAIDU_REDIRECT_NOTICE.extract(fixture('xiaohongshu_note.html'), {'url': url})
+
+    assert result['type'] == 'baidu_redirect'
+    assert result['title'] == '西湖醋鱼到底好不好吃 - 小红书'
+    assert result['source'] == source
+    assert result['needJump'] is True
+
+
+def test_generic_extractor_reads_title_and_paragraphs():
+    result = GENERIC_EXTRACTOR.extract(fixture('generic_note.html'), {'url': 'https://www.example.com/note/1'})
+
+    # 没有段落的 .content 被跳过，取 <article> 的段落
+    assert result == {
+        'type': 'generic',
+        'title': '周末去哪吃',
+        'content': '推荐一家新开的烧烤店。\n\n人均五十，分量很足。',
+    }
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+import upstream
+from upstream import HostPacer, SharedHostPacer
+
+
+@pytest.fixture
+def pacer(monkeypatch, clock):
+    monkeypatch.setattr(upstream, 'time', clock)
+    return HostPacer(rates={'baidu.com': (2.0, 2)}, default_rate=(4.0, 4))
+
+
+def test_burst_is_released_immediately_then_spaced(pacer):
+    delays = [pacer.reserve('https://www.baidu.com/s?wd=1') for _ in range(5)]
+
+    # 突发容量2个立即放行，之后按每秒2个依次错开
+    assert delays == [0.0, 0.0, 0.5, 1.0, 1.5]
+
+
+def test_tokens_refill_over_time(pacer, clock):
+    for _ in range(2):
+        pacer.reserve('https://www.baidu.com/')
+
+    clock.advance(0.5)
+    assert pacer.reserve('https://www.baidu.com/') == 0.0
+    assert pacer.reserve('https://www.baidu.com/') == 0.5
+
+
+def test_idle_site_does_not_accumulate_beyond_burst(pacer, clock):
+    clock.advance(3600)
+
+    delays = [pacer.reserve('https://www.baidu.com/') for _ in range(3)]
+
+    assert delays == [0.0, 0.0, 0.5]
+
+
+def test_subdomains_share_a_bucket_and_sites_are_independent(pacer):
+    pacer.reserve('https://www.baidu.com/')
+    pacer.reserve('https://mbd.baidu.com/note/1')
+
+    assert pacer.reserve('https://baidu.com/') == 0.5
+    # 未配置的站点使用默认速率
+    assert [pacer.reserve('https://www.example.com/') for _ in range(5)] == [0.0, 0.0, 0.0, 0.0, 0.25]
+
+
+def test_share_scales_rate_and_keeps_burst_at_least_one(monkeypatch, clock):
+    monkeypatch.setattr(upstream, 'time', clock)
+    pacer = HostPacer(rates={'baidu.com': (2.0, 2)}, share=1 / 4)
+
+    assert pacer.rates['baidu.com'] == (0.5, 1.0)
+    assert [pacer.reserve('https://www.baidu.com/') for _ in range(3)] == [0.0, 2.0, 4.0]
+
+
+def test_wait_sleeps_only_when_needed(pacer, clock):
+    start = clock.now
+
+    assert pacer.wait('https://www.baidu.com/') == 0.0
+    assert pacer.wait('https://www.baidu.com/') == 0.0
+    assert pacer.wait('https://www.baidu.com/') == 0.5
+
+    assert clock.now - start == 0.5
+
+
+# ---------- 多进程共享的令牌桶 ----------
+
+@pytest.fixture
+def shared(monkeypatch, clock, tmp_path):
+    """同一数据库文件上的多个 SharedHostPacer，代替多个工作进程"""
+    monkeypatch.setattr(upstream, 'time', clock)
+    pacers = []
+
+    def make(share=1 / 2):
+        pacer = SharedHostPacer(str(tmp_path / 'cache' / 'pacer.db'), rates={'baidu.com': (2.0, 2)}, share=share)
+        pacers.append(pacer)
+        return pacer
+
+    yield make
+    for pacer in pacers:
+        if pacer._conn is not None:
+            pacer._conn.close()
+
+
+def test_processes_share_one_bucket(shared):
+    first, second = shared(), shared()
+
+    delays = [pacer.reserve('https://www.baidu.com/') for pacer in (first, second, first, second)]
+
+    # 合计频率仍是每秒2个
+    assert delays == [0.0, 0.0, 0.5, 1.0]
+
+
+def test_busy_process_uses_the_full_rate(shared, clock):
+    background, idle = shared(), shared()
+
+    # 其他进程空闲时，运行预热的进程不受 share 限制
+    assert [background.reserve('https://www.baidu.com/') for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    clock.advance(10)
+    assert idle.reserve('https://www.baidu.com/') == 0.0
+    assert background.reserve('https://www.baidu.com/') == 0.0
+
+
+def test_shared_bucket_refills_over_time(shared, clock):
+    first, second = shared(), shared()
+    for _ in range(2):
+        first.reserve('https://www.baidu.com/')
+
+    clock.advance(0.5)
+    assert second.reserve('https://www.baidu.com/') == 0.0
+    assert first.reserve('https://www.baidu.com/') == 0.5
+    # 未配置的站点使用默认速率，各站点独立
+    assert second.reserve('https://www.example.com/') == 0.0
+
+
+def test_falls_back_to_the_local_share_when_the_store_fails(shared, monkeypatch):
+    pacer = shared(share=1 / 4)
+
+    def broken():
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(pacer, '_db', broken)
+
+    assert [pacer.reserve('https://www.baidu.com/') for _ in range(3)] == [0.0, 2.0, 4.0]
+
+
+def test_reopens_the_connection_after_fork(shared, monkeypatch):
+    pacer = shared()
+    pacer.reserve('https://www.baidu.com/')
+    parent_conn = pacer._conn
+
+    monkeypatch.setattr(upstream.os, 'getpid', lambda: pacer._pid + 1)
+
+    assert pacer.reserve('https://www.baidu.com/') == 0.0
+    assert pacer._conn is not parent_conn
+    assert pacer._inherited == [parent_conn]
+    parent_conn.close()
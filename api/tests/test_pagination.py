@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor, keyset_page
+
+SCORES = [4.5, None, 3.0, 4.5, None, 5.0, 3.0, None, 4.0, 4.5, 2.5]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('CREATE TABLE shops (name TEXT, score REAL)')
+    conn.execute('CREATE INDEX idx_shops_score ON shops(score)')
+    conn.executemany('INSERT INTO shops VALUES (?, ?)', [(f'店{i}', s) for i, s in enumerate(SCORES)])
+    yield conn
+    conn.close()
+
+
+def expected_order(conn, descending, where=''):
+    direction = 'DESC' if descending else 'ASC'
+    sql = 'SELECT rowid FROM shops' + (f' WHERE {where}' if where else '')
+    return [row[0] for row in conn.execute(f'{sql} ORDER BY score {direction}, rowid {direction}')]
+
+
+def read_all(conn, descending, limit, **kwargs):
+    """按游标读完全部分页，游标经过编码、解码往返"""
+    rowids = []
+    after = None
+    while True:
+        rows, has_more = keyset_page(conn, 'shops', 'name', 'score', descending, limit, after=after, **kwargs)
+        rowids += [row['_rowid'] for row in rows]
+        if not has_more:
+            return rowids
+        after = decode_cursor(encode_cursor('score', rows[-1]['_key'], rows[-1]['_rowid']), 'score')
+
+
+@pytest.mark.parametrize('descending', [True, False])
+@pytest.mark.parametrize('limit', [1, 2, 3, 4, 20])
+def test_cursor_pages_match_plain_order_by(conn, descending, limit):
+    # SQLite默认：升序时NULL在最前，降序时在最后
+    assert read_all(conn, descending, limit) == expected_order(conn, descending)
+
+
+@pytest.mark.parametrize('descending', [True, False])
+def test_offset_pages_use_the_same_order(conn, descending):
+    rowids = []
+    for offset in range(0, len(SCORES), 3):
+        rows, _ = keyset_page(conn, 'shops', 'name', 'score', descending, 3, offset=offset)
+        rowids += [row['_rowid'] for row in rows]
+    assert rowids == expected_order(conn, descending)
+
+
+def test_null_rows_come_first_when_ascending(conn):
+    rows, has_more = keyset_page(conn, 'shops', 'name', 'score', False, 3)
+    assert [row['_key'] for row in rows] == [None, None, None]
+    assert has_more
+
+
+def test_cursor_inside_null_segment(conn):
+    nulls = [rowid for rowid, score in enumerate(SCORES, 1) if score is None]
+    rows, _ = keyset_page(conn, 'shops', 'name', 'score', True, 10, after=(None, nulls[0]))
+    assert [row['_rowid'] for row in rows] == []
+    rows, _ = keyset_page(conn, 'shops', 'name', 'score', True, 10, after=(None, nulls[-1]))
+    assert [row['_rowid'] for row in rows] == nulls[-2::-1]
+
+
+def test_where_filter_is_applied_to_every_segment(conn):
+    where = "name != ?"
+    rowids = read_all(conn, False, 2, where=where, params=['店1'])
+    assert rowids == expected_order(conn, False, "name != '店1'")
+
+
+def test_last_page_has_no_more(conn):
+    rows, has_more = keyset_page(conn, 'shops', 'name', 'score', True, len(SCORES))
+    assert len(rows) == len(SCORES)
+    assert not has_more
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor('name', '老街面馆', 42)
+    assert '=' not in cursor
+    assert decode_cursor(cursor, 'name') == ('老街面馆', 42)
+
+
+@pytest.mark.parametrize('cursor, sort', [
+    ('not-a-cursor!', 'score'),
+    (encode_cursor('name', 'a', 1), 'score'),
+    (encode_cursor('score', 1.0, 'x'), 'score'),
+])
+def test_invalid_cursor(cursor, sort):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, sort)
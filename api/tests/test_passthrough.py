@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import gzip
+import os
+
+import pytest
+from flask import Flask, request
+from requests.structures import CaseInsensitiveDict
+
+import passthrough
+from passthrough import passthrough_response, upstream_accept_encoding
+
+PAGE = ('<html><head><meta charset="utf-8"></head><body>' + '杭州美食笔记' * 3000 + '</body></html>').encode('utf-8')
+
+
+class FakeStream:
+    """UpstreamStream 的替身：按块返回原始字节，记录是否已关闭"""
+
+    def __init__(self, body, headers, chunk_size=4096):
+        self.status_code = 200
+        self.url = 'https://example.com/page'
+        self.headers = CaseInsensitiveDict(headers)
+        self.chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+def gzip_stream(body=PAGE, content_type='text/html; charset=utf-8'):
+    return FakeStream(gzip.compress(body), {'Content-Encoding': 'gzip', 'Content-Type': content_type})
+
+
+def consume(response):
+    body = b''.join(response.response)
+    response.close()
+    return body
+
+
+def test_compressed_bytes_are_forwarded_unchanged(app):
+    stream = gzip_stream()
+    completed = []
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip, deflate'}):
+        response = passthrough_response(stream, request, on_complete=completed.append, cache_state='MISS')
+        body = consume(response)
+
+    assert body == b''.join(stream.chunks)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['X-Cache'] == 'MISS'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert stream.closed
+    assert [result.text for result in completed] == [PAGE.decode('utf-8')]
+
+
+def test_client_without_gzip_gets_decoded_page(app):
+    stream = gzip_stream()
+    completed = []
+    with app.test_request_context(headers={'Accept-Encoding': 'identity'}):
+        response = passthrough_response(stream, request, on_complete=completed.append)
+        body = consume(response)
+
+    assert 'Content-Encoding' not in response.headers
+    assert body == PAGE
+    assert len(completed) == 1
+
+
+def test_non_utf8_page_is_transcoded(app):
+    body = '<html><body>百度安全</body></html>'.encode('gbk')
+    stream = FakeStream(body, {'Content-Type': 'text/html; charset=gbk'})
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = passthrough_response(stream, request)
+        assert consume(response).decode('utf-8') == '<html><body>百度安全</body></html>'
+
+
+def test_failed_check_closes_upstream(app):
+    stream = gzip_stream(body='<html>百度安全验证</html>'.encode('utf-8'))
+
+    def check(head):
+        if '安全验证' in head:
+            raise PermissionError('blocked')
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        with pytest.raises(PermissionError):
+            passthrough_response(stream, request, check=check)
+    assert stream.closed
+
+
+def test_check_sees_decompressed_head(app):
+    seen = []
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        consume(passthrough_response(gzip_stream(), request, check=seen.append))
+    assert seen[0].startswith('<html>')
+    assert len(seen[0].encode('utf-8')) >= passthrough.SNIFF_BYTES
+
+
+def test_interrupted_transfer_is_not_cached(app):
+    stream = gzip_stream()
+    completed = []
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = passthrough_response(stream, request, on_complete=completed.append)
+        next(iter(response.response))
+        response.close()
+
+    assert stream.closed
+    assert completed == []
+
+
+def test_oversized_pages_are_not_kept_for_the_cache(app, monkeypatch):
+    monkeypatch.setattr(passthrough, 'TEE_MAX_BYTES', 32 * 1024)
+    # 随机内容压缩不了多少，压缩后仍远超 TEE_MAX_BYTES
+    noise = os.urandom(128 * 1024).hex()
+    stream = gzip_stream(body=f'<html><body>{noise}</body></html>'.encode('utf-8'))
+    completed = []
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        body = consume(passthrough_response(stream, request, on_complete=completed.append))
+    assert body == b''.join(stream.chunks)
+    assert completed == []
+
+
+def test_upstream_accept_encoding(app, monkeypatch):
+    monkeypatch.setattr(passthrough, 'brotli', object())
+    with app.test_request_context(headers={'Accept-Encoding': 'br, gzip'}):
+        assert upstream_accept_encoding(request) == 'br, gzip'
+        assert upstream_accept_encoding(request, allow_br=False) == 'gzip'
+    with app.test_request_context():
+        assert upstream_accept_encoding(request) == 'identity'
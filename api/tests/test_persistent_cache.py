@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import cache
+from cache import HIT, MISS, GeoCache, RedirectCache
+
+RESULT = {'city': '杭州市', 'district': '西湖区'}
+
+
+@pytest.fixture
+def db_path(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(cache, 'time', clock)
+    return str(tmp_path / 'cache' / 'geocode.db')
+
+
+def rows(db_path, table='geocode_cache', key_column='cell'):
+    with sqlite3.connect(db_path) as conn:
+        return [row[0] for row in conn.execute(f'SELECT {key_column} FROM {table} ORDER BY updated_at')]
+
+
+def test_nearby_coordinates_share_a_cell(db_path):
+    geo = GeoCache(db_path, precision=3)
+
+    geo.set(30.27412, 120.15511, RESULT)
+
+    assert geo.cell(30.27412, 120.15511) == '30.274,120.155'
+    assert geo.get(30.2739, 120.1548) == (RESULT, HIT)
+    assert geo.get(30.276, 120.155) == (None, MISS)
+
+
+def test_entries_expire_after_ttl(db_path, clock):
+    geo = GeoCache(db_path, ttl=60)
+    geo.set(30.274, 120.155, RESULT)
+
+    clock.advance(59)
+    assert geo.get(30.274, 120.155) == (RESULT, HIT)
+    clock.advance(1)
+    assert geo.get(30.274, 120.155) == (None, MISS)
+
+
+def test_entries_survive_a_restart(db_path):
+    GeoCache(db_path).set(30.274, 120.155, RESULT)
+
+    # 新实例（如重启后、或另一个工作进程）内存为空，从SQLite读到
+    geo = GeoCache(db_path)
+    assert geo.get(30.274, 120.155) == (RESULT, HIT)
+    assert '30.274,120.155' in geo._memory
+
+
+def test_memory_is_bounded_by_lru(db_path):
+    geo = GeoCache(db_path, max_entries=2)
+    for lat in (30.1, 30.2, 30.3):
+        geo.set(lat, 120.0, RESULT)
+
+    assert list(geo._memory) == ['30.200,120.000', '30.300,120.000']
+    # 淘汰出内存的条目仍在SQLite中
+    assert geo.get(30.1, 120.0) == (RESULT, HIT)
+
+
+def test_purge_removes_expired_rows(db_path, clock):
+    geo = GeoCache(db_path, ttl=60)
+    geo.PURGE_EVERY = 3
+    geo.set(30.1, 120.0, RESULT)
+    clock.advance(61)
+    geo.set(30.2, 120.0, RESULT)
+    geo.set(30.3, 120.0, RESULT)
+    assert len(rows(db_path)) == 3
+
+    geo.set(30.4, 120.0, RESULT)
+
+    assert rows(db_path) == ['30.200,120.000', '30.300,120.000', '30.400,120.000']
+
+
+def test_purge_keeps_the_newest_max_rows(db_path, clock):
+    geo = GeoCache(db_path, max_rows=2)
+    geo.PURGE_EVERY = 4
+    for lat in (30.1, 30.2, 30.3, 30.4, 30.5):
+        geo.set(lat, 120.0, RESULT)
+        clock.advance(1)
+
+    assert rows(db_path) == ['30.400,120.000', '30.500,120.000']
+
+
+def test_first_write_in_a_process_purges(db_path, clock):
+    GeoCache(db_path, ttl=60).set(30.1, 120.0, RESULT)
+    clock.advance(61)
+
+    GeoCache(db_path, ttl=60).set(30.2, 120.0, RESULT)
+
+    assert rows(db_path) == ['30.200,120.000']
+
+
+def test_disk_io_does_not_hold_the_memory_lock(db_path, monkeypatch):
+    geo = GeoCache(db_path)
+    geo.set(30.1, 120.0, RESULT)
+    geo._memory.clear()
+    real_db = geo._db
+
+    def db():
+        assert not geo._lock.locked()
+        return real_db()
+
+    monkeypatch.setattr(geo, '_db', db)
+
+    geo.set(30.2, 120.0, RESULT)
+    assert geo.get(30.1, 120.0) == (RESULT, HIT)
+    geo.delete_key('30.100,120.000')
+    assert geo.get(30.1, 120.0) == (None, MISS)
+
+
+def test_each_thread_uses_its_own_connection(db_path):
+    geo = GeoCache(db_path)
+    connections = []
+
+    def work(lat):
+        geo.set(lat, 120.0, RESULT)
+        connections.append(geo._db())
+
+    threads = [threading.Thread(target=work, args=(30.0 + i / 10,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(conn) for conn in connections}) == 4
+    assert len(rows(db_path)) == 4
+
+
+# ---------- 笔记跳转缓存 ----------
+
+NOTE_URL = 'https://mbd.baidu.com/newspage/data/landingshare?nid=123'
+REAL_URL = 'https://www.example.com/article/123'
+NOTICE = {'type': 'redirect', 'title': '第三方页面', 'content': '请在浏览器中打开'}
+
+
+@pytest.fixture
+def redirect_path(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(cache, 'time', clock)
+    return str(tmp_path / 'cache' / 'note_redirects.db')
+
+
+def test_redirect_hits_and_notices(redirect_path):
+    redirects = RedirectCache(redirect_path)
+    assert redirects.get(NOTE_URL) == (None, MISS)
+
+    redirects.set(NOTE_URL, REAL_URL)
+    redirects.set(NOTE_URL + '&x=1', REAL_URL, NOTICE)
+
+    assert redirects.get(NOTE_URL) == ({'real_url': REAL_URL, 'notice': None}, HIT)
+    assert redirects.get(NOTE_URL + '&x=1') == ({'real_url': REAL_URL, 'notice': NOTICE}, HIT)
+
+
+def test_redirects_expire_after_ttl(redirect_path, clock):
+    redirects = RedirectCache(redirect_path, ttl=7 * 86400)
+    redirects.set(NOTE_URL, REAL_URL)
+
+    clock.advance(7 * 86400 - 1)
+    assert redirects.get(NOTE_URL)[1] == HIT
+    clock.advance(1)
+    assert redirects.get(NOTE_URL) == (None, MISS)
+    # 其他进程（新实例）也读不到过期的条目
+    assert RedirectCache(redirect_path, ttl=7 * 86400).get(NOTE_URL) == (None, MISS)
+
+
+def test_redirects_survive_a_restart_and_deletes_reach_disk(redirect_path):
+    RedirectCache(redirect_path).set(NOTE_URL, REAL_URL, NOTICE)
+
+    redirects = RedirectCache(redirect_path)
+    assert redirects.get(NOTE_URL) == ({'real_url': REAL_URL, 'notice': NOTICE}, HIT)
+
+    redirects.delete(NOTE_URL)
+    assert RedirectCache(redirect_path).get(NOTE_URL) == (None, MISS)
+
+
+def test_redirects_are_purged(redirect_path, clock):
+    redirects = RedirectCache(redirect_path, ttl=60, max_rows=2)
+    redirects.PURGE_EVERY = 3
+    redirects.set(NOTE_URL + '&old=1', REAL_URL)
+    clock.advance(61)
+    for i in range(3):
+        redirects.set(f'{NOTE_URL}&new={i}', REAL_URL)
+        clock.advance(1)
+
+    # 过期的条目被删除，未过期的只保留最近写入的 max_rows 条
+    assert rows(redirect_path, 'note_redirects', 'url') == [f'{NOTE_URL}&new=1', f'{NOTE_URL}&new=2']
+
+
+class FakeResponse:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+
+@pytest.fixture
+def note_app(redirect_path, monkeypatch):
+    """load_note_detail 使用临时的跳转缓存，上游请求由测试提供（statuses: URL → 状态码）"""
+    import app as app_module
+
+    monkeypatch.setattr(app_module, 'redirect_cache', RedirectCache(redirect_path))
+    upstream = SimpleNamespace(app=app_module, resolved=[], fetched=[], statuses={})
+
+    def resolve(note_url):
+        upstream.resolved.append(note_url)
+        return FakeResponse('<html>跳转中</html>'), REAL_URL
+
+    def fetch(url, *args, **kwargs):
+        upstream.fetched.append(url)
+        return FakeResponse('<html><title>第三方页面</title><body>正文</body></html>', upstream.statuses.get(url, 200))
+
+    monkeypatch.setattr(app_module, 'resolve_note_redirect', resolve)
+    monkeypatch.setattr(app_module, 'fetch_upstream', fetch)
+    return upstream
+
+
+def test_cached_notice_skips_every_upstream_request(note_app):
+    first, status = note_app.app.load_note_detail(NOTE_URL)
+    assert status == 200
+    assert note_app.resolved == [NOTE_URL]
+    assert note_app.fetched == [REAL_URL]
+
+    second, status = note_app.app.load_note_detail(NOTE_URL)
+
+    assert status == 200
+    assert second == first
+    assert note_app.resolved == [NOTE_URL]
+    assert note_app.fetched == [REAL_URL]
+
+
+def test_dead_cached_target_is_resolved_again(note_app):
+    note_app.app.redirect_cache.set(NOTE_URL, REAL_URL)
+    note_app.statuses[REAL_URL] = 404
+
+    result, status = note_app.app.load_note_detail(NOTE_URL)
+
+    # 缓存的目标失效：删除缓存，重新识别跳转（重新识别后仍是404，不再写入缓存）
+    assert note_app.resolved == [NOTE_URL]
+    assert status == 404
+    assert note_app.app.redirect_cache.get(NOTE_URL) == (None, MISS)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+from contextlib import contextmanager
+
+import pytest
+
+import db
+from db import ConnectionPool, migrate_file
+from rankings import ThemeRankings
+from tokens import LEVEL1_SEEDS, matches_theme
+
+SHOPS = [
+    ['湖畔居', '¥120', '西湖区', '', 'https://example.com/1', '4.8'],
+    ['巷口面馆', '¥25', '上城区', '', '', '4.2'],
+]
+DISHES = [
+    ['麻辣牛肉面', '', '900', '巷口面馆'],
+    ['清汤牛肉面', '', '300', '巷口面馆'],
+    ['西湖醋鱼', '', '500', '湖畔居'],
+    ['龙井虾仁', '', '500', '湖畔居'],
+    ['麻辣香锅', '', '200', '湖畔居'],
+    ['米饭', '', '10', ''],
+]
+
+
+@pytest.fixture
+def db_path(catalog):
+    return catalog(SHOPS, DISHES)
+
+
+@pytest.fixture
+def pool(db_path):
+    pool = ConnectionPool(db_path, size=2, check_interval=0)
+    yield pool
+    pool.close()
+
+
+def execute(db_path, sql, params=()):
+    conn = sqlite3.connect(db_path)
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def expected_board(db_path, theme, k=10):
+    """原先的做法：扫描全部菜品，在Python中归类后按 (推荐人数降序, rowid) 取前K"""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('SELECT rowid, name, recommendation_count FROM dishes').fetchall()
+    conn.close()
+    members = sorted((-count, rowid, name) for rowid, name, count in rows if matches_theme(theme, name or ''))
+    return [name for _, _, name in members[:k]]
+
+
+def names(board):
+    return [item['name'] for item in board]
+
+
+def test_boards_match_python_classification(db_path, pool):
+    rankings = ThemeRankings(pool, k=2)
+
+    boards = rankings.get()
+
+    assert list(boards) == list(LEVEL1_SEEDS)
+    for theme in LEVEL1_SEEDS:
+        assert names(boards[theme]) == expected_board(db_path, theme, k=2), theme
+    assert rankings.get('海鲜盛宴') == [
+        {'name': '西湖醋鱼', 'shopName': '湖畔居', 'count': 500, 'imageUrl': '', 'detailUrl': 'https://example.com/1'},
+        {'name': '龙井虾仁', 'shopName': '湖畔居', 'count': 500, 'imageUrl': '', 'detailUrl': 'https://example.com/1'},
+    ]
+    assert rankings.get('不存在的主题') == []
+
+
+def test_triggers_follow_dish_changes(db_path, pool):
+    rankings = ThemeRankings(pool)
+    assert names(rankings.get('面条爱好者')) == ['麻辣牛肉面', '清汤牛肉面']
+
+    execute(db_path, "INSERT INTO dishes (name, recommendation_count, shop_name) VALUES ('炸酱面', 600, '巷口面馆')")
+    execute(db_path, "UPDATE dishes SET recommendation_count = 1000 WHERE name = '清汤牛肉面'")
+    execute(db_path, "UPDATE dishes SET name = '麻辣香锅面' WHERE name = '麻辣香锅'")
+    execute(db_path, "DELETE FROM dishes WHERE name = '麻辣牛肉面'")
+
+    for theme in LEVEL1_SEEDS:
+        assert names(rankings.get(theme)) == expected_board(db_path, theme), theme
+    assert names(rankings.get('面条爱好者')) == ['清汤牛肉面', '炸酱面', '麻辣香锅面']
+
+
+def test_refresh_reads_only_the_top_of_each_theme(db_path, pool, monkeypatch):
+    rankings = ThemeRankings(pool)
+    rankings.get()
+    statements = []
+    real_connection = pool.connection
+
+    @contextmanager
+    def traced():
+        with real_connection() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                yield conn
+            finally:
+                conn.set_trace_callback(None)
+
+    monkeypatch.setattr(pool, 'connection', traced)
+    execute(db_path, "UPDATE dishes SET recommendation_count = 50 WHERE name = '米饭'")
+
+    assert names(rankings.get('快手炒菜')) == []
+    # 每个主题一条按索引读取前K条的查询，不再读取全部菜品
+    assert len(statements) == len(LEVEL1_SEEDS)
+    assert all('FROM theme_dishes' in sql and 'LIMIT' in sql for sql in statements)
+    with real_connection() as conn:
+        plan = ' '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + statements[0]))
+    assert 'idx_theme_dishes_rank' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_unchanged_database_is_not_reread(pool, monkeypatch):
+    rankings = ThemeRankings(pool)
+    rankings.get()
+
+    def fail():
+        raise AssertionError('数据库没有变化时不应重新读取')
+
+    monkeypatch.setattr(pool, 'connection', fail)
+    assert names(rankings.get('面条爱好者')) == ['麻辣牛肉面', '清汤牛肉面']
+
+
+def test_get_returns_copies(pool):
+    rankings = ThemeRankings(pool)
+
+    rankings.get().clear()
+    rankings.get('面条爱好者').clear()
+    rankings.get('面条爱好者')[0]['name'] = '改掉'
+
+    assert names(rankings.get('面条爱好者')) == ['麻辣牛肉面', '清汤牛肉面']
+    assert len(rankings.get()) == len(LEVEL1_SEEDS)
+
+
+def test_migrate_reclassifies_when_keywords_change(db_path, pool, monkeypatch):
+    assert migrate_file(db_path) == []
+    monkeypatch.setattr(db, 'THEME_KEYWORDS', dict(db.THEME_KEYWORDS, 面条爱好者=('米饭',)))
+
+    assert migrate_file(db_path) == ['theme_dishes']
+
+    assert names(ThemeRankings(pool).get('面条爱好者')) == ['米饭']
+    assert migrate_file(db_path) == []
+
+
+def test_route_returns_theme_boards(db_app, db_path):
+    client = db_app(db_path).app.test_client()
+
+    payload = client.get('/api/rankings', query_string={'theme': '面条爱好者'}).get_json()
+    assert names(payload['data']['themes']['面条爱好者']) == ['麻辣牛肉面', '清汤牛肉面']
+
+    execute(db_path, "UPDATE dishes SET recommendation_count = 1000 WHERE name = '清汤牛肉面'")
+
+    payload = client.get('/api/rankings', query_string={'theme': 'all'}).get_json()
+    assert names(payload['data']['themes']['面条爱好者']) == ['清汤牛肉面', '麻辣牛肉面']
+    assert len(payload['data']['themes']) == len(LEVEL1_SEEDS)
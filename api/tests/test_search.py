@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+from search import search_dishes, search_shops, split_terms
+
+SHOPS = [
+    ['湖畔居', '¥120', '杭州市西湖区北山街', '', '', '4.8'],
+    ['西湖面馆', '¥25', '杭州市上城区河坊街', '', '', '4.2'],
+    ['夜宵摊', '', '拱墅区大关路', '', '', '3.9'],
+    ['100%手工面', '¥18', '拱墅区湖墅南路', '', '', '4.0'],
+]
+DISHES = [
+    ['西湖醋鱼', '', '500', '湖畔居'],
+    ['龙井虾仁', '', '300', '湖畔居'],
+    ['片儿川', '', '900', '西湖面馆'],
+    ['西湖牛肉羹', '', '200', '夜宵摊'],
+    ['烤串', '', '50', '夜宵摊'],
+]
+
+
+@pytest.fixture
+def db_path(catalog):
+    return catalog(SHOPS, DISHES)
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+
+def names(rows):
+    return [row['name'] for row in rows]
+
+
+def test_split_terms_dedupes_and_separates_short_terms():
+    assert split_terms(' 西湖醋鱼  西湖 西湖醋鱼 鱼 ') == (['西湖醋鱼'], ['西湖', '鱼'])
+    assert split_terms(None) == ([], [])
+
+
+def test_long_terms_use_the_trigram_index(conn):
+    # 两道菜都只有店名命中、相关度相同，推荐人数多的在前
+    assert names(search_dishes(conn, '湖畔居')) == ['西湖醋鱼', '龙井虾仁']
+    assert names(search_dishes(conn, '西湖醋')) == ['西湖醋鱼']
+
+    plan = ' '.join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT rowid FROM dishes_fts WHERE dishes_fts MATCH '\"西湖醋\"'"
+    ))
+    assert 'VIRTUAL TABLE INDEX' in plan
+
+
+def test_short_terms_are_substring_filters(conn):
+    # 1~2个字的词 trigram 无法索引，按子串过滤名称和店名
+    assert names(search_dishes(conn, '西湖')) == ['片儿川', '西湖醋鱼', '西湖牛肉羹']
+    assert names(search_dishes(conn, '串')) == ['烤串']
+
+
+def test_terms_are_combined_with_and(conn):
+    assert names(search_dishes(conn, '西湖 湖畔居')) == ['西湖醋鱼']
+    assert names(search_dishes(conn, '夜宵摊 牛肉')) == ['西湖牛肉羹']
+    assert search_dishes(conn, '西湖 不存在') == []
+
+
+def test_shops_match_name_or_address(conn):
+    assert sorted(names(search_shops(conn, '拱墅区'))) == ['100%手工面', '夜宵摊']
+    assert names(search_shops(conn, '湖畔居')) == ['湖畔居']
+
+
+def test_user_input_is_not_query_syntax(conn):
+    # FTS 运算符、引号和 LIKE 通配符都按普通字符匹配
+    assert search_dishes(conn, 'OR 醋鱼') == []
+    assert search_dishes(conn, '"西湖') == []
+    assert names(search_shops(conn, '100%')) == ['100%手工面']
+    assert names(search_shops(conn, '%')) == ['100%手工面']
+    assert search_shops(conn, '_') == []
+
+
+def test_limit_and_offset(conn):
+    assert names(search_dishes(conn, '西湖', limit=2)) == ['片儿川', '西湖醋鱼']
+    assert names(search_dishes(conn, '西湖', limit=2, offset=2)) == ['西湖牛肉羹']
+
+
+def test_blank_query_returns_nothing(conn):
+    assert search_dishes(conn, '   ') == []
+
+
+# ---------- /api/search ----------
+
+def test_route_returns_dishes_and_shops(db_app, db_path):
+    client = db_app(db_path).app.test_client()
+
+    payload = client.get('/api/search', query_string={'q': '湖畔居'}).get_json()
+
+    assert payload['success'] is True
+    assert [dish['菜品名称'] for dish in payload['data']['dishes']] == ['西湖醋鱼', '龙井虾仁']
+    assert [shop['店名'] for shop in payload['data']['shops']] == ['湖畔居']
+    assert payload['count'] == 3
+
+
+def test_route_filters_by_type_and_pages(db_app, db_path):
+    client = db_app(db_path).app.test_client()
+
+    payload = client.get('/api/search', query_string={'q': '西湖', 'type': 'dish', 'limit': 1, 'offset': 1}).get_json()
+
+    assert payload['data']['shops'] == []
+    assert [dish['菜品名称'] for dish in payload['data']['dishes']] == ['西湖醋鱼']
+
+
+@pytest.mark.parametrize('params', [{}, {'q': '  '}, {'q': '西湖', 'type': 'note'}])
+def test_route_rejects_bad_parameters(db_app, db_path, params):
+    client = db_app(db_path).app.test_client()
+
+    response = client.get('/api/search', query_string=params)
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+import cache
+from cache import HIT, MISS, STALE, SharedStore, TTLCache
+
+KEY = ('notes', '杭州 美食', 1, '')
+
+
+@pytest.fixture
+def db_path(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(cache, 'time', clock)
+    return str(tmp_path / 'shared' / 'cache.db')
+
+
+@pytest.fixture
+def store(db_path):
+    return SharedStore(db_path)
+
+
+@pytest.fixture
+def make_cache(db_path):
+    """每次调用返回一个独立的 TTLCache + SharedStore，模拟打开同一数据库的不同工作进程"""
+    caches = []
+
+    def make():
+        c = TTLCache(max_bytes=1024 * 1024, refresh_workers=1,
+                     shared=SharedStore(db_path), shared_namespaces=('notes',))
+        caches.append(c)
+        return c
+
+    yield make
+    for c in caches:
+        c._executor.shutdown(wait=True)
+
+
+# ---------- SharedStore ----------
+
+def test_store_round_trips_tuple_keys(store, clock):
+    store.set(KEY, {'notes': ['西湖醋鱼']}, clock.now + 10, clock.now + 30)
+
+    assert store.get(KEY) == ({'notes': ['西湖醋鱼']}, clock.now + 10, clock.now + 30)
+    assert store.get(('notes', '杭州 美食', 2, '')) is None
+
+
+def test_store_drops_entries_after_the_grace_period(store, clock):
+    store.set(KEY, 'v', clock.now + 10, clock.now + 30)
+
+    clock.advance(29)
+    assert store.get(KEY) is not None
+    clock.advance(1)
+    assert store.get(KEY) is None
+
+
+def test_store_skips_values_that_are_not_json(store, clock):
+    store.set(KEY, object(), clock.now + 10, clock.now + 30)
+
+    assert store.get(KEY) is None
+
+
+def test_store_delete_and_clear(store, clock):
+    store.set(KEY, 'a', clock.now + 10, clock.now + 30)
+    store.set('other', 'b', clock.now + 10, clock.now + 30)
+
+    store.delete(KEY)
+    assert store.get(KEY) is None
+    assert store.get('other') is not None
+
+    store.claim('other', 60)
+    store.clear()
+    assert store.get('other') is None
+    assert store.claim('other', 60) is True
+
+
+def test_store_purges_expired_and_excess_entries(db_path, clock):
+    store = SharedStore(db_path, max_entries=3)
+    store.PURGE_EVERY = 5
+    store.set('expired', 'x', clock.now + 1, clock.now + 2)
+    clock.advance(5)
+    for i in range(4):
+        store.set(f'k{i}', i, clock.now + 10 + i, clock.now + 20 + i)
+
+    rows = store._db().execute('SELECT key FROM shared_cache ORDER BY stale_until').fetchall()
+    # 超过宽限期的先删，剩余的保留最晚过期的 max_entries 条
+    assert [row[0] for row in rows] == ['"k1"', '"k2"', '"k3"']
+
+
+def test_lease_is_exclusive_until_released(db_path):
+    first, second = SharedStore(db_path), SharedStore(db_path)
+
+    assert first.claim(KEY, 60) is True
+    assert second.claim(KEY, 60) is False
+    assert second.claim(('notes', '其他', 1, ''), 60) is True
+
+    first.release(KEY)
+    assert second.claim(KEY, 60) is True
+
+
+def test_expired_lease_can_be_taken_over(db_path, clock):
+    first, second = SharedStore(db_path), SharedStore(db_path)
+    first.claim(KEY, 60)
+
+    clock.advance(59)
+    assert second.claim(KEY, 60) is False
+    clock.advance(1)
+    # 持有租约的进程退出后，租约到期由其他进程接替
+    assert second.claim(KEY, 60) is True
+    assert first.claim(KEY, 60) is False
+
+
+def test_store_failures_fall_back_safely(tmp_path):
+    # 数据库路径是一个目录，打开失败：读取当作未命中，租约当作申请成功
+    broken = tmp_path / 'broken.db'
+    broken.mkdir()
+    store = SharedStore(str(broken))
+
+    assert store.get(KEY) is None
+    store.set(KEY, 'v', 10, 20)
+    assert store.claim(KEY, 60) is True
+
+
+# ---------- TTLCache + SharedStore ----------
+
+def test_entries_written_by_one_process_are_read_by_another(make_cache):
+    writer, reader = make_cache(), make_cache()
+
+    writer.set(KEY, ['西湖醋鱼'], ttl=10, stale_ttl=20)
+
+    assert reader.get(KEY) == (['西湖醋鱼'], HIT)
+    # 读到后放入本进程内存
+    assert KEY in reader._data
+
+
+def test_only_shared_namespaces_are_written(make_cache):
+    writer, reader = make_cache(), make_cache()
+
+    writer.set(('recipes', '红烧肉', 1), ['红烧肉'], ttl=10)
+    writer.set('plain', 'v', ttl=10)
+
+    assert reader.get(('recipes', '红烧肉', 1)) == (None, MISS)
+    assert reader.get('plain') == (None, MISS)
+
+
+def test_stale_entry_picks_up_a_refresh_from_another_process(make_cache, clock):
+    first, second = make_cache(), make_cache()
+    first.set(KEY, 'old', ttl=10, stale_ttl=60)
+    assert second.get(KEY) == ('old', HIT)
+
+    clock.advance(11)
+    assert second.get(KEY) == ('old', STALE)
+    first.set(KEY, 'new', ttl=10, stale_ttl=60)
+
+    assert second.get(KEY) == ('new', HIT)
+
+
+def test_delete_removes_the_shared_copy(make_cache):
+    first, second = make_cache(), make_cache()
+    first.set(KEY, 'v', ttl=10)
+
+    first.delete(KEY)
+
+    assert second.get(KEY) == (None, MISS)
+
+
+def test_refresh_is_skipped_while_another_process_holds_the_lease(make_cache, clock):
+    first, second = make_cache(), make_cache()
+    first.set(KEY, 'old', ttl=10, stale_ttl=60)
+    clock.advance(11)
+    assert first.claim(KEY)
+    calls = []
+
+    assert second.get_or_refresh(KEY, lambda: calls.append(1) or 'new', ttl=10, stale_ttl=60) == ('old', STALE)
+    second._executor.shutdown(wait=True)
+
+    assert calls == []
+    assert KEY not in second._refreshing
+
+
+def test_background_refresh_releases_the_lease(make_cache, clock):
+    first, second = make_cache(), make_cache()
+    first.set(KEY, 'old', ttl=10, stale_ttl=60)
+    clock.advance(11)
+    done = threading.Event()
+
+    def loader():
+        done.set()
+        return 'new'
+
+    assert first.get_or_refresh(KEY, loader, ttl=10, stale_ttl=60) == ('old', STALE)
+    assert done.wait(5)
+    first._executor.shutdown(wait=True)
+
+    assert second.get(KEY) == ('new', HIT)
+    assert second.claim(KEY) is True
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+from tokens import LEVEL1_SEEDS, TokenIndex, matches_theme, tokenize_dish_name
+
+SHOPS = [['湖畔居', '¥120', '西湖区', '', '', '4.8'], ['巷口面馆', '¥25', '上城区', '', '', '4.2']]
+DISHES = [
+    ['麻辣 牛肉面', '', '900', '巷口面馆'],
+    ['麻辣 牛肉面', '', '100', '湖畔居'],
+    ['清汤 牛肉面', '', '300', '巷口面馆'],
+    ['麻辣 香锅', '', '200', '湖畔居'],
+    ['西湖醋鱼', '', '500', '湖畔居'],
+]
+
+
+@pytest.fixture
+def db_path(catalog):
+    return catalog(SHOPS, DISHES)
+
+
+@pytest.fixture
+def app_module(db_app, db_path):
+    return db_app(db_path)
+
+
+def texts(items):
+    return [item['text'] for item in items]
+
+
+def test_tokenize_dish_name_matches_frontend():
+    assert tokenize_dish_name('（招牌）麻辣·牛肉面/大份') == ['（招牌）麻辣', '牛肉面', '大份']
+    assert tokenize_dish_name('[特价] 酸菜鱼+米饭') == ['特价', '酸菜鱼', '米饭']
+
+
+def test_unknown_theme_does_not_filter():
+    assert matches_theme('面条爱好者', '牛肉面')
+    assert not matches_theme('面条爱好者', '西湖醋鱼')
+    assert matches_theme('不存在的主题', '西湖醋鱼')
+
+
+def test_levels(app_module):
+    index = app_module.token_index
+
+    level1 = {item['text']: item['count'] for item in index.candidates(1)}
+    assert list(level1) == list(LEVEL1_SEEDS)
+    # 主题大小按菜名出现次数计（同名菜出现在两家店算2次）
+    assert level1['面条爱好者'] == 3
+
+    assert index.candidates(2, theme='面条爱好者') == [
+        {'text': '牛肉面', 'count': 3}, {'text': '麻辣', 'count': 2}, {'text': '清汤', 'count': 1},
+    ]
+    # 次数相同时以推荐人数高的菜品中先出现的词为准
+    assert texts(index.candidates(2)) == ['麻辣', '牛肉面', '西湖醋鱼', '清汤', '香锅']
+    assert index.candidates(3, parent='牛肉面') == [
+        {'text': '麻辣 牛肉面', 'count': 2}, {'text': '清汤 牛肉面', 'count': 1},
+    ]
+    # 不是第二层候选的词按需计算
+    assert texts(index.candidates(3, parent='醋鱼')) == ['西湖醋鱼']
+    assert index.candidates(3) == []
+
+
+def test_route_rebuilds_after_the_database_changes(app_module, db_path, monkeypatch):
+    client = app_module.app.test_client()
+    builds = []
+    real_build = TokenIndex._build
+
+    def build(self, names):
+        builds.append(len(names))
+        real_build(self, names)
+
+    monkeypatch.setattr(TokenIndex, '_build', build)
+
+    first = client.get('/api/tokens?level=3&parent=牛肉面').get_json()
+    client.get('/api/tokens?level=2')
+    assert builds == [5]
+    assert texts(first['data']) == ['麻辣 牛肉面', '清汤 牛肉面']
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO dishes (name, recommendation_count, shop_name) VALUES ('红烧牛肉面', 50, '巷口面馆')")
+    conn.commit()
+    conn.close()
+
+    second = client.get('/api/tokens?level=3&parent=牛肉面').get_json()
+    assert builds == [5, 6]
+    assert texts(second['data']) == ['麻辣 牛肉面', '清汤 牛肉面', '红烧牛肉面']
+
+
+def test_route_rejects_unknown_level(app_module):
+    response = app_module.app.test_client().get('/api/tokens?level=4')
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import random
+import threading
+
+import pytest
+
+from upstream import UpstreamUnavailable
+from warmer import CacheWarmer
+
+RECIPES = ('recipes', '家常菜', '')
+HEALTH = ('health', '', '减脂')
+
+
+class Recorder:
+    """预热函数：记录调用；results 为 目标 → 返回值或异常"""
+
+    def __init__(self, results=None):
+        self.calls = []
+        self.results = results or {}
+
+    def __call__(self, endpoint, query, category, horizon):
+        self.calls.append(((endpoint, query, category), horizon))
+        result = self.results.get((endpoint, query, category), True)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_next_delay_stays_within_the_jitter():
+    warmer_ = CacheWarmer(Recorder(), interval=300, jitter=0.2)
+    random.seed(1234)
+
+    delays = [warmer_.next_delay() for _ in range(200)]
+
+    assert all(240 <= delay <= 360 for delay in delays)
+    # 确实有抖动：多个进程/重启后不会同时刷新
+    assert max(delays) - min(delays) > 60
+    assert warmer_.horizon == pytest.approx(360)
+
+
+def test_zero_jitter_is_a_fixed_interval():
+    assert {CacheWarmer(Recorder(), interval=60, jitter=0).next_delay() for _ in range(10)} == {60}
+
+
+def test_run_once_counts_each_outcome():
+    warm = Recorder({
+        RECIPES: False,
+        HEALTH: UpstreamUnavailable('meishichina.com', 30, '熔断中'),
+        ('recipes', '', '川菜'): ValueError('解析失败'),
+    })
+    warmer_ = CacheWarmer(warm, static_targets=[RECIPES, HEALTH, ('recipes', '', '川菜'), ('recipes', '', '粤菜')],
+                          interval=100, jitter=0.5)
+
+    stats = warmer_.run_once()
+
+    assert stats == {'warmed': 1, 'fresh': 1, 'skipped': 1, 'failed': 1}
+    assert warmer_.last_run == stats
+    # 每个目标都带上"下一轮最晚开始时间"作为新鲜度要求
+    assert {horizon for _, horizon in warm.calls} == {150}
+
+
+def test_popular_queries_are_warmed_and_decay():
+    warm = Recorder()
+    warmer_ = CacheWarmer(warm, static_targets=[RECIPES], top_queries=2)
+    for query, times in (('火锅', 5), ('烧烤', 3), ('面条', 1)):
+        for _ in range(times):
+            warmer_.record('search-notes', query)
+    warmer_.record('search-notes', '  ')
+
+    warmer_.run_once()
+
+    assert [target for target, _ in warm.calls] == [RECIPES, ('search-notes', '火锅', ''), ('search-notes', '烧烤', '')]
+    # 每轮之后计数减半，只出现过一次的关键词被遗忘
+    assert warmer_._counts == {('search-notes', '火锅'): 2, ('search-notes', '烧烤'): 1}
+
+
+def test_disabled_popular_queries_are_not_recorded():
+    warmer_ = CacheWarmer(Recorder(), top_queries=0)
+    warmer_.record('search-notes', '火锅')
+
+    assert warmer_.popular_targets() == []
+
+
+def test_stop_interrupts_a_round():
+    warmer_ = None
+
+    def warm(*target, horizon):
+        warmer_.stop()
+        return True
+
+    warmer_ = CacheWarmer(warm, static_targets=[RECIPES, HEALTH])
+
+    assert warmer_.run_once()['warmed'] == 1
+
+
+def test_background_loop_uses_startup_delay_then_jittered_intervals(monkeypatch):
+    waits = []
+    rounds = threading.Event()
+    warmer_ = CacheWarmer(Recorder(), static_targets=[RECIPES], interval=100, jitter=0.2)
+    monkeypatch.setattr(warmer_, 'next_delay', lambda: 0.01)
+    real_wait = warmer_._stop.wait
+
+    def wait(delay):
+        waits.append(delay)
+        if len(waits) == 3:
+            rounds.set()
+        return real_wait(delay)
+
+    monkeypatch.setattr(warmer_._stop, 'wait', wait)
+
+    warmer_.start(startup_delay=0.02)
+    assert rounds.wait(5)
+    warmer_.stop()
+    warmer_._thread.join(5)
+
+    assert not warmer_._thread.is_alive()
+    assert waits[:3] == [0.02, 0.01, 0.01]
+    assert warmer_.last_run['warmed'] == 1
+
+
+def test_stop_wakes_a_sleeping_loop():
+    warm = Recorder()
+    warmer_ = CacheWarmer(warm, static_targets=[RECIPES], interval=3600)
+
+    warmer_.start(startup_delay=3600)
+    thread = warmer_._thread
+    warmer_.stop()
+    thread.join(2)
+
+    assert not thread.is_alive()
+    assert warm.calls == []
+
+
+def test_start_is_idempotent_and_respects_disabled_interval():
+    warmer_ = CacheWarmer(Recorder(), interval=3600)
+    warmer_.start(startup_delay=3600)
+    thread = warmer_._thread
+
+    warmer_.start(startup_delay=3600)
+    assert warmer_._thread is thread
+    warmer_.stop()
+    thread.join(2)
+
+    disabled = CacheWarmer(Recorder(), interval=0)
+    disabled.start()
+    assert disabled._thread is None
+
+
+def test_errors_in_a_round_do_not_stop_the_loop(monkeypatch):
+    rounds = []
+    done = threading.Event()
+    warmer_ = CacheWarmer(Recorder(), interval=100)
+    monkeypatch.setattr(warmer_, 'next_delay', lambda: 0.01)
+
+    def run_once():
+        rounds.append(1)
+        if len(rounds) == 2:
+            done.set()
+        raise RuntimeError('意外错误')
+
+    monkeypatch.setattr(warmer_, 'run_once', run_once)
+    warmer_.start(startup_delay=0)
+    assert done.wait(5)
+    warmer_.stop()
+    warmer_._thread.join(2)
+
+    assert len(rounds) >= 2
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+关键词气泡索引（与前端 tokenizeDishName / getThemeFilter / nextCandidates 逻辑一致）
+- 第一层：固定的主题词（LEVEL1_SEEDS）
+- 第二层：主题下菜名中2~4个字的词，按出现次数取前40
+- 第三层：包含第二层词的菜名，按出现次数取前40
+- 数据库加载时一次性建好索引，点击气泡只需查表，不再扫描全部菜品
+"""
+
+import logging
+import re
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+TOP_N = 40
+LEVEL2_MIN_LEN = 2
+LEVEL2_MAX_LEN = 4
+
+LEVEL1_SEEDS = (
+    '辣的让你爽', '香的让你睡', '人间烟火气', '夜有所胖', '解馋必点', '下饭灵魂',
+    '鲜香快乐', '暖胃治愈', '夏日清爽', '硬核肉食', '素食也香', '海鲜盛宴',
+    '地道家常', '异域风情', '汤汤水水', '烧烤江湖', '深夜放毒', '早餐能量',
+    '霸气巨无霸', '精致小份菜', '甜品终结者', '酸爽开胃王', '川湘麻辣魂', '东北硬菜',
+    '粤式清新', '小吃一条街', '网红打卡款', '妈妈的味道', '减肥失败款', '快手炒菜',
+    '低卡轻食', '养生佳品', '醉酒必备', '宵夜yyds', '早茶小点心', '米饭杀手',
+    '面条爱好者', '饺子宇宙', '小龙虾天堂', '火锅爱好者', '吃出回忆杀', '包子馒头',
+    '饼类专场', '蒸的健康', '炸的酥脆', '煮的软烂', '烤的焦香', '凉拌清新',
+    '油泼辣子', '蘸料灵魂', '酱香浓郁', '越吃越上头',
+)
+
+# 主题 → 菜名包含任一关键词即属于该主题
+THEME_KEYWORDS = {
+    '素食也香': ('素', '素食', '素菜', '蔬菜', '清炒', '凉拌', '沙拉', '菌', '豆腐', '青菜', '茄子', '土豆', '西蓝花', '西兰花', '菜花'),
+    '硬核肉食': ('牛', '羊', '猪', '鸡', '鸭', '鹅', '肉', '排', '肘子', '肉夹馍', '烤肉', '牛排'),
+    '辣的让你爽': ('辣', '麻辣', '香辣', '剁椒', '椒麻', '重庆', '川', '湘', '火锅', '酸辣'),
+    '香的让你睡': ('葱香', '蒜香', '椒盐', '葱油', '酥香', '芝麻', '孜然', '奶香'),
+    '人间烟火气': ('小炒', '小吃', '家常', '快餐', '便当', '盖饭', '卤味', '拌饭', '简餐'),
+    '夜有所胖': ('烧烤', '烤', '炸', '串', '夜宵', '花甲', '龙虾', '烤串', '烤鱼'),
+    '解馋必点': ('烤', '炸', '卤', '辣', '糖醋', '香辣', '孜然', '干锅', '铁板'),
+    '下饭灵魂': ('盖饭', '拌饭', '焖饭', '卤肉', '红烧', '酱香', '咖喱'),
+    '鲜香快乐': ('鲜', '清蒸', '白灼', '水煮', '清汤', '菌'),
+    '暖胃治愈': ('汤', '粥', '面', '粉', '米线', '馄饨', '煲', '火锅'),
+    '夏日清爽': ('凉', '冷', '冰', '沙拉', '酸辣', '青柠', '凉皮', '凉粉'),
+    '海鲜盛宴': ('虾', '蟹', '鱼', '贝', '海鲜', '蛤', '螺', '鲍', '海', '蚝', '扇贝'),
+    '地道家常': ('家常', '小炒', '炒菜', '番茄', '土豆', '青椒', '茄子', '豆腐', '炖'),
+    '异域风情': ('韩', '日', '泰', '越', '意', '法', '墨', '印', '咖喱', '披萨', '寿司', '拉面'),
+    '汤汤水水': ('汤', '煲', '粥', '羹', '锅', '炖', '煮', '米线', '粉', '面'),
+    '烧烤江湖': ('烤', '烧烤', '串', '炭火', '铁板', '烤肉', '烤鱼'),
+    '深夜放毒': ('烧烤', '烤', '炸', '串', '夜宵', '龙虾', '花甲', '烤串', '炸鸡', '汉堡', '披萨'),
+    '早餐能量': ('包子', '馒头', '粥', '豆浆', '油条', '饼', '煎饼', '鸡蛋', '早餐', '三明治', '面包', '小笼包'),
+    '霸气巨无霸': ('大份', '超大', '巨无霸', '特大', '加量', '双份', '三人份', '全家桶', '霸王'),
+    '精致小份菜': ('小份', '例份', '精致', '小碟', '一人食', '单人', '迷你', '小巧'),
+    '甜品终结者': ('甜品', '蛋糕', '冰淇淋', '奶茶', '甜', '糖', '糕', '布丁', '慕斯', '芝士'),
+    '酸爽开胃王': ('酸', '醋', '柠檬', '酸辣', '酸菜', '酸汤', '开胃', '泡椒', '青柠'),
+    '川湘麻辣魂': ('麻辣', '剁椒', '川', '湘', '辣', '椒麻', '香辣', '麻', '火锅', '水煮'),
+    '东北硬菜': ('东北', '锅包肉', '溜肉段', '杀猪菜', '酸菜', '炖', '大盘', '铁锅'),
+    '粤式清新': ('清蒸', '白灼', '煲仔', '广式', '粤', '烧腊', '肠粉', '虾饺', '烧味'),
+    '小吃一条街': ('小吃', '街边', '特色', '传统', '老字号', '地道', '特产'),
+    '网红打卡款': ('网红', '爆款', '抖音', '流行', '必吃', '排队'),
+    '妈妈的味道': ('妈', '家', '传统', '经典', '旧', '老', '儿时'),
+    '减肥失败款': ('炸', '烤', '烧烤', '油炸', '肥肉', '奶油', '芝士', '肘子', '红烧肉'),
+    '快手炒菜': ('快炒', '小炒', '爆炒', '清炒', '炒', '青椒', '番茄', '豆角'),
+    '低卡轻食': ('沙拉', '轻食', '低卡', '健康', '减脂', '蔬菜', '水煮', '无油'),
+    '养生佳品': ('养生', '清淡', '滋补', '煲汤', '炖', '药膳', '枸杞', '红枣', '滋润'),
+    '醉酒必备': ('解酒', '清汤', '粥', '面', '小吃', '下酒', '烤串', '花生', '毛豆'),
+    '宵夜yyds': ('宵夜', '夜宵', '烧烤', '烤串', '炸鸡', '花甲', '龙虾', '麻辣烫'),
+    '早茶小点心': ('点心', '早茶', '虾饺', '烧卖', '叉烧', '肠粉', '凤爪', '糕'),
+    '米饭杀手': ('盖饭', '拌饭', '下饭', '卤肉', '红烧', '酱香', '咖喱', '茄汁'),
+    '面条爱好者': ('面', '面条', '拉面', '刀削面', '担担面', '炸酱面', '阳春面', '牛肉面'),
+    '饺子宇宙': ('饺子', '水饺', '蒸饺', '锅贴', '煎饺', '馄饨', '云吞', '抄手'),
+    '小龙虾天堂': ('小龙虾', '龙虾', '麻辣虾', '虾尾', '虾球'),
+    '火锅爱好者': ('火锅', '涮', '麻辣烫', '串串', '冒菜', '关东煮'),
+    '吃出回忆杀': ('传统', '老字号', '经典', '怀旧', '童年', '儿时', '老味道'),
+    '包子馒头': ('包子', '馒头', '花卷', '肉包', '菜包', '豆沙包', '糖三角', '小笼包'),
+    '饼类专场': ('饼', '煎饼', '烙饼', '馅饼', '葱油饼', '手抓饼', '千层饼'),
+    '蒸的健康': ('蒸', '清蒸', '粉蒸', '水蒸'),
+    '炸的酥脆': ('炸', '油炸', '酥炸', '干炸', '脆皮', '酥脆'),
+    '煮的软烂': ('煮', '水煮', '白煮', '炖煮', '慢炖'),
+    '烤的焦香': ('烤', '烧烤', '炙烤', '碳烤', '烤箱'),
+    '凉拌清新': ('凉拌', '凉菜', '凉', '拌', '凉皮', '凉粉'),
+    '油泼辣子': ('油泼', '油辣', '辣椒油', '红油', '辣子'),
+    '蘸料灵魂': ('蘸', '蘸料', '酱', '调料', '蘸水'),
+    '酱香浓郁': ('酱', '酱香', '黄豆酱', '甜面酱', '豆瓣酱', '京酱'),
+    '越吃越上头': ('上瘾', '回味', '停不下来', '辣', '麻辣', '香', '鲜'),
+}
+
+STRIP_PATTERN = re.compile(r'[()\[\]{}·•]')
+SPLIT_PATTERN = re.compile(r'[\s,，/\\+\-&|·]+')
+
+
+def tokenize_dish_name(name):
+    """按常见分隔符切分菜名（与前端 tokenizeDishName 一致）"""
+    parts = SPLIT_PATTERN.split(STRIP_PATTERN.sub(' ', str(name)))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def matches_theme(theme, name):
+    """菜名是否属于主题；未知主题不过滤（与前端 getThemeFilter 的 default 分支一致）"""
+    keywords = THEME_KEYWORDS.get(theme)
+    return keywords is None or any(k in name for k in keywords)
+
+
+def top_counts(counter, n=TOP_N):
+    """按次数降序取前n个；次数相同时保持首次出现的顺序"""
+    return [{'text': text, 'count': count} for text, count in counter.most_common(n)]
+
+
+class TokenIndex:
+    """
+    菜名倒排索引
+
+    - name_counts: 菜名 → 出现次数（同名菜可能出现在多家店）
+    - token_names: 词 → 包含该词的菜名（第三层候选）
+    - level1 / level2: 预先算好的各层候选列表
+    数据库版本变化时在下一次查询前重建
+    """
+
+    def __init__(self, db_pool):
+        self.db_pool = db_pool
+        self._version = None
+        self._lock = threading.Lock()
+        self.level1 = []
+        self.level2 = {}
+        self.level3 = {}
+        self._names = Counter()
+
+    def _ensure_current(self):
+        version, _ = self.db_pool.version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            with self.db_pool.connection() as conn:
+                # 按推荐人数降序读取：次数相同的候选词、菜名以热门菜品中先出现的为准
+                names = [row[0] or '' for row in conn.execute(
+                    'SELECT name FROM dishes ORDER BY recommendation_count DESC, rowid'
+                )]
+            self._build(names)
+            self._version = version
+
+    def _build(self, names):
+        name_counts = Counter(names)
+        all_tokens = Counter()
+        theme_tokens = {theme: Counter() for theme in LEVEL1_SEEDS}
+        theme_sizes = Counter()
+
+        for name, count in name_counts.items():
+            tokens = [t for t in tokenize_dish_name(name) if LEVEL2_MIN_LEN <= len(t) <= LEVEL2_MAX_LEN]
+            themes = [theme for theme in LEVEL1_SEEDS if matches_theme(theme, name)]
+            for theme in themes:
+                theme_sizes[theme] += count
+            for token in tokens:
+                all_tokens[token] += count
+                for theme in themes:
+                    theme_tokens[theme][token] += count
+
+        level2 = {theme: top_counts(counter) for theme, counter in theme_tokens.items()}
+        level2[''] = top_counts(all_tokens)
+
+        # 第三层按"菜名包含该词"匹配，为所有第二层候选词预先算好
+        level3 = {}
+        for candidates in level2.values():
+            for item in candidates:
+                parent = item['text']
+                if parent not in level3:
+                    level3[parent] = self._level3_for(name_counts, parent)
+
+        self._names = name_counts
+        self.level1 = [{'text': theme, 'count': theme_sizes[theme]} for theme in LEVEL1_SEEDS]
+        self.level2 = level2
+        self.level3 = level3
+        logger.info(f"🫧 气泡索引已建立: 菜品 {len(names)} 个, 菜名 {len(name_counts)} 个, 第三层候选 {len(level3)} 组")
+
+    @staticmethod
+    def _level3_for(name_counts, parent):
+        return top_counts(Counter({name: count for name, count in name_counts.items() if parent in name}))
+
+    def candidates(self, level, theme='', parent=''):
+        """
+        查询某一层的气泡候选
+
+        返回: [{text, count}]
+        """
+        self._ensure_current()
+        if level == 1:
+            return self.level1
+        if level == 2:
+            return self.level2.get(theme if theme in THEME_KEYWORDS else '', [])
+        if level == 3:
+            if not parent:
+                return []
+            result = self.level3.get(parent)
+            if result is None:
+                # 不是第二层候选的词（如手动构造的请求），按需计算一次
+                result = self._level3_for(self._names, parent)
+            return result
+        return []
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上游网站访问工具
+- 按站点复用的长连接Session池（keep-alive）
+- Cookie预热、后台定时刷新、落盘持久化
+- 按站点的请求节奏控制（令牌桶，多进程部署时保存在本地SQLite中共享）
+- 按站点的熔断器（closed / open / half-open）
+"""
+
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import requote_uri
+
+logger = logging.getLogger(__name__)
+
+# 运行期缓存目录（cookie、缓存数据库等），可通过环境变量修改
+CACHE_DIR = os.environ.get(
+    'AI_GOURMET_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+)
+
+# 需要预热cookie的站点：站点 -> 首页URL
+WARMUP_URLS = {
+    'baidu.com': 'https://www.baidu.com/',
+    'douguo.com': 'https://www.douguo.com/',
+}
+
+# 各站点的请求节奏：(每秒请求数, 突发容量)
+# 所有进行中的请求共享同一个令牌桶，保证对上游的整体访问频率
+HOST_RATES = {
+    'baidu.com': (1.0, 2),
+    'douguo.com': (2.0, 4),
+    'dianping.com': (1.0, 2),
+    'ctrip.com': (1.0, 2),
+}
+DEFAULT_RATE = (4.0, 4)
+
+# 熔断参数：连续失败多少次后熔断，熔断时长（秒）；探测仍失败时熔断时长翻倍，最长 BREAKER_MAX_OPEN
+# 遇到安全验证（反爬拦截）时立即熔断，时长单独设置
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_OPEN_SECONDS = 30
+BREAKER_BLOCK_SECONDS = 60
+BREAKER_MAX_OPEN_SECONDS = 600
+# 探测请求超过该时长仍未回报结果（被取消等）时，再放行一个
+BREAKER_PROBE_TIMEOUT = 60
+
+# 熔断状态
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 失败原因
+BLOCKED = 'blocked'        # 安全验证、反爬拦截
+TIMEOUT = 'timeout'
+ERROR = 'error'            # 连接失败、5xx、429
+
+
+def site_of(url):
+    """
+    提取URL所属站点（主域名），如 https://m.dianping.com/xxx -> dianping.com
+    同一站点的子域名共享同一个Session和cookie
+    """
+    host = (urlsplit(url).hostname or '').lower()
+    parts = host.split('.')
+    if len(parts) >= 2:
+        return '.'.join(parts[-2:])
+    return host
+
+
+def normalize_url(url):
+    """
+    规范化URL（用于合并相同的请求）：协议和域名转小写、统一百分号编码、去掉 #片段
+    如 https://WWW.Baidu.com/s?wd=杭州 与 https://www.baidu.com/s?wd=%E6%9D%AD%E5%B7%9E 相同
+    """
+    parts = urlsplit(requote_uri(url.strip()))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', parts.query, ''))
+
+
+class SessionPool:
+    """
+    按站点复用的Session池
+
+    - 每个站点一个长期存活的 requests.Session，连接保持keep-alive
+    - 预热站点的cookie在后台按TTL刷新，不占用请求路径
+    - cookie定期写入本地文件，重启后直接恢复
+    """
+
+    def __init__(self, cookie_file=None, warm_ttl=1800, pool_maxsize=32, headers_factory=None, pacer=None):
+        """
+        参数:
+        - cookie_file: cookie持久化文件路径
+        - warm_ttl: cookie刷新间隔（秒）
+        - pool_maxsize: 每个站点的最大连接数
+        - headers_factory: 预热请求使用的headers生成函数 (site) -> dict
+        - pacer: 预热请求使用的节奏控制器（HostPacer），可选
+        """
+        self.cookie_file = cookie_file or os.path.join(CACHE_DIR, 'cookies.json')
+        self.warm_ttl = warm_ttl
+        self.pool_maxsize = pool_maxsize
+        self.headers_factory = headers_factory
+        self.pacer = pacer
+        self._sessions = {}
+        self._warmed_at = {}
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._stop = threading.Event()
+        self._load()
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get(self, url):
+        """获取URL所属站点的共享Session"""
+        site = site_of(url)
+        with self._lock:
+            session = self._sessions.get(site)
+            if session is None:
+                session = self._new_session()
+                self._sessions[site] = session
+            return session
+
+    def warm(self, site):
+        """访问站点首页获取cookie"""
+        home_url = WARMUP_URLS.get(site)
+        if not home_url:
+            return False
+        session = self.get(home_url)
+        headers = self.headers_factory(site) if self.headers_factory else None
+        try:
+            if self.pacer:
+                self.pacer.wait(home_url)
+            session.get(home_url, headers=headers, timeout=10)
+            self._warmed_at[site] = time.time()
+            logger.info(f"🍪 cookie预热完成: {site}, cookies={len(session.cookies)}")
+            return True
+        except Exception as e:
+            logger.warning(f"cookie预热失败: {site}, {e}")
+            return False
+
+    def refresh_expired(self):
+        """刷新过期的预热cookie，并落盘"""
+        now = time.time()
+        changed = False
+        for site in WARMUP_URLS:
+            if now - self._warmed_at.get(site, 0) >= self.warm_ttl:
+                changed = self.warm(site) or changed
+        if changed:
+            self.save()
+
+    def start_background_refresh(self, interval=60):
+        """启动后台刷新线程（重复调用无副作用）"""
+        if self._refresher and self._refresher.is_alive():
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.refresh_expired()
+                except Exception as e:
+                    logger.warning(f"后台刷新cookie失败: {e}")
+                self._stop.wait(interval)
+
+        self._refresher = threading.Thread(target=loop, name='cookie-refresher', daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        """停止后台刷新并保存cookie"""
+        self._stop.set()
+        self.save()
+
+    def save(self):
+        """把各站点cookie写入本地文件"""
+        data = {}
+        with self._lock:
+            items = list(self._sessions.items())
+        for site, session in items:
+            data[site] = {
+                'warmed_at': self._warmed_at.get(site, 0),
+                'cookies': [
+                    {'name': c.name, 'value': c.value, 'domain': c.domain,
+                     'path': c.path, 'expires': c.expires, 'secure': c.secure}
+                    for c in session.cookies
+                ],
+            }
+        try:
+            os.makedirs(os.path.dirname(self.cookie_file), exist_ok=True)
+            tmp_file = self.cookie_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cookie_file)
+        except OSError as e:
+            logger.warning(f"保存cookie失败: {e}")
+
+    def _load(self):
+        """启动时从本地文件恢复cookie"""
+        if not os.path.exists(self.cookie_file):
+            return
+        try:
+            with open(self.cookie_file, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取cookie文件失败: {e}")
+            return
+
+        now = time.time()
+        for site, entry in data.items():
+            session = self._new_session()
+            for c in entry.get('cookies', []):
+                if c.get('expires') and c['expires'] < now:
+                    continue
+                session.cookies.set(
+                    c['name'], c['value'], domain=c.get('domain', ''),
+                    path=c.get('path', '/'), expires=c.get('expires'), secure=c.get('secure', False)
+                )
+            self._sessions[site] = session
+            self._warmed_at[site] = entry.get('warmed_at', 0)
+        logger.info(f"🍪 已恢复cookie: {', '.join(data.keys()) or '无'}")
+
+
+class HostPacer:
+    """
+    按站点的请求节奏控制（令牌桶）
+
+    - 每个站点一个令牌桶，所有线程共享
+    - 有令牌时立即放行；没有令牌时预约下一个时间槽，只等待必要的时长
+    - 相比固定的 time.sleep，空闲站点零等待，并发请求按间隔依次错开
+    - share：只用该比例的速率（突发容量至少为1）；多进程部署时作为 SharedHostPacer 不可用时的退路
+    """
+
+    def __init__(self, rates=None, default_rate=DEFAULT_RATE, share=1.0):
+        self.share = share
+        self.rates = {site: self._scaled(rate) for site, rate in (HOST_RATES if rates is None else rates).items()}
+        self.default_rate = self._scaled(default_rate)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _scaled(self, rate):
+        per_second, burst = rate
+        return per_second * self.share, max(1.0, burst * self.share)
+
+    def reserve(self, url):
+        """
+        为一次请求预约令牌
+
+        返回: 需要等待的秒数（0表示立即放行）
+        """
+        site = site_of(url)
+        rate, burst = self.rates.get(site, self.default_rate)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(site, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            tokens -= 1
+            self._buckets[site] = (tokens, now)
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+    def wait(self, url):
+        """预约令牌并等待到预约的时间槽"""
+        delay = self.reserve(url)
+        if delay > 0:
+            logger.debug(f"⏳ {site_of(url)} 请求排队 {delay:.2f}s")
+            time.sleep(delay)
+        return delay
+
+
+class SharedHostPacer(HostPacer):
+    """
+    多进程共享的请求节奏控制（令牌桶保存在本地SQLite中）
+
+    - 所有工作进程从同一个令牌桶取令牌，合计频率不超过站点速率；忙碌的进程（如运行缓存预热的进程）可以用上空闲进程的额度
+    - 每次预约在一个写事务（BEGIN IMMEDIATE）中读出并更新令牌数，时间用 time.time()（各进程的 monotonic 时钟不可比）
+    - 预约在抓取引擎的事件循环中调用：锁等待时间很短，状态不需要落盘保证
+    - 数据库读写失败时退回进程内的令牌桶，只用 share 比例的速率，合计频率仍不超过站点速率
+    - 进程fork后自动重新打开连接（SQLite连接不能跨进程使用）
+    """
+
+    def __init__(self, db_path, rates=None, default_rate=DEFAULT_RATE, share=1.0, busy_timeout=0.2):
+        super().__init__(rates=rates, default_rate=default_rate, share=share)
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.shared_rates = dict(HOST_RATES if rates is None else rates)
+        self.shared_default_rate = default_rate
+        self._db_lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._inherited = []
+
+    def _db(self):
+        if self._conn is not None and self._pid != os.getpid():
+            # fork前打开的连接：子进程中既不能使用也不能关闭
+            self._inherited.append(self._conn)
+            self._conn = None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS pacer_buckets ('
+                'site TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def reserve(self, url):
+        """
+        为一次请求预约共享令牌桶中的令牌
+
+        返回: 需要等待的秒数（0表示立即放行）
+        """
+        site = site_of(url)
+        rate, burst = self.shared_rates.get(site, self.shared_default_rate)
+        try:
+            with self._db_lock:
+                db = self._db()
+                db.execute('BEGIN IMMEDIATE')
+                try:
+                    now = time.time()
+                    row = db.execute('SELECT tokens, updated_at FROM pacer_buckets WHERE site = ?', (site,)).fetchone()
+                    tokens, updated_at = row if row is not None else (burst, now)
+                    # 系统时间回拨时不补充令牌
+                    tokens = min(burst, tokens + max(0.0, now - updated_at) * rate) - 1
+                    db.execute('INSERT OR REPLACE INTO pacer_buckets (site, tokens, updated_at) VALUES (?, ?, ?)',
+                               (site, tokens, now))
+                    db.execute('COMMIT')
+                except BaseException:
+                    db.execute('ROLLBACK')
+                    raise
+        except sqlite3.Error as e:
+            logger.warning(f"共享令牌桶读写失败，改用进程内令牌桶: {e}")
+            return super().reserve(url)
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+
+class UpstreamUnavailable(requests.RequestException):
+    """站点熔断中，或同一请求刚失败过（负缓存）：不请求上游，直接失败"""
+
+    def __init__(self, site, retry_after, reason):
+        self.site = site
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+        super().__init__(f'{site} 暂不可用（{reason}），请{self.retry_after}秒后重试')
+
+
+class _Circuit:
+    __slots__ = ('state', 'failures', 'reason', 'open_seconds', 'opened_until', 'probe_started', 'closed_at')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.reason = None
+        self.open_seconds = 0
+        self.opened_until = 0.0
+        self.probe_started = 0.0
+        self.closed_at = 0.0
+
+
+class CircuitBreaker:
+    """
+    按站点的熔断器
+
+    - closed：正常请求；连续失败（超时、连接失败、5xx）达到阈值，或遇到安全验证时熔断
+    - open：熔断期内的请求不发往上游，直接抛出 UpstreamUnavailable
+    - half-open：熔断到期后只放行一个探测请求；成功则恢复，失败则再次熔断且时长翻倍
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, open_seconds=BREAKER_OPEN_SECONDS,
+                 block_seconds=BREAKER_BLOCK_SECONDS, max_open_seconds=BREAKER_MAX_OPEN_SECONDS,
+                 probe_timeout=BREAKER_PROBE_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.block_seconds = block_seconds
+        self.max_open_seconds = max_open_seconds
+        self.probe_timeout = probe_timeout
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def before_request(self, url):
+        """请求前调用：熔断中抛出 UpstreamUnavailable，熔断到期后只放行一个探测请求"""
+        site = site_of(url)
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits.get(site)
+            if circuit is None or circuit.state == CLOSED:
+                return
+            if circuit.state == OPEN and now >= circuit.opened_until:
+                circuit.state = HALF_OPEN
+                circuit.probe_started = now
+                logger.info(f"🔌 {site} 熔断到期，放行一个探测请求")
+                return
+            if circuit.state == HALF_OPEN and now - circuit.probe_started >= self.probe_timeout:
+                circuit.probe_started = now
+                return
+            retry_after = circuit.opened_until - now if circuit.state == OPEN else 1
+            raise UpstreamUnavailable(site, retry_after, circuit.reason)
+
+    def record_success(self, url):
+        """上游正常响应；熔断期内完成的旧请求不改变状态"""
+        site = site_of(url)
+        with self._lock:
+            circuit = self._circuits.get(site)
+            if circuit is None or circuit.state == OPEN:
+                return
+            if circuit.state == HALF_OPEN:
+                circuit.closed_at = time.monotonic()
+                logger.info(f"✅ {site} 探测成功，恢复请求")
+            circuit.state = CLOSED
+            circuit.failures = 0
+
+    def record_failure(self, url, reason=ERROR):
+        """上游请求失败（reason 为 BLOCKED 时立即熔断）"""
+        site = site_of(url)
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits.setdefault(site, _Circuit())
+            if circuit.state == OPEN:
+                return
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN or reason == BLOCKED or circuit.failures >= self.failure_threshold:
+                self._trip(site, circuit, reason, now)
+
+    def record_block(self, url):
+        """上游返回了安全验证等拦截页面"""
+        self.record_failure(url, BLOCKED)
+
+    def _trip(self, site, circuit, reason, now):
+        base = self.block_seconds if reason == BLOCKED else self.open_seconds
+        # 探测失败，或刚恢复不久又失败：熔断时长翻倍
+        if circuit.state == HALF_OPEN or (circuit.closed_at and now - circuit.closed_at < self.probe_timeout):
+            circuit.open_seconds = min(max(circuit.open_seconds * 2, base), self.max_open_seconds)
+        else:
+            circuit.open_seconds = base
+        circuit.state = OPEN
+        circuit.reason = reason
+        circuit.opened_until = now + circuit.open_seconds
+        logger.warning(f"⚡ {site} 熔断 {circuit.open_seconds}s（{reason}，连续失败 {circuit.failures} 次）")
+
+    def snapshot(self):
+        """各站点的熔断状态（用于健康检查）"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                site: {
+                    'state': circuit.state,
+                    'reason': circuit.reason,
+                    'failures': circuit.failures,
+                    'retryAfter': max(0, math.ceil(circuit.opened_until - now)) if circuit.state == OPEN else 0,
+                }
+                for site, circuit in self._circuits.items()
+            }
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台缓存预热
+- 固定的热门页面（菜谱精选、饮食健康各分类）和近期搜索最多的关键词，按带抖动的间隔定时刷新
+- 刷新间隔短于页面缓存的新鲜期，这些页面总是直接从内存返回
+- 页面逐个顺序请求，仍经过抓取引擎的节奏控制和熔断，不会集中占用上游的请求配额
+- 到下一轮时仍然新鲜的页面本轮跳过，包括已由其他进程请求过的页面（共享缓存）；多进程部署时只在持有后台任务锁的一个进程中运行
+"""
+
+import logging
+import random
+import threading
+from collections import Counter
+
+from upstream import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 300      # 秒
+DEFAULT_JITTER = 0.2        # 间隔随机浮动 ±20%，多个进程/重启后不会同时刷新
+DEFAULT_TOP_QUERIES = 10
+STARTUP_DELAY = 5           # 启动后首次预热前等待的秒数
+
+
+class CacheWarmer:
+    """
+    缓存预热调度器
+
+    - 预热目标为 (接口, 关键词, 分类) 元组，由 warm(*target, horizon=...) 完成请求和写入缓存；
+      页面在 horizon 秒内仍然新鲜（或其他进程正在刷新）时 warm 返回False，本轮跳过
+    - record() 记录用户搜索的关键词；每轮预热搜索最多的 top_queries 个，之后计数减半，只保留近期热度
+    """
+
+    def __init__(self, warm, static_targets=(), interval=DEFAULT_INTERVAL, jitter=DEFAULT_JITTER,
+                 top_queries=DEFAULT_TOP_QUERIES):
+        """
+        参数:
+        - warm: 预热函数 (endpoint, query, category, horizon) -> 是否请求了上游，失败时抛出异常
+        - static_targets: 固定预热的目标
+        - interval: 预热间隔（秒）
+        - top_queries: 每轮预热的热门搜索数（0表示不预热搜索）
+        """
+        self.warm = warm
+        self.static_targets = list(static_targets)
+        self.interval = interval
+        self.jitter = jitter
+        self.top_queries = top_queries
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_run = None
+
+    def record(self, endpoint, query):
+        """记录一次搜索（只用于统计热度，不触发请求）"""
+        query = (query or '').strip()
+        if not query or self.top_queries <= 0:
+            return
+        with self._lock:
+            self._counts[(endpoint, query)] += 1
+
+    def popular_targets(self):
+        """近期搜索最多的关键词"""
+        with self._lock:
+            top = self._counts.most_common(self.top_queries) if self.top_queries > 0 else []
+        return [(endpoint, query, '') for (endpoint, query), _ in top]
+
+    def _decay(self):
+        with self._lock:
+            self._counts = Counter({key: count // 2 for key, count in self._counts.items() if count // 2 > 0})
+
+    def targets(self):
+        return self.static_targets + self.popular_targets()
+
+    @property
+    def horizon(self):
+        """下一轮预热最晚开始的时间（秒）：页面在这之后才过期的，本轮不需要刷新"""
+        return self.interval * (1 + self.jitter)
+
+    def run_once(self):
+        """
+        顺序预热所有目标
+
+        返回: 统计信息字典
+        """
+        stats = {'warmed': 0, 'fresh': 0, 'skipped': 0, 'failed': 0}
+        for target in self.targets():
+            if self._stop.is_set():
+                break
+            try:
+                stats['warmed' if self.warm(*target, horizon=self.horizon) else 'fresh'] += 1
+            except UpstreamUnavailable as e:
+                # 站点熔断中：跳过，等下一轮
+                stats['skipped'] += 1
+                logger.info(f"预热跳过（{e.site} 熔断中）: {target}")
+            except Exception as e:
+                stats['failed'] += 1
+                logger.warning(f"预热失败: {target}, {e}")
+        self._decay()
+        self.last_run = stats
+        logger.info(f"🔥 缓存预热完成: 成功 {stats['warmed']}, 仍新鲜 {stats['fresh']}, 跳过 {stats['skipped']}, 失败 {stats['failed']}")
+        return stats
+
+    def next_delay(self):
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def start(self, startup_delay=STARTUP_DELAY):
+        """启动后台预热线程（重复调用无副作用；interval<=0 时不启动）"""
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+
+        def loop():
+            delay = startup_delay
+            while not self._stop.wait(delay):
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.warning(f"缓存预热出错: {e}")
+                delay = self.next_delay()
+
+        self._thread = threading.Thread(target=loop, name='cache-warmer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
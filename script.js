@@ -213,7 +213,7 @@ async function onAiRecommend() {
 
     // 根据AI推荐的菜品名筛选
     if (recommendedDishes.length > 0) {
-      const filteredBase = joinAndFilter();
+      const filteredBase = await joinAndFilter();
       const result = filteredBase.filter(item => 
         recommendedDishes.some(dish => 
           (item.dishName || '').includes(dish) || dish.includes(item.dishName || '')
@@ -291,8 +291,9 @@ function rowsToObjects(rows) {
 
 const state = {
   dishes: [], // from 菜品名录.csv
-  shops: [],  // from 店铺名录.csv
+  shops: [],  // from 店铺名录.csv（仅离线模式）
   filtered: [],
+  offline: false, // API不可用、改读CSV时为true
   preferences: { likes: new Set() },
 };
 
@@ -339,27 +340,30 @@ const els = {
   favoritesSummary: document.getElementById('favorites-summary'),
 };
 
-// 从API获取数据（替代原来的CSV读取）
+// /api/feed 每页条数（接口上限200）
+const FEED_PAGE_SIZE = 200;
+
+// 按 next_cursor 逐页读取，直到没有下一页
+async function fetchAllPages(url, label) {
+  const items = [];
+  let cursor = null;
+  do {
+    const pageUrl = cursor ? `${url}&cursor=${encodeURIComponent(cursor)}` : url;
+    const res = await fetch(pageUrl);
+    if (!res.ok) throw new Error(`${label}API请求失败: ` + res.status);
+    const data = await res.json();
+    if (!data.success) throw new Error(`${label}数据获取失败`);
+    items.push(...data.data);
+    cursor = data.next_cursor;
+  } while (cursor);
+  return items;
+}
+
+// 从API获取菜品名录（气泡、AI推荐、本地榜单使用）；菜品与店铺的关联、筛选由 /api/feed 完成
 async function fetchDataFromAPI() {
   try {
-    const [dishesRes, shopsRes] = await Promise.all([
-      fetch('http://localhost:5000/api/dishes'),
-      fetch('http://localhost:5000/api/shops'),
-    ]);
-    
-    if (!dishesRes.ok) throw new Error('菜品API请求失败: ' + dishesRes.status);
-    if (!shopsRes.ok) throw new Error('店铺API请求失败: ' + shopsRes.status);
-    
-    const dishesData = await dishesRes.json();
-    const shopsData = await shopsRes.json();
-    
-    if (!dishesData.success) throw new Error('菜品数据获取失败');
-    if (!shopsData.success) throw new Error('店铺数据获取失败');
-    
-    return {
-      dishes: dishesData.data,
-      shops: shopsData.data
-    };
+    const dishes = await fetchAllPages('http://localhost:5000/api/dishes?limit=1000', '菜品');
+    return { dishes, shops: [] };
   } catch (error) {
     console.error('API获取数据失败:', error);
     throw error;
@@ -371,10 +375,11 @@ async function tryAutoLoad() {
   try {
     // 从API获取数据而不是读取CSV
     const { dishes, shops } = await fetchDataFromAPI();
-    applyLoadedData(dishes, shops);
+    state.offline = false;
+    await applyLoadedData(dishes, shops);
   } catch (e) {
     console.warn('API加载失败，尝试降级到CSV:', e);
-    // 降级策略：如果API失败，尝试读取CSV
+    // 降级策略：如果API失败，尝试读取CSV，在本地关联筛选
   try {
     const [dishesText, shopsText] = await Promise.all([
         fetch('./菜品名录.csv').then(r => r.text()),
@@ -382,7 +387,8 @@ async function tryAutoLoad() {
       ]);
       const dishes = rowsToObjects(parseCsv(dishesText));
       const shops = rowsToObjects(parseCsv(shopsText));
-      applyLoadedData(dishes, shops);
+      state.offline = true;
+      await applyLoadedData(dishes, shops);
     } catch (e2) {
       console.warn(e2);
       els.stats.textContent = '数据加载失败：请确保后端服务已启动。';
@@ -390,24 +396,71 @@ async function tryAutoLoad() {
   }
 }
 
-function applyLoadedData(dishes, shops) {
+async function applyLoadedData(dishes, shops) {
   // 随机打乱顺序，让每次加载展示不同
   state.dishes = shuffleArray(dishes);
   state.shops = shuffleArray(shops);
-  state.filtered = joinAndFilter();
+  state.filtered = await joinAndFilter();
   render();
   updateStats();
-  els.stats.textContent = `已为您找到您周边的美食：菜品 ${state.dishes.length}，店铺 ${state.shops.length}`;
-  // Build and render keyword bubbles now that data is available
-  bubbleState.tokens = [];
+  els.stats.textContent = state.offline
+    ? `已为您找到您周边的美食：菜品 ${state.dishes.length}，店铺 ${state.shops.length}`
+    : `已为您找到您周边的美食：菜品 ${state.dishes.length}`;
+  // Render keyword bubbles now that data is available
   renderBubbles();
   renderRankings();
 }
 
-function joinAndFilter() {
-  const keyword = (els.keyword.value || '').trim().toLowerCase();
-  const minScore = parseFloat(els.minScore.value || '0') || 0;
-  const maxPp = parseFloat(els.maxPp.value || '');
+function currentFilters() {
+  return {
+    keyword: (els.keyword.value || '').trim().toLowerCase(),
+    minScore: parseFloat(els.minScore.value || '0') || 0,
+    maxPp: parseFloat(els.maxPp.value || ''),
+  };
+}
+
+// 关联列表按筛选条件缓存，收藏、气泡、AI推荐等在同一条件下重复使用，不重复请求
+const feedCache = { key: null, items: [] };
+
+// 关联、过滤、排序都在后端完成（/api/feed），按 has_more 逐页读取
+async function fetchFeed(params) {
+  const items = [];
+  let offset = 0;
+  let hasMore = true;
+  while (hasMore) {
+    const query = new URLSearchParams({ ...params, limit: FEED_PAGE_SIZE, offset });
+    const res = await fetch(`http://localhost:5000/api/feed?${query}`);
+    if (!res.ok) throw new Error('关联列表API请求失败: ' + res.status);
+    const data = await res.json();
+    if (!data.success) throw new Error('关联列表获取失败');
+    items.push(...data.data);
+    offset += data.count;
+    hasMore = data.has_more && data.count > 0;
+  }
+  return items;
+}
+
+async function joinAndFilter() {
+  if (state.offline) return joinAndFilterLocal();
+  const { keyword, minScore, maxPp } = currentFilters();
+  const params = {};
+  if (keyword) params.keyword = keyword;
+  if (minScore > 0) params.min_score = minScore;
+  if (Number.isFinite(maxPp) && maxPp > 0) params.max_price = maxPp;
+
+  const key = new URLSearchParams(params).toString();
+  if (feedCache.key !== key) {
+    const items = await fetchFeed(params);
+    // 后端已按 (评分, 推荐人数) 降序排好；只在有筛选条件时才排序，初始加载时保持随机顺序
+    feedCache.items = key ? items : shuffleArray(items);
+    feedCache.key = key;
+  }
+  return feedCache.items;
+}
+
+// 离线模式（读取CSV）下在本地关联、筛选
+function joinAndFilterLocal() {
+  const { keyword, minScore, maxPp } = currentFilters();
 
   // Build shop map by name
   const shopByName = new Map();
@@ -607,8 +660,8 @@ function render(list = state.filtered) {
   if (info) info.textContent = `${pagination.page} / ${totalPages}（共${total}条）`;
 }
 
-function onFilter() {
-  state.filtered = joinAndFilter();
+async function onFilter() {
+  state.filtered = await joinAndFilter();
   updateStats();
   render();
 }
@@ -623,13 +676,13 @@ function onRandom() {
   }, 450);
 }
 
-function onReset() {
+async function onReset() {
   els.keyword.value = '';
   els.minScore.value = '0';
   els.maxPp.value = '';
   els.count.value = '3';
   bubbleState.path = [];
-  state.filtered = joinAndFilter();
+  state.filtered = await joinAndFilter();
   updateStats();
   render();
   renderBubbles();
@@ -682,7 +735,7 @@ async function generateFavoritesSummary() {
   els.favoritesSummary.classList.add('loading');
   els.favoritesSummary.innerHTML = '正在分析您的美食偏好...';
   
-  const filteredBase = joinAndFilter();
+  const filteredBase = await joinAndFilter();
   const favorites = Array.from(state.preferences.likes)
     .map(key => {
       const [shopName, dishName] = key.split('::');
@@ -746,7 +799,7 @@ async function generateFavoritesSummary() {
   }
 }
 
-function renderFavoritesList() {
+async function renderFavoritesList() {
   if (!els.favoritesList) return;
   
   els.favoritesList.innerHTML = '';
@@ -756,7 +809,7 @@ function renderFavoritesList() {
     return;
   }
   
-  const filteredBase = joinAndFilter();
+  const filteredBase = await joinAndFilter();
   const favorites = Array.from(state.preferences.likes)
     .map(key => {
       const [shopName, dishName] = key.split('::');
@@ -828,7 +881,7 @@ function showSpin(show) {
   el.classList.toggle('show', !!show);
 }
 
-function onDishSearch() {
+async function onDishSearch() {
   const query = (els.dishSearchInput?.value || '').trim();
   if (!query) return;
   
@@ -836,7 +889,7 @@ function onDishSearch() {
   bubbleState.path = [];
   
   // 模糊搜索菜品名
-  const base = joinAndFilter();
+  const base = await joinAndFilter();
   const searchResults = base.filter(item => 
     item.dishName.toLowerCase().includes(query.toLowerCase())
   );
@@ -1511,14 +1564,21 @@ const rankingState = {
   shopInterval: null,
 };
 
-function renderRankings() {
-  if (!els.dishRanking || !els.shopRanking) {
-    console.log('Ranking elements not found:', { dishRanking: els.dishRanking, shopRanking: els.shopRanking });
-    return;
+// 榜单优先使用后端预先计算的结果，后端不可用时（如CSV降级模式）在本地计算
+async function fetchRankings() {
+  try {
+    const res = await fetch('http://localhost:5000/api/rankings?dish_limit=20&shop_limit=10');
+    if (res.ok) {
+      const data = await res.json();
+      if (data.success) return data.data;
+    }
+  } catch (e) {
+    console.warn('榜单接口不可用，改为本地计算:', e);
   }
-  
-  console.log('Rendering rankings with', state.dishes.length, 'dishes');
-  
+  return computeLocalRankings();
+}
+
+function computeLocalRankings() {
   // 榜单一：根据菜品推荐人数排行
   const dishRankingFull = state.dishes
     .map(d => ({
@@ -1535,28 +1595,6 @@ function renderRankings() {
     ? dishRankingFull.filter(d => d.count > 0)
     : dishRankingFull).slice(0, Math.max(dishLimit, 10));
 
-  els.dishRanking.innerHTML = '';
-  const dishInner = document.createElement('div');
-  dishInner.className = 'ranking-list-inner';
-  dishSlice.forEach((item, index) => {
-    const div = document.createElement('div');
-    div.className = 'ranking-item';
-    div.dataset.index = index;
-    div.innerHTML = `
-      <span class="rank">${index + 1}</span>
-      <img class="dish-img" src="${normalizeImage(item.imageUrl)}" alt="${item.name}" />
-      <span class="name">${item.name}</span>
-      <span class="count">${item.count}人推荐</span>
-    `;
-    // 点击跳转
-    div.addEventListener('click', () => {
-      const shop = state.shops.find(s => s['店名'] === item.shopName);
-      if (shop && shop['详情页']) window.open(shop['详情页'], '_blank', 'noopener');
-    });
-    dishInner.appendChild(div);
-  });
-  els.dishRanking.appendChild(dishInner);
-
   // 榜单二：根据店铺所有菜品推荐人数之和排行
   const shopTotals = new Map();
   const shopDishes = new Map();
@@ -1585,10 +1623,51 @@ function renderRankings() {
     shopRanking = shopRanking.slice(0, 10);
   }
   const shopLimit = 10; // 固定10，一列展示
+  return { dishes: dishSlice, shops: shopRanking.slice(0, Math.max(shopLimit, 5)) };
+}
+
+// 点击榜单项跳转到店铺详情页
+function openShopDetail(shopName, detailUrl) {
+  if (detailUrl) {
+    window.open(detailUrl, '_blank', 'noopener');
+    return;
+  }
+  const shop = state.shops.find(s => s['店名'] === shopName);
+  if (shop && shop['详情页']) window.open(shop['详情页'], '_blank', 'noopener');
+}
+
+async function renderRankings() {
+  if (!els.dishRanking || !els.shopRanking) {
+    console.log('Ranking elements not found:', { dishRanking: els.dishRanking, shopRanking: els.shopRanking });
+    return;
+  }
+  
+  const rankings = await fetchRankings();
+  const dishSlice = rankings.dishes;
+
+  els.dishRanking.innerHTML = '';
+  const dishInner = document.createElement('div');
+  dishInner.className = 'ranking-list-inner';
+  dishSlice.forEach((item, index) => {
+    const div = document.createElement('div');
+    div.className = 'ranking-item';
+    div.dataset.index = index;
+    div.innerHTML = `
+      <span class="rank">${index + 1}</span>
+      <img class="dish-img" src="${normalizeImage(item.imageUrl)}" alt="${item.name}" />
+      <span class="name">${item.name}</span>
+      <span class="count">${item.count}人推荐</span>
+    `;
+    // 点击跳转
+    div.addEventListener('click', () => openShopDetail(item.shopName, item.detailUrl));
+    dishInner.appendChild(div);
+  });
+  els.dishRanking.appendChild(dishInner);
+
   els.shopRanking.innerHTML = '';
   const shopInner = document.createElement('div');
   shopInner.className = 'ranking-list-inner';
-  shopRanking.slice(0, Math.max(shopLimit, 5)).forEach((item, index) => {
+  rankings.shops.forEach((item, index) => {
     const div = document.createElement('div');
     div.className = 'shop-item';
     div.dataset.index = index;
@@ -1608,11 +1687,7 @@ function renderRankings() {
     `;
     const topDishElements = div.querySelectorAll('.top-dish');
     topDishElements.forEach(dishElement => {
-      dishElement.addEventListener('click', () => {
-        const shopName = dishElement.dataset.shopName;
-        const shop = state.shops.find(s => s['店名'] === shopName);
-        if (shop && shop['详情页']) window.open(shop['详情页'], '_blank', 'noopener');
-      });
+      dishElement.addEventListener('click', () => openShopDetail(dishElement.dataset.shopName, item.detailUrl));
     });
     shopInner.appendChild(div);
   });
@@ -1800,7 +1875,6 @@ function startRankingCarousel() {
 }
 // -------- Keyword bubble explorer --------
 const bubbleState = {
-  tokens: [], // all tokens from dishName
   path: [],   // [level1, level2] then dish names at level3
   level: 1,
   theme: '',  // current level1 seed
@@ -1942,21 +2016,6 @@ function tokenizeDishName(name) {
   return parts;
 }
 
-function buildTokens() {
-  const freq = new Map();
-  for (const d of state.dishes) {
-    const name = d['菜品名称'] || d['菜名'] || d['名称'] || '';
-    const tokens = tokenizeDishName(name);
-    for (const t of tokens) {
-      const count = freq.get(t) || 0;
-      freq.set(t, count + 1);
-    }
-  }
-  bubbleState.tokens = Array.from(freq.entries())
-    .filter(([, c]) => c >= 2)
-    .map(([text, count]) => ({ text, count }));
-}
-
 function nextCandidates() {
   // Level1: show seeded themes (static)
   if (bubbleState.level === 1) {
@@ -2000,6 +2059,27 @@ function nextCandidates() {
   return [];
 }
 
+// 第二、三层候选优先使用后端预先建好的索引，后端不可用时（如CSV降级模式）在本地计算
+let bubbleRequestId = 0;
+async function fetchCandidates() {
+  if (bubbleState.level === 1) return nextCandidates();
+  try {
+    const params = new URLSearchParams({
+      level: String(bubbleState.level),
+      theme: bubbleState.theme || '',
+      parent: bubbleState.path[1] || '',
+    });
+    const res = await fetch(`http://localhost:5000/api/tokens?${params}`);
+    if (res.ok) {
+      const data = await res.json();
+      if (data.success) return data.data;
+    }
+  } catch (e) {
+    console.warn('气泡候选接口不可用，改为本地计算:', e);
+  }
+  return nextCandidates();
+}
+
 function bubbleColor(idx) {
   const hues = [212, 260, 160, 20, 300, 40, 190];
   const h = hues[idx % hues.length];
@@ -2047,12 +2127,14 @@ function renderBubblePath() {
   els.bubblePath.appendChild(frag);
 }
 
-function renderBubbles() {
+async function renderBubbles() {
   if (!state.dishes.length) return; // wait for data
-  if (bubbleState.tokens.length === 0) buildTokens();
+  const requestId = ++bubbleRequestId;
+  const cand = await fetchCandidates();
+  // 等待期间又点击了其他气泡，丢弃过期结果
+  if (requestId !== bubbleRequestId) return;
   renderBubblePath();
   els.bubbleCanvas.innerHTML = '';
-  const cand = nextCandidates();
   const W = els.bubbleCanvas.clientWidth || 700;
   const H = Math.max(320, els.bubbleCanvas.clientHeight || 320);
   const pad = 28;
@@ -2110,11 +2192,11 @@ function renderBubbles() {
   });
 }
 
-function applyBubbleFilter() {
+async function applyBubbleFilter() {
   if (bubbleState.path.length === 0) {
-    state.filtered = joinAndFilter();
+    state.filtered = await joinAndFilter();
   } else {
-    const filteredBase = joinAndFilter();
+    const filteredBase = await joinAndFilter();
     const currentPath = bubbleState.path;
     
     // Apply filter based on current path level
@@ -2280,7 +2362,8 @@ async function searchNotes(query, page = 1) {
     
     // 使用Flask后端API（解决CORS跨域问题）
     // 确保Flask服务器已启动: python api/app.py
-    const apiUrl = `http://localhost:5000/api/search-notes?query=${encodeURIComponent(enhancedQuery)}&page=${page}`;
+    // format=json：由后端解析百度结果页，只返回紧凑的笔记列表
+    const apiUrl = `http://localhost:5000/api/search-notes?query=${encodeURIComponent(enhancedQuery)}&page=${page}&format=json`;
     
     console.log('原始搜索词:', query);
     console.log('增强搜索词:', enhancedQuery);
@@ -2290,7 +2373,7 @@ async function searchNotes(query, page = 1) {
     const response = await fetch(apiUrl, {
       method: 'GET',
       headers: {
-        'Accept': 'text/html',
+        'Accept': 'application/json',
       },
     });
 
@@ -2305,10 +2388,10 @@ async function searchNotes(query, page = 1) {
       throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
     }
 
-    const html = await response.text();
+    const data = await response.json();
     
-    // 解析HTML并提取笔记内容
-    const notes = parseNotesFromHtml(html);
+    // 后端已完成提取和去重，这里只补充前端展示需要的字段
+    const notes = normalizeNotes(data.data || []);
     
     if (notes.length === 0) {
       throw new Error('未找到相关笔记');
@@ -2379,115 +2462,15 @@ async function searchNotes(query, page = 1) {
   }
 }
 
-function parseNotesFromHtml(html) {
-  // 创建临时DOM解析器
-  const parser = new DOMParser();
-  const doc = parser.parseFromString(html, 'text/html');
-  
-  const notes = [];
-  const seenTitles = new Set(); // 用于去重
-  
-  // 百度搜索结果的容器 - 优先使用更具体的选择器
-  const resultItems = doc.querySelectorAll('.c-result[data-srcid="1599"]');
-  
-  console.log(`找到 ${resultItems.length} 个搜索结果容器`);
-  
-  resultItems.forEach((item, index) => {
-    try {
-      // 提取标题 - 百度使用 cosc-title 类和 s-text 注释标记
-      const titleEl = item.querySelector('h3.cosc-title, h3 .cosc-title-slot, h3');
-      let title = '';
-      if (titleEl) {
-        // 尝试从HTML注释中提取标题（更准确）
-        const htmlContent = titleEl.innerHTML;
-        const match = htmlContent.match(/<!--s-text-->(.*?)<!--\/s-text-->/);
-        if (match) {
-          title = match[1].trim();
-        } else {
-          title = titleEl.textContent.trim();
-        }
-      }
-      
-      // 提取图片
-      const imgEl = item.querySelector('img.cos-image-body, img[alt]');
-      let image = '';
-      if (imgEl) {
-        image = imgEl.getAttribute('src') || imgEl.getAttribute('data-src') || '';
-        // 解码HTML实体
-        image = image.replace(/&amp;/g, '&');
-      }
-      
-      // 提取链接
-      let url = '';
-      const linkEl = item.querySelector('[rl-link-href]');
-      if (linkEl) {
-        url = linkEl.getAttribute('rl-link-href') || '';
-      } else {
-        const aEl = item.querySelector('a[href]');
-        if (aEl) {
-          url = aEl.href;
-        }
-      }
-      
-      // 如果没有找到链接，尝试从article元素上查找
-      if (!url) {
-        const articleLink = item.getAttribute('rl-link-href');
-        if (articleLink) {
-          url = articleLink;
-        }
-      }
-      
-      // 提取来源和时间
-      const sourceEl = item.querySelector('.source-name_5yg27, .cu-color-source');
-      const source = sourceEl ? sourceEl.textContent.trim() : '百度';
-      
-      const timeEl = item.querySelector('.source-time_7nWwX, .cu-color-info');
-      const time = timeEl ? timeEl.textContent.trim() : '';
-      
-      // 生成描述（使用来源和时间）
-      const description = time ? `${source} · ${time}` : source;
-      
-      if (title) {
-        // 去重检查：如果标题已经存在，跳过
-        if (seenTitles.has(title)) {
-          console.log(`⚠️ 跳过重复笔记: ${title.substring(0, 30)}...`);
-          return;
-        }
-        
-        seenTitles.add(title);
-        
-        const noteData = {
-          id: `note-${notes.length}-${Date.now()}`,
-          title,
-          description,
-          url: url || '',
-          image: image || `data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' width='280' height='180' viewBox='0 0 280 180'%3E%3Crect width='280' height='180' fill='%23222'/%3E%3Ctext x='140' y='90' text-anchor='middle' fill='%23666' font-size='16'%3E美食笔记%3C/text%3E%3C/svg%3E`,
-          source,
-        };
-        
-        // 调试日志
-        if (notes.length < 3) {
-          console.log(`✅ 笔记 ${notes.length + 1}:`, {
-            title: noteData.title.substring(0, 30),
-            url: noteData.url.substring(0, 80),
-            hasUrl: !!noteData.url
-          });
-        }
-        
-        notes.push(noteData);
-      }
-    } catch (err) {
-      console.error('解析笔记项失败:', err);
-    }
-  });
-  
-  console.log(`📊 解析完成: 找到 ${resultItems.length} 个容器, 去重后得到 ${notes.length} 个唯一笔记`);
-  
-  if (resultItems.length > notes.length) {
-    console.log(`✨ 成功去除 ${resultItems.length - notes.length} 个重复笔记`);
-  }
-  
-  return notes;
+function normalizeNotes(items) {
+  return items.map((item, index) => ({
+    id: `note-${index}-${Date.now()}`,
+    title: item.title,
+    description: item.description || item.source || '百度',
+    url: item.url || '',
+    image: item.image || `data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' width='280' height='180' viewBox='0 0 280 180'%3E%3Crect width='280' height='180' fill='%23222'/%3E%3Ctext x='140' y='90' text-anchor='middle' fill='%23666' font-size='16'%3E美食笔记%3C/text%3E%3C/svg%3E`,
+    source: item.source || '百度',
+  }));
 }
 
 // 渲染当前页的笔记
@@ -2560,10 +2543,18 @@ function renderNotes(notes) {
 
   els.notesResults.innerHTML = html;
   
+  // 只预取最前面的几篇，其余在鼠标停留时预取，避免每次翻页都集中请求上游
+  prefetchNoteDetails(notes.map(note => note.url).filter(url => url && url !== '#').slice(0, NOTE_PREFETCH_COUNT));
+  
   // 为笔记卡片添加点击事件
   document.querySelectorAll('.note-item').forEach(item => {
     const url = item.getAttribute('data-note-url');
     if (url) {
+      let hoverTimer = null;
+      item.addEventListener('mouseenter', () => {
+        hoverTimer = setTimeout(() => prefetchNoteDetails([url]), NOTE_PREFETCH_HOVER_DELAY);
+      });
+      item.addEventListener('mouseleave', () => clearTimeout(hoverTimer));
       item.addEventListener('click', () => {
         // 从卡片中获取标题
         const titleEl = item.querySelector('.note-item-title');
@@ -2735,7 +2726,7 @@ async function searchRecipes(query) {
   `;
   
   try {
-    const apiUrl = `http://localhost:5000/api/search-recipes?query=${encodeURIComponent(query)}&page=1`;
+    const apiUrl = `http://localhost:5000/api/search-recipes?query=${encodeURIComponent(query)}&page=1&format=json`;
     console.log('搜索菜谱:', apiUrl);
     
     const response = await fetch(apiUrl);
@@ -2743,8 +2734,8 @@ async function searchRecipes(query) {
       throw new Error(`HTTP ${response.status}`);
     }
     
-    const html = await response.text();
-    const recipes = parseRecipesFromHtml(html);
+    const data = await response.json();
+    const recipes = normalizeRecipes(data.data || []);
     
     if (recipes.length === 0) {
       throw new Error('未找到相关菜谱');
@@ -2794,7 +2785,7 @@ async function loadFeaturedRecipes() {
   `;
   
   try {
-    const apiUrl = `http://localhost:5000/api/featured-recipes`;
+    const apiUrl = `http://localhost:5000/api/featured-recipes?format=json`;
     console.log('加载精选菜谱:', apiUrl);
     
     const response = await fetch(apiUrl);
@@ -2802,8 +2793,8 @@ async function loadFeaturedRecipes() {
       throw new Error(`HTTP ${response.status}`);
     }
     
-    const html = await response.text();
-    const recipes = parseRecipesFromHtml(html);
+    const data = await response.json();
+    const recipes = normalizeRecipes(data.data || []);
     
     if (recipes.length === 0) {
       throw new Error('未找到精选菜谱');
@@ -2855,8 +2846,8 @@ async function loadHealthRecipes(category) {
   
   try {
     const apiUrl = category 
-      ? `http://localhost:5000/api/health-recipes?category=${encodeURIComponent(category)}`
-      : `http://localhost:5000/api/health-recipes`;
+      ? `http://localhost:5000/api/health-recipes?category=${encodeURIComponent(category)}&format=json`
+      : `http://localhost:5000/api/health-recipes?format=json`;
     console.log('加载健康菜谱:', apiUrl);
     
     const response = await fetch(apiUrl);
@@ -2864,8 +2855,8 @@ async function loadHealthRecipes(category) {
       throw new Error(`HTTP ${response.status}`);
     }
     
-    const html = await response.text();
-    const recipes = parseRecipesFromHtml(html);
+    const data = await response.json();
+    const recipes = normalizeRecipes(data.data || []);
     
     if (recipes.length === 0) {
       throw new Error('未找到相关健康菜谱');
@@ -2891,124 +2882,15 @@ async function loadHealthRecipes(category) {
   }
 }
 
-function parseRecipesFromHtml(html) {
-  const parser = new DOMParser();
-  const doc = parser.parseFromString(html, 'text/html');
-  
-  const recipes = [];
-  const seenTitles = new Set();
-  
-  // 豆果美食的多种可能的菜谱容器选择器
-  // 尝试多种选择器以适配不同页面结构
-  let recipeItems = doc.querySelectorAll('a[href*="/cookbook/"]');
-  
-  // 如果找不到，尝试其他选择器
-  if (recipeItems.length === 0) {
-    recipeItems = doc.querySelectorAll('.cook-list li, .recipe-item, .item, .list-item');
-  }
-  
-  console.log(`找到 ${recipeItems.length} 个菜谱容器`);
-  
-  recipeItems.forEach((item, index) => {
-    try {
-      let title = '';
-      let image = '';
-      let url = '';
-      let author = '';
-      
-      // 如果item本身是a标签
-      if (item.tagName === 'A' && item.getAttribute('href') && item.getAttribute('href').includes('/cookbook/')) {
-        // ✅ 使用getAttribute获取原始href，不要使用.href（会被浏览器转换为绝对路径）
-        url = item.getAttribute('href');
-        
-        // 提取图片
-        const imgEl = item.querySelector('img');
-        if (imgEl) {
-          image = imgEl.src || imgEl.dataset.src || imgEl.dataset.original || '';
-          // 从alt获取标题
-          if (imgEl.alt) {
-            title = imgEl.alt;
-          }
-        }
-        
-        // 从其他元素获取标题
-        if (!title) {
-          const titleEl = item.querySelector('.title, .name, .cp-title, h3, strong, p');
-          if (titleEl) {
-            title = titleEl.textContent.trim();
-          }
-        }
-      } else {
-        // 提取链接
-        const linkEl = item.querySelector('a[href*="/cookbook/"]');
-        if (linkEl) {
-          // ✅ 使用getAttribute获取原始href
-          url = linkEl.getAttribute('href');
-        }
-        
-        // 提取标题
-        const titleEl = item.querySelector('.title, .name, .cp-title, h3, strong, a');
-        if (titleEl) {
-          title = titleEl.textContent.trim();
-        }
-        
-        // 提取图片
-        const imgEl = item.querySelector('img');
-        if (imgEl) {
-          image = imgEl.src || imgEl.dataset.src || imgEl.dataset.original || '';
-          if (!title && imgEl.alt) {
-            title = imgEl.alt;
-          }
-        }
-      }
-      
-      // 提取作者
-      const authorEl = item.querySelector('.author, .username, .by');
-      if (authorEl) {
-        author = authorEl.textContent.trim();
-      }
-      
-      // 清理标题（去除多余空格和换行）
-      title = title.replace(/\s+/g, ' ').trim();
-      
-      // 验证URL和标题的有效性
-      if (title && title.length > 0 && title.length < 100 && url && !seenTitles.has(title)) {
-        seenTitles.add(title);
-        
-        // 确保URL是完整的
-        if (!url.startsWith('http')) {
-          url = url.startsWith('/') ? `https://www.douguo.com${url}` : `https://www.douguo.com/${url}`;
-        }
-        
-        recipes.push({
-          id: `recipe-${recipes.length}-${Date.now()}`,
-          title,
-          image: image || `data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' width='280' height='180' viewBox='0 0 280 180'%3E%3Crect width='280' height='180' fill='%23f5f5f5'/%3E%3Ctext x='140' y='90' text-anchor='middle' fill='%23999' font-size='16'%3E菜谱图片%3C/text%3E%3C/svg%3E`,
-          url: url,
-          author: author || '豆果美食',
-        });
-        
-        if (recipes.length <= 3) {
-          console.log(`✅ 菜谱 ${recipes.length}:`, {
-            title: title.substring(0, 30),
-            url: url.substring(0, 50),
-            hasImage: !!image
-          });
-        }
-      }
-    } catch (err) {
-      console.error('解析菜谱项失败:', err);
-    }
-  });
-  
-  console.log(`📊 解析完成: 找到 ${recipeItems.length} 个容器, 去重后得到 ${recipes.length} 个唯一菜谱`);
-  
-  // 如果没有找到菜谱，记录HTML的开头部分用于调试
-  if (recipes.length === 0) {
-    console.warn('⚠️ 未找到菜谱，HTML开头:', html.substring(0, 500));
-  }
-  
-  return recipes;
+// 后端（format=json）已完成菜谱提取和去重，这里只补充前端展示需要的字段
+function normalizeRecipes(items) {
+  return items.map((item, index) => ({
+    id: `recipe-${index}-${Date.now()}`,
+    title: item.title,
+    image: item.image || `data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' width='280' height='180' viewBox='0 0 280 180'%3E%3Crect width='280' height='180' fill='%23f5f5f5'/%3E%3Ctext x='140' y='90' text-anchor='middle' fill='%23999' font-size='16'%3E菜谱图片%3C/text%3E%3C/svg%3E`,
+    url: item.url,
+    author: item.author || '豆果美食',
+  }));
 }
 
 function renderCurrentPageRecipes() {
@@ -3119,6 +3001,76 @@ function updateRecipesPagination() {
 }
 
 // -------- 笔记详情弹窗 --------
+// 预取的笔记详情：url -> Promise（结果为详情对象，预取失败时为null）
+const noteDetailCache = new Map();
+const NOTE_DETAIL_CACHE_SIZE = 100;
+// 渲染结果时预取的篇数；其余笔记在鼠标停留超过 NOTE_PREFETCH_HOVER_DELAY 毫秒时预取
+const NOTE_PREFETCH_COUNT = 2;
+const NOTE_PREFETCH_HOVER_DELAY = 300;
+
+// 批量请求笔记详情，后端按完成先后逐行（NDJSON）返回，每篇到达即可使用
+async function prefetchNoteDetails(urls) {
+  const pending = [...new Set(urls)].filter(url => !noteDetailCache.has(url));
+  if (pending.length === 0) return;
+  
+  const resolvers = new Map();
+  pending.forEach(url => {
+    noteDetailCache.set(url, new Promise(resolve => resolvers.set(url, resolve)));
+  });
+  // 只保留最近的详情
+  while (noteDetailCache.size > NOTE_DETAIL_CACHE_SIZE) {
+    noteDetailCache.delete(noteDetailCache.keys().next().value);
+  }
+  
+  const handleLine = line => {
+    if (!line.trim()) return;
+    const item = JSON.parse(line);
+    const resolve = resolvers.get(item.url);
+    if (!resolve) return;
+    resolvers.delete(item.url);
+    if (item.status === 200) {
+      resolve(item.data);
+    } else {
+      // 出错的笔记点击时再单独请求
+      noteDetailCache.delete(item.url);
+      resolve(null);
+    }
+  };
+  
+  try {
+    console.log(`📚 预取笔记详情: ${pending.length} 篇`);
+    const response = await fetch('http://localhost:5000/api/note-details', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ urls: pending }),
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`HTTP ${response.status}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop();
+      lines.forEach(handleLine);
+    }
+    handleLine(buffer + decoder.decode());
+  } catch (error) {
+    console.warn('⚠️ 预取笔记详情失败:', error);
+  } finally {
+    // 没有拿到结果的笔记移出缓存，点击时单独请求
+    resolvers.forEach((resolve, url) => {
+      noteDetailCache.delete(url);
+      resolve(null);
+    });
+  }
+}
+
 async function showNoteDetail(noteUrl, title = '') {
   const modal = document.getElementById('note-detail-modal');
   const titleEl = document.getElementById('note-detail-title');
@@ -3150,17 +3102,22 @@ async function showNoteDetail(noteUrl, title = '') {
   `;
   
   try {
-    const apiUrl = `http://localhost:5000/api/note-detail?url=${encodeURIComponent(noteUrl)}`;
-    console.log('🔍 获取笔记详情:', noteUrl);
-    console.log('📡 API URL:', apiUrl);
+    // 优先使用预取结果（仍在加载中时等待它完成）
+    let noteDetail = noteDetailCache.has(noteUrl) ? await noteDetailCache.get(noteUrl) : null;
     
-    const response = await fetch(apiUrl);
-    if (!response.ok) {
-      throw new Error(`HTTP ${response.status}`);
+    if (!noteDetail) {
+      const apiUrl = `http://localhost:5000/api/note-detail?url=${encodeURIComponent(noteUrl)}`;
+      console.log('🔍 获取笔记详情:', noteUrl);
+      console.log('📡 API URL:', apiUrl);
+      
+      const response = await fetch(apiUrl);
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      
+      noteDetail = await response.json();
     }
     
-    const noteDetail = await response.json();
-    
     console.log('✅ 笔记详情:', noteDetail);
     console.log('📊 详情统计:', {
       '类型': noteDetail.type,
@@ -3340,8 +3297,8 @@ async function showRecipeDetail(recipeUrl, title = '') {
   `;
   
   try {
-    // 添加debug参数以获取调试信息
-    const apiUrl = `http://localhost:5000/api/recipe-detail?url=${encodeURIComponent(recipeUrl)}&debug=true`;
+    // format=json：由后端解析菜谱详情（解析结果在后端按URL+内容哈希缓存）
+    const apiUrl = `http://localhost:5000/api/recipe-detail?url=${encodeURIComponent(recipeUrl)}&format=json`;
     console.log('🔍 获取菜谱详情:', recipeUrl);
     console.log('📡 API URL:', apiUrl);
     
@@ -3350,23 +3307,8 @@ async function showRecipeDetail(recipeUrl, title = '') {
       throw new Error(`HTTP ${response.status}`);
     }
     
-    const html = await response.text();
-    
-    // 保存HTML供调试使用
-    window.lastRecipeHtml = html;
-    window.lastRecipeUrl = recipeUrl;
-    
-    // 输出HTML的前2000字符用于调试
-    console.log('📄 HTML内容（前2000字符）:\n', html.substring(0, 2000));
-    console.log('💾 完整HTML已保存到 window.lastRecipeHtml，可在控制台查看');
-    
-    // 查找调试信息
-    const debugMatch = html.match(/<!-- ===== 调试信息 =====([\s\S]*?)===== 调试信息结束 ===== -->/);
-    if (debugMatch) {
-      console.log('🐛 调试信息:\n', debugMatch[1]);
-    }
-    
-    const recipeDetail = parseRecipeDetail(html);
+    const data = await response.json();
+    const recipeDetail = data.data;
     
     console.log('✅ 解析结果:', recipeDetail);
     console.log('📊 解析统计:', {
@@ -3394,123 +3336,6 @@ async function showRecipeDetail(recipeUrl, title = '') {
   }
 }
 
-function parseRecipeDetail(html) {
-  const parser = new DOMParser();
-  const doc = parser.parseFromString(html, 'text/html');
-  
-  const detail = {
-    title: '',
-    image: '',
-    author: '',
-    description: '',
-    ingredients: [],
-    steps: [],
-    tips: ''
-  };
-  
-  // 提取标题 - 豆果美食使用 h1.title
-  const titleEl = doc.querySelector('h1.title');
-  if (titleEl) {
-    detail.title = titleEl.textContent.trim();
-  }
-  
-  // 提取主图 - 豆果美食在 #banner 里
-  const bannerImg = doc.querySelector('#banner img, #banner .wb100');
-  if (bannerImg) {
-    detail.image = bannerImg.src || bannerImg.dataset.src || '';
-  }
-  
-  // 提取作者 - 豆果美食使用 .nickname
-  const authorEl = doc.querySelector('.nickname, .author-info .nickname');
-  if (authorEl) {
-    detail.author = authorEl.textContent.trim();
-  }
-  
-  // 提取描述 - 豆果美食使用 p.intro
-  const descEl = doc.querySelector('p.intro');
-  if (descEl) {
-    detail.description = descEl.textContent.trim();
-  }
-  
-  // 提取食材 - 豆果美食使用 table.retamr 结构
-  const ingredientTable = doc.querySelector('table.retamr');
-  if (ingredientTable) {
-    const tds = ingredientTable.querySelectorAll('td');
-    tds.forEach(td => {
-      const nameEl = td.querySelector('.scname');
-      const amountEl = td.querySelector('.scnum');
-      
-      if (nameEl) {
-        const name = nameEl.textContent.trim();
-        const amount = amountEl ? amountEl.textContent.trim() : '';
-        
-        if (name) {
-          detail.ingredients.push({
-            name: name,
-            amount: amount
-          });
-        }
-      }
-    });
-  }
-  
-  // 提取步骤 - 豆果美食使用 .stepcont 结构
-  const stepContainers = doc.querySelectorAll('.stepcont');
-  stepContainers.forEach((container, index) => {
-    const stepInfo = container.querySelector('.stepinfo');
-    if (stepInfo) {
-      // 获取步骤文本（排除"步骤X"这个p标签）
-      const stepP = stepInfo.querySelector('p');
-      let text = '';
-      
-      // 获取stepinfo下的所有文本，但排除p标签
-      const childNodes = Array.from(stepInfo.childNodes);
-      childNodes.forEach(node => {
-        if (node.nodeType === Node.TEXT_NODE) {
-          text += node.textContent.trim() + ' ';
-        } else if (node.nodeName !== 'P') {
-          text += node.textContent.trim() + ' ';
-        }
-      });
-      
-      text = text.trim();
-      
-      // 获取步骤图片
-      const imgEl = container.querySelector('img');
-      const imgSrc = imgEl ? (imgEl.src || imgEl.dataset.src || '') : '';
-      
-      if (text && text.length > 3) {
-        detail.steps.push({
-          step: index + 1,
-          text: text,
-          image: imgSrc
-        });
-      }
-    }
-  });
-  
-  // 提取小贴士 - 豆果美食使用 .tips
-  const tipsEl = doc.querySelector('.tips');
-  if (tipsEl) {
-    // 获取tips中p标签的文本，排除标题
-    const tipsP = tipsEl.querySelector('p');
-    if (tipsP) {
-      detail.tips = tipsP.textContent.trim();
-    }
-  }
-  
-  console.log('✅ 解析完成:', {
-    标题: detail.title,
-    作者: detail.author,
-    描述长度: detail.description.length,
-    食材数量: detail.ingredients.length,
-    步骤数量: detail.steps.length,
-    有小贴士: !!detail.tips
-  });
-  
-  return detail;
-}
-
 function renderRecipeDetail(detail) {
   const contentEl = document.getElementById('recipe-detail-content');
   if (!contentEl) return;
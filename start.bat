@@ -110,6 +110,17 @@ if %errorlevel% neq 0 (
 echo ✅ 依赖安装成功
 echo.
 
+REM 补齐数据库结构（服务只读打开 data.db，不会自己迁移；可重复执行，没有 data.db 时跳过）
+echo 🗄️ 检查数据库结构...
+python db.py migrate --if-exists
+if %errorlevel% neq 0 (
+    echo ❌ 数据库迁移失败
+    cd ..
+    pause
+    exit /b 1
+)
+echo.
+
 REM 检查端口5000是否被占用
 netstat -ano | findstr ":5000" | findstr "LISTENING" >nul 2>&1
 if %errorlevel% equ 0 (
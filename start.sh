@@ -32,8 +32,15 @@ source venv/bin/activate
 echo "📦 安装依赖包..."
 pip install -q -r requirements.txt
 
-# 后台启动Flask
-python3 app.py > /dev/null 2>&1 &
+# 补齐数据库结构（服务只读打开 data.db，不会自己迁移；可重复执行，没有 data.db 时跳过）
+echo "🗄️ 检查数据库结构..."
+if ! python3 db.py migrate --if-exists; then
+    echo "❌ 数据库迁移失败"
+    exit 1
+fi
+
+# 后台启动Flask（生产模式：gunicorn多进程，见 api/serve.py）
+python3 serve.py > /dev/null 2>&1 &
 BACKEND_PID=$!
 echo "✅ 后端服务器已启动 (PID: $BACKEND_PID)"
 echo ""